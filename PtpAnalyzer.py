@@ -6,6 +6,7 @@ import cmdapp.Analyze as app
 from appcommon.AppLogger.Logger import Logger
 from appcommon.ConfigReader.ConfigReader import ConfigReader
 from mptp import mPTP
+from mptp.PtpStream import TrimEnd, TrimStart
 
 
 def main():
@@ -14,17 +15,31 @@ def main():
         file_path,
         log_severity,
         print_option,
+        compress_log,
         analyse_depth,
         plotter_off,
+        reader_options,
+        analysis_options,
     ) = dispatcher.dispatch_args()
 
     config = ConfigReader()
     config.plotter_off = plotter_off
-    logger = Logger(apputils.get_file_name_from_path(file_path), log_severity, print_option)
-    ptp = mPTP.PcapToPtpStream(file_path)
-    analyzer = mPTP.CreatePtpAnalyser(config, logger, ptp)
-    app.analyse_ptp(analyzer, analyse_depth)
+    reader_options.cache_max_size_mb = config.cache_max_size_mb
+    reader_options.cache_max_age_days = config.cache_max_age_days
+    reader_options.trim_start = TrimStart(config.capture_trim_start)
+    reader_options.trim_end = TrimEnd(config.capture_trim_end)
+    logger = Logger(
+        apputils.get_file_name_from_path(file_path), log_severity, print_option, compress_log=compress_log
+    )
+    try:
+        ptp = mPTP.PcapToPtpStream(file_path, reader_options, logger)
+        analyzer = mPTP.CreatePtpAnalyser(config, logger, ptp, analysis_options)
+        app.analyse_ptp(analyzer, analyse_depth)
+    finally:
+        # what is logged is written even if analysis failed
+        logger.close()
     apputils.print_footer(logger, start_time)
+    analyzer.wait_for_plots()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,164 @@
+import gzip
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from appcommon.AppLogger.BufferedLogger import BufferedLogger
+from appcommon.AppLogger.LogSinks import BATCH_LINES, CompressedFileSink, FileSink, LogSink, LogWriter
+from appcommon.AppLogger.Logger import Logger
+from appcommon.AppLogger.LoggerOptions import LogsSeverity, PrintOption
+from appcommon.AppLogger.RepeatedWarnings import RepeatedWarnings
+
+
+def warning_message(i: int) -> str:
+    return f"warning {i}"
+
+
+class LazyLoggingTest(unittest.TestCase):
+    def setUp(self):
+        self.logger = Logger("test_lazy_logging", LogsSeverity.InfoOnly, PrintOption.NoPrints)
+
+    def tearDown(self):
+        self.logger.close()
+        os.remove(self.logger.get_log_dir_and_name())
+
+    def test_builder_called_only_for_enabled_log_type(self):
+        builder = mock.Mock(return_value="built")
+        self.logger.warning(builder)
+        self.logger.debug(builder)
+        builder.assert_not_called()
+        self.logger.info(builder)
+        builder.assert_called_once_with()
+        self.logger.flush()
+        with open(self.logger.get_log_dir_and_name()) as log:
+            self.assertTrue(log.read().endswith("[INF] built\n"))
+
+    def test_buffered_logger_drops_disabled_log_types(self):
+        builder = mock.Mock(return_value="built")
+        sut = BufferedLogger(self.logger)
+        sut.warning(builder)
+        sut.msg_timing(mock.Mock())
+        sut.info(builder)
+        self.assertEqual([("info", ("built",))], sut.calls)
+        worker = BufferedLogger(None, "test.log", frozenset(("warning",)))
+        worker.info(builder)
+        worker.warning("kept")
+        self.assertEqual([("warning", ("kept",))], worker.calls)
+
+
+class ListSink(LogSink):
+    def __init__(self):
+        self.writes = []
+        self.closed = False
+
+    def write(self, text: str):
+        self.writes.append(text)
+
+    def close(self):
+        self.closed = True
+
+
+class FailingSink(ListSink):
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+
+    def write(self, text: str):
+        if self.failures > 0:
+            self.failures -= 1
+            raise OSError("No space left on device")
+        super().write(text)
+
+
+class LogWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_lines_written_in_batches_and_order(self):
+        sink = ListSink()
+        # long interval, so only full batch or close wakes writer up
+        sut = LogWriter([sink], flush_interval=60)
+        lines = [f"line {i}" for i in range(3 * BATCH_LINES + 5)]
+        for line in lines:
+            sut.write(line)
+        sut.close()
+        self.assertTrue(sink.closed)
+        self.assertLess(len(sink.writes), 10)
+        self.assertEqual("\n".join(lines) + "\n", "".join(sink.writes))
+
+    def test_file_and_compressed_sinks(self):
+        path = os.path.join(self.dir.name, "test.log")
+        sut = LogWriter([FileSink(path), CompressedFileSink(path + ".gz")])
+        sut.write("first")
+        sut.flush()
+        with open(path) as log:
+            self.assertEqual("first\n", log.read())
+        sut.write("second")
+        sut.close()
+        with gzip.open(path + ".gz", "rt") as log:
+            self.assertEqual("first\nsecond\n", log.read())
+
+    def test_lines_kept_when_writer_fails(self):
+        sink = FailingSink(failures=1)
+        sut = LogWriter([sink], flush_interval=0.001)
+        sut.write("kept")
+        sut._thread.join(timeout=5)
+        self.assertIsInstance(sut.error, OSError)
+        sut.write("after error")
+        sut.close()
+        self.assertEqual("kept\nafter error\n", "".join(sink.writes))
+
+
+class RepeatedWarningsTest(unittest.TestCase):
+    def test_warnings_over_limit_summarised(self):
+        logger = BufferedLogger(None)
+        sut = RepeatedWarnings(logger, "Test warnings", limit=3)
+        for i in range(10):
+            sut.add(warning_message, i)
+        sut.flush()
+        self.assertEqual(
+            ["warning 0", "warning 1", "warning 2", "Test warnings: 10 in total, 7 not logged, last of them:\nwarning 9"],
+            [args[0] for _, args in logger.calls],
+        )
+
+    def test_no_summary_within_limit(self):
+        logger = BufferedLogger(None)
+        sut = RepeatedWarnings(logger, "Test warnings", limit=3)
+        for i in range(3):
+            sut.add(warning_message, i)
+        sut.flush()
+        self.assertEqual(["warning 0", "warning 1", "warning 2"], [args[0] for _, args in logger.calls])
+
+    def test_not_built_when_disabled(self):
+        builder = mock.Mock(return_value="built")
+        sut = RepeatedWarnings(BufferedLogger(None, None, frozenset()), "Test warnings", limit=3)
+        for i in range(10):
+            sut.add(builder, i)
+        sut.add_not_logged(5, builder, 15)
+        sut.flush()
+        builder.assert_not_called()
+        self.assertEqual(15, len(sut))
+
+    def test_merged_same_as_added_together(self):
+        expected_logger = BufferedLogger(None)
+        expected = RepeatedWarnings(expected_logger, "Test warnings", limit=4)
+        for i in range(7):
+            expected.add(warning_message, i)
+        expected.flush()
+        for edge in (0, 2, 4, 6, 7):
+            logger = BufferedLogger(None)
+            sut = RepeatedWarnings(logger, "Test warnings", limit=4)
+            other = RepeatedWarnings(BufferedLogger(None), "Test warnings", limit=4)
+            for i in range(7):
+                (sut if i < edge else other).add(warning_message, i)
+            sut.merge(other)
+            sut.flush()
+            self.assertEqual(expected_logger.calls, logger.calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
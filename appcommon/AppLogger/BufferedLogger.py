@@ -0,0 +1,67 @@
+from typing import FrozenSet, List, Optional, Tuple
+from .ILogger import ILogger, LogMessage, build_message
+
+class BufferedLogger(ILogger):
+    # Keeps log calls and passes them to target logger on flush, so analyses running
+    # together still write their logs one after another, in the same order as alone.
+    # Calls are kept as logger method name and arguments, so they may be sent from
+    # worker process to be replayed by logger of main process. Log types disabled in
+    # target, or not in enabled_log_types of worker, are dropped before message is built.
+    def __init__(
+        self,
+        target: Optional[ILogger],
+        log_dir_and_name: str = None,
+        enabled_log_types: Optional[FrozenSet[str]] = None,
+    ):
+        self._target = target
+        self._log_dir_and_name = log_dir_and_name
+        self._enabled_log_types = enabled_log_types
+        self.calls: List[Tuple[str, tuple]] = []
+
+    def info(self, in_string: LogMessage):
+        self._add_message("info", in_string)
+
+    def debug(self, in_string: LogMessage):
+        self._add_message("debug", in_string)
+
+    def warning(self, in_string: LogMessage):
+        self._add_message("warning", in_string)
+
+    def error(self, in_string: LogMessage):
+        self._add_message("error", in_string)
+
+    def msg_timing(self, msg, time_offset=0):
+        if self.is_enabled("msg_timing"):
+            self.calls.append(("msg_timing", (msg, time_offset)))
+
+    def banner_small(self, in_string: str):
+        self.calls.append(("banner_small", (in_string,)))
+
+    def banner_large(self, in_string: str):
+        self.calls.append(("banner_large", (in_string,)))
+
+    def new_line(self):
+        self.calls.append(("new_line", ()))
+
+    def _add_message(self, log_type: str, message: LogMessage):
+        # Builders are called right away, state they read may change before flush
+        if self.is_enabled(log_type):
+            self.calls.append((log_type, (build_message(message),)))
+
+    def get_log_dir_and_name(self) -> str:
+        if self._target is None:
+            return self._log_dir_and_name
+        return self._target.get_log_dir_and_name()
+
+    def is_enabled(self, log_type: str) -> bool:
+        if self._enabled_log_types is not None:
+            return log_type in self._enabled_log_types
+        return self._target is None or self._target.is_enabled(log_type)
+
+    def flush(self):
+        self.flush_to(self._target)
+
+    def flush_to(self, target: ILogger):
+        calls, self.calls = self.calls, []
+        for name, args in calls:
+            getattr(target, name)(*args)
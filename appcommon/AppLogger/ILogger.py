@@ -1,20 +1,31 @@
 from abc import ABC, abstractmethod
+from typing import Callable, FrozenSet, Union
+
+# Message is a string or builder of it called only when its log type is enabled
+LogMessage = Union[str, Callable[[], str]]
+# Log types are named as logger methods
+LOG_TYPES = ("info", "debug", "warning", "error", "msg_timing", "banner_small", "banner_large", "new_line")
+
+
+def build_message(message: LogMessage) -> str:
+    return message() if callable(message) else message
+
 
 class ILogger(ABC):
     @abstractmethod
-    def info(self, in_string: str):
+    def info(self, in_string: LogMessage):
         pass
 
     @abstractmethod
-    def debug(self, in_string: str):
+    def debug(self, in_string: LogMessage):
         pass
 
     @abstractmethod
-    def warning(self, in_string: str):
+    def warning(self, in_string: LogMessage):
         pass
 
     @abstractmethod
-    def error(self, in_string: str):
+    def error(self, in_string: LogMessage):
         pass
 
     @abstractmethod
@@ -32,7 +43,15 @@ class ILogger(ABC):
     @abstractmethod
     def new_line(self):
         pass
-    
+
     @abstractmethod
     def get_log_dir_and_name(self) -> str:
-        pass
\ No newline at end of file
+        pass
+
+    def is_enabled(self, log_type: str) -> bool:
+        # Checked before costly messages are built, log type is name of logger method
+        return True
+
+
+def get_enabled_log_types(logger: ILogger) -> FrozenSet[str]:
+    return frozenset(log_type for log_type in LOG_TYPES if logger.is_enabled(log_type))
@@ -0,0 +1,118 @@
+import atexit
+import gzip
+import sys
+import threading
+from collections import deque
+from typing import List, Optional
+
+# Lines logged are written to sinks by background thread in batches, logging call only
+# appends line to queue. Writer wakes up when batch is full or flush interval passed,
+# so console output lags logging by at most the interval.
+BATCH_LINES = 1024
+FLUSH_INTERVAL_S = 0.1
+FILE_BUFFER_SIZE = 1024 * 1024
+
+
+class LogSink:
+    def write(self, text: str):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FileSink(LogSink):
+    def __init__(self, path: str):
+        self._file = open(path, "w", buffering=FILE_BUFFER_SIZE)
+
+    def write(self, text: str):
+        self._file.write(text)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class CompressedFileSink(FileSink):
+    # gzip file, written in the same batches as plain file
+    def __init__(self, path: str):
+        self._file = gzip.open(path, "wt")
+
+
+class ConsoleSink(LogSink):
+    def write(self, text: str):
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+
+class LogWriter:
+    # Writes lines to sinks in order they were logged. All lines are written and sinks
+    # closed on close(), which is called at interpreter exit if not called before. If
+    # background thread fails, lines left are written by thread calling flush or close,
+    # so the error is raised there.
+    def __init__(self, sinks: List[LogSink], flush_interval: float = FLUSH_INTERVAL_S):
+        self._sinks = sinks
+        self._flush_interval = flush_interval
+        self._lines = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self.error: Optional[Exception] = None
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, line: str):
+        self._lines.append(line)
+        if len(self._lines) >= BATCH_LINES:
+            self._wakeup.set()
+
+    def flush(self):
+        with self._lock:
+            self._write_lines()
+            for sink in self._sinks:
+                sink.flush()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        self._wakeup.set()
+        self._thread.join()
+        try:
+            self.flush()
+        finally:
+            for sink in self._sinks:
+                sink.close()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self._flush_interval)
+            self._wakeup.clear()
+            try:
+                with self._lock:
+                    self._write_lines()
+            except Exception as e:
+                self.error = e
+                return
+
+    def _write_lines(self):
+        lines = []
+        while self._lines:
+            lines.append(self._lines.popleft())
+        if not lines:
+            return
+        text = "\n".join(lines) + "\n"
+        try:
+            for sink in self._sinks:
+                sink.write(text)
+        except Exception:
+            # lines are given back, to be written by flush or close
+            self._lines.extendleft(reversed(lines))
+            raise
@@ -3,7 +3,8 @@ import os
 import time
 import datetime as date
 from .LoggerOptions import LogsSeverity, PrintOption
-from .ILogger import ILogger
+from .ILogger import ILogger, LogMessage, build_message
+from .LogSinks import CompressedFileSink, ConsoleSink, FileSink, LogWriter
 
 class Logger(ILogger):
     class LogType(Enum):
@@ -42,6 +43,14 @@ class Logger(ILogger):
         LogType.msg_timing,
         LogType.banner_small,
     )
+    _log_type_allowed = {
+        LogsSeverity.NoLogs: _log_type_allowed_in_no_logs,
+        LogsSeverity.ErrorsOnly: _log_type_allowed_in_error_only,
+        LogsSeverity.WaningsAndErrors: _log_type_allowed_in_waring_and_errors,
+        LogsSeverity.InfoOnly: _log_type_allowed_in_info_only,
+        LogsSeverity.Regular: _log_type_allowed_in_regular,
+        LogsSeverity.Debug: _log_type_allowed_in_debug,
+    }
 
     BANNER_LEN = 140
     LOGS_SEPARATOR = "\n"
@@ -57,50 +66,63 @@ class Logger(ILogger):
         severity=LogsSeverity.Regular,
         print_options=PrintOption.PrintToConsole,
         val_error_raise=False,
+        compress_log=False,
     ):
         self.severity = severity
         self.print_options = print_options
         self.val_error_raise = val_error_raise
         self._log_file_name = log_file_name + ".log"
         self._create_report_dir_if_not_created(self._prepare_path())
+        # Reports of analysis, like plots, are named after log_dir_and_name,
+        # compressed log is written to file of the same name with .gz suffix
         self.log_dir_and_name = self._prepare_path() + self._log_file_name
+        self.log_file_path = self.log_dir_and_name + ".gz" if compress_log else self.log_dir_and_name
+        self._writer = None
         if self.severity is LogsSeverity.NoLogs:
             return
+        sinks = [CompressedFileSink(self.log_file_path) if compress_log else FileSink(self.log_file_path)]
+        if self.print_options == PrintOption.PrintToConsole:
+            sinks.append(ConsoleSink())
+        self._writer = LogWriter(sinks)
         LOGS_TITLE = "PTP ANALYSER"
-        with open(self.log_dir_and_name, "w") as self._logFile:
-            self.banner_small("--------------------------")
-            self.banner_large(LOGS_TITLE)
-            self.info(f"Started at: {date.datetime.now()}")
+        self.banner_small("--------------------------")
+        self.banner_large(LOGS_TITLE)
+        self.info(f"Started at: {date.datetime.now()}")
+
+    def flush(self):
+        # Lines logged so far are written to log file and console
+        if self._writer is not None:
+            self._writer.flush()
 
-    def _write_to_log_file(self, in_string: str):
-        with open(self.log_dir_and_name, "a") as self._logFile:
-            self._logFile.write(in_string + self.LOGS_SEPARATOR)
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
 
-    def info(self, in_string: str):
+    def info(self, in_string: LogMessage):
         self._loggerCall(self.LogType.info, in_string)
 
-    def debug(self, in_string: str):
+    def debug(self, in_string: LogMessage):
         self._loggerCall(self.LogType.debug, in_string)
 
-    def warning(self, in_string: str):
+    def warning(self, in_string: LogMessage):
         self._loggerCall(self.LogType.warning, in_string)
 
-    def error(self, in_string: str):
+    def error(self, in_string: LogMessage):
         self._loggerCall(self.LogType.error, in_string)
 
     def msg_timing(self, msg, time_offset=0):
         self._loggerCall(
-            self.LogType.msg_timing, self._get_str_for_timing_log(msg, time_offset)
+            self.LogType.msg_timing, lambda: self._get_str_for_timing_log(msg, time_offset)
         )
 
     def banner_small(self, in_string: str):
         self._loggerCall(
-            self.LogType.banner_small, self._prepare_small_banner(in_string.upper())
+            self.LogType.banner_small, lambda: self._prepare_small_banner(in_string.upper())
         )
 
     def banner_large(self, in_string: str):
         self._loggerCall(
-            self.LogType.banner_large, self._prepare_large_banner(in_string.upper())
+            self.LogType.banner_large, lambda: self._prepare_large_banner(in_string.upper())
         )
 
     def new_line(self):
@@ -109,12 +131,16 @@ class Logger(ILogger):
     def get_log_dir_and_name(self):
         return self.log_dir_and_name
 
-    def _loggerCall(self, log_type: LogType = LogType.newline, in_string=""):
-        if self._is_in_severity(log_type) and self._is_str(in_string):
-            preamble = self._get_log_preamble(log_type)
-            log_str = preamble + in_string
-            self._write_to_log_file(log_str)
-            self._print_strict(log_str)
+    def is_enabled(self, log_type: str) -> bool:
+        return self._is_in_severity(self.LogType.newline if log_type == "new_line" else self.LogType[log_type])
+
+    def _loggerCall(self, log_type: LogType = LogType.newline, in_string: LogMessage = ""):
+        # Severity is checked first, message builders of disabled log types are not called
+        if not self._is_in_severity(log_type):
+            return
+        in_string = build_message(in_string)
+        if self._is_str(in_string) and self._writer is not None:
+            self._writer.write(self._get_log_preamble(log_type) + in_string)
 
     def _get_log_preamble(self, log_type: LogType) -> str:
         if log_type == self.LogType.info:
@@ -130,26 +156,8 @@ class Logger(ILogger):
         else:
             return ""
 
-    def _is_in_severity(self, log_type: LogsSeverity) -> bool:
-        if self.severity == LogsSeverity.NoLogs:
-            if log_type in self._log_type_allowed_in_no_logs:
-                return True
-        elif self.severity == LogsSeverity.ErrorsOnly:
-            if log_type in self._log_type_allowed_in_error_only:
-                return True
-        elif self.severity == LogsSeverity.WaningsAndErrors:
-            if log_type in self._log_type_allowed_in_waring_and_errors:
-                return True
-        elif self.severity == LogsSeverity.InfoOnly:
-            if log_type in self._log_type_allowed_in_info_only:
-                return True
-        elif self.severity == LogsSeverity.Regular:
-            if log_type in self._log_type_allowed_in_regular:
-                return True
-        elif self.severity == LogsSeverity.Debug:
-            if log_type in self._log_type_allowed_in_debug:
-                return True
-        return False
+    def _is_in_severity(self, log_type: LogType) -> bool:
+        return log_type in self._log_type_allowed.get(self.severity, ())
 
     def _is_str(self, string) -> bool:
         if isinstance(string, str):
@@ -161,7 +169,7 @@ class Logger(ILogger):
             return False
 
     def _get_str_for_timing_log(self, msg, time_offset: float) -> str:
-        t = time.strftime("%H:%M:%S", time.localtime(msg.time))
+        t = time.strftime("%H:%M:%S", time.localtime(float(msg.time)))
         return (
             f"Capture time: {t},\tCapture offset: {msg.time-time_offset:.9f},\t"
             f"Sequence ID: {msg.sequenceId}"
@@ -0,0 +1,55 @@
+from typing import Callable, List, Optional, Tuple
+from .ILogger import ILogger
+
+MAX_REPEATED_WARNINGS = 100
+
+
+class RepeatedWarnings:
+    # Warnings of one kind logged in full up to limit, following ones are only counted
+    # and summarised with the last of them, so log size is bounded on noisy captures.
+    # Warning is built out of builder and its arguments only when it is logged. Builder
+    # has to be module level function to send warnings from worker process for merging.
+    def __init__(self, logger: ILogger, kind: str, limit: int = MAX_REPEATED_WARNINGS):
+        self._logger = logger
+        self._kind = kind
+        self._limit = limit
+        self._logged: List[str] = []
+        self._last: Optional[Tuple[Callable[..., str], tuple]] = None
+        self.count = 0
+
+    @property
+    def left(self) -> int:
+        # Number of warnings which are still logged in full
+        return max(0, self._limit - self.count)
+
+    def add(self, build: Callable[..., str], *args):
+        if self.left > 0 and self._logger.is_enabled("warning"):
+            self._logged.append(build(*args))
+        self._last = (build, args)
+        self.count += 1
+
+    def add_not_logged(self, number: int, build: Callable[..., str], *args):
+        # Number of warnings over limit, arguments are of the last of them
+        self._last = (build, args)
+        self.count += number
+
+    def merge(self, other: "RepeatedWarnings"):
+        # Other warnings were added after ones here
+        self._logged += other._logged[: self.left]
+        if other.count > 0:
+            self._last = other._last
+        self.count += other.count
+
+    def flush(self):
+        logged, self._logged = self._logged, []
+        for message in logged:
+            self._logger.warning(message)
+        if self.count > self._limit:
+            build, args = self._last
+            self._logger.warning(
+                lambda: f"{self._kind}: {self.count} in total, {self.count - self._limit} not logged, "
+                f"last of them:\n{build(*args)}"
+            )
+
+    def __len__(self):
+        return self.count
@@ -3,21 +3,91 @@ import os
 
 class ConfigReader:
     plotter_off = False
-    
+    DEFAULT_CACHE_MAX_SIZE_MB = 2048
+    DEFAULT_CACHE_MAX_AGE_DAYS = 30
+    CAPTURE_TRIM_START_RULES = ("first_sync", "none")
+    CAPTURE_TRIM_END_RULES = ("last_delay_resp", "none")
+    EXCHANGE_MATCHERS = ("sequential", "sequence_id")
+    DEFAULT_EXCHANGE_REORDER_WINDOW_MS = 1000
+    DEFAULT_PLOT_DPI = 150
+    PLOT_FORMATS = ("png", "svg")
+
     def __init__(self):
+        self._config = self._read_config()
         self._ptp_rate_err = self.get_allowed_relative_ptp_rate_error()
-        
+        self._cache_max_size_mb = self._get_positive_number(
+            "parsed_capture_cache_max_size_mb", self.DEFAULT_CACHE_MAX_SIZE_MB
+        )
+        self._cache_max_age_days = self._get_positive_number(
+            "parsed_capture_cache_max_age_days", self.DEFAULT_CACHE_MAX_AGE_DAYS
+        )
+        self._capture_trim_start = self._get_choice("capture_trim_start", self.CAPTURE_TRIM_START_RULES)
+        self._capture_trim_end = self._get_choice("capture_trim_end", self.CAPTURE_TRIM_END_RULES)
+        self._exchange_matcher = self._get_choice("exchange_matcher", self.EXCHANGE_MATCHERS)
+        self._exchange_reorder_window_ms = self._get_positive_number(
+            "exchange_reorder_window_ms", self.DEFAULT_EXCHANGE_REORDER_WINDOW_MS
+        )
+        self._plot_dpi = self._get_positive_number("plot_dpi", self.DEFAULT_PLOT_DPI)
+        self._plot_format = self._get_choice("plot_format", self.PLOT_FORMATS)
+
     @property
     def ptp_rate_err(self):
         return self._ptp_rate_err
-    
+
+    @property
+    def cache_max_size_mb(self):
+        return self._cache_max_size_mb
+
+    @property
+    def cache_max_age_days(self):
+        return self._cache_max_age_days
+
+    @property
+    def capture_trim_start(self):
+        return self._capture_trim_start
+
+    @property
+    def capture_trim_end(self):
+        return self._capture_trim_end
+
+    @property
+    def exchange_matcher(self):
+        return self._exchange_matcher
+
+    @property
+    def exchange_reorder_window_ms(self):
+        return self._exchange_reorder_window_ms
+
+    @property
+    def plot_dpi(self):
+        return self._plot_dpi
+
+    @property
+    def plot_format(self):
+        return self._plot_format
+
     def get_allowed_relative_ptp_rate_error(self) -> float:
-        with open(self._get_path(), "r") as f:
-            config = json.load(f)
-        percent_err = config["allowed_relative_ptp_rate_error"]
+        percent_err = self._config["allowed_relative_ptp_rate_error"]
         self._check_correctness(percent_err)
         return self._percent_err_to_float(percent_err)
 
+    def _read_config(self) -> dict:
+        with open(self._get_path(), "r") as f:
+            return json.load(f)
+
+    def _get_positive_number(self, name: str, default: float) -> float:
+        value = self._config.get(name, default)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            raise Exception('Provided config invalid')
+        return value
+
+    def _get_choice(self, name: str, choices: tuple) -> str:
+        # First choice is default
+        value = self._config.get(name, choices[0])
+        if value not in choices:
+            raise Exception('Provided config invalid')
+        return value
+
     def _check_correctness(self, percent_err: str):
         if not percent_err.endswith("%"):
             raise Exception('Provided config invalid')
@@ -0,0 +1,30 @@
+from typing import Tuple
+import numpy as np
+
+# Series longer than two points per pixel column are reduced to min and max point of
+# each column, kept in time order, so outliers stay visible while number of points
+# rendered does not depend on capture length.
+
+
+def min_max_decimate(t: np.ndarray, values: np.ndarray, pixels: int) -> Tuple[np.ndarray, np.ndarray]:
+    finite = np.isfinite(values)
+    if not finite.all():
+        t, values = t[finite], values[finite]
+    if len(t) <= 2 * pixels:
+        return t, values
+    if np.any(t[1:] < t[:-1]):
+        order = np.argsort(t, kind="stable")
+        t, values = t[order], values[order]
+    # empty pixel columns have the same first point as the next column
+    starts = np.unique(np.searchsorted(t, np.linspace(t[0], t[-1], pixels + 1)[:-1]))
+    column = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(t))))
+    mins = _first_of_column(values == np.minimum.reduceat(values, starts)[column], column)
+    maxs = _first_of_column(values == np.maximum.reduceat(values, starts)[column], column)
+    kept = np.union1d(mins, maxs)
+    return t[kept], values[kept]
+
+
+def _first_of_column(selected: np.ndarray, column: np.ndarray) -> np.ndarray:
+    indexes = np.flatnonzero(selected)
+    columns = column[indexes]
+    return indexes[np.concatenate(([True], columns[1:] != columns[:-1]))]
@@ -1,77 +1,232 @@
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import matplotlib
+matplotlib.use("Agg")  # figures are only written to files
 import matplotlib.pyplot as plt
-from mptp.PtpCheckers.PtpTiming import PtpTiming
+import numpy as np
+from appcommon.Plotter.Decimation import min_max_decimate
+from mptp.PtpCheckers.PtpTiming import MsgInterval, PtpTiming
+from mptp.PtpCheckers.PtpOffset import PtpOffset
+from mptp.PtpCheckers.PtpSequenceId import PtpSequenceId
 from mptp.PtpPacket.PTPv2 import PtpType
+from mptp.PtpSequence import SequenceRunKind
+from mptp.PtpTimestamps import timestamps_to_ns
+
+DEFAULT_DPI = 150
+FIGURE_SIZE_INCHES = (24, 12)   # 11, 8,5 inches is A4
+SEQUENCE_RUN_COLORS = {
+    SequenceRunKind.Lost: 'red',
+    SequenceRunKind.Duplicated: 'orange',
+    SequenceRunKind.Reordered: 'purple',
+}
+
+
+@dataclass
+class RateHistogram:
+    # Msg rates binned in main process, only bins are sent to be rendered
+    title: str
+    counts: np.ndarray
+    edges: np.ndarray
+
+
+@dataclass
+class TimeSeries:
+    # Decimated in main process to at most two points per pixel column
+    label: str
+    color: str
+    t: np.ndarray
+    values: np.ndarray
+    linestyle: str = '-'
+
+
+@dataclass
+class TimeSeriesAxis:
+    title: str
+    ylabel: str
+    series: List[TimeSeries]
+    log_scale: bool = False
+
 
 class Plotter:
-    
-    def __init__(self, plotter_off=False, plot_dir_and_name:str = 'figure.png') -> None:
+    # Data of plots is prepared right away, figures are rendered in background process,
+    # so analysis does not wait for them. Plots of analyses run in worker processes are
+    # rendered there. wait has to be called before plot files are read. Time series are
+    # decimated to min and max of each pixel column, so render time does not grow with
+    # capture length.
+    def __init__(
+        self, plotter_off=False, plot_dir_and_name: str = 'figure.png', dpi: int = DEFAULT_DPI, plot_format: str = "png"
+    ) -> None:
         self._plotter_off = plotter_off
-        self._plot_path = plot_dir_and_name[:plot_dir_and_name.rfind(".")] + ".png"
-        
+        self._dpi = dpi
+        self._plot_path = plot_dir_and_name[:plot_dir_and_name.rfind(".")] + "." + plot_format
+        self._offset_plot_path = plot_dir_and_name[:plot_dir_and_name.rfind(".")] + "_offset." + plot_format
+        self._inter_arrival_plot_path = plot_dir_and_name[:plot_dir_and_name.rfind(".")] + "_inter_arrival." + plot_format
+        self._sequence_plot_path = plot_dir_and_name[:plot_dir_and_name.rfind(".")] + "_sequence." + plot_format
+        self._pixels = FIGURE_SIZE_INCHES[0] * dpi
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._renders: List[Future] = []
+
     def general_plots(self):
         pass
 
-    def plot_timings(self, announce: PtpTiming, sync: PtpTiming, follow_up: PtpTiming):
+    def plot_timings(self, announce: PtpTiming, sync: PtpTiming, follow_up: PtpTiming, time_offset_ns: int = 0):
         if self._plotter_off:
             return
-        if len(announce.msgs) == 0:
-            hist2,hist0 = self._create_subplots_without_announce()
-        else:
-            hist3, hist2, hist1, hist0 = self._create_subplots_with_announce()
-            self._add_timestamp_histogram(hist1, announce)
-            self._add_capture_histogram(hist3, announce) 
         ts = self._sync_or_followup_timestamps_input_determine(sync, follow_up)
-        self._add_timestamp_histogram(hist0, ts)
-        self._add_capture_histogram(hist2, ts)
-        self._save_plot_to_file(plt.gcf()) 
-
-    def _create_subplots_without_announce(self):
-        plt.rcParams["figure.autolayout"] = True
-        fig = plt.figure()
-        spec = fig.add_gridspec(ncols=1, nrows=2)
-        hist2 = fig.add_subplot(spec[1, 0])
-        hist0 = fig.add_subplot(spec[0, 0], sharex=hist2)
-        return hist2,hist0 
-    
-    def _create_subplots_with_announce(self):
-        plt.rcParams["figure.autolayout"] = True
-        fig = plt.figure()
-        spec = fig.add_gridspec(ncols=2, nrows=2) 
-        hist3 = fig.add_subplot(spec[1, 1])
-        hist2 = fig.add_subplot(spec[1, 0])
-        hist1 = fig.add_subplot(spec[0, 1], sharex=hist3)
-        hist0 = fig.add_subplot(spec[0, 0], sharex=hist2)
-        return hist3,hist2,hist1,hist0 
-    
+        # column of timestamp and capture histogram for each msg type
+        columns = [self._get_histograms(ts)]
+        if len(announce.msgs) != 0:
+            columns.append(self._get_histograms(announce))
+        self._render(_render_timings, columns, self._plot_path, self._dpi)
+        axes = [self._get_inter_arrival_errors(timing, time_offset_ns) for timing in (ts, announce)]
+        axes = [axis for axis in axes if axis is not None]
+        if len(axes) != 0:
+            self._render(_render_time_series, axes, self._inter_arrival_plot_path, self._dpi)
+
+    def plot_offset(self, offset: PtpOffset, time_offset_ns: int = 0):
+        if self._plotter_off or len(offset.offset_ns) == 0:
+            return
+        t = (offset.time_ns - time_offset_ns) / 1e9
+        axes = [
+            TimeSeriesAxis('Offset from master', 'offset [us]', [self._decimate('', 'green', t, offset.offset_ns / 1000)]),
+            TimeSeriesAxis(
+                'Mean path delay', 'delay [us]', [self._decimate('', 'blue', t, offset.mean_path_delay_ns / 1000)]
+            ),
+            TimeSeriesAxis('Master to slave and slave to master time', 'time [us]', [
+                self._decimate('T2 - T1', 'green', t, offset.master_to_slave_ns / 1000),
+                self._decimate('T4 - T3', 'blue', t, offset.slave_to_master_ns / 1000),
+            ]),
+        ]
+        self._render(_render_time_series, axes, self._offset_plot_path, self._dpi)
+
+    def plot_sequence_gaps(self, sequence_id: PtpSequenceId, time_offset_ns: int = 0):
+        # Runs of msgs out of order, number of msgs of run against its capture time
+        if self._plotter_off:
+            return
+        result = sequence_id.result()
+        t = (result.run_time_ns - time_offset_ns) / 1e9
+        series = [
+            self._decimate(kind.name, color, t[result.run_kind == kind], result.run_msgs[result.run_kind == kind], '')
+            for kind, color in SEQUENCE_RUN_COLORS.items()
+        ]
+        series = [s for s in series if len(s.t) != 0]
+        if len(series) != 0:
+            axis = TimeSeriesAxis('Sequence ID gaps', 'msgs [n]', series, log_scale=True)
+            self._render(_render_time_series, [axis], self._sequence_plot_path, self._dpi)
+
+    def wait(self):
+        # Errors of rendering are raised here
+        if self._pool is None:
+            return
+        try:
+            for render in self._renders:
+                render.result()
+        finally:
+            self._pool.shutdown()
+            self._pool, self._renders = None, []
+
+    def _render(self, render, *args):
+        if multiprocessing.parent_process() is not None:
+            render(*args)
+            return
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=1)
+        self._renders.append(self._pool.submit(render, *args))
+
     def _sync_or_followup_timestamps_input_determine(self, sync: PtpTiming, follow_up: PtpTiming):
         if len(follow_up.msgs) == 0:
             return sync
         else:
             return follow_up
-        
-    def _save_plot_to_file(self, figure):
-        figure.set_size_inches((24, 12), forward=False)    # 11, 8,5 inches is A4
-        figure.savefig(self._plot_path, dpi=600) 
-        
-    def _add_timestamp_histogram(self, ax, series):
-        hist_range = self._get_range(series)
-        num_bins = 40 if (hist_range[1] - hist_range[0]) < 4 else 120
-        ax.hist(series.msg_rates, num_bins, range=hist_range, facecolor='green', alpha=0.5, edgecolor='black')
-        ax.set(ylabel='occurrence [n]', title=f'{PtpType.get_ptp_type_str(series.msgs[0])} - Time Stamp')
-        self._set_grid_and_scale_for_timings(ax)
-        
-    def _add_capture_histogram(self, ax, series):
+
+    def _get_histograms(self, series: PtpTiming) -> Tuple[RateHistogram, RateHistogram]:
         hist_range = self._get_range(series)
         num_bins = 40 if (hist_range[1] - hist_range[0]) < 4 else 120
-        ax.hist(series.capture_rates, num_bins, range=hist_range, facecolor='blue', alpha=0.5, edgecolor='black')
-        ax.set(xlabel='msg rate [msg/sec]', ylabel='occurrence [n]', title=f'{PtpType.get_ptp_type_str(series.msgs[0])} - Capture')
-        self._set_grid_and_scale_for_timings(ax)
-        
-    def _set_grid_and_scale_for_timings(self, ax):
-        ax.grid(linestyle='--', which='minor', alpha=0.4)
-        ax.grid(linestyle='--', which='major', alpha=0.7)
-        ax.set_yscale('log')
-        
+        type_str = PtpType.get_ptp_type_str(series.msgs[0])
+        return (
+            RateHistogram(f'{type_str} - Time Stamp', *np.histogram(series.msg_rates, num_bins, range=hist_range)),
+            RateHistogram(f'{type_str} - Capture', *np.histogram(series.capture_rates, num_bins, range=hist_range)),
+        )
+
+    def _get_inter_arrival_errors(self, timing: PtpTiming, time_offset_ns: int) -> Optional[TimeSeriesAxis]:
+        # Time difference of consecutive msgs less expected interval, timestamps are taken
+        # up to first msg without them
+        if len(timing.msgs) < 2 or timing.msg_interval == MsgInterval.Unknown:
+            return None
+        time_ns = timing.msgs.column("time_ns")
+        timestamps_ns = timestamps_to_ns(timing.msgs.column("ts_sec"), timing.msgs.column("ts_ns"))
+        timestamp_pairs = len(timing.msg_rates)
+        t = (time_ns[1:] - time_offset_ns) / 1e9
+        return TimeSeriesAxis(
+            f'{PtpType.get_ptp_type_str(timing.msgs[0])} - inter-arrival error', 'error [us]', [
+                self._decimate(
+                    'Time Stamp', 'green', t[:timestamp_pairs],
+                    (np.diff(timestamps_ns[: timestamp_pairs + 1]) - timing.msg_interval.value) / 1000,
+                ),
+                self._decimate('Capture', 'blue', t, (np.diff(time_ns) - timing.msg_interval.value) / 1000),
+            ]
+        )
+
+    def _decimate(self, label: str, color: str, t: np.ndarray, values: np.ndarray, linestyle: str = '-') -> TimeSeries:
+        return TimeSeries(label, color, *min_max_decimate(t, values, self._pixels), linestyle)
+
     def _get_range(self, x):
-        return (round(min(x.capture_rates), 3), round(max(x.capture_rates), 3)) 
+        rates = x.capture_rates[np.isfinite(x.capture_rates)]
+        return (round(rates.min().item(), 3), round(rates.max().item(), 3))
         # by some reason when does not round to int sometimes does not print in log scale
+
+
+def _render_timings(columns: List[Tuple[RateHistogram, RateHistogram]], path: str, dpi: int):
+    plt.rcParams["figure.autolayout"] = True
+    fig = plt.figure()
+    spec = fig.add_gridspec(ncols=len(columns), nrows=2)
+    for i, (timestamp, capture) in enumerate(columns):
+        capture_ax = fig.add_subplot(spec[1, i])
+        timestamp_ax = fig.add_subplot(spec[0, i], sharex=capture_ax)
+        _add_histogram(timestamp_ax, timestamp, 'green')
+        _add_histogram(capture_ax, capture, 'blue')
+        capture_ax.set(xlabel='msg rate [msg/sec]')
+    _save_plot_to_file(fig, path, dpi)
+    plt.close(fig)
+
+
+def _render_time_series(axes: List[TimeSeriesAxis], path: str, dpi: int):
+    plt.rcParams["figure.autolayout"] = True
+    fig = plt.figure()
+    spec = fig.add_gridspec(ncols=1, nrows=len(axes))
+    bottom_ax = fig.add_subplot(spec[len(axes) - 1, 0])
+    for i, axis in enumerate(axes):
+        ax = bottom_ax if i == len(axes) - 1 else fig.add_subplot(spec[i, 0], sharex=bottom_ax)
+        for series in axis.series:
+            ax.plot(
+                series.t, series.values, color=series.color, linestyle=series.linestyle, linewidth=0.5,
+                marker='.', markersize=2 if series.linestyle else 6, label=series.label,
+            )
+        ax.set(ylabel=axis.ylabel, title=axis.title)
+        if axis.log_scale:
+            ax.set_yscale('log')
+        if any(series.label for series in axis.series):
+            ax.legend()
+        ax.grid(linestyle='--', alpha=0.7)
+    bottom_ax.set(xlabel='capture time [s]')
+    _save_plot_to_file(fig, path, dpi)
+    plt.close(fig)
+
+
+def _add_histogram(ax, histogram: RateHistogram, color: str):
+    # Bins are drawn as histogram of their left edges weighted with counts
+    ax.hist(
+        histogram.edges[:-1], histogram.edges, weights=histogram.counts,
+        facecolor=color, alpha=0.5, edgecolor='black',
+    )
+    ax.set(ylabel='occurrence [n]', title=histogram.title)
+    ax.grid(linestyle='--', which='minor', alpha=0.4)
+    ax.grid(linestyle='--', which='major', alpha=0.7)
+    ax.set_yscale('log')
+
+
+def _save_plot_to_file(figure, path: str, dpi: int):
+    figure.set_size_inches(FIGURE_SIZE_INCHES, forward=False)
+    figure.savefig(path, dpi=dpi)
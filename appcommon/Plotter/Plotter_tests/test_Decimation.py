@@ -0,0 +1,35 @@
+import unittest
+import numpy as np
+
+from appcommon.Plotter.Decimation import min_max_decimate
+
+
+class DecimationTest(unittest.TestCase):
+
+    def test_short_series_not_decimated(self):
+        t, values = np.arange(8.0), np.array([1, 2, np.nan, 4, 5, 6, 7, 8.0])
+        decimated_t, decimated_values = min_max_decimate(t, values, 4)
+        self.assertEqual([0, 1, 3, 4, 5, 6, 7], decimated_t.tolist())
+        self.assertEqual([1, 2, 4, 5, 6, 7, 8], decimated_values.tolist())
+
+    def test_min_and_max_of_each_pixel_kept_in_time_order(self):
+        t = np.arange(1000.0)
+        values = np.zeros(1000)
+        values[[10, 620]] = 50
+        values[[30, 600]] = -50
+        decimated_t, decimated_values = min_max_decimate(t, values, 4)
+        self.assertEqual([10, 30, 250, 600, 620, 750], decimated_t.tolist())
+        self.assertEqual([50, -50, 0, -50, 50, 0], decimated_values.tolist())
+
+    def test_points_bounded_by_pixels(self):
+        t = np.sort(np.random.default_rng(0).uniform(0, 100, 100000))
+        values = np.random.default_rng(1).normal(size=100000)
+        decimated_t, decimated_values = min_max_decimate(t, values, 100)
+        self.assertLessEqual(len(decimated_t), 200)
+        self.assertEqual(values.max(), decimated_values.max())
+        self.assertEqual(values.min(), decimated_values.min())
+        self.assertTrue(np.all(np.diff(decimated_t) > 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+
+from appcommon.Plotter.Plotter import Plotter
+from mptp.PtpCheckers.PtpTiming import PtpTiming
+from mptp.PtpCheckers.PtpCheckers_tests.PtpTiming_test import PtpTiming_test
+from tests.testutils.DummyLogger import DummyLogger
+
+
+class PlotterTest(unittest.TestCase):
+
+    dummy_logger = DummyLogger()
+
+    def setUp(self):
+        stream = PtpTiming_test.create_sync_test_data([125, 125, 200, 100, 125] * 20)
+        self.sync = PtpTiming(self.dummy_logger, stream.sync)
+        self.no_msgs = PtpTiming(self.dummy_logger, stream.sync[:0])
+
+    def test_rates_binned_before_rendering(self):
+        plotter = Plotter(plot_dir_and_name="capture.log")
+        timestamp, capture = plotter._get_histograms(self.sync)
+        self.assertEqual("Sync - Time Stamp", timestamp.title)
+        self.assertEqual(len(self.sync.capture_rates), capture.counts.sum())
+        self.assertEqual(121, len(capture.edges))
+        self.assertEqual(5, capture.edges[0])
+        self.assertEqual(10, capture.edges[-1])
+
+    def test_plots_rendered_in_background_to_configured_format(self):
+        with tempfile.TemporaryDirectory() as reports:
+            for plot_format in ("png", "svg"):
+                plotter = Plotter(False, os.path.join(reports, "capture.log"), 20, plot_format)
+                plotter.plot_timings(self.no_msgs, self.sync, self.no_msgs)
+                plotter.wait()
+                for plot in ("capture", "capture_inter_arrival"):
+                    self.assertTrue(os.path.getsize(os.path.join(reports, f"{plot}.{plot_format}")) > 0)
+
+    def test_inter_arrival_error_against_capture_time(self):
+        plotter = Plotter(plot_dir_and_name="capture.log")
+        axis = plotter._get_inter_arrival_errors(self.sync, self.sync.msgs.column("time_ns")[0])
+        timestamp, capture = axis.series
+        self.assertEqual("Sync - inter-arrival error", axis.title)
+        self.assertEqual([0, 0, 75000, -25000, 0], capture.values[:5].tolist())
+        self.assertEqual([0.125, 0.25, 0.45, 0.55, 0.675], capture.t[:5].tolist())
+        self.assertEqual(len(self.sync.msg_rates), len(timestamp.t))
+        self.assertIsNone(plotter._get_inter_arrival_errors(self.no_msgs, 0))
+
+    def test_nothing_rendered_when_plotter_off(self):
+        plotter = Plotter(True, "capture.log")
+        plotter.plot_timings(self.no_msgs, self.sync, self.no_msgs)
+        plotter.wait()
+        self.assertFalse(os.path.exists("capture.png"))
+
+
+if __name__ == '__main__':
+    unittest.main()
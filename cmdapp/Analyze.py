@@ -15,3 +15,6 @@ def analyse_ptp(analyser: Analyser, analyse_depth: tuple):
             analyser.analyse_timings()
         if "--match" in analyse_depth:
             analyser.analyse_if_stream_match_sequence_of_sync_dreq_dreq_pattern()
+        if "--offset" in analyse_depth:
+            analyser.analyse_offset_from_master()
+        analyser.finish_analyses()
@@ -1,12 +1,15 @@
+import os
 import sys
 import re
-from typing import Tuple
+from typing import Optional, Tuple
 from appcommon.AppLogger import LoggerOptions
+from mptp.AnalysisOptions import AnalysisMode, AnalysisOptions
+from mptp.PtpReader.ReaderOptions import CacheMode, PtpEngine, ReaderOptions
 from cmdapp.utils import print_help, print_greeting
 
 
 def dispatch_args() -> Tuple[
-    str, LoggerOptions.LogsSeverity, LoggerOptions.PrintOption, Tuple[str]
+    str, LoggerOptions.LogsSeverity, LoggerOptions.PrintOption, bool, Tuple[str], bool, ReaderOptions, AnalysisOptions
 ]:
     if "--help" in sys.argv or "-h" in sys.argv:
         print_help()
@@ -20,7 +23,10 @@ def dispatch_args() -> Tuple[
         quit()
     log_severity = LoggerOptions.LogsSeverity.InfoOnly
     print_option = LoggerOptions.PrintOption.PrintToConsole
+    compress_log = False
     plotter_off = False
+    reader_options = ReaderOptions()
+    analysis_options = AnalysisOptions()
     for a in sys.argv[2:]:
         if a in ("-v", "--verbose"):
             log_severity = LoggerOptions.LogsSeverity.Regular
@@ -30,8 +36,38 @@ def dispatch_args() -> Tuple[
             log_severity = LoggerOptions.LogsSeverity.Debug
         elif a in ("--no-prints", "-p"):
             print_option = LoggerOptions.PrintOption.NoPrints
+        elif a in ("--gzip-log", "-z"):
+            compress_log = True
         elif a in ("--no-plots", "-t"):
             plotter_off = True
+        elif a in ("--scapy", "-s"):
+            reader_options.engine = PtpEngine.Scapy
+        elif a in ("--fast", "-f"):
+            reader_options.engine = PtpEngine.Fast
+        elif a in ("--no-mmap", "-m"):
+            reader_options.mmap = False
+        elif a in ("--parallel", "-j"):
+            reader_options.workers = os.cpu_count() or 1
+        elif a in ("--no-cache", "-n"):
+            reader_options.cache = CacheMode.Bypass
+        elif a in ("--rebuild-cache", "-r"):
+            reader_options.cache = CacheMode.Rebuild
+        elif a.startswith("--time-range="):
+            time_range = parse_time_range(a[len("--time-range="):])
+            if time_range is None:
+                print(f"Invalid time range: {a}, expected --time-range=START:END in seconds")
+            else:
+                reader_options.time_range = time_range
+        elif a in ("--single-pass", "-o"):
+            analysis_options.mode = AnalysisMode.SinglePass
+        elif a in ("--concurrent", "-c"):
+            analysis_options.mode = AnalysisMode.Concurrent
+            analysis_options.workers = os.cpu_count() or 1
+        elif a in ("--time-shards", "-x"):
+            analysis_options.mode = AnalysisMode.TimeSharded
+            analysis_options.workers = os.cpu_count() or 1
+        elif a in ("--export-results", "-e"):
+            analysis_options.export_results = True
         elif a in (
             "--full",
             "--announce",
@@ -39,6 +75,7 @@ def dispatch_args() -> Tuple[
             "--sequenceId",
             "--timing",
             "--match",
+            "--offset",
         ):
             if not "analyse_depth" in locals():
                 analyse_depth = ()
@@ -53,4 +90,18 @@ def dispatch_args() -> Tuple[
         print("Wrong file name format provided")
         quit()
     print_greeting()
-    return (file_path, log_severity, print_option, analyse_depth, plotter_off)
+    return (file_path, log_severity, print_option, compress_log, analyse_depth, plotter_off, reader_options, analysis_options)
+
+
+def parse_time_range(value: str) -> Optional[Tuple[Optional[float], Optional[float]]]:
+    # START:END in seconds from first frame, either side may be left empty
+    bounds = value.split(":")
+    if len(bounds) != 2:
+        return None
+    try:
+        start, end = (float(b) if b else None for b in bounds)
+    except ValueError:
+        return None
+    if start is not None and end is not None and end <= start:
+        return None
+    return start, end
@@ -13,30 +13,53 @@ def get_help():
         f"\t5. Detection and check of message rate errors\n"
         f"\t6. Providing statistics of intervals and rates\n"
         f"\t7. Checking PTP messages not in sequence (one-step-mode)\n"
-        f"\t8. Providing statistics of intervals between PTP message exchanges\n\n"
+        f"\t8. Providing statistics of intervals between PTP message exchanges\n"
+        f"\t9. Joining two-step Sync with Follow-up, statistics of Sync to Follow-up turnaround\n"
+        f"\t10. Offset from master and mean path delay of exchanges, statistics and plot\n\n"
         f"USAGE:\n"
         f"PtpAnalyzer.py can be run as python argument or simply ./ :\n"
         f"\tpython PtpAnalyzer.py [FILENAME] [options]\n"
         f"\t./PtpAnalyzer.py [FILENAME] [options]\n\n"
         f"Application works under Linux and Windows as well.\n"
-        f"Argument [FILENAME] is mandatory. Pcap file is dispatched by scapy,\n"
-        f"which does not accept tcpdumps taken from all interfaces (Linux cooked capture).\n"
+        f"Argument [FILENAME] is mandatory. Pcap and pcapng files are read natively,\n"
+        f"tcpdumps taken from all interfaces (Linux cooked capture) are accepted as well.\n"
+        f"PTP over Ethernet, UDP/IPv4 and UDP/IPv6 (ports 319, 320) also VLAN tagged is found.\n"
+        f"Captures compressed with gzip, xz, zstd or lz4 are decompressed on the fly.\n"
         f"All other options are, well optional and not required. Default arguments are marked\n"
         f"as DEFAULT in argument list below. Order of options does not matter, however\n"
         f"if more than one option impact the same functionality last one is taken.\n"
         f"Analysis depth arguments adds up.\n\n"
         f"Analysis reports are stored in <Ptp Analyser Path>/reports/ \n"
-        f"as .log files named same as provided pcap file. If file exist will be overwritten!\n\n"
+        f"as .log files named same as provided pcap file. If file exist will be overwritten!\n"
+        f"Parsed PTP messages are cached in <Ptp Analyser Path>/cache/, so next analysis of\n"
+        f"the same capture skips parsing. Cache limits are set in config.json.\n"
+        f"Capture is trimmed to start at first Sync and end at last Delay Response,\n"
+        f"trimming rules are set in config.json.\n\n"
         f"OPTIONS:\n"
         f"-v or --verbose\t\t\t\tMore logging and printing, all warnings and wrong frames time\n"
         f"-l or --no-logs\t\t\t\tTurns off creating report file\n"
         f"-p or --no-prints\t\t\tTurns off printing logs to console\n"
-        f"-t or --no-plots\t\t\tTurns off timings histogram png file creation\n"
+        f"-z or --gzip-log\t\t\tWrite report compressed with gzip to .log.gz file\n"
+        f"-t or --no-plots\t\t\tTurns off timings, sequence and offset plot files creation\n"
+        f"-f or --fast\t\t\t\tFast struct based PTP decoder - DEFAULT\n"
+        f"-s or --scapy\t\t\t\tReference scapy PTP dissection, much slower, cache not used\n"
+        f"-m or --no-mmap\t\t\t\tStream pcap/pcapng instead of memory mapping it (fast decoder only)\n"
+        f"-j or --parallel\t\t\tParse big pcap in parallel on all CPU cores (fast decoder only)\n"
+        f"-n or --no-cache\t\t\tDo not use nor store parsed capture cache\n"
+        f"-r or --rebuild-cache\t\t\tParse capture again and replace its cache entry\n"
+        f"--time-range=START:END\t\t\tAnalyse only frames captured START to END seconds after first frame,\n"
+        f"\t\t\t\t\teither may be omitted, parsed capture cache is not used\n"
+        f"\t\t\t\t\tbut pcapng block index is kept in cache for next seeks\n"
+        f"-o or --single-pass\t\t\tRun all analyses together in one pass over PTP messages\n"
+        f"-c or --concurrent\t\t\tRun analyses concurrently in worker processes\n"
+        f"-x or --time-shards\t\t\tSplit long capture into time shards analysed on all CPU cores\n"
+        f"-e or --export-results\t\t\tWrite results of checks to .jsonl and event columns to .npz file\n"
         f"--full\t\t\t\t\tAnalysis Depth - all available analysis - DEFAULT\n"
         f"--announce\t\t\t\tAnalysis Depth - announce PTP messages check\n"
         f"--ports\t\t\t\t\tAnalysis Depth - MAC and Clock ID check\n"
         f"--sequenceId\t\t\t\tAnalysis Depth - PTP message sequence ID check\n"
         f"--timing\t\t\t\tAnalysis Depth - Message rate and interval check with statistics\n"
         f"--match\t\t\t\t\tAnalysis Depth - One step mesage exchange check with statistics\n"
+        f"--offset\t\t\t\tAnalysis Depth - Offset from master and mean path delay with statistics\n"
         f"-h or --help\t\t\t\tPrint help\n\n"
     )
@@ -1,21 +1,39 @@
 import re
+import sys
 import time
+from typing import Optional
 from .help import get_help
-from appcommon.AppLogger import ILogger
+from appcommon.AppLogger.Logger import Logger
+
+try:
+    import resource
+except ImportError:  # not available under Windows
+    resource = None
 
 
 def get_file_name_from_path(file_path: str) -> str:
     return re.search("[\w-]+\.", file_path).group(0)[:-1]
 
 
+def get_peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is given in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
 def print_greeting():
     print("Starting PTP pcap Analyser\n-----\n")
 
 
-def print_footer(logger: ILogger, start_time: float):
+def print_footer(logger: Logger, start_time: float):
+    peak_rss = get_peak_rss_mb()
+    peak_rss_str = f"{peak_rss:.1f} MB" if peak_rss is not None else "n/a"
     print(
-        f"\n-----\nLog file location: {logger.get_log_dir_and_name()}\n"
-        f"PTP analysis took approx.: {time.time() - start_time:.3f} seconds\nDone!"
+        f"\n-----\nLog file location: {logger.log_file_path}\n"
+        f"PTP analysis took approx.: {time.time() - start_time:.3f} seconds, "
+        f"peak memory usage (RSS): {peak_rss_str}\nDone!"
     )
 
 
@@ -1,23 +1,72 @@
 import time
-from appcommon.AppLogger.ILogger import ILogger
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import FrozenSet, List, Optional, Tuple
+from appcommon.AppLogger.ILogger import ILogger, get_enabled_log_types
+from appcommon.AppLogger.BufferedLogger import BufferedLogger
 from appcommon.Plotter.Plotter import Plotter
 from appcommon.ConfigReader.ConfigReader import ConfigReader
+from mptp.AnalysisOptions import AnalysisMode, AnalysisOptions
 from mptp.PtpStream import PtpStream
+from mptp.PtpPipeline import PipelineStage, PtpPipeline, split_into_time_shards
+from mptp.PtpResults import CheckResult, write_results
+from mptp.PtpSharedColumns import SharedColumns, SharedColumnsHandle, attach_shared_columns
 from mptp.PtpCheckers.PtpTiming import PtpTiming
 from mptp.PtpCheckers.PtpMatched import PtpMatched
+from mptp.PtpCheckers.PtpJoinMatched import PtpJoinMatched
+from mptp.PtpCheckers.PtpTwoStep import PtpTwoStep
+from mptp.PtpCheckers.PtpOffset import PtpOffset
 from mptp.PtpCheckers.PtpSequenceId import PtpSequenceId
 from mptp.PtpCheckers.PtpAnnounceSignal import PtpAnnounceSignal
 from mptp.PtpCheckers.PtpPortCheck import PtpPortCheck
+from mptp.PtpCheckers.PtpCheckerStages import (
+    AnnounceStage,
+    JoinMatchedStage,
+    MatchedStage,
+    OffsetStage,
+    PortCheckStage,
+    SequenceIdStage,
+    TimingStage,
+    TwoStepStage,
+)
+from mptp.PtpPacket.PTPv2 import PTP_MSG_TYPE
+
+ANALYSES_NUM = 6
+MIN_SHARD_MSGS = 256 * 1024
+ONE_MS_IN_NS = 1000000
 
 
 class Analyser:
-    def __init__(self, config: ConfigReader, logger: ILogger, ptp_stream: PtpStream):
+    def __init__(
+        self, config: ConfigReader, logger: ILogger, ptp_stream: PtpStream, options: AnalysisOptions = AnalysisOptions()
+    ):
         self._logger: ILogger = logger
-        self._plotter = Plotter(config.plotter_off, logger.get_log_dir_and_name())
+        self._plotter = Plotter(
+            config.plotter_off, logger.get_log_dir_and_name(), config.plot_dpi, config.plot_format
+        )
         self._config: ConfigReader = config
         self._ptp_stream: PtpStream = ptp_stream
+        self._options = options
+        # In single pass mode analyses are only registered as pipeline stages and run
+        # together by finish_analyses, logs of each analysis are buffered till then.
+        # In time sharded mode the pipeline runs over time shards of stream in worker
+        # processes and stages of shards are merged. In concurrent mode analyses run
+        # in worker processes, finish_analyses writes their logs in order in which
+        # analyses were started.
+        with_pipeline = options.mode in (AnalysisMode.SinglePass, AnalysisMode.TimeSharded)
+        self._pipeline = PtpPipeline(ptp_stream) if with_pipeline else None
+        self._sharded_analyses: List[str] = []
+        self._analysis_logs: List[BufferedLogger] = []
+        self._sequence_to_plot = False
+        self._timings_to_plot = False
+        self._offset_to_plot = False
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._shared_columns: Optional[SharedColumns] = None
+        self._analysis_jobs: List[Future] = []
+        # checkers in order analyses were started, their results are taken when finished
+        self._checkers: List = []
+        self.results: List[CheckResult] = []
         if len(ptp_stream.ptp_total) > 0:
-            t = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ptp_stream.ptp_total[0].time))
+            t = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(float(ptp_stream.ptp_total[0].time)))
             self._logger.info(f"Pcap started at: {t}")
         self._logger.banner_small("counted messages")
         self._logger.info(self._ptp_stream.__repr__())
@@ -31,39 +80,277 @@ class Analyser:
         self.analyse_sequence_id()
         self.analyse_timings()
         self.analyse_if_stream_match_sequence_of_sync_dreq_dreq_pattern()
+        self.analyse_offset_from_master()
+        self.finish_analyses()
         self._logger.banner_small("Finished")
         self._logger.info("Done")
 
+    def finish_analyses(self):
+        self._run_pipeline()
+        self._collect_concurrent_analyses()
+        checkers, self._checkers = self._checkers, []
+        if self._options.export_results:
+            self.results += _get_results(checkers)
+            write_results(self._logger.get_log_dir_and_name(), self.results)
+
+    def wait_for_plots(self):
+        # Plots are rendered in background, report is complete before they are
+        self._plotter.wait()
+
+    def _run_pipeline(self):
+        if self._pipeline is None:
+            return
+        if self._options.mode is AnalysisMode.TimeSharded:
+            self._process_time_shards()
+        else:
+            self._pipeline.process(0, len(self._ptp_stream.columns))
+        self._pipeline.finish()
+        for log in self._analysis_logs:
+            log.flush()
+        self._analysis_logs = []
+        if self._sequence_to_plot:
+            self._sequence_to_plot = False
+            self._plot_sequence_gaps()
+        if self._timings_to_plot:
+            self._timings_to_plot = False
+            self._plot_timings()
+        if self._offset_to_plot:
+            self._offset_to_plot = False
+            self._plot_offset()
+
+    def _process_time_shards(self):
+        # First shard is processed here while following ones are processed by workers
+        columns = self._ptp_stream.columns
+        shards = min(self._options.workers, max(1, len(columns) // MIN_SHARD_MSGS))
+        bounds = split_into_time_shards(columns, shards)
+        if len(bounds) == 1:
+            self._pipeline.process(0, len(columns))
+            return
+        with SharedColumns(columns) as shared, ProcessPoolExecutor(max_workers=len(bounds) - 1) as pool:
+            jobs = [
+                pool.submit(
+                    _process_shard,
+                    shared.handle,
+                    self._ptp_stream.time_offset_ns,
+                    self._config,
+                    self._logger.get_log_dir_and_name(),
+                    get_enabled_log_types(self._logger),
+                    self._sharded_analyses,
+                    start,
+                    end,
+                )
+                for start, end in bounds[1:]
+            ]
+            self._pipeline.process(*bounds[0])
+            for job, (start, end) in zip(jobs, bounds[1:]):
+                self._pipeline.merge(job.result(), start, end)
+
+    def _collect_concurrent_analyses(self):
+        if self._pool is None:
+            return
+        try:
+            for job in self._analysis_jobs:
+                log = BufferedLogger(self._logger)
+                log.calls, results = job.result()
+                log.flush()
+                self.results += results
+        finally:
+            self._pool.shutdown()
+            self._shared_columns.close()
+            self._pool, self._shared_columns, self._analysis_jobs = None, None, []
+
+    def _start_analysis(self, analysis: str, shardable: bool = True) -> bool:
+        # True when analysis is submitted to worker process, otherwise it has to be run here.
+        # Analyses registered in pipeline of time shards are repeated by shard workers.
+        if self._options.mode is AnalysisMode.TimeSharded and shardable:
+            self._sharded_analyses.append(analysis)
+        if self._options.mode is not AnalysisMode.Concurrent:
+            return False
+        if self._pool is None:
+            self._shared_columns = SharedColumns(self._ptp_stream.columns)
+            self._pool = ProcessPoolExecutor(max_workers=min(ANALYSES_NUM, self._options.workers))
+        job = self._pool.submit(
+            _run_analysis,
+            self._shared_columns.handle,
+            self._ptp_stream.time_offset_ns,
+            self._config,
+            self._logger.get_log_dir_and_name(),
+            get_enabled_log_types(self._logger),
+            analysis,
+            self._options.export_results,
+        )
+        self._analysis_jobs.append(job)
+        return True
+
     def analyse_announce(self):
-        self._announce_sig = PtpAnnounceSignal(self._logger, self._ptp_stream.time_offset)
-        self._announce_sig.check_announce_consistency(self._ptp_stream.announce)
+        if self._start_analysis("analyse_announce", shardable=False):
+            return
+        logger = self._get_analysis_logger()
+        self._announce_sig = PtpAnnounceSignal(logger, self._ptp_stream.time_offset)
+        self._checkers.append(self._announce_sig)
+        # Announce msgs are few, they are not split into time shards
+        if self._pipeline is None or self._options.mode is AnalysisMode.TimeSharded:
+            self._announce_sig.check_announce_consistency(self._ptp_stream.announce)
+        else:
+            self._pipeline.add_stage(AnnounceStage(self._announce_sig))
 
     def analyse_ports(self):
-        port_check = PtpPortCheck(self._logger, self._ptp_stream.time_offset)
-        port_check.check_ports(self._ptp_stream.ptp_total)
+        if self._start_analysis("analyse_ports"):
+            return
+        logger = self._get_analysis_logger()
+        port_check = PtpPortCheck(logger, self._ptp_stream.time_offset)
+        self._checkers.append(port_check)
+        if self._pipeline is None:
+            port_check.check_ports(self._ptp_stream.ptp_total)
+        else:
+            self._pipeline.add_stage(PortCheckStage(port_check, len(self._ptp_stream.ptp_total)))
 
     def analyse_sequence_id(self):
+        if self._start_analysis("analyse_sequence_id"):
+            return
+        logger = self._get_analysis_logger()
         if len(self._ptp_stream.ptp_total) == 0:
-            self._logger.error("PTP stream empty")
+            logger.error("PTP stream empty")
             return
-        self._logger.banner_large("ptp messages sequence id analysis")
-        seq_check = PtpSequenceId(self._logger, self._ptp_stream.time_offset)
-        seq_check.check_sync_followup_sequence(self._ptp_stream.sync, self._ptp_stream.follow_up)
-        seq_check.check_delay_req_resp_sequence(self._ptp_stream.delay_req, self._ptp_stream.delay_resp)
-        seq_check.check_dresp_dresp_fup_sequence(self._ptp_stream.delay_resp, self._ptp_stream.delay_resp_fup)
+        logger.banner_large("ptp messages sequence id analysis")
+        self._sequence_id = PtpSequenceId(logger, self._ptp_stream.time_offset)
+        self._checkers.append(self._sequence_id)
+        if self._pipeline is not None:
+            self._pipeline.add_stage(SequenceIdStage(self._sequence_id))
+            self._sequence_to_plot = True
+            return
+        self._sequence_id.check_sync_followup_sequence(self._ptp_stream.sync, self._ptp_stream.follow_up)
+        self._sequence_id.check_delay_req_resp_sequence(self._ptp_stream.delay_req, self._ptp_stream.delay_resp)
+        self._sequence_id.check_dresp_dresp_fup_sequence(self._ptp_stream.delay_resp, self._ptp_stream.delay_resp_fup)
+        self._plot_sequence_gaps()
 
     def analyse_timings(self):
+        if self._start_analysis("analyse_timings"):
+            return
+        logger = self._get_analysis_logger()
         if len(self._ptp_stream.ptp_total) == 0:
-            self._logger.error("PTP stream empty")
+            logger.error("PTP stream empty")
             return
-        self._logger.banner_large("ptp timing and rate")
-        self._announce_timing = PtpTiming(self._logger, self._ptp_stream.announce, self._ptp_stream.time_offset, self._config.ptp_rate_err)
-        self._sync_timing = PtpTiming(self._logger, self._ptp_stream.sync, self._ptp_stream.time_offset, self._config.ptp_rate_err)
-        self._followup_timing = PtpTiming(self._logger, self._ptp_stream.follow_up, self._ptp_stream.time_offset, self._config.ptp_rate_err)
-        self._plotter.plot_timings(self._announce_timing, self._sync_timing, self._followup_timing)
+        logger.banner_large("ptp timing and rate")
+        self._announce_timing = self._create_timing(logger, self._ptp_stream.announce, PTP_MSG_TYPE.ANNOUNCE_MSG)
+        self._sync_timing = self._create_timing(logger, self._ptp_stream.sync, PTP_MSG_TYPE.SYNC_MSG)
+        self._followup_timing = self._create_timing(logger, self._ptp_stream.follow_up, PTP_MSG_TYPE.FOLLOW_UP_MSG)
+        if self._pipeline is None:
+            self._plot_timings()
+        else:
+            self._timings_to_plot = True
 
     def analyse_if_stream_match_sequence_of_sync_dreq_dreq_pattern(self):
+        if self._start_analysis("analyse_if_stream_match_sequence_of_sync_dreq_dreq_pattern"):
+            return
+        logger = self._get_analysis_logger()
         if len(self._ptp_stream.sync) == 0:
-            self._logger.error("No PTP Sync messages")
+            logger.error("No PTP Sync messages")
+            return
+        msgs = self._ptp_stream.ptp_total if self._pipeline is None else None
+        if self._config.exchange_matcher == "sequence_id":
+            window_ns = round(self._config.exchange_reorder_window_ms * ONE_MS_IN_NS)
+            self._sync_dreq_dresp_match = PtpJoinMatched(logger, msgs, self._ptp_stream.time_offset, window_ns)
+            stage = JoinMatchedStage(self._sync_dreq_dresp_match)
+        else:
+            self._sync_dreq_dresp_match = PtpMatched(logger, msgs, self._ptp_stream.time_offset)
+            stage = MatchedStage(self._sync_dreq_dresp_match)
+        self._checkers.append(self._sync_dreq_dresp_match)
+        if self._pipeline is None:
+            self._two_step = PtpTwoStep(logger, self._ptp_stream.sync, self._ptp_stream.follow_up, self._ptp_stream.time_offset)
+        else:
+            self._pipeline.add_stage(stage)
+            self._two_step = PtpTwoStep(logger, None, None, self._ptp_stream.time_offset)
+            self._pipeline.add_stage(TwoStepStage(self._two_step))
+        self._checkers.append(self._two_step)
+
+    def analyse_offset_from_master(self):
+        if self._start_analysis("analyse_offset_from_master"):
             return
-        self._sync_dreq_dresp_match = PtpMatched(self._logger, self._ptp_stream.ptp_total, self._ptp_stream.time_offset)
+        logger = self._get_analysis_logger()
+        if self._pipeline is None:
+            self._offset = PtpOffset(logger, self._ptp_stream.ptp_total, self._ptp_stream.time_offset)
+            self._plot_offset()
+        else:
+            self._offset = PtpOffset(logger, None, self._ptp_stream.time_offset)
+            self._pipeline.add_stage(OffsetStage(self._offset))
+            self._offset_to_plot = True
+        self._checkers.append(self._offset)
+
+    def _get_analysis_logger(self) -> ILogger:
+        if self._pipeline is None:
+            return self._logger
+        log = BufferedLogger(self._logger)
+        self._analysis_logs.append(log)
+        return log
+
+    def _create_timing(self, logger: ILogger, msgs, msg_type: PTP_MSG_TYPE) -> PtpTiming:
+        if self._pipeline is None:
+            timing = PtpTiming(logger, msgs, self._ptp_stream.time_offset, self._config.ptp_rate_err)
+        else:
+            # each timing logs at creation and at finish, so gets own buffer
+            timing = PtpTiming(
+                self._get_analysis_logger(), msgs, self._ptp_stream.time_offset, self._config.ptp_rate_err,
+                in_batches=True,
+            )
+            self._pipeline.add_stage(TimingStage(timing, msg_type))
+        self._checkers.append(timing)
+        return timing
+
+    def _plot_sequence_gaps(self):
+        self._plotter.plot_sequence_gaps(self._sequence_id, self._ptp_stream.time_offset_ns)
+
+    def _plot_timings(self):
+        self._plotter.plot_timings(
+            self._announce_timing, self._sync_timing, self._followup_timing, self._ptp_stream.time_offset_ns
+        )
+
+    def _plot_offset(self):
+        self._plotter.plot_offset(self._offset, self._ptp_stream.time_offset_ns)
+
+
+def _run_analysis(
+    columns: SharedColumnsHandle,
+    time_offset_ns: int,
+    config: ConfigReader,
+    log_dir_and_name: str,
+    enabled_log_types: FrozenSet[str],
+    analysis: str,
+    export_results: bool,
+) -> Tuple[List[Tuple[str, tuple]], List[CheckResult]]:
+    # Runs in worker process, logs and results are sent back to main process
+    stream = PtpStream.from_trimmed_columns(attach_shared_columns(columns), time_offset_ns)
+    logger = BufferedLogger(None, log_dir_and_name, enabled_log_types)
+    analyser = Analyser(config, logger, stream)
+    logger.calls = []  # stream summary is logged by main process
+    getattr(analyser, analysis)()
+    return logger.calls, _get_results(analyser._checkers) if export_results else []
+
+
+def _get_results(checkers: list) -> List[CheckResult]:
+    # Checkers without msgs to analyse have no result
+    results = (checker.result() for checker in checkers)
+    return [result for result in results if result is not None]
+
+
+def _process_shard(
+    columns: SharedColumnsHandle,
+    time_offset_ns: int,
+    config: ConfigReader,
+    log_dir_and_name: str,
+    enabled_log_types: FrozenSet[str],
+    analyses: List[str],
+    start: int,
+    end: int,
+) -> List[PipelineStage]:
+    # Runs in worker process, stages which processed shard are sent back to be merged
+    stream = PtpStream.from_trimmed_columns(attach_shared_columns(columns), time_offset_ns)
+    logger = BufferedLogger(None, log_dir_and_name, enabled_log_types)
+    analyser = Analyser(config, logger, stream, AnalysisOptions(AnalysisMode.SinglePass))
+    for analysis in analyses:
+        getattr(analyser, analysis)()
+    # what is logged when analyses start is logged by main process
+    for log in [logger] + analyser._analysis_logs:
+        log.calls = []
+    analyser._pipeline.process(start, end)
+    return analyser._pipeline.stages
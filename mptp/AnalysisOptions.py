@@ -0,0 +1,17 @@
+from enum import Enum
+from dataclasses import dataclass
+
+
+class AnalysisMode(Enum):
+    Serial = 0
+    SinglePass = 1
+    Concurrent = 2
+    TimeSharded = 3
+
+
+@dataclass
+class AnalysisOptions:
+    mode: AnalysisMode = AnalysisMode.Serial
+    workers: int = 1
+    # typed results of checkers are kept and written next to report
+    export_results: bool = False
@@ -1,42 +1,96 @@
 from dataclasses import dataclass
 
 from appcommon.AppLogger.ILogger import ILogger
-from typing import List
+from typing import List, Optional, Tuple, Union
+import numpy as np
+from mptp.PtpColumns import PtpMsgView
 from mptp.PtpPacket.PTPv2 import PTPv2, PtpType, PTP_MSG_TYPE
+from mptp.PtpResults import AnnounceResult, msg_time_ns
 
 
 class PtpAnnounceSignal:
+    # Announce stream is checked for change points only: in batches of columns the key
+    # of msg is made of its interned Announce body and source port identity, msgs are
+    # decoded only where key changes. Changes are logged as compact timeline.
     def __init__(self, logger: ILogger, time_offset=0):
         self.time_offset = time_offset
         self._logger = logger
         self._announce_data = AnnounceData()
+        self._announce_counter = 0
+        self._inconsistent_counter = 0
+        self._first_key: Optional[int] = None
+        self._last_key: Optional[int] = None
+        self._last_data = AnnounceData()
+        self._changes: List[Tuple[PTPv2, AnnounceData, AnnounceData]] = []
 
-    def check_announce_consistency(self, announce: List[PTPv2]):
-        if not announce:
+    def check_announce_consistency(self, announce: Union[List[PTPv2], PtpMsgView]):
+        if len(announce) == 0:
             self._logger.info("PTP Announce list empty.")
             return
         if not self._is_input_valid(announce):
             self._logger.error("PTP Announce input invalid!")
             return
-        self._announce_data = AnnounceData(announce[0])
+        if isinstance(announce, PtpMsgView):
+            self.add_batch(announce)
+        else:
+            for msg in announce:
+                self.add_announce(msg)
+        self.finish_announce_check()
+
+    def add_announce(self, msg: PTPv2):
+        # Announce messages may be also given one by one, first one is the reference
+        data = AnnounceData(msg)
+        if self._announce_counter == 0:
+            self._add_first(msg, data)
+        elif data != self._last_data:
+            self._add_change(msg, data)
+        self._announce_counter += 1
+        if data != self._announce_data:
+            self._inconsistent_counter += 1
+
+    def add_batch(self, msgs: PtpMsgView):
+        if len(msgs) == 0:
+            return
+        keys = (msgs.column("announce").astype(np.int64) << 32) | msgs.column("source_port").astype(np.uint32)
+        if self._announce_counter == 0:
+            self._first_key = keys[0].item()
+            self._last_key = self._first_key
+            self._add_first(msgs[0], AnnounceData(msgs[0]))
+        previous = np.concatenate(([self._last_key], keys[:-1]))
+        for i in np.flatnonzero(keys != previous).tolist():
+            self._add_change(msgs[i], AnnounceData(msgs[i]))
+        self._announce_counter += len(keys)
+        self._inconsistent_counter += int(np.count_nonzero(keys != self._first_key))
+        self._last_key = keys[-1].item()
+
+    def _add_first(self, msg: PTPv2, data: "AnnounceData"):
+        self._announce_data = data
+        self._last_data = data
         self._logger.banner_large("PTP Announce")
-        self._check_announce_stream_consistency(announce)
-        self._logger.info(self.__repr__())
 
-    def _check_announce_stream_consistency(self, announce: List[PTPv2]):
-        inconsistent_counter = 0
-        for msg in announce:
-            if AnnounceData(msg) != self._announce_data:
-                inconsistent_counter += 1
-                if inconsistent_counter == 1:
-                    self._logger.banner_small("Inconsistent Announce messages")
+    def _add_change(self, msg: PTPv2, data: "AnnounceData"):
+        self._changes.append((msg, self._last_data, data))
+        self._last_data = data
+
+    def finish_announce_check(self):
+        if self._announce_counter == 0:
+            self._logger.info("PTP Announce list empty.")
+            return
+        if self._changes:
+            self._logger.banner_small("Announce changes timeline")
+            for msg, previous, data in self._changes:
+                self._logger.warning(f"Announce changed: {data.changes_from(previous)}")
                 self._logger.msg_timing(msg, self.time_offset)
-        if inconsistent_counter > 0:
-            self._logger.warning(f"Number of inconsistencies: {inconsistent_counter}")
+            self._logger.warning(f"Number of Announce changes: {len(self._changes)}")
+        if self._inconsistent_counter > 0:
+            self._logger.warning(f"Number of inconsistencies: {self._inconsistent_counter}")
         else:
             self._logger.info(f"PTP Announce stream: [OK]")
+        self._logger.info(self.__repr__())
 
-    def _is_input_valid(self, msgs: List[PTPv2]) -> bool:
+    def _is_input_valid(self, msgs: Union[List[PTPv2], PtpMsgView]) -> bool:
+        if isinstance(msgs, PtpMsgView):
+            return bool(np.all(msgs.column("msg_type") == PTP_MSG_TYPE.ANNOUNCE_MSG.value))
         for msg in msgs:
             if PtpType.get_ptp_msg_type(msg) != PTP_MSG_TYPE.ANNOUNCE_MSG:
                 return False
@@ -46,6 +100,21 @@ class PtpAnnounceSignal:
     def announce_data(self):
         return self._announce_data
 
+    @property
+    def changes(self) -> List[Tuple[PTPv2, "AnnounceData", "AnnounceData"]]:
+        return self._changes
+
+    def result(self) -> AnnounceResult:
+        return AnnounceResult(
+            ok=self._inconsistent_counter == 0,
+            announce_msgs=self._announce_counter,
+            inconsistent_msgs=self._inconsistent_counter,
+            changes=len(self._changes),
+            source=self._announce_data._fields() if self._announce_counter > 0 else {},
+            change_time_ns=np.array([msg_time_ns(msg) for msg, _, _ in self._changes], dtype=np.int64),
+            change_sequence_id=np.array([msg.sequenceId for msg, _, _ in self._changes], dtype=np.uint16),
+        )
+
     def __repr__(self) -> str:
         return self._announce_data.__repr__()
 
@@ -76,6 +145,36 @@ class AnnounceData:
             self.local_steps_removed = 0
             self.time_source = 0
 
+    def _fields(self) -> dict:
+        return {
+            "Clock ID": self.clock_id,
+            "UTC Offset": self.origin_utc_offset,
+            "priority1": self.priority_1,
+            "grandmasterClockClass": self.grandmaster_clock_class,
+            "grandmasterClockAccuracy": PTPv2.CLK_ACCURACY.get(
+                self.grandmaster_clock_accuracy, self.grandmaster_clock_accuracy
+            ),
+            "grandmasterClockVariance": self.grandmaster_clock_variance,
+            "priority2": self.priority_2,
+            "grandmasterClockIdentity": (
+                f"0x{self.grandmaster_clock_id.hex()}"
+                if isinstance(self.grandmaster_clock_id, bytes)
+                else self.grandmaster_clock_id
+            ),
+            "localStepsRemoved": self.local_steps_removed,
+            "TimeSource": PTPv2.TIME_SOURCE.get(self.time_source, self.time_source),
+        }
+
+    def changes_from(self, previous: "AnnounceData") -> str:
+        # Fields which differ, as old -> new
+        before = previous._fields()
+        return ", ".join(
+            f"{name}: {before[name]} -> {value}" for name, value in self._fields().items() if before[name] != value
+        )
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, AnnounceData) and self._fields() == other._fields()
+
     def __repr__(self) -> str:
         return (
             f"PTP signal source data from announce msg:\n\tClock ID: {self.clock_id},\n\t"
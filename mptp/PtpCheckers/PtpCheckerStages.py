@@ -0,0 +1,203 @@
+import numpy as np
+from mptp.PtpPacket.PTPv2 import PTP_MSG_TYPE
+from mptp.PtpPacket.PtpDecoder import PtpRecord
+from mptp.PtpColumns import PtpMsgView
+from mptp.PtpPipeline import PipelineStage
+from mptp.PtpCheckers.PtpAnnounceSignal import PtpAnnounceSignal
+from mptp.PtpCheckers.PtpMatched import PtpMatched
+from mptp.PtpCheckers.PtpOffset import PtpOffset
+from mptp.PtpCheckers.PtpJoinMatched import PtpJoinMatched
+from mptp.PtpCheckers.PtpPortCheck import PtpPortCheck
+from mptp.PtpCheckers.PtpSequenceId import (
+    DELAY_REQ_TYPES,
+    DELAY_RESP_FOLLOW_UP_TYPES,
+    DELAY_RESP_TYPES,
+    FOLLOW_UP_TYPES,
+    SYNC_TYPES,
+    PtpSequenceId,
+)
+from mptp.PtpCheckers.PtpTiming import PtpTiming
+from mptp.PtpCheckers.PtpTwoStep import PtpTwoStep
+
+# Checkers adapted to single pass pipeline, each stage feeds its checker
+# with messages of types the checker looks at
+
+
+class AnnounceStage(PipelineStage):
+    msg_types = (PTP_MSG_TYPE.ANNOUNCE_MSG,)
+    uses_records = False
+
+    def __init__(self, announce_signal: PtpAnnounceSignal):
+        self._announce_signal = announce_signal
+
+    def add_batch(self, msgs: PtpMsgView):
+        self._announce_signal.add_batch(msgs)
+
+    def finish(self):
+        self._announce_signal.finish_announce_check()
+
+
+class PortCheckStage(PipelineStage):
+    msg_types = (
+        PTP_MSG_TYPE.ANNOUNCE_MSG,
+        PTP_MSG_TYPE.SYNC_MSG,
+        PTP_MSG_TYPE.FOLLOW_UP_MSG,
+        PTP_MSG_TYPE.DELAY_REQ_MSG,
+        PTP_MSG_TYPE.PDELAY_REQ_MSG,
+        PTP_MSG_TYPE.DELAY_RESP_MSG,
+        PTP_MSG_TYPE.PDELAY_RESP_MSG,
+        PTP_MSG_TYPE.PDELAY_RESP_FOLLOW_UP_MSG,
+    )
+    uses_records = False
+
+    def __init__(self, port_check: PtpPortCheck, msgs_number: int):
+        self._port_check = port_check
+        self._enough_msgs = port_check.start_check(msgs_number)
+
+    def add_batch(self, msgs: PtpMsgView):
+        if self._enough_msgs:
+            self._port_check.add_batch(msgs)
+
+    def merge(self, other: "PortCheckStage") -> bool:
+        # Flows and bindings of other shard are added to ones registered here
+        if self._enough_msgs:
+            self._port_check.merge(other._port_check)
+        return True
+
+    def finish(self):
+        if self._enough_msgs:
+            self._port_check.finish_check()
+
+
+class SequenceIdStage(PipelineStage):
+    msg_types = SYNC_TYPES + FOLLOW_UP_TYPES + DELAY_REQ_TYPES + DELAY_RESP_TYPES + DELAY_RESP_FOLLOW_UP_TYPES
+
+    uses_records = False
+
+    def __init__(self, sequence_id: PtpSequenceId):
+        self._sequence_id = sequence_id
+        self._sync = sequence_id.create_tracker(SYNC_TYPES)
+        self._follow_up = sequence_id.create_tracker(FOLLOW_UP_TYPES)
+        self._delay_req = sequence_id.create_tracker(DELAY_REQ_TYPES)
+        self._delay_resp = sequence_id.create_tracker(DELAY_RESP_TYPES)
+        self._delay_resp_fup = sequence_id.create_tracker(DELAY_RESP_FOLLOW_UP_TYPES)
+
+    def add_batch(self, msgs: PtpMsgView):
+        msg_type = msgs.column("msg_type")
+        for tracker in (self._sync, self._follow_up, self._delay_req, self._delay_resp, self._delay_resp_fup):
+            selected = np.isin(msg_type, [t.value for t in tracker.msg_types])
+            if selected.any():
+                tracker.add_batch(PtpMsgView(msgs.columns, msgs.indexes[selected]))
+
+    def merge(self, other: "SequenceIdStage") -> bool:
+        for tracker in ("_sync", "_follow_up", "_delay_req", "_delay_resp", "_delay_resp_fup"):
+            getattr(self, tracker).merge(getattr(other, tracker))
+        return True
+
+    def finish(self):
+        self._sequence_id.check_sync_followup_sequence(self._sync, self._follow_up)
+        self._sequence_id.check_delay_req_resp_sequence(self._delay_req, self._delay_resp)
+        self._sequence_id.check_dresp_dresp_fup_sequence(self._delay_resp, self._delay_resp_fup)
+
+
+class TimingStage(PipelineStage):
+    uses_records = False
+
+    def __init__(self, timing: PtpTiming, msg_type: PTP_MSG_TYPE):
+        self.msg_types = (msg_type,)
+        self._timing = timing
+
+    def add_batch(self, msgs: PtpMsgView):
+        self._timing.add_batch(msgs)
+
+    def merge(self, other: "TimingStage") -> bool:
+        self._timing.merge(other._timing)
+        return True
+
+    def finish(self):
+        self._timing.finish()
+
+
+class MatchedStage(PipelineStage):
+    msg_types = (
+        PTP_MSG_TYPE.SYNC_MSG,
+        PTP_MSG_TYPE.FOLLOW_UP_MSG,
+        PTP_MSG_TYPE.DELAY_REQ_MSG,
+        PTP_MSG_TYPE.PDELAY_REQ_MSG,
+        PTP_MSG_TYPE.DELAY_RESP_MSG,
+        PTP_MSG_TYPE.PDELAY_RESP_MSG,
+    )
+
+    def __init__(self, matched: PtpMatched):
+        self._matched = matched
+
+    def add(self, msg: PtpRecord):
+        self._matched.add_msg(msg)
+
+    def merge(self, other: "MatchedStage") -> bool:
+        self._matched.merge(other._matched)
+        return True
+
+    def finish(self):
+        self._matched.finish()
+
+
+class JoinMatchedStage(PipelineStage):
+    msg_types = MatchedStage.msg_types
+    uses_records = False
+
+    def __init__(self, matched: PtpJoinMatched):
+        self._matched = matched
+
+    def add_batch(self, msgs: PtpMsgView):
+        self._matched.add_batch(msgs)
+
+    def merge(self, other: "JoinMatchedStage") -> bool:
+        return self._matched.merge(other._matched)
+
+    def finish(self):
+        self._matched.finish()
+
+
+class TwoStepStage(PipelineStage):
+    msg_types = (PTP_MSG_TYPE.SYNC_MSG, PTP_MSG_TYPE.FOLLOW_UP_MSG)
+    uses_records = False
+
+    def __init__(self, two_step: PtpTwoStep):
+        self._two_step = two_step
+
+    def add_batch(self, msgs: PtpMsgView):
+        self._two_step.add_batch(msgs)
+
+    def merge(self, other: "TwoStepStage") -> bool:
+        self._two_step.merge(other._two_step)
+        return True
+
+    def finish(self):
+        self._two_step.finish()
+
+
+class OffsetStage(PipelineStage):
+    msg_types = (
+        PTP_MSG_TYPE.SYNC_MSG,
+        PTP_MSG_TYPE.FOLLOW_UP_MSG,
+        PTP_MSG_TYPE.DELAY_REQ_MSG,
+        PTP_MSG_TYPE.DELAY_RESP_MSG,
+        PTP_MSG_TYPE.PDELAY_REQ_MSG,
+        PTP_MSG_TYPE.PDELAY_RESP_MSG,
+        PTP_MSG_TYPE.PDELAY_RESP_FOLLOW_UP_MSG,
+    )
+    uses_records = False
+
+    def __init__(self, offset: PtpOffset):
+        self._offset = offset
+
+    def add_batch(self, msgs: PtpMsgView):
+        self._offset.add_batch(msgs)
+
+    def merge(self, other: "OffsetStage") -> bool:
+        self._offset.merge(other._offset)
+        return True
+
+    def finish(self):
+        self._offset.finish()
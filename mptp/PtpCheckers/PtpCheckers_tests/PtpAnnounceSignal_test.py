@@ -0,0 +1,75 @@
+from mptp.PtpPacket.PTPv2 import PTP_MSG_TYPE
+from mptp.PtpCheckers.PtpAnnounceSignal import PtpAnnounceSignal
+from mptp.PtpStream import PtpStream, TrimEnd, TrimStart
+from mptp.mptp_tests.test_PtpStream import create_ptp_packet
+from tests.testutils.DummyLogger import DummyLogger
+from unittest import mock
+import unittest
+
+GRANDMASTER_ID = b"\x11\x22\x33\xff\xfe\x44\x55\x66"
+OTHER_GRANDMASTER_ID = b"\x11\x22\x33\xff\xfe\x44\x55\x77"
+
+
+class PtpAnnounceSignal_test(unittest.TestCase):
+
+    dummy_logger = DummyLogger()
+
+    def test_constant_announce_stream(self):
+        logger = mock.Mock()
+        sut = PtpAnnounceSignal(logger)
+        sut.check_announce_consistency(self.create_stream([6] * 20).announce)
+        self.assertEqual([], sut.changes)
+        logger.info.assert_any_call("PTP Announce stream: [OK]")
+        self.assertEqual(6, sut.announce_data.grandmaster_clock_class)
+
+    def test_changes_timeline(self):
+        logger = mock.Mock()
+        sut = PtpAnnounceSignal(logger)
+        clock_classes = [6] * 10 + [7] * 10 + [6] * 10 + [6] * 10
+        sut.check_announce_consistency(self.create_stream(clock_classes, grandmaster_changed_at=30).announce)
+        self.assertEqual([10, 20, 30], [msg.sequenceId for msg, _, _ in sut.changes])
+        self.assertEqual(
+            [
+                "grandmasterClockClass: 6 -> 7",
+                "grandmasterClockClass: 7 -> 6",
+                "grandmasterClockIdentity: 0x112233fffe445566 -> 0x112233fffe445577",
+            ],
+            [data.changes_from(previous) for _, previous, data in sut.changes],
+        )
+        logger.warning.assert_any_call("Number of Announce changes: 3")
+        logger.warning.assert_any_call("Number of inconsistencies: 20")
+        self.assertEqual(3, logger.msg_timing.call_count)
+
+    def test_in_batches_same_as_msg_by_msg(self):
+        clock_classes = [6] * 5 + [7] * 3 + [6] * 4 + [248] * 8
+        stream = self.create_stream(clock_classes, grandmaster_changed_at=15)
+        expected = PtpAnnounceSignal(self.dummy_logger)
+        expected.check_announce_consistency(list(stream.announce))
+        for edge in (1, 5, 8, 19):
+            sut = PtpAnnounceSignal(self.dummy_logger)
+            sut.add_batch(stream.announce[:edge])
+            sut.add_batch(stream.announce[edge:])
+            self.assertEqual(
+                [(msg.sequenceId, previous, data) for msg, previous, data in expected.changes],
+                [(msg.sequenceId, previous, data) for msg, previous, data in sut.changes],
+            )
+            self.assertEqual(expected._inconsistent_counter, sut._inconsistent_counter)
+
+    @staticmethod
+    def create_stream(clock_classes, grandmaster_changed_at: int = None) -> PtpStream:
+        packets = []
+        for i, clock_class in enumerate(clock_classes):
+            grandmaster = GRANDMASTER_ID
+            if grandmaster_changed_at is not None and i >= grandmaster_changed_at:
+                grandmaster = OTHER_GRANDMASTER_ID
+            packets.append(
+                create_ptp_packet(
+                    PTP_MSG_TYPE.ANNOUNCE_MSG, i, i * 1000,
+                    grandmasterClockClass=clock_class, grandmasterClockId=grandmaster,
+                )
+            )
+        return PtpStream(packets, TrimStart.NoTrim, TrimEnd.NoTrim)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+from mptp.PtpPacket.PTPv2 import PTP_MSG_TYPE
+from mptp.PtpCheckers.PtpMatched import PtpExchangeMatcher, PtpMatched
+from mptp.PtpCheckers.PtpJoinMatched import PtpJoinMatched
+from mptp.PtpStream import PtpStream, TrimEnd, TrimStart
+from mptp.mptp_tests.test_PtpStream import create_exchange_test_data
+from tests.testutils.DummyLogger import DummyLogger
+import unittest
+
+ONE_MS_IN_NS = 1000000
+
+
+class PtpJoinMatched_test(unittest.TestCase):
+
+    dummy_logger = DummyLogger()
+
+    def setUp(self):
+        self.packets = create_exchange_test_data(10)
+
+    def test_exchanges_in_order_matched_as_sequentially(self):
+        stream = self.create_stream()
+        sut = PtpJoinMatched(self.dummy_logger, stream.ptp_total, stream.time_offset)
+        sequential = PtpMatched(self.dummy_logger, stream.ptp_total, stream.time_offset)
+        self.assertEqual(len(sequential.ptp_exchanges), len(sut.ptp_exchanges))
+        self.assertEqual(repr(sequential), repr(sut))
+        self.assertEqual(list(range(10)), sut.ptp_exchanges.column("sequence_id").tolist())
+        self.assertEqual(sequential._get_exchange_delays()[2], sut._get_exchange_delays()[2])
+        self.assertEqual(sequential.result().exchanges, sut.result().exchanges)
+        self.assertEqual(sequential.result().ok, sut.result().ok)
+
+    def test_reordered_and_interleaved_exchanges_matched(self):
+        # Delay Resp captured before its Delay Req, next Sync before Delay Resp
+        self.packets[10], self.packets[11] = self.packets[11], self.packets[10]
+        self.packets[19], self.packets[20] = self.packets[20], self.packets[19]
+        stream = self.create_stream()
+        sut = PtpJoinMatched(self.dummy_logger, stream.ptp_total, stream.time_offset)
+        sequential = PtpMatched(self.dummy_logger, stream.ptp_total, stream.time_offset)
+        self.assertEqual(10, len(sut.ptp_exchanges))
+        self.assertEqual(0, len(sut.ptp_unmatched))
+        self.assertLess(len(sequential.ptp_exchanges), 10)
+
+    def test_msgs_without_pair_discarded_in_capture_order(self):
+        del self.packets[14]  # Delay Req 3
+        del self.packets[22]  # Delay Resp 5
+        stream = self.create_stream()
+        sut = PtpJoinMatched(self.dummy_logger, stream.ptp_total, stream.time_offset)
+        self.assertEqual(8, len(sut.ptp_exchanges))
+        self.assertEqual((2, 1, 1), sut._get_discarded_counts())
+        self.assertEqual(
+            [(PTP_MSG_TYPE.SYNC_MSG.value, 3), (PTP_MSG_TYPE.DELAY_RESP_MSG.value, 3),
+             (PTP_MSG_TYPE.SYNC_MSG.value, 5), (PTP_MSG_TYPE.DELAY_REQ_MSG.value, 5)],
+            [(t, seq) for t, _, seq in sut._get_unordered_msgs()],
+        )
+
+    def test_delay_resp_out_of_reorder_window_discarded(self):
+        self.packets.insert(28, self.packets.pop(7))  # Delay Resp 1 captured with exchange 6
+        stream = self.create_stream()
+        sut = PtpJoinMatched(self.dummy_logger, stream.ptp_total, stream.time_offset, 100 * ONE_MS_IN_NS)
+        self.assertEqual(9, len(sut.ptp_exchanges))
+        self.assertEqual((1, 1, 1), sut._get_discarded_counts())
+        sut = PtpJoinMatched(self.dummy_logger, stream.ptp_total, stream.time_offset, 1000 * ONE_MS_IN_NS)
+        self.assertEqual(10, len(sut.ptp_exchanges))
+
+    def test_merged_shards_same_as_whole_stream(self):
+        del self.packets[23]  # Delay Resp 5
+        stream = self.create_stream()
+        window = 100 * ONE_MS_IN_NS
+        expected = PtpJoinMatched(self.dummy_logger, stream.ptp_total, stream.time_offset, window)
+        for edge in (8, 20, 27):
+            self.assertEqual(PTP_MSG_TYPE.SYNC_MSG.value, stream.ptp_total[edge].messageType)
+            sut = PtpJoinMatched(self.dummy_logger, None, stream.time_offset, window)
+            sut.add_batch(stream.ptp_total[:edge])
+            other = PtpJoinMatched(self.dummy_logger, None, stream.time_offset, window)
+            other.add_batch(stream.ptp_total[edge:])
+            self.assertTrue(sut.merge(other))
+            sut.finish()
+            self.assertEqual(repr(expected), repr(sut))
+            self.assertEqual(list(expected._get_unordered_msgs()), list(sut._get_unordered_msgs()))
+            self.assertEqual(expected._get_exchange_delays(), sut._get_exchange_delays())
+
+    def test_merge_refused_when_msg_left_pending(self):
+        stream = self.create_stream()
+        sut = PtpJoinMatched(self.dummy_logger, None, stream.time_offset)
+        sut.add_batch(stream.ptp_total[:7])
+        other = PtpJoinMatched(self.dummy_logger, None, stream.time_offset)
+        other.add_batch(stream.ptp_total[7:])
+        self.assertFalse(sut.merge(other))
+
+    def test_incomplete_matcher_not_created(self):
+        class NoDiscardedCounts(PtpJoinMatched):
+            _get_discarded_counts = PtpExchangeMatcher._get_discarded_counts
+
+        with self.assertRaises(TypeError):
+            NoDiscardedCounts(self.dummy_logger, None)
+
+    def create_stream(self) -> PtpStream:
+        return PtpStream(self.packets, TrimStart.NoTrim, TrimEnd.NoTrim)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+from mptp.PtpPacket.PTPv2 import PTPv2, PTP_MSG_TYPE, TWO_STEP_FLAG
+from mptp.PtpCheckers.PtpOffset import PtpOffset
+from mptp.PtpStream import PtpStream, TrimEnd, TrimStart
+from mptp.mptp_tests.test_PtpStream import SLAVE_PORT, create_exchange_test_data, create_ptp_packet
+from tests.testutils.DummyLogger import DummyLogger
+import unittest
+import numpy as np
+
+ONE_SEC_IN_NS = 1000000000
+# capture clock stands for slave clock, it is ahead of master by OFFSET_NS
+OFFSET_NS = 7000
+PATH_DELAY_NS = 2000
+
+
+def capture_ns(p) -> int:
+    return int(p.time.scaleb(9))
+
+
+def set_timestamp(p, name: str, ns: int):
+    # raw value of 80 bit timestamp field, exact to nanosecond
+    p[PTPv2].fields[name] = ((ns // ONE_SEC_IN_NS) << 32) | (ns % ONE_SEC_IN_NS)
+
+
+def set_correction(p, ns: int):
+    p[PTPv2].correctionField = ns << 16
+
+
+class PtpOffset_test(unittest.TestCase):
+
+    dummy_logger = DummyLogger()
+
+    def setUp(self):
+        self.packets = create_exchange_test_data(8)
+        self.set_exchange_timestamps(OFFSET_NS)
+
+    def set_exchange_timestamps(self, offset_ns: int):
+        for p in self.packets:
+            msg_type = p[PTPv2].messageType
+            if msg_type == PTP_MSG_TYPE.SYNC_MSG.value:
+                sync_ns = capture_ns(p)
+                set_timestamp(p, "originTimestamp", sync_ns - PATH_DELAY_NS - offset_ns)
+            elif msg_type == PTP_MSG_TYPE.FOLLOW_UP_MSG.value:
+                set_timestamp(p, "preciseOriginTimestamp", sync_ns - PATH_DELAY_NS - offset_ns)
+            elif msg_type == PTP_MSG_TYPE.DELAY_REQ_MSG.value:
+                delay_req_ns = capture_ns(p)
+            elif msg_type == PTP_MSG_TYPE.DELAY_RESP_MSG.value:
+                set_timestamp(p, "receiveTimestamp", delay_req_ns + PATH_DELAY_NS - offset_ns)
+
+    def test_offset_and_mean_path_delay_of_exchanges(self):
+        sut = PtpOffset(self.dummy_logger, self.create_stream().ptp_total)
+        self.assertEqual(8, sut.delay_req_exchanges)
+        self.assertEqual([OFFSET_NS] * 8, sut.offset_ns.tolist())
+        self.assertEqual([PATH_DELAY_NS] * 8, sut.mean_path_delay_ns.tolist())
+        self.assertEqual([PATH_DELAY_NS + OFFSET_NS] * 8, sut.master_to_slave_ns.tolist())
+        self.assertEqual([PATH_DELAY_NS - OFFSET_NS] * 8, sut.slave_to_master_ns.tolist())
+        self.assertEqual(0.0, sut.get_offset_drift_ppb())
+
+    def test_offset_over_seconds_exact(self):
+        offset_ns = 3 * ONE_SEC_IN_NS + 999999999
+        self.set_exchange_timestamps(offset_ns)
+        sut = PtpOffset(self.dummy_logger, self.create_stream().ptp_total)
+        self.assertEqual([offset_ns] * 8, sut.offset_ns.tolist())
+        self.assertEqual([PATH_DELAY_NS] * 8, sut.mean_path_delay_ns.tolist())
+
+    def test_correction_field_applied(self):
+        # residence time in transparent clocks is added to correctionField
+        for p in self.packets:
+            msg_type = p[PTPv2].messageType
+            if msg_type == PTP_MSG_TYPE.SYNC_MSG.value:
+                set_correction(p, 500)
+                set_timestamp(p, "originTimestamp", capture_ns(p) - PATH_DELAY_NS - OFFSET_NS - 500)
+            elif msg_type == PTP_MSG_TYPE.DELAY_RESP_MSG.value:
+                set_correction(p, 300)
+                ts = p[PTPv2].receiveTimestamp
+                set_timestamp(p, "receiveTimestamp", ts["s"] * ONE_SEC_IN_NS + ts["ns"] + 300)
+        sut = PtpOffset(self.dummy_logger, self.create_stream().ptp_total)
+        self.assertEqual([OFFSET_NS] * 8, sut.offset_ns.tolist())
+        self.assertEqual([PATH_DELAY_NS] * 8, sut.mean_path_delay_ns.tolist())
+
+    def test_two_step_sync_takes_follow_up(self):
+        for p in self.packets:
+            msg_type = p[PTPv2].messageType
+            if msg_type == PTP_MSG_TYPE.SYNC_MSG.value:
+                p[PTPv2].flags = TWO_STEP_FLAG
+                set_timestamp(p, "originTimestamp", 0)
+            elif msg_type == PTP_MSG_TYPE.FOLLOW_UP_MSG.value:
+                set_correction(p, 100)
+                ts = p[PTPv2].preciseOriginTimestamp
+                set_timestamp(p, "preciseOriginTimestamp", ts["s"] * ONE_SEC_IN_NS + ts["ns"] - 100)
+        del self.packets[5]  # Follow Up 1
+        sut = PtpOffset(self.dummy_logger, self.create_stream().ptp_total)
+        # Delay Req 1 makes exchange with Sync 0, the last one with known origin timestamp
+        self.assertEqual(8, sut.delay_req_exchanges)
+        self.assertEqual([OFFSET_NS] * 8, sut.offset_ns.tolist())
+        self.assertEqual(sut.time_ns[0], sut.time_ns[1])
+
+    def test_peer_delay_exchanges(self):
+        packets = []
+        for i in range(4):
+            t = i * 1000
+            sync = create_ptp_packet(PTP_MSG_TYPE.SYNC_MSG, i, t)
+            set_timestamp(sync, "originTimestamp", capture_ns(sync) - PATH_DELAY_NS - OFFSET_NS)
+            pdelay_req = create_ptp_packet(PTP_MSG_TYPE.PDELAY_REQ_MSG, i, t + 50)
+            pdelay_resp = create_ptp_packet(
+                PTP_MSG_TYPE.PDELAY_RESP_MSG, i, t + 51, flags=TWO_STEP_FLAG, requestingPortIdentity=SLAVE_PORT
+            )
+            follow_up = create_ptp_packet(
+                PTP_MSG_TYPE.PDELAY_RESP_FOLLOW_UP_MSG, i, t + 52, requestingPortIdentity=SLAVE_PORT
+            )
+            # request received after path delay, responded 1 ms - 2 path delays later
+            receipt_ns = capture_ns(pdelay_req) + PATH_DELAY_NS - OFFSET_NS
+            set_timestamp(pdelay_resp, "requestReceiptTimestamp", receipt_ns)
+            set_timestamp(follow_up, "responseOriginTimestamp", receipt_ns + 1000000 - 2 * PATH_DELAY_NS - 40)
+            set_correction(follow_up, 40)
+            packets += [sync, pdelay_req, pdelay_resp, follow_up]
+        del packets[10]  # Pdelay Resp 2
+        sut = PtpOffset(self.dummy_logger, PtpStream(packets, TrimStart.NoTrim, TrimEnd.NoTrim).ptp_total)
+        self.assertEqual(3, sut.pdelay_req_exchanges)
+        self.assertEqual(1, sut.requests_without_response)
+        self.assertEqual([OFFSET_NS] * 3, sut.offset_ns.tolist())
+        self.assertEqual([PATH_DELAY_NS] * 3, sut.mean_path_delay_ns.tolist())
+        # T4 - T3 is not known with peer delay mechanism
+        self.assertTrue(np.isnan(sut.slave_to_master_ns).all())
+
+    def test_delay_req_paired_with_sync_of_its_domain(self):
+        # Syncs of other domain with unrelated timestamps captured just before Delay Reqs
+        for i in range(8):
+            other = create_ptp_packet(PTP_MSG_TYPE.SYNC_MSG, 100 + i, i * 125 + 49, domainNumber=1)
+            set_timestamp(other, "originTimestamp", capture_ns(other) - ONE_SEC_IN_NS)
+            self.packets.insert(i * 5 + 2, other)
+        self.packets.insert(0, create_ptp_packet(PTP_MSG_TYPE.DELAY_REQ_MSG, 50, -1, domainNumber=1))
+        sut = PtpOffset(self.dummy_logger, self.create_stream().ptp_total)
+        self.assertEqual(8, sut.delay_req_exchanges)
+        self.assertEqual(1, sut.requests_without_response)
+        self.assertEqual(0, sut.requests_without_sync)
+        self.assertEqual([OFFSET_NS] * 8, sut.offset_ns.tolist())
+        self.assertEqual([PATH_DELAY_NS] * 8, sut.mean_path_delay_ns.tolist())
+
+    def test_in_batches_same_as_whole_stream(self):
+        del self.packets[11]  # Delay Resp 2
+        stream = self.create_stream()
+        expected = PtpOffset(self.dummy_logger, stream.ptp_total)
+        for edge in (1, 10, 18):
+            sut = PtpOffset(self.dummy_logger, None)
+            sut.add_batch(stream.ptp_total[:edge])
+            other = PtpOffset(self.dummy_logger, None)
+            other.add_batch(stream.ptp_total[edge:])
+            sut.merge(other)
+            sut.finish()
+            self.assertEqual(repr(expected), repr(sut))
+            self.assertEqual(expected.offset_ns.tolist(), sut.offset_ns.tolist())
+            self.assertEqual(expected.time_ns.tolist(), sut.time_ns.tolist())
+
+    def create_stream(self) -> PtpStream:
+        return PtpStream(self.packets, TrimStart.NoTrim, TrimEnd.NoTrim)
+
+
+if __name__ == '__main__':
+    unittest.main()
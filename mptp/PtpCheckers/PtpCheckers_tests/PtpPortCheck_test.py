@@ -0,0 +1,117 @@
+from scapy.layers.l2 import Ether
+from mptp.PtpPacket.PTPv2 import PTPv2, PTP_MSG_TYPE
+from mptp.PtpCheckers.PtpPortCheck import PtpPortCheck
+from mptp.PtpStream import PtpStream, TrimEnd, TrimStart
+from mptp.mptp_tests.test_PtpStream import (
+    MASTER_MAC,
+    PTP_MULTICAST_MAC,
+    SLAVE_MAC,
+    START_TIME,
+    create_exchange_test_data,
+    create_ptp_packet,
+)
+from tests.testutils.DummyLogger import DummyLogger
+from unittest import mock
+import unittest
+
+
+def slave_mac(i: int) -> str:
+    return f"8c:16:45:9b:{i // 256:02x}:{i % 256:02x}"
+
+
+def slave_port(i: int) -> bytes:
+    return b"\x8c\x16\x45\xff\xfe\x9b" + i.to_bytes(2, "big") + b"\x00\x01"
+
+
+class PtpPortCheck_test(unittest.TestCase):
+
+    dummy_logger = DummyLogger()
+
+    def test_single_master_and_slave(self):
+        logger = mock.Mock()
+        sut = PtpPortCheck(logger)
+        sut.check_ports(self.create_stream(create_exchange_test_data(8)).ptp_total)
+        self.assertEqual([], sut.changes)
+        logger.info.assert_any_call("PTP Clock ID and MAC addresses: [OK]")
+        self.assertEqual(3, len(sut.flows))
+        sync_flow = sut.flows[(MASTER_MAC, PTP_MULTICAST_MAC, "11:22:33:44:55:66/6", None)]
+        self.assertEqual({"Sync": 9, "Follow-up": 8}, sync_flow.msgs)
+        self.assertEqual(START_TIME * 1000000000, sync_flow.first_ns)
+        self.assertEqual(1000000000, sync_flow.last_ns - sync_flow.first_ns)
+        resp_flow = sut.flows[(MASTER_MAC, PTP_MULTICAST_MAC, "11:22:33:44:55:66/6", "8c:16:45:9b:9e:11/1")]
+        self.assertEqual({"Delay res": 8}, resp_flow.msgs)
+
+    def test_many_slaves_are_not_inconsistencies(self):
+        packets = []
+        for i in range(500):
+            packets.append(self.create_slave_packet(PTP_MSG_TYPE.DELAY_REQ_MSG, i, i))
+            packets.append(
+                create_ptp_packet(PTP_MSG_TYPE.DELAY_RESP_MSG, i, i, requestingPortIdentity=slave_port(i))
+            )
+        sut = PtpPortCheck(self.dummy_logger)
+        sut.check_ports(self.create_stream(packets).ptp_total)
+        self.assertEqual([], sut.changes)
+        self.assertEqual(1000, len(sut.flows))
+        self.assertEqual(1000, sum(len(flow) for flow in sut.flows.values()))
+
+    def test_identity_changes_flagged_once(self):
+        packets = create_exchange_test_data(8)
+        # slave port identity sent twice from other MAC, change is flagged once
+        for p in packets[10:12] + packets[22:24]:
+            if p[PTPv2].messageType == PTP_MSG_TYPE.DELAY_REQ_MSG.value:
+                p[Ether].src = MASTER_MAC
+        # master restarted with other clock identity
+        packets[-1][PTPv2].sourcePortIdentity = slave_port(7)
+        logger = mock.Mock()
+        sut = PtpPortCheck(logger)
+        sut.check_ports(self.create_stream(packets).ptp_total)
+        self.assertEqual([2, 8], [msg.sequenceId for msg, _ in sut.changes])
+        self.assertEqual(
+            [
+                f"Clk ID and Port 8c:16:45:9b:9e:11/1 sent from MAC {SLAVE_MAC}, now from {MASTER_MAC}",
+                f"MAC {MASTER_MAC} sent Clk ID 11:22:33:44:55:66, now 8c:16:45:9b:00:07",
+            ],
+            [change for _, change in sut.changes],
+        )
+        logger.info.assert_any_call("PTP Clock ID and MAC number of issues found: 2")
+        self.assertEqual(2, logger.msg_timing.call_count)
+
+    def test_in_batches_same_as_whole_stream(self):
+        packets = create_exchange_test_data(8)
+        packets[13][Ether].src = SLAVE_MAC
+        stream = self.create_stream(packets)
+        expected = PtpPortCheck(self.dummy_logger)
+        expected.check_ports(list(stream.ptp_total))
+        for edge in (1, 6, 14, 30):
+            sut = PtpPortCheck(self.dummy_logger)
+            sut.add_batch(stream.ptp_total[:edge])
+            other = PtpPortCheck(self.dummy_logger)
+            other.add_batch(stream.ptp_total[edge:])
+            sut.merge(other)
+            sut.finish_check()
+            self.assertEqual(repr(expected), repr(sut))
+            self.assertEqual(
+                [(msg.sequenceId, change) for msg, change in expected.changes],
+                [(msg.sequenceId, change) for msg, change in sut.changes],
+            )
+
+    def test_not_enough_msgs(self):
+        logger = mock.Mock()
+        sut = PtpPortCheck(logger)
+        sut.check_ports(self.create_stream(create_exchange_test_data(1)[:4]).ptp_total)
+        logger.info.assert_called_once_with("Not enough PTP messages to perform valid port check.")
+
+    @staticmethod
+    def create_slave_packet(msg_type: PTP_MSG_TYPE, i: int, time_ms: int) -> Ether:
+        p = create_ptp_packet(msg_type, i, time_ms)
+        p[Ether].src = slave_mac(i)
+        p[PTPv2].sourcePortIdentity = slave_port(i)
+        return p
+
+    @staticmethod
+    def create_stream(packets) -> PtpStream:
+        return PtpStream(packets, TrimStart.NoTrim, TrimEnd.NoTrim)
+
+
+if __name__ == '__main__':
+    unittest.main()
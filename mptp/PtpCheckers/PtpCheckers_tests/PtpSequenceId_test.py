@@ -2,6 +2,7 @@ from mptp.PtpPacket.PTPv2 import PTPv2, PTP_MSG_TYPE
 from mptp.PtpCheckers.PtpSequenceId import PtpSequenceId
 from tests.testutils.DummyLogger import DummyLogger
 from typing import List
+from unittest import mock
 import unittest
 
 class PtpSequenceId_test(unittest.TestCase):
@@ -23,6 +24,59 @@ class PtpSequenceId_test(unittest.TestCase):
         sync, fup = PtpSequenceId_test.create_ptp_sync_fup_test_data()
         self.sut.check_sync_followup_sequence(sync, fup)    
     
+    def test_lost_msgs_reported_in_bursts(self):
+        logger = mock.Mock()
+        sut = PtpSequenceId(logger, self.dummy_time_offset)
+        sync, fup = PtpSequenceId_test.create_ptp_sync_fup_test_data(100)
+        lost = set(range(10, 30)) | {40} | set(range(60, 76))
+        sync = [msg for msg in sync if msg.sequenceId not in lost]
+        sut.check_sync_followup_sequence(sync, fup)
+        infos = [c.args[0] for c in logger.info.call_args_list]
+        self.assertIn("Sync msgs lost: 37 in 3 bursts", infos)
+        self.assertEqual(3, logger.warning.call_count)
+        self.assertNotIn("Sync msg sequenceId: [OK]", infos)
+
+    def test_result_with_runs_out_of_order(self):
+        sync, fup = PtpSequenceId_test.create_ptp_sync_fup_test_data(20)
+        for i, msg in enumerate(sync):
+            msg.time = 100 + i
+        del sync[10:13]
+        sync.insert(3, sync[3])
+        fup = [msg for msg in fup if msg.sequenceId != 7]
+        self.sut.check_sync_followup_sequence(sync, fup)
+        result = self.sut.result()
+        self.assertFalse(result.ok)
+        self.assertEqual((3 + 1, 1, 0), (result.lost_msgs, result.duplicated_msgs, result.reordered_msgs))
+        self.assertEqual(1, result.missing_msgs)
+        self.assertEqual(1, result.length_mismatches)
+        self.assertEqual(
+            [PTP_MSG_TYPE.SYNC_MSG.value] * 2 + [PTP_MSG_TYPE.FOLLOW_UP_MSG.value], result.run_msg_type.tolist()
+        )
+        self.assertEqual(
+            [(3, 3), (9, 13), (6, 8)], list(zip(result.run_first_id.tolist(), result.run_last_id.tolist()))
+        )
+        self.assertEqual([103 * 10**9, 109 * 10**9], result.run_time_ns[:2].tolist())
+
+    def test_missing_msgs_reported_in_id_ranges(self):
+        logger = mock.Mock()
+        sut = PtpSequenceId(logger, self.dummy_time_offset)
+        sync, fup = PtpSequenceId_test.create_ptp_sync_fup_test_data(20)
+        fup = [msg for msg in fup if msg.sequenceId not in (3, 4, 5, 9)]
+        sut.check_sync_followup_sequence(sync, fup)
+        infos = [c.args[0] for c in logger.info.call_args_list]
+        self.assertIn("Sync missing msgs to Follow-up msgs: 4 with Id: 3-5, 9", infos)
+
+    def test_delay_reqs_without_delay_resp(self):
+        logger = mock.Mock()
+        sut = PtpSequenceId(logger, self.dummy_time_offset)
+        delay_req, _ = PtpSequenceId_test.create_ptp_sync_fup_test_data(5)
+        for msg in delay_req:
+            msg.messageType = PTP_MSG_TYPE.DELAY_REQ_MSG.value
+        sut.check_delay_req_resp_sequence(delay_req, [])
+        infos = [c.args[0] for c in logger.info.call_args_list]
+        self.assertIn("Number of Delay req and Delay res/PDelay res messages mismatch!", infos)
+        self.assertEqual(1, sut.result().length_mismatches)
+
     @staticmethod  
     def create_ptp_sync_fup_test_data(n: int = 10):
         sync: List[PTPv2] = []
@@ -0,0 +1,102 @@
+from appcommon.AppLogger.BufferedLogger import BufferedLogger
+from appcommon.AppLogger.RepeatedWarnings import MAX_REPEATED_WARNINGS
+from mptp.PtpPacket.PTPv2 import PTP_MSG_TYPE
+from mptp.PtpCheckers.PtpTiming import PtpTiming, MsgInterval
+from mptp.PtpStream import PtpStream, TrimEnd, TrimStart
+from mptp.mptp_tests.test_PtpStream import START_TIME, create_ptp_packet
+from tests.testutils.DummyLogger import DummyLogger
+import statistics
+import unittest
+
+class PtpTiming_test(unittest.TestCase):
+
+    dummy_logger = DummyLogger()
+
+    def test_regular_sync(self):
+        sut = PtpTiming(self.dummy_logger, PtpTiming_test.create_sync_test_data([125] * 20).sync)
+        self.assertTrue(sut.success)
+        self.assertEqual(MsgInterval.Rate_8, sut._msg_interval)
+        self.assertEqual([8.0] * 20, sut.msg_rates.tolist())
+        self.assertEqual([8.0] * 20, sut.capture_rates.tolist())
+        self.assertEqual(0, len(sut.error_over_threshold))
+
+    def test_irregularities_and_statistics(self):
+        intervals = [125, 125, 150, 100, 125, 125, 126, 125]
+        sut = PtpTiming(self.dummy_logger, PtpTiming_test.create_sync_test_data(intervals).sync, START_TIME, 0.01)
+        self.assertFalse(sut.success)
+        self.assertEqual(2, len(sut.error_over_threshold))
+        self.assertEqual([25000000, -25000000], sut.capture_error_over_threshold.tolist())
+        rates = [1000 / i for i in intervals]
+        self.assertEqual(rates, sut.capture_rates.tolist())
+        self.assertIn(f"mean capture rate: {statistics.mean(rates):.9f},", repr(sut))
+        self.assertIn(f"std dev capture rate: {statistics.stdev(rates):.9f},", repr(sut))
+        self.assertIn(f"max capture rate: {max(rates):.9f},", repr(sut))
+
+    def test_result_with_irregularities(self):
+        stream = PtpTiming_test.create_sync_test_data([125, 125, 150, 100, 125], 0.9)
+        result = PtpTiming(self.dummy_logger, stream.sync, START_TIME).result()
+        self.assertEqual("timing.Sync", result.name)
+        self.assertFalse(result.ok)
+        self.assertEqual(6, result.msgs)
+        self.assertEqual(8, result.detected_rate)
+        self.assertEqual(2, result.capture_irregularities)
+        # capture time of latter msg of irregular pair
+        self.assertEqual(stream.sync.column("time_ns")[[3, 4]].tolist(), result.capture_irregularity_time_ns.tolist())
+        self.assertEqual([25000000, -25000000], result.capture_irregularity_error_ns.tolist())
+        self.assertAlmostEqual(1000 / 150, result.capture_rate_min)
+        self.assertIsNone(PtpTiming(self.dummy_logger, PtpTiming_test.create_sync_test_data([]).sync[:0]).result())
+
+    def test_timestamp_wraps_over_second(self):
+        sut = PtpTiming(self.dummy_logger, PtpTiming_test.create_sync_test_data([125] * 10, 0.9).sync)
+        self.assertEqual([8.0] * 10, sut.msg_rates.tolist())
+
+    def test_timestamp_gap_longer_than_second(self):
+        sut = PtpTiming(self.dummy_logger, PtpTiming_test.create_sync_test_data([125, 125, 1625, 125], 0.9).sync)
+        self.assertEqual(1, len(sut.error_over_threshold))
+        self.assertAlmostEqual(1500000, sut.error_over_threshold[0] / 1000, places=0)
+        self.assertAlmostEqual(1000 / 1625, sut.msg_rates[2], places=6)
+
+    def test_timestamp_analysis_stops_at_sync_without_origin_timestamp(self):
+        stream = PtpTiming_test.create_sync_test_data([125] * 10, no_timestamp_at=4)
+        sut = PtpTiming(self.dummy_logger, stream.sync)
+        self.assertFalse(sut.success)
+        self.assertEqual(4, len(sut.msg_rates))
+        self.assertEqual(10, len(sut.capture_rates))
+
+    def test_irregularities_over_limit_summarised(self):
+        stream = PtpTiming_test.create_sync_test_data([125, 100, 150] * 100)
+        logger = BufferedLogger(None)
+        sut = PtpTiming(logger, stream.sync)
+        self.assertEqual(200, len(sut.error_over_threshold))
+        warnings = [args[0] for name, args in logger.calls if name == "warning"]
+        # logged in full up to limit and summary, for timestamps and capture times
+        self.assertEqual(2 * (MAX_REPEATED_WARNINGS + 1) + 2, len(warnings))
+        self.assertIn("Sync msg timestamp irregularities: 200 in total, 100 not logged", "\n".join(warnings))
+        for edge in (1, 150, 250):
+            batches_logger = BufferedLogger(None)
+            first = PtpTiming(batches_logger, stream.sync, in_batches=True)
+            first.add_batch(stream.sync[:edge])
+            other = PtpTiming(BufferedLogger(None), stream.sync, in_batches=True)
+            other.add_batch(stream.sync[edge:])
+            first.merge(other)
+            first.finish()
+            self.assertEqual(logger.calls, batches_logger.calls)
+
+    def test_not_enough_data(self):
+        sut = PtpTiming(self.dummy_logger, PtpTiming_test.create_sync_test_data([]).sync)
+        self.assertFalse(sut.success)
+        self.assertEqual("Ptp Timing: not enough data", repr(sut))
+
+    @staticmethod
+    def create_sync_test_data(intervals_ms, ts_start: float = 0.0, no_timestamp_at: int = None):
+        packets = []
+        t = 0
+        for i, interval in enumerate([0] + intervals_ms):
+            t += interval
+            ts = 0.000001 if i == no_timestamp_at else START_TIME + ts_start + t / 1000
+            packets.append(create_ptp_packet(PTP_MSG_TYPE.SYNC_MSG, i, t, originTimestamp=ts))
+        return PtpStream(packets, TrimStart.NoTrim, TrimEnd.NoTrim)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+from mptp.PtpPacket.PTPv2 import PTPv2, PTP_MSG_TYPE, TWO_STEP_FLAG
+from mptp.PtpCheckers.PtpMatched import PtpMatched
+from mptp.PtpCheckers.PtpJoinMatched import PtpJoinMatched
+from mptp.PtpCheckers.PtpTwoStep import PtpTwoStep
+from mptp.PtpStream import PtpStream, TrimEnd, TrimStart
+from mptp.mptp_tests.test_PtpStream import create_exchange_test_data
+from tests.testutils.DummyLogger import DummyLogger
+import unittest
+
+
+class PtpTwoStep_test(unittest.TestCase):
+
+    dummy_logger = DummyLogger()
+
+    def setUp(self):
+        # two-step master, origin timestamp of Sync is not set
+        self.packets = create_exchange_test_data(10)
+        for p in self.packets:
+            if p[PTPv2].messageType == PTP_MSG_TYPE.SYNC_MSG.value:
+                p[PTPv2].flags = TWO_STEP_FLAG
+                p[PTPv2].originTimestamp = 0
+
+    def test_turnaround_of_two_step_syncs(self):
+        del self.packets[13]  # Follow Up 3
+        stream = self.create_stream()
+        sut = PtpTwoStep(self.dummy_logger, stream.sync, stream.follow_up, stream.time_offset)
+        self.assertEqual(11, sut.two_step_syncs)
+        self.assertEqual(2, sut.syncs_without_follow_up)
+        self.assertEqual(0, sut.follow_ups_without_sync)
+        self.assertEqual([1000000] * 9, sut.turnaround_ns.tolist())
+
+    def test_in_batches_same_as_whole_stream(self):
+        stream = self.create_stream()
+        expected = PtpTwoStep(self.dummy_logger, stream.sync, stream.follow_up, stream.time_offset)
+        sut = PtpTwoStep(self.dummy_logger, None, None, stream.time_offset)
+        sut.add_batch(stream.ptp_total[:20])
+        other = PtpTwoStep(self.dummy_logger, None, None, stream.time_offset)
+        other.add_batch(stream.ptp_total[20:])
+        sut.merge(other)
+        sut.finish()
+        self.assertEqual(repr(expected), repr(sut))
+        self.assertEqual(expected.turnaround_ns.tolist(), sut.turnaround_ns.tolist())
+
+    def test_matched_exchanges_take_precise_origin_timestamp(self):
+        stream = self.create_stream()
+        sequential = PtpMatched(self.dummy_logger, stream.ptp_total, stream.time_offset)
+        joined = PtpJoinMatched(self.dummy_logger, stream.ptp_total, stream.time_offset)
+        self.assertEqual(10, len(sequential.ptp_exchanges))
+        self.assertEqual(10, len(joined.ptp_exchanges))
+        t1_t4 = [exchange.t1_t4 for exchange in sequential.ptp_exchanges]
+        self.assertTrue(all(abs(t - 50000) < 1 for t in t1_t4))
+        self.assertEqual(t1_t4, joined._get_exchange_delays()[2])
+
+    def create_stream(self) -> PtpStream:
+        return PtpStream(self.packets, TrimStart.NoTrim, TrimEnd.NoTrim)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,332 @@
+from array import array
+from collections import deque
+from decimal import Decimal
+from typing import Deque, Dict, Iterable, Optional, Set, Tuple
+import numpy as np
+
+from appcommon.AppLogger.ILogger import ILogger
+from mptp.PtpColumns import PtpMsgView
+from mptp.PtpPacket.PTPv2 import PTP_MSG_TYPE, TWO_STEP_FLAG
+from mptp.PtpCheckers.PtpMatched import PtpExchangeMatcher, ONE_SEC_IN_NS
+from mptp.PtpTimestamps import timestamps_to_ns
+
+NS_IN_US = 1000
+DEFAULT_REORDER_WINDOW_NS = ONE_SEC_IN_NS
+
+SYNC = PTP_MSG_TYPE.SYNC_MSG.value
+FOLLOW_UP = PTP_MSG_TYPE.FOLLOW_UP_MSG.value
+DELAY_REQS = (PTP_MSG_TYPE.DELAY_REQ_MSG.value, PTP_MSG_TYPE.PDELAY_REQ_MSG.value)
+DELAY_RESPS = (PTP_MSG_TYPE.DELAY_RESP_MSG.value, PTP_MSG_TYPE.PDELAY_RESP_MSG.value)
+MATCHED_TYPES = (SYNC, FOLLOW_UP) + DELAY_REQS + DELAY_RESPS
+
+# T1 is Sync origin timestamp, precise origin timestamp of Follow Up for two-step
+# Sync. T2 and T3 are capture times of Sync and Delay Req, capture taken at slave
+# stands for slave clock. T4 is Delay Resp receive timestamp or Pdelay Resp request
+# receipt timestamp.
+EXCHANGE_COLUMNS = {
+    "t1_ns": "q",
+    "t2_ns": "q",
+    "t3_ns": "q",
+    "t4_ns": "q",
+    "delay_resp_time_ns": "q",
+    "sync_sequence_id": "H",
+    "sequence_id": "H",
+    "requesting_port": "i",
+}
+DISCARDED_COLUMNS = {
+    "row": "q",
+    "msg_type": "B",
+    "time_ns": "q",
+    "sequence_id": "H",
+}
+
+
+class ArrayTable:
+    # Rows of integers kept column by column in typed arrays
+    def __init__(self, columns: Dict[str, str]):
+        self._arrays = {name: array(code) for name, code in columns.items()}
+
+    def append(self, *row):
+        for column, value in zip(self._arrays.values(), row):
+            column.append(value)
+
+    def extend(self, other: "ArrayTable"):
+        for name, column in self._arrays.items():
+            column.extend(other._arrays[name])
+
+    def column(self, name: str) -> np.ndarray:
+        # copy, arrays exporting their buffer could not grow anymore
+        column = self._arrays[name]
+        return np.frombuffer(column, dtype=column.typecode).copy()
+
+    def __len__(self):
+        return len(next(iter(self._arrays.values())))
+
+
+class _Sync:
+    __slots__ = ("row", "time_ns", "sequence_id", "ts_ns", "port", "two_step", "used", "refs", "replaced")
+
+    def __init__(self, row: int, time_ns: int, sequence_id: int, ts_ns: int, port: int, two_step: bool):
+        self.row = row
+        self.time_ns = time_ns
+        self.sequence_id = sequence_id
+        self.ts_ns = ts_ns
+        self.port = port
+        self.two_step = two_step
+        self.used = False
+        self.refs = 0  # pending Delay Reqs paired with this Sync
+        self.replaced = False
+
+
+class _Pending:
+    # Delay Req or Delay Resp waiting for its pair, key is port identity of requester
+    # and sequence id, Delay Req keeps Sync it follows
+    __slots__ = ("row", "msg_type", "time_ns", "sequence_id", "ts_ns", "key", "sync")
+
+    def __init__(self, row: int, msg_type: int, time_ns: int, sequence_id: int, ts_ns: int, port: int):
+        self.row = row
+        self.msg_type = msg_type
+        self.time_ns = time_ns
+        self.sequence_id = sequence_id
+        self.ts_ns = ts_ns
+        self.key = (port, sequence_id)
+        self.sync: Optional[_Sync] = None
+
+
+class PtpJoinMatched(PtpExchangeMatcher):
+    # Alternative to sequential matching. Delay Reqs and Delay Resps are joined in hash
+    # tables by port identity of requester and sequence id, so exchanges interleaved or
+    # reordered in capture are matched as well. Delay Req is paired with the last Sync
+    # of its domain captured before it. Messages waiting for pair longer than reorder
+    # window of capture time are discarded. Msgs are taken in batches of columns,
+    # exchanges and discarded msgs are kept in typed arrays.
+    BANNER = "ptp one step message exchange joined by sequence id"
+
+    def __init__(
+        self,
+        logger: ILogger,
+        msgs: Optional[PtpMsgView],
+        time_offset=0,
+        reorder_window_ns: int = DEFAULT_REORDER_WINDOW_NS,
+    ):
+        self._reorder_window_ns = reorder_window_ns
+        super().__init__(logger, msgs, time_offset)
+
+    def _init_state(self):
+        self._ptp_msg_exchange = ArrayTable(EXCHANGE_COLUMNS)
+        self._unmatched_all = ArrayTable(DISCARDED_COLUMNS)
+        self._discarded_syncs = 0
+        self._discarded_delay_reqs = 0
+        self._discarded_delay_resps = 0
+        self._last_syncs: Dict[int, _Sync] = {}
+        self._delay_reqs: Dict[Tuple[int, int], _Pending] = {}
+        self._delay_resps: Dict[Tuple[int, int], _Pending] = {}
+        self._pending_order: Deque[_Pending] = deque()
+        self._first_time_ns: Optional[int] = None
+        self._now_ns: Optional[int] = None
+        # domains of Delay Reqs which came before any Sync of the domain
+        self._syncless_domains: Set[int] = set()
+
+    def add_batch(self, msgs: PtpMsgView):
+        msg_type = msgs.column("msg_type")
+        selected = np.isin(msg_type, MATCHED_TYPES)
+        rows = msgs.indexes[selected]
+        c = msgs.columns
+        ts_ns = timestamps_to_ns(c.ts_sec[rows], c.ts_ns[rows])
+        two_step = (c.flags[rows] & TWO_STEP_FLAG) != 0
+        for row, t, time_ns, sequence_id, domain, source_port, requesting_port, ts, is_two_step in zip(
+            rows.tolist(),
+            msg_type[selected].tolist(),
+            c.time_ns[rows].tolist(),
+            c.sequence_id[rows].tolist(),
+            c.domain[rows].tolist(),
+            c.source_port[rows].tolist(),
+            c.requesting_port[rows].tolist(),
+            ts_ns.tolist(),
+            two_step.tolist(),
+        ):
+            self._discard_expired(time_ns)
+            if t == SYNC:
+                self._add_sync(_Sync(row, time_ns, sequence_id, ts, source_port, is_two_step), domain)
+            elif t == FOLLOW_UP:
+                self._add_follow_up(sequence_id, domain, source_port, ts)
+            elif t in DELAY_REQS:
+                self._add_delay_req(_Pending(row, t, time_ns, sequence_id, ts, source_port), domain)
+            else:
+                self._add_delay_resp(_Pending(row, t, time_ns, sequence_id, ts, requesting_port))
+
+    def merge(self, other: "PtpJoinMatched") -> bool:
+        # Other matcher got msgs following ones added here. Its results are taken over
+        # if no msg is left pending here and its Delay Reqs had Syncs of their domains,
+        # otherwise its msgs have to be added again.
+        if other._first_time_ns is None:
+            return True
+        self._discard_expired(other._first_time_ns)
+        if self._delay_reqs or self._delay_resps:
+            return False
+        if any(domain in self._last_syncs for domain in other._syncless_domains):
+            return False
+        for domain in other._last_syncs:
+            if domain in self._last_syncs:
+                self._replace_sync(self._last_syncs[domain])
+        self._last_syncs.update(other._last_syncs)
+        self._ptp_msg_exchange.extend(other._ptp_msg_exchange)
+        self._unmatched_all.extend(other._unmatched_all)
+        self._discarded_syncs += other._discarded_syncs
+        self._discarded_delay_reqs += other._discarded_delay_reqs
+        self._discarded_delay_resps += other._discarded_delay_resps
+        self._delay_reqs, self._delay_resps = other._delay_reqs, other._delay_resps
+        self._pending_order = other._pending_order
+        self._now_ns = max(self._now_ns, other._now_ns)
+        return True
+
+    @property
+    def ptp_exchanges(self) -> ArrayTable:
+        # T1-T4 timestamps, capture times and sequence ids of exchanges, see EXCHANGE_COLUMNS
+        return self._ptp_msg_exchange
+
+    @property
+    def ptp_unmatched(self) -> ArrayTable:
+        # Discarded msgs in order they were discarded, see DISCARDED_COLUMNS
+        return self._unmatched_all
+
+    def _add(self, msgs: PtpMsgView):
+        self.add_batch(msgs)
+
+    def _add_sync(self, sync: _Sync, domain: int):
+        last = self._last_syncs.get(domain)
+        if last is not None:
+            self._replace_sync(last)
+        self._last_syncs[domain] = sync
+
+    def _replace_sync(self, sync: _Sync):
+        sync.replaced = True
+        self._release_sync(sync)
+
+    def _release_sync(self, sync: _Sync):
+        # Sync no longer the last one is discarded once none of its Delay Reqs got response
+        if sync.replaced and sync.refs == 0 and not sync.used:
+            self._discard(SYNC, sync.row, sync.time_ns, sync.sequence_id)
+
+    def _add_follow_up(self, sequence_id: int, domain: int, port: int, ts_ns: int):
+        # Precise origin timestamp of last two-step Sync of the domain
+        sync = self._last_syncs.get(domain)
+        if sync is not None and sync.two_step and sync.sequence_id == sequence_id and sync.port == port:
+            sync.ts_ns = ts_ns
+
+    def _add_delay_req(self, delay_req: _Pending, domain: int):
+        sync = self._last_syncs.get(domain)
+        if sync is None:
+            self._syncless_domains.add(domain)
+        else:
+            sync.refs += 1
+            delay_req.sync = sync
+        delay_resp = self._delay_resps.pop(delay_req.key, None)
+        if delay_resp is None:
+            self._add_pending(self._delay_reqs, delay_req)
+        else:
+            self._add_exchange(delay_req, delay_resp)
+
+    def _add_delay_resp(self, delay_resp: _Pending):
+        delay_req = self._delay_reqs.pop(delay_resp.key, None)
+        if delay_req is None:
+            self._add_pending(self._delay_resps, delay_resp)
+        else:
+            self._add_exchange(delay_req, delay_resp)
+
+    def _add_pending(self, pending: Dict[Tuple[int, int], _Pending], msg: _Pending):
+        duplicate = pending.get(msg.key)
+        if duplicate is not None:
+            self._discard_pending(duplicate)
+        pending[msg.key] = msg
+        self._pending_order.append(msg)
+
+    def _add_exchange(self, delay_req: _Pending, delay_resp: _Pending):
+        sync = delay_req.sync
+        if sync is None:
+            self._discard_pending(delay_req)
+            self._discard_pending(delay_resp)
+            return
+        sync.used = True
+        sync.refs -= 1
+        self._ptp_msg_exchange.append(
+            sync.ts_ns,
+            sync.time_ns,
+            delay_req.time_ns,
+            delay_resp.ts_ns,
+            delay_resp.time_ns,
+            sync.sequence_id,
+            delay_req.sequence_id,
+            delay_req.key[0],
+        )
+
+    def _discard_expired(self, time_ns: int):
+        # Pending msgs are checked in order they came, capture time is not strictly
+        # ordered, so msgs may wait a bit longer than reorder window
+        if self._first_time_ns is None:
+            self._first_time_ns = time_ns
+        if self._now_ns is None or time_ns > self._now_ns:
+            self._now_ns = time_ns
+        oldest_ns = self._now_ns - self._reorder_window_ns
+        pending_order = self._pending_order
+        while pending_order and pending_order[0].time_ns < oldest_ns:
+            self._discard_if_pending(pending_order.popleft())
+
+    def _discard_if_pending(self, msg: _Pending):
+        # Msgs replaced by duplicates or matched are already gone from pending tables
+        pending = self._delay_reqs if msg.msg_type in DELAY_REQS else self._delay_resps
+        if pending.get(msg.key) is msg:
+            del pending[msg.key]
+            self._discard_pending(msg)
+
+    def _discard_pending(self, msg: _Pending):
+        self._discard(msg.msg_type, msg.row, msg.time_ns, msg.sequence_id)
+        if msg.sync is not None:
+            msg.sync.refs -= 1
+            self._release_sync(msg.sync)
+
+    def _discard(self, msg_type: int, row: int, time_ns: int, sequence_id: int):
+        self._unmatched_all.append(row, msg_type, time_ns, sequence_id)
+        if msg_type == SYNC:
+            self._discarded_syncs += 1
+        elif msg_type in DELAY_REQS:
+            self._discarded_delay_reqs += 1
+        else:
+            self._discarded_delay_resps += 1
+
+    def _log_state(self):
+        # msgs still waiting for pair are discarded, last Syncs may be followed by
+        # exchange not captured, as in sequential matching they are not discarded
+        while self._pending_order:
+            self._discard_if_pending(self._pending_order.popleft())
+        super()._log_state()
+
+    def _get_exchange_count(self) -> int:
+        return len(self._ptp_msg_exchange)
+
+    def _get_exchange_delays(self) -> Tuple[list, list, list]:
+        exchanges = self._ptp_msg_exchange
+        delay_req_time_ns = exchanges.column("t3_ns")
+        return (
+            ((delay_req_time_ns - exchanges.column("t2_ns")) / NS_IN_US).tolist(),
+            ((exchanges.column("delay_resp_time_ns") - delay_req_time_ns) / NS_IN_US).tolist(),
+            ((exchanges.column("t4_ns") - exchanges.column("t1_ns")) / NS_IN_US).tolist(),
+        )
+
+    def _get_unordered_msgs(self) -> Iterable[Tuple[int, Decimal, int]]:
+        discarded = self._unmatched_all
+        order = np.argsort(discarded.column("row"), kind="stable")
+        for msg_type, time_ns, sequence_id in zip(
+            discarded.column("msg_type")[order].tolist(),
+            discarded.column("time_ns")[order].tolist(),
+            discarded.column("sequence_id")[order].tolist(),
+        ):
+            yield msg_type, Decimal(time_ns).scaleb(-9), sequence_id
+
+    def _get_discarded_columns(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        discarded = self._unmatched_all
+        order = np.argsort(discarded.column("row"), kind="stable")
+        return tuple(discarded.column(name)[order] for name in ("msg_type", "time_ns", "sequence_id"))
+
+    def _get_discarded_counts(self) -> Tuple[int, int, int]:
+        return (self._discarded_syncs, self._discarded_delay_reqs, self._discarded_delay_resps)
@@ -1,20 +1,32 @@
 import enum
+from abc import ABC, abstractmethod
 import time
 import copy
 import statistics
 from dataclasses import dataclass
-from typing import List
+from decimal import Decimal
+from typing import Iterable, Optional, Tuple
+import numpy as np
 from appcommon.AppLogger.ILogger import ILogger
-from mptp.PtpPacket.PTPv2 import PTPv2, PtpType
+from appcommon.AppLogger.RepeatedWarnings import RepeatedWarnings
+from mptp.PtpPacket.PTPv2 import PTPv2, PtpType, PTP_MSG_TYPE
+from mptp.PtpResults import MatchedResult, msg_time_ns
+from mptp.PtpTimestamps import timestamp_to_ns
 
 ONE_SEC_IN_NS = 1000000000
 ONE_SEC_IN_US = 1000000
 ONE_SEC_IN_MS = 1000
+UNORDERED_MSG_STR = {
+    PTP_MSG_TYPE.SYNC_MSG.value: "Unhandled SYNC__MSG",
+    PTP_MSG_TYPE.DELAY_REQ_MSG.value: "Unordered DELAY_REQ",
+    PTP_MSG_TYPE.DELAY_RESP_MSG.value: "Unordered DELAY_RES",
+}
 
 
 @dataclass
 class Ptp1StepExchenge:
     sync = PTPv2()
+    follow_up = None
     delay_req = PTPv2()
     delay_resp = PTPv2()
     t1_t4 = float()
@@ -29,15 +41,144 @@ class Ptp1StepExchenge:
         )
 
 
-class PtpMatched:
+class PtpExchangeMatcher(ABC):
+    # Statistics, log and result of Sync-Delay Req-Delay Resp exchange matching. Matchers
+    # keep exchanges and discarded msgs their own way and give them through _get_* methods.
+    BANNER = ""
+
+    def __init__(self, logger: ILogger, msgs: Optional[Iterable], time_offset=0):
+        self.time_offset = time_offset
+        self._logger = logger
+        self._init_state()
+        self._logger.banner_large(self.BANNER)
+        if msgs is None:
+            return  # messages are given in parts and finished with finish
+        self._add(msgs)
+        self._log_state()
+
+    @abstractmethod
+    def _init_state(self):
+        pass
+
+    @abstractmethod
+    def _add(self, msgs):
+        pass
+
+    def finish(self):
+        self._log_state()
+
+    def _log_state(self):
+        self._logger.info(self.__repr__())
+        self._logger.banner_small("ptp message exchange statistics")
+        self._log_statistics()
+        self._logger.banner_small("Unordered ptp messages")
+        self._log_unordered_msgs()
+
+    def _log_statistics(self):
+        sync_to_delay, d_req_resp_delay, t1_to_t4 = self._get_exchange_delays()
+        if len(sync_to_delay) != 0:
+            self._logger.info(
+                f"Sync message to Delay Request message capture time in matched PTP messages "
+                f"exchange:\n\tmean: {statistics.mean(sync_to_delay):.3f} us,\n\tstd dev: "
+                f"{statistics.stdev(sync_to_delay):.3f} us,\n\tmin: {min(sync_to_delay):.3f}"
+                f"us,\n\tmax: {max(sync_to_delay):.3f} us"
+            )
+        if len(d_req_resp_delay) != 0:
+            self._logger.info(
+                f"Delay Request message to Delay Response message capture time in matched PTP "
+                f"messages  exchange:\n\tmean: {statistics.mean(d_req_resp_delay):.3f} us,"
+                f"\n\tstd dev: {statistics.stdev(d_req_resp_delay):.3f} us,\n\tmin: "
+                f"{min(d_req_resp_delay):.3f} us,\n\tmax: {max(d_req_resp_delay):.3f} us"
+            )
+        if len(t1_to_t4) != 0:
+            self._logger.info(
+                f"1st Timestamp to 4th Timestamp time difference in full PTP messages exchange"
+                f"exchange:\n\tmean: {statistics.mean(t1_to_t4):.3f} us,\n\tstd dev: "
+                f"{statistics.stdev(t1_to_t4):.3f} us,\n\tmin: {min(t1_to_t4):.3f} us,"
+                f"\n\tmax: {max(t1_to_t4):.3f} us"
+            )
+
+    @abstractmethod
+    def _get_exchange_count(self) -> int:
+        pass
+
+    @abstractmethod
+    def _get_exchange_delays(self) -> Tuple[list, list, list]:
+        # Sync-to-Delay_Req and Delay_Req-to-Delay_Resp capture time and T1-T4 in us
+        pass
+
+    @abstractmethod
+    def _get_unordered_msgs(self) -> Iterable[Tuple[int, Decimal, int]]:
+        # Message type, capture time and sequence id of discarded messages in capture order
+        pass
+
+    @abstractmethod
+    def _get_discarded_columns(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Message type, capture time in ns and sequence id of discarded messages in capture order
+        pass
+
+    @abstractmethod
+    def _get_discarded_counts(self) -> Tuple[int, int, int]:
+        pass
+
+    def result(self) -> MatchedResult:
+        syncs, delay_reqs, delay_resps = self._get_discarded_counts()
+        sync_to_delay, d_req_resp_delay, t1_to_t4 = self._get_exchange_delays()
+        msg_type, time_ns, sequence_id = self._get_discarded_columns()
+        return MatchedResult(
+            ok=syncs + delay_reqs + delay_resps == 0,
+            exchanges=self._get_exchange_count(),
+            discarded_syncs=syncs,
+            discarded_delay_reqs=delay_reqs,
+            discarded_delay_resps=delay_resps,
+            exchange_sync_to_delay_req_us=np.array(sync_to_delay, dtype=np.float64),
+            exchange_delay_req_to_resp_us=np.array(d_req_resp_delay, dtype=np.float64),
+            exchange_t1_to_t4_us=np.array(t1_to_t4, dtype=np.float64),
+            discarded_msg_type=msg_type,
+            discarded_time_ns=time_ns,
+            discarded_sequence_id=sequence_id,
+        )
+
+    def _log_unordered_msgs(self):
+        # Discarded msgs may be very many on broken capture, only some are logged in full
+        msgs_logged = False
+        warnings = RepeatedWarnings(self._logger, "Unordered messages")
+        for msg_type, msg_time, sequence_id in self._get_unordered_msgs():
+            msgs_logged = True
+            if msg_type in UNORDERED_MSG_STR:
+                warnings.add(self._unordered_msg_info, msg_type, msg_time, sequence_id, self.time_offset)
+        warnings.flush()
+        if not msgs_logged:
+            self._logger.info("There are no unordered messages")
+
+    @staticmethod
+    def _unordered_msg_info(msg_type: int, msg_time: Decimal, sequence_id: int, time_offset) -> str:
+        t = time.strftime("%H:%M:%S", time.localtime(float(msg_time)))
+        return (
+            f"{UNORDERED_MSG_STR[msg_type]}:   Capture time: {t},    Capture offset: {msg_time-time_offset:.9f},"
+            f"\tSequence ID: {sequence_id}"
+        )
+
+    def __repr__(self) -> str:
+        syncs, delay_reqs, delay_resps = self._get_discarded_counts()
+        return (
+            f"PTP Signal Match 1-step Sequence:\n\tPTP Exchanges (Sync-D_Req-D_Resp): "
+            f"{self._get_exchange_count()},\n\tDiscarded (unhandled) Sync Msgs: "
+            f"{syncs},\n\tDiscarded (unordered) Delay Reqs: "
+            f"{delay_reqs},\n\tDiscarded (unordered) Delay Resps: "
+            f"{delay_resps},"
+        )
+
+
+class PtpMatched(PtpExchangeMatcher):
+    BANNER = "ptp one step full sequential message exchange"
+
     class DispatcherState(enum.IntEnum):
         NEW_EXCHANGE = 1
         GOT_SYNC = 2
         WAITING_AT_RESP = 3
 
-    def __init__(self, logger: ILogger, packets: List[PTPv2], time_offset=0):
-        self.time_offset = time_offset
-        self._logger = logger
+    def _init_state(self):
         self._ptp_msg_exchange = []
         self._unmatched_all = []
         self._unmatched_syncs = []
@@ -45,9 +186,24 @@ class PtpMatched:
         self._unmatched_delay_resps = []
         self._dispatcher_state = self.DispatcherState.NEW_EXCHANGE
         self._current_processed_exchange = Ptp1StepExchenge()
-        self._logger.banner_large("ptp one step full sequential message exchange")
-        self._add(packets)
-        self._log_state()
+
+    def add_msg(self, p: PTPv2):
+        self._add_dispatch(p)
+
+    def merge(self, other: "PtpMatched"):
+        # Other matcher got msgs following ones added here, starting with Sync,
+        # which discards exchange still open here
+        other._logger.flush_to(self._logger)
+        if self._dispatcher_state != self.DispatcherState.NEW_EXCHANGE:
+            self._unmatched_syncs.append(self._current_processed_exchange.sync)
+            self._unmatched_all.append(self._current_processed_exchange.sync)
+        self._ptp_msg_exchange += other._ptp_msg_exchange
+        self._unmatched_all += other._unmatched_all
+        self._unmatched_syncs += other._unmatched_syncs
+        self._unmatched_delay_reqs += other._unmatched_delay_reqs
+        self._unmatched_delay_resps += other._unmatched_delay_resps
+        self._dispatcher_state = other._dispatcher_state
+        self._current_processed_exchange = other._current_processed_exchange
 
     @property
     def ptp_exchanges(self):
@@ -67,6 +223,8 @@ class PtpMatched:
     def _add_dispatch(self, p):
         if PtpType.is_sync(p):
             self._add_sync(p)
+        elif PtpType.is_followup(p):
+            self._add_follow_up(p)
         elif PtpType.is_delay_req(p) or PtpType.is_pdelay_req(p):
             self._add_delay_req(p)
         elif PtpType.is_delay_resp(p) or PtpType.is_pdelay_resp(p):
@@ -81,6 +239,17 @@ class PtpMatched:
             self._unmatched_all.append(self._current_processed_exchange.sync)
             self._current_processed_exchange.sync = p
             self._dispatcher_state = self.DispatcherState.GOT_SYNC
+        self._current_processed_exchange.follow_up = None
+
+    def _add_follow_up(self, p):
+        # Precise origin timestamp of two-step Sync of current exchange
+        sync = self._current_processed_exchange.sync
+        if (
+            self._dispatcher_state != self.DispatcherState.NEW_EXCHANGE
+            and p.sequenceId == sync.sequenceId
+            and p.sourcePortIdentity == sync.sourcePortIdentity
+        ):
+            self._current_processed_exchange.follow_up = p
 
     def _add_delay_req(self, p):
         if self._dispatcher_state == self.DispatcherState.GOT_SYNC:
@@ -127,17 +296,14 @@ class PtpMatched:
             )
 
     def _update_current_time_differences(self):
-        ns = self._current_processed_exchange.sync.originTimestamp["ns"]
+        origin_ns = timestamp_to_ns(self._get_origin_timestamp())
         if PtpType.is_pdelay_resp(self._current_processed_exchange.delay_resp):
-            ns_next = (
-                self._current_processed_exchange.delay_resp.requestReceiptTimestamp["ns"]
+            receipt_ns = timestamp_to_ns(
+                self._current_processed_exchange.delay_resp.requestReceiptTimestamp
             )
         else:
-            ns_next = self._current_processed_exchange.delay_resp.receiveTimestamp["ns"]
-        t1_t4 = ns_next - ns
-        if t1_t4 < 0:
-            t1_t4 = ONE_SEC_IN_NS - ns + ns_next
-        self._current_processed_exchange.t1_t4 = t1_t4 / ONE_SEC_IN_MS
+            receipt_ns = timestamp_to_ns(self._current_processed_exchange.delay_resp.receiveTimestamp)
+        self._current_processed_exchange.t1_t4 = (receipt_ns - origin_ns) / ONE_SEC_IN_MS
         self._current_processed_exchange.sync_to_delay_req_time = (
             self._current_processed_exchange.delay_req.time
             - self._current_processed_exchange.sync.time
@@ -147,68 +313,31 @@ class PtpMatched:
             - self._current_processed_exchange.delay_req.time
         ) * ONE_SEC_IN_US
 
-    def _log_state(self):
-        self._logger.info(self.__repr__())
-        self._logger.banner_small("ptp message exchange statistics")
-        self._log_statistics()
-        self._logger.banner_small("Unordered ptp messages")
-        self._log_unordered_msgs()
+    def _get_origin_timestamp(self) -> dict:
+        exchange = self._current_processed_exchange
+        if PtpType.is_two_step(exchange.sync) and exchange.follow_up is not None:
+            return exchange.follow_up.preciseOriginTimestamp
+        return exchange.sync.originTimestamp
 
-    def _log_statistics(self):
-        sync_to_delay = [exchange.sync_to_delay_req_time for exchange in self._ptp_msg_exchange]
-        if len(sync_to_delay) != 0:
-            self._logger.info(
-                f"Sync message to Delay Request message capture time in matched PTP messages "
-                f"exchange:\n\tmean: {statistics.mean(sync_to_delay):.3f} us,\n\tstd dev: "
-                f"{statistics.stdev(sync_to_delay):.3f} us,\n\tmin: {min(sync_to_delay):.3f}"
-                f"us,\n\tmax: {max(sync_to_delay):.3f} us"
-            )
-        d_req_resp_delay = [exchange.delay_req_to_resp_time for exchange in self._ptp_msg_exchange]
-        if len(d_req_resp_delay) != 0:
-            self._logger.info(
-                f"Delay Request message to Delay Response message capture time in matched PTP "
-                f"messages  exchange:\n\tmean: {statistics.mean(d_req_resp_delay):.3f} us,"
-                f"\n\tstd dev: {statistics.stdev(d_req_resp_delay):.3f} us,\n\tmin: "
-                f"{min(d_req_resp_delay):.3f} us,\n\tmax: {max(d_req_resp_delay):.3f} us"
-            )
-        t1_to_t4 = [exchange.t1_t4 for exchange in self._ptp_msg_exchange]
-        if len(t1_to_t4) != 0:
-            self._logger.info(
-                f"1st Timestamp to 4th Timestamp time difference in full PTP messages exchange"
-                f"exchange:\n\tmean: {statistics.mean(t1_to_t4):.3f} us,\n\tstd dev: "
-                f"{statistics.stdev(t1_to_t4):.3f} us,\n\tmin: {min(t1_to_t4):.3f} us,"
-                f"\n\tmax: {max(t1_to_t4):.3f} us"
-            )
+    def _get_exchange_count(self) -> int:
+        return len(self._ptp_msg_exchange)
 
-    def _log_unordered_msgs(self):
-        if len(self._unmatched_all) == 0:
-            self._logger.info("There are no unordered messages")
-        for msg in self._unmatched_all:
-            if PtpType.is_sync(msg):
-                self._logger.warning(
-                    f"Unhandled SYNC__MSG:" + self._msg_sequence_and_time_info(msg)
-                )
-            elif PtpType.is_delay_req(msg):
-                self._logger.warning(
-                    f"Unordered DELAY_REQ:" + self._msg_sequence_and_time_info(msg)
-                )
-            elif PtpType.is_delay_resp(msg):
-                self._logger.warning(
-                    f"Unordered DELAY_RES:" + self._msg_sequence_and_time_info(msg)
-                )
-
-    def _msg_sequence_and_time_info(self, msg: PTPv2) -> str:
-        t = time.strftime("%H:%M:%S", time.localtime(msg.time))
+    def _get_exchange_delays(self) -> Tuple[list, list, list]:
         return (
-            f"   Capture time: {t},    Capture offset: {msg.time-self.time_offset:.9f},"
-            f"\tSequence ID: {msg.sequenceId}"
+            [exchange.sync_to_delay_req_time for exchange in self._ptp_msg_exchange],
+            [exchange.delay_req_to_resp_time for exchange in self._ptp_msg_exchange],
+            [exchange.t1_t4 for exchange in self._ptp_msg_exchange],
         )
 
-    def __repr__(self) -> str:
+    def _get_unordered_msgs(self) -> Iterable[Tuple[int, Decimal, int]]:
+        return ((msg.messageType, msg.time, msg.sequenceId) for msg in self._unmatched_all)
+
+    def _get_discarded_columns(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         return (
-            f"PTP Signal Match 1-step Sequence:\n\tPTP Exchanges (Sync-D_Req-D_Resp): "
-            f"{len(self._ptp_msg_exchange)},\n\tDiscarded (unhandled) Sync Msgs: "
-            f"{len(self._unmatched_syncs)},\n\tDiscarded (unordered) Delay Reqs: "
-            f"{len(self._unmatched_delay_reqs)},\n\tDiscarded (unordered) Delay Resps: "
-            f"{len(self._unmatched_delay_resps)},"
+            np.array([msg.messageType for msg in self._unmatched_all], dtype=np.uint8),
+            np.array([msg_time_ns(msg) for msg in self._unmatched_all], dtype=np.int64),
+            np.array([msg.sequenceId for msg in self._unmatched_all], dtype=np.uint16),
         )
+
+    def _get_discarded_counts(self) -> Tuple[int, int, int]:
+        return (len(self._unmatched_syncs), len(self._unmatched_delay_reqs), len(self._unmatched_delay_resps))
@@ -0,0 +1,251 @@
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from appcommon.AppLogger.ILogger import ILogger
+from mptp.PtpColumns import NO_INDEX, PtpMsgView
+from mptp.PtpPacket.PTPv2 import PTP_MSG_TYPE, TWO_STEP_FLAG
+from mptp.PtpResults import OffsetResult
+from mptp.PtpTimestamps import corrections_to_ns, join_next_msgs, take, timestamps_to_ns
+
+ONE_SEC_IN_NS = 1000000000
+SYNC = PTP_MSG_TYPE.SYNC_MSG.value
+FOLLOW_UP = PTP_MSG_TYPE.FOLLOW_UP_MSG.value
+DELAY_REQ = PTP_MSG_TYPE.DELAY_REQ_MSG.value
+DELAY_RESP = PTP_MSG_TYPE.DELAY_RESP_MSG.value
+PDELAY_REQ = PTP_MSG_TYPE.PDELAY_REQ_MSG.value
+PDELAY_RESP = PTP_MSG_TYPE.PDELAY_RESP_MSG.value
+PDELAY_RESP_FOLLOW_UP = PTP_MSG_TYPE.PDELAY_RESP_FOLLOW_UP_MSG.value
+TIMESTAMP = ("correction", "ts_sec", "ts_ns")
+MSG_COLUMNS = {
+    SYNC: ("time_ns", "domain", "source_port", "sequence_id", "flags") + TIMESTAMP,
+    FOLLOW_UP: ("source_port", "sequence_id") + TIMESTAMP,
+    DELAY_REQ: ("time_ns", "domain", "source_port", "sequence_id"),
+    DELAY_RESP: ("requesting_port", "sequence_id") + TIMESTAMP,
+    PDELAY_REQ: ("time_ns", "domain", "source_port", "sequence_id"),
+    PDELAY_RESP: ("time_ns", "requesting_port", "sequence_id", "flags") + TIMESTAMP,
+    PDELAY_RESP_FOLLOW_UP: ("requesting_port", "sequence_id") + TIMESTAMP,
+}
+
+
+class PtpOffset:
+    # Offset from master and mean path delay of each exchange, computed on columns with
+    # exact nanosecond timestamps and correctionField. Capture time stands for slave
+    # clock: T2 is capture of Sync and, with delay request mechanism, T3 is capture of
+    # Delay Req, with peer delay mechanism capture of Pdelay Req and Pdelay Resp are
+    # T1 and T4 of link delay. Each delay request makes exchange with the last Sync
+    # of its domain with known origin timestamp captured before it.
+    def __init__(self, logger: ILogger, msgs: Optional[PtpMsgView], time_offset=0):
+        # Without msgs given, add_batch has to be called with consecutive batches
+        # of msgs and then finish
+        self._logger = logger
+        self._time_offset = time_offset
+        self._parts: Dict[int, List[Tuple[np.ndarray, ...]]] = {t: [] for t in MSG_COLUMNS}
+        self.time_ns = np.empty(0, dtype=np.int64)
+        self.offset_ns = np.empty(0, dtype=np.int64)
+        self.mean_path_delay_ns = np.empty(0, dtype=np.int64)
+        # T2 - T1 and T4 - T3 of exchange, the latter is NaN for Pdelay Req exchanges
+        self.master_to_slave_ns = np.empty(0, dtype=np.int64)
+        self.slave_to_master_ns = np.empty(0)
+        self.delay_req_exchanges = 0
+        self.pdelay_req_exchanges = 0
+        self.requests_without_response = 0
+        self.requests_without_sync = 0
+        if msgs is None:
+            return
+        self.add_batch(msgs)
+        self.finish()
+
+    def add_batch(self, msgs: PtpMsgView):
+        msg_type = msgs.column("msg_type")
+        for t, parts in self._parts.items():
+            selected = msg_type == t
+            if selected.any():
+                rows = msgs.indexes[selected]
+                parts.append((rows,) + tuple(msgs.columns.column(name)[rows] for name in MSG_COLUMNS[t]))
+
+    def merge(self, other: "PtpOffset"):
+        # Other got msgs following ones added here
+        for t, parts in self._parts.items():
+            parts += other._parts[t]
+
+    def finish(self):
+        sync_row, sync_domain, sync_time_ns, master_to_slave_ns = self._get_syncs()
+        delay_req_row, delay_req_domain, slave_to_master_ns, delay_req_missing = self._get_delay_req_exchanges()
+        pdelay_req_row, pdelay_req_domain, link_delay_ns, pdelay_req_missing = self._get_pdelay_req_exchanges()
+        self._parts = {t: [] for t in MSG_COLUMNS}
+        self.requests_without_response = delay_req_missing + pdelay_req_missing
+        delay_req_sync = _last_sync_of_domain(sync_row, sync_domain, delay_req_row, delay_req_domain)
+        pdelay_req_sync = _last_sync_of_domain(sync_row, sync_domain, pdelay_req_row, pdelay_req_domain)
+        self.requests_without_sync = int(np.count_nonzero(delay_req_sync < 0) + np.count_nonzero(pdelay_req_sync < 0))
+        delay_req_with_sync = delay_req_sync >= 0
+        pdelay_req_with_sync = pdelay_req_sync >= 0
+        delay_req_sync = delay_req_sync[delay_req_with_sync]
+        pdelay_req_sync = pdelay_req_sync[pdelay_req_with_sync]
+        self.delay_req_exchanges = len(delay_req_sync)
+        self.pdelay_req_exchanges = len(pdelay_req_sync)
+        # with delay request mechanism path delay is mean of both directions
+        delay_req_path_ns = (master_to_slave_ns[delay_req_sync] + slave_to_master_ns[delay_req_with_sync]) // 2
+        order = np.argsort(
+            np.concatenate((delay_req_row[delay_req_with_sync], pdelay_req_row[pdelay_req_with_sync])), kind="stable"
+        )
+        exchange_sync = np.concatenate((delay_req_sync, pdelay_req_sync))[order]
+        self.mean_path_delay_ns = np.concatenate((delay_req_path_ns, link_delay_ns[pdelay_req_with_sync]))[order]
+        self.master_to_slave_ns = master_to_slave_ns[exchange_sync]
+        self.slave_to_master_ns = np.concatenate(
+            (slave_to_master_ns[delay_req_with_sync], np.full(self.pdelay_req_exchanges, np.nan))
+        )[order]
+        self.offset_ns = self.master_to_slave_ns - self.mean_path_delay_ns
+        self.time_ns = sync_time_ns[exchange_sync]
+        self._log_state()
+
+    def _get_syncs(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        # Rows, domains, capture times and T2 - T1 - correction of Syncs with known origin timestamp,
+        # precise origin timestamp of two-step Sync and its correction are in Follow Up
+        sync = self._join_parts(SYNC)
+        follow_up = self._join_parts(FOLLOW_UP)
+        follow_up_of_sync = join_next_msgs(
+            sync["source_port"], sync["sequence_id"], sync["row"],
+            follow_up["source_port"], follow_up["sequence_id"], follow_up["row"],
+        )
+        two_step = (sync["flags"] & TWO_STEP_FLAG) != 0
+        origin_ns = np.where(
+            two_step,
+            take(timestamps_to_ns(follow_up["ts_sec"], follow_up["ts_ns"]), follow_up_of_sync),
+            timestamps_to_ns(sync["ts_sec"], sync["ts_ns"]),
+        )
+        correction_ns = corrections_to_ns(sync["correction"]) + np.where(
+            two_step, take(corrections_to_ns(follow_up["correction"]), follow_up_of_sync), 0
+        )
+        known = ~two_step | (follow_up_of_sync != NO_INDEX)
+        master_to_slave_ns = sync["time_ns"] - origin_ns - correction_ns
+        return sync["row"][known], sync["domain"][known], sync["time_ns"][known], master_to_slave_ns[known]
+
+    def _get_delay_req_exchanges(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+        # Rows and domains of Delay Reqs with response, their T4 - T3 - correction and number of
+        # Delay Reqs without response
+        delay_req = self._join_parts(DELAY_REQ)
+        delay_resp = self._join_parts(DELAY_RESP)
+        delay_resp_of_req = join_next_msgs(
+            delay_req["source_port"], delay_req["sequence_id"], delay_req["row"],
+            delay_resp["requesting_port"], delay_resp["sequence_id"], delay_resp["row"],
+        )
+        joined = delay_resp_of_req != NO_INDEX
+        delay_resp_of_req = delay_resp_of_req[joined]
+        receive_ns = timestamps_to_ns(delay_resp["ts_sec"], delay_resp["ts_ns"])[delay_resp_of_req]
+        correction_ns = corrections_to_ns(delay_resp["correction"])[delay_resp_of_req]
+        slave_to_master_ns = receive_ns - delay_req["time_ns"][joined] - correction_ns
+        return delay_req["row"][joined], delay_req["domain"][joined], slave_to_master_ns, int(np.count_nonzero(~joined))
+
+    def _get_pdelay_req_exchanges(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+        # Rows and domains of Pdelay Reqs with response, their mean link delay and number of Pdelay
+        # Reqs without response. Response origin timestamp of two-step responder and
+        # its correction are in Pdelay Resp Follow Up, one-step responder puts its
+        # turnaround into correction of Pdelay Resp.
+        pdelay_req = self._join_parts(PDELAY_REQ)
+        pdelay_resp = self._join_parts(PDELAY_RESP)
+        follow_up = self._join_parts(PDELAY_RESP_FOLLOW_UP)
+        pdelay_resp_of_req = join_next_msgs(
+            pdelay_req["source_port"], pdelay_req["sequence_id"], pdelay_req["row"],
+            pdelay_resp["requesting_port"], pdelay_resp["sequence_id"], pdelay_resp["row"],
+        )
+        follow_up_of_resp = join_next_msgs(
+            pdelay_resp["requesting_port"], pdelay_resp["sequence_id"], pdelay_resp["row"],
+            follow_up["requesting_port"], follow_up["sequence_id"], follow_up["row"],
+        )
+        two_step = (pdelay_resp["flags"] & TWO_STEP_FLAG) != 0
+        receipt_ns = timestamps_to_ns(pdelay_resp["ts_sec"], pdelay_resp["ts_ns"])
+        response_origin_ns = np.where(
+            two_step, take(timestamps_to_ns(follow_up["ts_sec"], follow_up["ts_ns"]), follow_up_of_resp), receipt_ns
+        )
+        correction_ns = corrections_to_ns(pdelay_resp["correction"]) + np.where(
+            two_step, take(corrections_to_ns(follow_up["correction"]), follow_up_of_resp), 0
+        )
+        known = ~two_step | (follow_up_of_resp != NO_INDEX)
+        turnaround_ns = response_origin_ns - receipt_ns + correction_ns
+        joined = pdelay_resp_of_req != NO_INDEX
+        joined[joined] = known[pdelay_resp_of_req[joined]]
+        pdelay_resp_of_req = pdelay_resp_of_req[joined]
+        round_trip_ns = pdelay_resp["time_ns"][pdelay_resp_of_req] - pdelay_req["time_ns"][joined]
+        link_delay_ns = (round_trip_ns - turnaround_ns[pdelay_resp_of_req]) // 2
+        return pdelay_req["row"][joined], pdelay_req["domain"][joined], link_delay_ns, int(np.count_nonzero(~joined))
+
+    def _join_parts(self, msg_type: int) -> Dict[str, np.ndarray]:
+        names = ("row",) + MSG_COLUMNS[msg_type]
+        parts = self._parts[msg_type]
+        if not parts:
+            return {name: np.empty(0, dtype=np.int64) for name in names}
+        return {name: np.concatenate(column) for name, column in zip(names, zip(*parts))}
+
+    def _log_state(self):
+        self._logger.banner_small("offset from master and mean path delay")
+        self._logger.info(self.__repr__())
+        if len(self.offset_ns) == 0:
+            self._logger.info("No complete exchanges, offset from master and mean path delay not computed")
+            return
+        self._logger.info(
+            "Offset from master, capture time stands for slave clock:\n" + self._stats_to_str(self.offset_ns)
+        )
+        self._logger.info("Mean path delay:\n" + self._stats_to_str(self.mean_path_delay_ns))
+        drift = self.get_offset_drift_ppb()
+        if drift is not None:
+            self._logger.info(f"Drift of offset from master: {drift:.3f} ppb")
+
+    def get_offset_drift_ppb(self) -> Optional[float]:
+        # Slope of least squares line of offset against capture time
+        if len(self.offset_ns) < 2 or self.time_ns[-1] == self.time_ns[0]:
+            return None
+        t = (self.time_ns - self.time_ns[0]) / ONE_SEC_IN_NS
+        return np.polyfit(t, (self.offset_ns - self.offset_ns[0]).astype(np.float64), 1)[0].item()
+
+    def result(self) -> OffsetResult:
+        return OffsetResult(
+            ok=self.requests_without_response == 0 and self.requests_without_sync == 0,
+            delay_req_exchanges=self.delay_req_exchanges,
+            pdelay_req_exchanges=self.pdelay_req_exchanges,
+            requests_without_response=self.requests_without_response,
+            requests_without_sync=self.requests_without_sync,
+            drift_ppb=self.get_offset_drift_ppb(),
+            exchange_time_ns=self.time_ns,
+            offset_ns=self.offset_ns,
+            mean_path_delay_ns=self.mean_path_delay_ns,
+        )
+
+    @staticmethod
+    def _stats_to_str(values_ns: np.ndarray) -> str:
+        # Offsets may be far from zero, so statistics are taken relative to first value
+        # and printed with exact integer part
+        first = values_ns[0].item()
+        relative = (values_ns - first).astype(np.float64)
+        std = relative.std(ddof=1) if len(relative) > 1 else 0.0
+        mean, median = (Decimal(first) + Decimal(v.item()) for v in (relative.mean(), np.median(relative)))
+        return (
+            f"\tmean: {mean.scaleb(-3):.3f} us,\n\tstd dev: {std / 1000:.3f} us,\n\t"
+            f"min: {Decimal(values_ns.min().item()).scaleb(-3):.3f} us,\n\tmedian: {median.scaleb(-3):.3f} us,"
+            f"\n\tmax: {Decimal(values_ns.max().item()).scaleb(-3):.3f} us"
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"PTP Offset from master and mean path delay:\n\t"
+            f"Exchanges with Delay Req: {self.delay_req_exchanges},\n\t"
+            f"Exchanges with Pdelay Req: {self.pdelay_req_exchanges},\n\t"
+            f"Requests without response: {self.requests_without_response},\n\t"
+            f"Requests before first Sync: {self.requests_without_sync}"
+        )
+
+
+def _last_sync_of_domain(
+    sync_row: np.ndarray, sync_domain: np.ndarray, req_row: np.ndarray, req_domain: np.ndarray
+) -> np.ndarray:
+    # Index of the last Sync of request domain captured before each request, -1 if none.
+    # Rows of Syncs are in capture order, so they are searched within each domain.
+    last_sync = np.full(len(req_row), -1, dtype=np.int64)
+    for domain in np.unique(req_domain).tolist():
+        syncs = np.flatnonzero(sync_domain == domain)
+        if len(syncs) == 0:
+            continue
+        reqs = req_domain == domain
+        found = np.searchsorted(sync_row[syncs], req_row[reqs]) - 1
+        last_sync[reqs] = np.where(found >= 0, syncs[found], -1)
+    return last_sync
@@ -1,109 +1,169 @@
+from decimal import Decimal
+from math import prod
+from typing import Dict, List, Optional, Tuple, Union
+import numpy as np
+
 from appcommon.AppLogger.ILogger import ILogger
-from typing import List
-from mptp.PtpPacket.PTPv2 import PTP_MSG_TYPE, PTPv2, PtpType
+from mptp.PtpColumns import NO_INDEX, PtpColumns, PtpMsgView
+from mptp.PtpPacket.PTPv2 import PTPv2, PtpType
+from mptp.PtpPacket.PtpDecoder import PtpRecord
+from mptp.PtpResults import PortCheckResult, msg_time_ns
+
+# Flow is made of interned src MAC, dst MAC, sourcePortIdentity and requestingPortIdentity,
+# msgs of a flow are counted per type
+FLOW_COLUMNS = ("src_mac", "dst_mac", "source_port", "requesting_port", "msg_type")
+INT64_RANGE = 1 << 63
+BATCH_SIZE = 64 * 1024
+
+# src MAC, dst MAC, sourcePortIdentity, requestingPortIdentity or None
+FlowKey = Tuple[str, str, str, Optional[str]]
+
+
+class PtpFlow:
+    def __init__(self, first_ns: int):
+        self.msgs: Dict[str, int] = {}
+        self.first_ns = first_ns
+        self.last_ns = first_ns
+
+    def merge(self, other: "PtpFlow"):
+        # Other flow has msgs following ones counted here
+        for msg_type, count in other.msgs.items():
+            self.msgs[msg_type] = self.msgs.get(msg_type, 0) + count
+        self.last_ns = other.last_ns
+
+    def __len__(self):
+        return sum(self.msgs.values())
 
 
 class PtpPortCheck:
+    # Single pass identity index of PTP stream. Msgs are grouped into flows on interned
+    # columns, every flow keeps its msgs count and first and last seen time. Port identity
+    # is bound to MAC address it is sent from, only a binding not seen before which
+    # conflicts with registered ones is an identity change: port identity sent from
+    # other MAC or MAC sending other clock identity. Many masters and slaves on the
+    # segment are many flows, not inconsistencies.
 
     MINIMAL_MESSAGE_NUMBER_REQUIRED = 5
 
     def __init__(self, logger: ILogger, time_offset=0.0):
         self._logger = logger
-        self._inconsistency_counter = 0
         self.time_offset = time_offset
-        self.ptp_eth_source_port = None
-        self.ptp_eth_slave_port = None
-        self.ptp_eth_source_destination = None
-        self.ptp_eth_slave_destination = None
-        self.ptp_source_clk_id = None
-        self.ptp_slave_clk_id = None
-
-    def check_ports(self, ptp_stream):
-        self._inconsistency_counter = 0
+        self._flows: Dict[FlowKey, PtpFlow] = {}
+        # (sourcePortIdentity, src MAC) to first msg of binding, in order of stream
+        self._bindings: Dict[Tuple[str, str], PtpRecord] = {}
+        self._changes: List[Tuple[PtpRecord, str]] = []
+
+    def check_ports(self, ptp_stream: Union[List[PTPv2], PtpMsgView]):
+        if not self.start_check(len(ptp_stream)):
+            return
+        if not isinstance(ptp_stream, PtpMsgView):
+            columns = PtpColumns.from_messages(ptp_stream)
+            ptp_stream = PtpMsgView(columns, np.arange(len(columns)))
+        for start in range(0, len(ptp_stream), BATCH_SIZE):
+            self.add_batch(ptp_stream[start : start + BATCH_SIZE])
+        self.finish_check()
+
+    def start_check(self, msgs_number: int) -> bool:
+        # For messages given in batches with add_batch, False if there are too few of them
         self._logger.banner_large("PTP message MAC address and clock id analysis")
-        if len(ptp_stream) < self.MINIMAL_MESSAGE_NUMBER_REQUIRED:
+        if msgs_number < self.MINIMAL_MESSAGE_NUMBER_REQUIRED:
             self._logger.info("Not enough PTP messages to perform valid port check.")
-            return
-        self._check_ports_for_ptp_messages_in_stream(ptp_stream)
-        self._log_status()
-
-    def _check_ports_for_ptp_messages_in_stream(self, ptp_stream: List[PTPv2]):
-        for msg in ptp_stream:
-            msg_type = PtpType.get_ptp_msg_type(msg)
-            if msg_type in (
-                PTP_MSG_TYPE.ANNOUNCE_MSG,
-                PTP_MSG_TYPE.SYNC_MSG,
-                PTP_MSG_TYPE.FOLLOW_UP_MSG,
-            ):
-                self._check_sync_fup_announce_ports(msg)
-            elif msg_type in (PTP_MSG_TYPE.DELAY_REQ_MSG, PTP_MSG_TYPE.PDELAY_REQ_MSG):
-                self._check_dreq_ports(msg)
-            elif msg_type in (
-                PTP_MSG_TYPE.DELAY_RESP_MSG,
-                PTP_MSG_TYPE.PDELAY_RESP_MSG,
-                PTP_MSG_TYPE.PDELAY_RESP_FOLLOW_UP_MSG,
-            ):
-                self._check_dresp_ports(msg)
-
-    def _check_sync_fup_announce_ports(self, msg: PTPv2):
-        self._initial_source_values(msg)
-        if (
-            self.ptp_eth_source_port != msg.src
-            or self.ptp_eth_source_destination != msg.dst
-            or self.ptp_source_clk_id != msg.sourcePortIdentity
-        ):
-            self._inconsistency_counter += 1
-            self._log_sync_announce_followup_issue(msg)
-            self._reset_source_data()
-
-    def _check_dreq_ports(self, msg: PTPv2):
-        self._initial_slave_values(msg)
-        if (
-            self.ptp_eth_slave_port != msg.src
-            or self.ptp_eth_slave_destination != msg.dst
-            or self.ptp_slave_clk_id != msg.sourcePortIdentity
-        ):
-            self._inconsistency_counter += 1
-            self._log_delay_request_issue(msg)
-            self._reset_slave_data()
+            return False
+        return True
 
-    def _check_dresp_ports(self, msg: PTPv2):
-        if self.ptp_eth_slave_port is None:
+    def add_batch(self, msgs: PtpMsgView):
+        if len(msgs) == 0:
             return
-        if (
-            self.ptp_eth_source_port != msg.src
-            or self.ptp_eth_source_destination != msg.dst
-            or self.ptp_source_clk_id != msg.sourcePortIdentity
-            or self.ptp_slave_clk_id != msg.requestingPortIdentity
+        keys = self._get_flow_keys(msgs)
+        # Both first and last row of each key, keys are sorted the same way
+        _, first, counts = np.unique(keys, axis=0, return_index=True, return_counts=True)
+        _, last_reversed = np.unique(keys[::-1], axis=0, return_index=True)
+        last = len(keys) - 1 - last_reversed
+        order = np.argsort(first, kind="stable")
+        columns, rows = msgs.columns, msgs.indexes
+        time_ns = columns.time_ns
+        for i, row_first, row_last, count in zip(
+            first[order].tolist(), rows[first[order]].tolist(), rows[last[order]].tolist(), counts[order].tolist()
         ):
-            self._inconsistency_counter += 1
-            self._log_delay_response_issue(msg)
-
-    def _initial_source_values(self, msg: PTPv2):
-        if self.ptp_eth_source_port is None:
-            self.ptp_eth_source_port = msg.src
-        if self.ptp_eth_source_destination is None:
-            self.ptp_eth_source_destination = msg.dst
-        if self.ptp_source_clk_id is None:
-            self.ptp_source_clk_id = msg.sourcePortIdentity
-
-    def _initial_slave_values(self, msg: PTPv2):
-        if self.ptp_slave_clk_id is None:
-            self.ptp_slave_clk_id = msg.sourcePortIdentity
-        if self.ptp_eth_slave_port is None:
-            self.ptp_eth_slave_port = msg.src
-        if self.ptp_eth_slave_destination is None:
-            self.ptp_eth_slave_destination = msg.dst
-
-    def _reset_source_data(self):
-        self.ptp_eth_source_port = None
-        self.ptp_eth_source_destination = None
-        self.ptp_source_clk_id = None
-
-    def _reset_slave_data(self):
-        self.ptp_eth_slave_port = None
-        self.ptp_eth_slave_destination = None
-        self.ptp_slave_clk_id = None
+            requesting_port = columns.requesting_port[row_first]
+            flow_key = (
+                columns.macs[columns.src_mac[row_first]],
+                columns.macs[columns.dst_mac[row_first]],
+                columns.port_ids[columns.source_port[row_first]],
+                columns.port_ids[requesting_port] if requesting_port != NO_INDEX else None,
+            )
+            flow = self._flows.get(flow_key)
+            if flow is None:
+                flow = self._flows[flow_key] = PtpFlow(time_ns[row_first].item())
+            msg = msgs[i]
+            msg_type = PtpType.get_ptp_type_str(msg)
+            flow.msgs[msg_type] = flow.msgs.get(msg_type, 0) + count
+            flow.last_ns = max(flow.last_ns, time_ns[row_last].item())
+            self._bindings.setdefault((flow_key[2], flow_key[0]), msg)
+
+    @staticmethod
+    def _get_flow_keys(msgs: PtpMsgView) -> np.ndarray:
+        # Flow columns packed into single number if it fits, rows of columns otherwise
+        flow_columns = [msgs.column(name).astype(np.int64) - NO_INDEX for name in FLOW_COLUMNS]
+        dims = [int(c.max()) + 1 for c in flow_columns]
+        if prod(dims) < INT64_RANGE:
+            return np.ravel_multi_index(flow_columns, dims)
+        return np.stack(flow_columns, axis=1)
+
+    def merge(self, other: "PtpPortCheck"):
+        # Other check got msgs following ones checked here
+        for flow_key, flow in other._flows.items():
+            if flow_key in self._flows:
+                self._flows[flow_key].merge(flow)
+            else:
+                self._flows[flow_key] = flow
+        for binding, msg in other._bindings.items():
+            self._bindings.setdefault(binding, msg)
+
+    @property
+    def flows(self) -> Dict[FlowKey, PtpFlow]:
+        return self._flows
+
+    @property
+    def changes(self) -> List[Tuple[PtpRecord, str]]:
+        return self._changes
+
+    def result(self) -> PortCheckResult:
+        flows = self._flows.items()
+        return PortCheckResult(
+            ok=len(self._changes) == 0,
+            flows=len(self._flows),
+            identity_changes=len(self._changes),
+            flow_src_mac=np.array([src for (src, _, _, _), _ in flows], dtype=str),
+            flow_dst_mac=np.array([dst for (_, dst, _, _), _ in flows], dtype=str),
+            flow_source_port=np.array([port for (_, _, port, _), _ in flows], dtype=str),
+            flow_requesting_port=np.array([port or "" for (_, _, _, port), _ in flows], dtype=str),
+            flow_msgs=np.array([len(flow) for flow in self._flows.values()], dtype=np.int64),
+            flow_first_ns=np.array([flow.first_ns for flow in self._flows.values()], dtype=np.int64),
+            flow_last_ns=np.array([flow.last_ns for flow in self._flows.values()], dtype=np.int64),
+            change_time_ns=np.array([msg_time_ns(msg) for msg, _ in self._changes], dtype=np.int64),
+            change_sequence_id=np.array([msg.sequenceId for msg, _ in self._changes], dtype=np.uint16),
+        )
+
+    def finish_check(self):
+        self._find_identity_changes()
+        for msg, change in self._changes:
+            self._logger.warning(f"{PtpType.get_ptp_type_str(msg)} msg with changed identity: {change}")
+            self._logger.msg_timing(msg, self.time_offset)
+        self._log_status()
+
+    def _find_identity_changes(self):
+        self._changes = []
+        port_macs: Dict[str, str] = {}
+        mac_clocks: Dict[str, str] = {}
+        for (port, mac), msg in self._bindings.items():
+            clock = port.split("/")[0]
+            registered_mac = port_macs.setdefault(port, mac)
+            registered_clock = mac_clocks.setdefault(mac, clock)
+            if registered_mac != mac:
+                self._changes.append((msg, f"Clk ID and Port {port} sent from MAC {registered_mac}, now from {mac}"))
+            elif registered_clock != clock:
+                self._changes.append((msg, f"MAC {mac} sent Clk ID {registered_clock}, now {clock}"))
 
     @staticmethod
     def is_mac_multicast(mac: str) -> bool:
@@ -113,60 +173,27 @@ class PtpPortCheck:
 
     @staticmethod
     def add_multicast_mark_to_mac_address(mac: str) -> str:
-        return f"{mac} - Multicast" if PtpPortCheck.is_mac_multicast(mac) else {mac}
-
-    def _log_sync_announce_followup_issue(self, msg: PTPv2):
-        self._logger.warning(
-            f"{PtpType.get_ptp_type_str(msg)} msg inconsistent with previous port data!\n"
-            f"Registered port data:\n\tSource MAC: {self.ptp_eth_source_port},\n\tDestination MAC:"
-            f"{PtpPortCheck.add_multicast_mark_to_mac_address(self.ptp_eth_source_destination)},"
-            f"\n\tSource Clk ID and Port: {self.ptp_source_clk_id},\nProcessing message port data:"
-            f"\n\tSource MAC: {msg.src},\n\tDestination MAC: {msg.dst},"
-            f"\n\tSource Clk ID and Port: {msg.sourcePortIdentity}"
-        )
-        self._logger.msg_timing(msg, self.time_offset)
-
-    def _log_delay_request_issue(self, msg: PTPv2):
-        self._logger.warning(
-            f"Delay Request msg inconsistent with previous port data!\nRegistered port data:"
-            f"\n\tSlave MAC: {self.ptp_eth_slave_port},\n\tDestination MAC: "
-            f"{PtpPortCheck.add_multicast_mark_to_mac_address(self.ptp_eth_slave_destination)},"
-            f"\n\tSlave Clk ID and Port: {self.ptp_slave_clk_id},\nProcessing message port data:"
-            f"\n\tSlave MAC: {msg.src},\n\tDestination MAC: {msg.dst},"
-            f"\n\tSlave Clk ID and Port: {msg.sourcePortIdentity}"
-        )
-        self._logger.msg_timing(msg, self.time_offset)
-
-    def _log_delay_response_issue(self, msg):
-        self._logger.warning(
-            f"{PtpType.get_ptp_type_str(msg)} msg inconsistent with previous port data!\n"
-            f"Registered port data:\n\tSource MAC: {self.ptp_eth_source_port},\n\tDestination MAC:"
-            f"{PtpPortCheck.add_multicast_mark_to_mac_address(self.ptp_eth_source_destination)},"
-            f"\n\tSource Clk ID and Port: {self.ptp_source_clk_id},\n\tSlave Clk ID and Port: "
-            f"{self.ptp_slave_clk_id},\nProcessing message port data:\n\tSource MAC: {msg.src},"
-            f"\n\tDestination MAC: {msg.dst},\n\tSource Clk ID and Port: {msg.sourcePortIdentity},"
-            f"\n\tSlave Clk ID and Port: {msg.requestingPortIdentity}"
-        )
-        self._logger.msg_timing(msg, self.time_offset)
+        return f"{mac} - Multicast" if PtpPortCheck.is_mac_multicast(mac) else mac
 
     def _log_status(self):
-        if self._inconsistency_counter:
-            self._logger.info(
-                f"PTP Clock ID and MAC number of issues found: {self._inconsistency_counter}"
-            )
+        if self._changes:
+            self._logger.info(f"PTP Clock ID and MAC number of issues found: {len(self._changes)}")
         else:
             self._logger.info(f"PTP Clock ID and MAC addresses: [OK]")
         self._logger.banner_small("Port and clock id addresses")
         self._logger.info(self.__repr__())
 
+    def _seen_at(self, time_ns: int) -> str:
+        return f"{Decimal(time_ns).scaleb(-9) - Decimal(self.time_offset):.9f}"
+
     def __repr__(self) -> str:
-        return (
-            f"Last PTP MAC address and Clock ID data:\n\tPTP Source MAC: {self.ptp_eth_source_port},"
-            f"\n\tPTP Slave MAC: {self.ptp_eth_slave_port},"
-            f"\n\tDestination for PTP Source MAC: "
-            f"{PtpPortCheck.add_multicast_mark_to_mac_address(self.ptp_eth_source_destination)},"
-            f"\n\tDestination for PTP Slave MAC: "
-            f"{PtpPortCheck.add_multicast_mark_to_mac_address(self.ptp_eth_slave_destination)},"
-            f"\n\tSource Clock ID and Port: {self.ptp_source_clk_id},"
-            f"\n\tRequesting Clock ID and Port: {self.ptp_slave_clk_id}"
-        )
+        flows = []
+        for (src, dst, port, requesting_port), flow in self._flows.items():
+            requesting = f",\n\tRequesting Clock ID and Port: {requesting_port}" if requesting_port else ""
+            msgs = ", ".join(f"{msg_type}: {count}" for msg_type, count in flow.msgs.items())
+            flows.append(
+                f"\n{src} -> {PtpPortCheck.add_multicast_mark_to_mac_address(dst)},"
+                f"\n\tSource Clock ID and Port: {port}{requesting},\n\tMsgs: {msgs},"
+                f"\n\tFirst seen: {self._seen_at(flow.first_ns)}, last seen: {self._seen_at(flow.last_ns)}"
+            )
+        return f"PTP flows: {len(self._flows)}" + "".join(flows)
@@ -1,22 +1,62 @@
-from mptp.PtpPacket.PTPv2 import PTPv2, PtpType
-from typing import List
+import time
+from array import array
+from decimal import Decimal
+from mptp.PtpPacket.PTPv2 import PTPv2, PTP_MSG_TYPE, PtpType
+from mptp.PtpColumns import PtpMsgView
+from mptp.PtpResults import SequenceIdResult
+from mptp.PtpSequence import (
+    SequenceRunKind,
+    find_sequence_runs,
+    missing_sequence_ids,
+    sequence_id_ranges,
+)
+from typing import List, Set, Tuple, Union
 from appcommon.AppLogger.ILogger import ILogger
+from appcommon.AppLogger.RepeatedWarnings import RepeatedWarnings
+import numpy as np
+
+ONE_SEC_IN_NS = 1000000000
+MAX_LOGGED_RANGES = 32
+RUN_KIND_STR = {
+    SequenceRunKind.Lost: "lost",
+    SequenceRunKind.Duplicated: "duplicated",
+    SequenceRunKind.Reordered: "out of order",
+}
+# msg type, kind, msgs, first id, last id and capture time of runs in result
+RUN_DTYPES = (np.uint8, np.uint8, np.int64, np.uint16, np.uint16, np.int64)
+# msg types tracked together, same grouping as in PtpStream
+SYNC_TYPES = (PTP_MSG_TYPE.SYNC_MSG,)
+FOLLOW_UP_TYPES = (PTP_MSG_TYPE.FOLLOW_UP_MSG,)
+DELAY_REQ_TYPES = (PTP_MSG_TYPE.DELAY_REQ_MSG, PTP_MSG_TYPE.PDELAY_REQ_MSG)
+DELAY_RESP_TYPES = (PTP_MSG_TYPE.DELAY_RESP_MSG, PTP_MSG_TYPE.PDELAY_RESP_MSG)
+DELAY_RESP_FOLLOW_UP_TYPES = (PTP_MSG_TYPE.PDELAY_RESP_FOLLOW_UP_MSG,)
 
 
 class PtpSequenceId:
     def __init__(self, logger: ILogger, time_offset=0):
         self._logger = logger
         self.time_offset = time_offset
+        self._runs: List[Tuple[np.ndarray, ...]] = []
+        self._missing_msgs = 0
+        self._length_mismatches = 0
+
+    def create_tracker(self, msg_types: Tuple[PTP_MSG_TYPE, ...]) -> "SequenceTracker":
+        # Tracker may be filled message by message or in batches and passed to checks
+        # instead of list
+        return SequenceTracker(msg_types)
 
     def check_sync_followup_sequence(self, sync: List[PTPv2], followup: List[PTPv2]):
+        sync, followup = self._track(sync, SYNC_TYPES), self._track(followup, FOLLOW_UP_TYPES)
         self._check_sync_sequence_correctness(sync)
         self._check_followup_sequence_correctness(sync, followup)
 
     def check_delay_req_resp_sequence(self, dreq: List[PTPv2], dresp: List[PTPv2]):
+        dreq, dresp = self._track(dreq, DELAY_REQ_TYPES), self._track(dresp, DELAY_RESP_TYPES)
         self._check_delay_req_sequence_correctness(dreq, dresp)
         self._check_delay_resp_sequence_correctness(dreq, dresp)
 
     def check_dresp_dresp_fup_sequence(self, dresp: List[PTPv2], dresp_fup: List[PTPv2]):
+        dresp, dresp_fup = self._track(dresp, DELAY_RESP_TYPES), self._track(dresp_fup, DELAY_RESP_FOLLOW_UP_TYPES)
         if len(dresp_fup) == 0:
             return
         self._logger.banner_small("delay request follow-up message sequence id")
@@ -26,14 +66,27 @@ class PtpSequenceId:
         if delay_resp_fup_correct:
             self._logger.info("Delay Resp Follow-up msg sequenceId: [OK]")
 
-    def _check_sync_sequence_correctness(self, sync: List[PTPv2]):
+    def _track(
+        self, msgs: Union[List[PTPv2], PtpMsgView, "SequenceTracker"], msg_types: Tuple[PTP_MSG_TYPE, ...]
+    ) -> "SequenceTracker":
+        if isinstance(msgs, SequenceTracker):
+            return msgs
+        tracker = self.create_tracker(msg_types)
+        if isinstance(msgs, PtpMsgView):
+            tracker.add_batch(msgs)
+            return tracker
+        for msg in msgs:
+            tracker.add(msg)
+        return tracker
+
+    def _check_sync_sequence_correctness(self, sync: "SequenceTracker"):
         if len(sync) == 0:
             return
         self._logger.banner_small("Sync message sequence id")
         if self._is_sequence_in_order(sync):
             self._logger.info("Sync msg sequenceId: [OK]")
 
-    def _check_followup_sequence_correctness(self, sync: List[PTPv2], followup: List[PTPv2]):
+    def _check_followup_sequence_correctness(self, sync: "SequenceTracker", followup: "SequenceTracker"):
         if len(followup) == 0:
             return
         self._logger.banner_small("Follow-up message sequence id")
@@ -43,7 +96,7 @@ class PtpSequenceId:
         if followup_correct:
             self._logger.info("Follow-up msg sequenceId: [OK]")
 
-    def _check_delay_req_sequence_correctness(self, dreq: List[PTPv2], dresp: List[PTPv2]):
+    def _check_delay_req_sequence_correctness(self, dreq: "SequenceTracker", dresp: "SequenceTracker"):
         if len(dreq) == 0:
             return
         self._logger.banner_small("delay request message sequence id")
@@ -52,7 +105,7 @@ class PtpSequenceId:
         if delay_req_correct:
             self._logger.info("Delay Req msg sequenceId: [OK]")
 
-    def _check_delay_resp_sequence_correctness(self, dreq: List[PTPv2], dresp: List[PTPv2]):
+    def _check_delay_resp_sequence_correctness(self, dreq: "SequenceTracker", dresp: "SequenceTracker"):
         if len(dresp) == 0:
             return
         self._logger.banner_small("delay resp message sequence id")
@@ -61,45 +114,140 @@ class PtpSequenceId:
         if delay_resp_correct:
             self._logger.info("Delay Resp msg sequenceId: [OK]")
 
-    def _is_same_len(self, arg1: List[PTPv2], arg2: List[PTPv2]) -> bool:
+    def _is_same_len(self, arg1: "SequenceTracker", arg2: "SequenceTracker") -> bool:
         if len(arg1) != len(arg2):
+            self._length_mismatches += 1
             self._logger.info(
-                f"Number of {PtpType.get_ptp_type_str(arg1[0])} and"
-                f"{PtpType.get_ptp_type_str(arg2[0])} messages mismatch!"
+                f"Number of {arg1.type_str} and {arg2.type_str} messages mismatch!"
             )
             return False
         return True
 
-    def _is_sequence_in_order(self, ptp_frames: List[PTPv2]) -> bool:
-        SEQUENCE_ID_SATURATION_DIFF = -0xFFFE
-        inconsistent_counter = 0
-        for frame, next_frame in zip(ptp_frames[:-1], ptp_frames[1:]):
-            diff = next_frame.sequenceId - frame.sequenceId
-            if diff != 1 and diff != SEQUENCE_ID_SATURATION_DIFF:
-                self._log_mismatch(frame, next_frame, diff)
-                inconsistent_counter += 1
-        if inconsistent_counter > 0:
-            self._log_inconsistency(ptp_frames[0], inconsistent_counter)
-        return inconsistent_counter == 0
-
-    def _is_sequence_in_superset(self, in_set: List[PTPv2], subset: List[PTPv2]) -> bool:
-        m_seq = set([msg.sequenceId for msg in in_set]) - set([msg.sequenceId for msg in subset])
+    def _is_sequence_in_order(self, ptp_frames: "SequenceTracker") -> bool:
+        # Lost, duplicated and reordered msgs are reported in runs of neighbour pairs
+        runs = find_sequence_runs(ptp_frames.sequence_ids)
+        if len(runs) == 0:
+            return True
+        sequence_ids, time_ns = ptp_frames.sequence_ids, ptp_frames.time_ns
+        self._runs.append((
+            np.full(len(runs), ptp_frames.first.messageType), runs.kind, runs.msgs, sequence_ids[runs.first_pair],
+            sequence_ids[runs.first_pair + runs.pairs], time_ns[runs.first_pair],
+        ))
+        msg_type = ptp_frames.type_str
+        warnings = RepeatedWarnings(self._logger, f"{msg_type} msgs sequenceId runs out of order")
+        for kind, first_pair, pairs, msgs in zip(
+            runs.kind.tolist(), runs.first_pair.tolist(), runs.pairs.tolist(), runs.msgs.tolist()
+        ):
+            warnings.add(
+                self._run_info, msg_type, kind, msgs, sequence_ids[first_pair].item(),
+                sequence_ids[first_pair + pairs].item(), time_ns[first_pair].item(), self.time_offset,
+            )
+        warnings.flush()
+        for kind, kind_str in RUN_KIND_STR.items():
+            of_kind = runs.of_kind(kind)
+            if len(of_kind) > 0:
+                self._logger.info(
+                    f"{msg_type} msgs {kind_str}: {of_kind.msgs.sum().item()} in {len(of_kind)} "
+                    f"{'burst' if len(of_kind) == 1 else 'bursts'}"
+                )
+        return False
+
+    def _is_sequence_in_superset(self, in_set: "SequenceTracker", subset: "SequenceTracker") -> bool:
+        m_seq = missing_sequence_ids(in_set.sequence_ids, subset.sequence_ids)
         if len(m_seq) > 0:
+            self._missing_msgs += len(m_seq)
+            ranges = sequence_id_ranges(m_seq)
+            ranges_str = ", ".join(
+                str(first) if first == last else f"{first}-{last}" for first, last in ranges[:MAX_LOGGED_RANGES]
+            )
+            if len(ranges) > MAX_LOGGED_RANGES:
+                ranges_str += f" and {len(ranges) - MAX_LOGGED_RANGES} more ranges"
             self._logger.info(
-                f"{PtpType.get_ptp_type_str(in_set[0])} missing msgs to "
-                f"{PtpType.get_ptp_type_str(subset[0])} msgs with Id: {m_seq}"
+                f"{in_set.type_str} missing msgs to {subset.type_str} msgs: {len(m_seq)} with Id: {ranges_str}"
             )
             return False
         return True
 
-    def _log_inconsistency(self, frame: PTPv2, counter: int):
-        self._logger.info(
-            f"{PtpType.get_ptp_type_str(frame)} number of sequence Id inconsistencies: {counter}"
+    def result(self) -> SequenceIdResult:
+        parts = list(zip(*self._runs)) or [()] * len(RUN_DTYPES)
+        msg_type, kind, msgs, first_id, last_id, time_ns = (
+            np.concatenate(part).astype(dtype, copy=False) if part else np.empty(0, dtype=dtype)
+            for part, dtype in zip(parts, RUN_DTYPES)
+        )
+        return SequenceIdResult(
+            ok=len(kind) == 0 and self._missing_msgs == 0 and self._length_mismatches == 0,
+            lost_msgs=msgs[kind == SequenceRunKind.Lost].sum().item(),
+            duplicated_msgs=msgs[kind == SequenceRunKind.Duplicated].sum().item(),
+            reordered_msgs=msgs[kind == SequenceRunKind.Reordered].sum().item(),
+            missing_msgs=self._missing_msgs,
+            length_mismatches=self._length_mismatches,
+            run_msg_type=msg_type,
+            run_kind=kind,
+            run_msgs=msgs,
+            run_first_id=first_id,
+            run_last_id=last_id,
+            run_time_ns=time_ns,
         )
 
-    def _log_mismatch(self, frame: PTPv2, next_f: PTPv2, diff: int):
-        self._logger.warning(
-            f"{PtpType.get_ptp_type_str(frame)} msg sequenceId mismatch with next msg:"
-            f"diff: {diff}, Next id: {next_f.sequenceId}"
+    @staticmethod
+    def _run_info(msg_type: str, kind: int, msgs: int, first_id: int, last_id: int, time_ns: int, time_offset) -> str:
+        t = Decimal(time_ns).scaleb(-9)
+        return (
+            f"{msg_type} msgs {RUN_KIND_STR[kind]}: {msgs}, sequenceId {first_id} to {last_id}\n"
+            f"[TIME] Capture time: {time.strftime('%H:%M:%S', time.localtime(float(t)))},\t"
+            f"Capture offset: {t - Decimal(time_offset):.9f},\tSequence ID: {first_id}"
         )
-        self._logger.msg_timing(frame, self.time_offset)
+
+
+class SequenceTracker:
+    # Sequence ids and capture times of one PTP message list, added message by message
+    # or in batches. Order is checked on columns when it is reported by PtpSequenceId.
+    # Msgs are named by types tracker is created for, only by ones it got msgs of if any.
+    def __init__(self, msg_types: Tuple[PTP_MSG_TYPE, ...]):
+        self.msg_types = msg_types
+        self.first = None
+        self._received_types: Set[int] = set()
+        self._sequence_ids = array("H")
+        self._time_ns = array("q")
+
+    def add(self, msg: PTPv2):
+        if self.first is None:
+            self.first = msg
+        self._received_types.add(msg.messageType)
+        time_ns = getattr(msg, "time_ns", None)
+        self._sequence_ids.append(msg.sequenceId)
+        self._time_ns.append(time_ns if time_ns is not None else round(msg.time * ONE_SEC_IN_NS))
+
+    def add_batch(self, msgs: PtpMsgView):
+        if len(msgs) == 0:
+            return
+        if self.first is None:
+            self.first = msgs[0]
+        self._received_types.update(np.unique(msgs.column("msg_type")).tolist())
+        self._sequence_ids.frombytes(msgs.column("sequence_id").astype(np.uint16, copy=False).tobytes())
+        self._time_ns.frombytes(msgs.column("time_ns").astype(np.int64, copy=False).tobytes())
+
+    def merge(self, other: "SequenceTracker"):
+        # Other tracker got msgs following ones added here
+        if self.first is None:
+            self.first = other.first
+        self._received_types |= other._received_types
+        self._sequence_ids.extend(other._sequence_ids)
+        self._time_ns.extend(other._time_ns)
+
+    @property
+    def type_str(self) -> str:
+        types = [t.value for t in self.msg_types]
+        types = [t for t in types if t in self._received_types] or types
+        return "/".join(PtpType.get_msg_type_str(msg_type) for msg_type in types)
+
+    @property
+    def sequence_ids(self) -> np.ndarray:
+        return np.frombuffer(self._sequence_ids, dtype=np.uint16)
+
+    @property
+    def time_ns(self) -> np.ndarray:
+        return np.frombuffer(self._time_ns, dtype=np.int64)
+
+    def __len__(self):
+        return len(self._sequence_ids)
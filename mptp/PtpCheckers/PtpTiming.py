@@ -1,9 +1,13 @@
 from appcommon.AppLogger.ILogger import ILogger
-from mptp.PtpPacket.PTPv2 import PTPv2, PtpType
-from typing import List
+from appcommon.AppLogger.RepeatedWarnings import RepeatedWarnings
+from mptp.PtpColumns import PtpMsgView
+from mptp.PtpPacket.PTPv2 import PTP_MSG_TYPE, PtpType
+from mptp.PtpResults import TimingResult
+from mptp.PtpTimestamps import timestamps_to_ns
+from typing import Optional, Sequence, Tuple
 from enum import IntEnum
 import time
-import statistics
+import numpy as np
 
 ONE_SEC_IN_NS = 1000000000
 
@@ -31,9 +35,15 @@ def rate_to_str(rate: MsgInterval) -> str:
     else:
         return ""
 
-# This analysis makes sense for ptp msgs like announce, sync and follow-up
+# This analysis makes sense for ptp msgs like announce, sync and follow-up.
+# Time differences of neighbour msgs are computed on columns, batch by batch when
+# msgs are given in batches, only msgs with irregularity are materialised for logging.
 class PtpTiming:
-    def __init__(self, logger: ILogger, packets: List[PTPv2], time_offset=0, ptp_rate_err = 0.01):
+    def __init__(self, logger: ILogger, packets: PtpMsgView, time_offset=0, ptp_rate_err = 0.01, in_batches=False):
+        # With in_batches packets are only inspected, add_batch has to be called with
+        # consecutive parts of packets and then finish
+        self._active = False
+        self._type_str: Optional[str] = None
         if len(packets) == 0:
             self._msgs = []
             return
@@ -43,39 +53,131 @@ class PtpTiming:
         self._msg_interval = self._get_msg_rate_out_of_capture(packets)
         self.ERROR_THRESHOLD = self._get_concrete_err_threshold_from_percentage(ptp_rate_err)
         self._status_ok = True
-        self.error_over_threshold = []
-        self.msg_rates = []
-        self.capture_error_over_threshold = []
-        self.capture_rates = []
-        self.processed_ptp_type = PtpType.get_ptp_msg_type(self._msgs[0]) if packets else None
+        self.error_over_threshold = np.empty(0, dtype=np.int64)
+        self.msg_rates = np.empty(0)
+        self.capture_error_over_threshold = np.empty(0, dtype=np.int64)
+        self.capture_rates = np.empty(0)
+        self.error_time_ns = np.empty(0, dtype=np.int64)
+        self.capture_error_time_ns = np.empty(0, dtype=np.int64)
+        self.processed_ptp_type = PtpType.get_ptp_msg_type(self._msgs[0])
+        self._type_str = PtpType.get_ptp_type_str(self._msgs[0])
+        self._msgs_number = len(packets)
+        self._timestamps_complete = False
         if not self._is_input_valid():
             self._status_ok = False
             return
+        self._active = True
+        self._first_msg = None
+        self._last_msg_columns = None
+        self._timestamps_complete = True
+        self._timestamp_log = RepeatedWarnings(logger, f"{self._type_str} msg timestamp irregularities")
+        self._capture_log = RepeatedWarnings(logger, f"{self._type_str} msg capture time irregularities")
+        self._results = {
+            "msg_rates": [], "errors": [], "error_times": [],
+            "capture_rates": [], "capture_errors": [], "capture_error_times": [],
+        }
+        if not in_batches:
+            self.add_batch(packets)
+            self.finish()
+
+    def add_batch(self, msgs: PtpMsgView):
+        if not self._active or len(msgs) == 0:
+            return
+        columns = tuple(msgs.column(name) for name in ("time_ns", "ts_sec", "ts_ns"))
+        if self._first_msg is None:
+            # kept for merging with timing of msgs preceding these ones
+            self._first_msg = (tuple(c[:1] for c in columns), msgs[0])
+        self._add_msgs(columns, msgs)
+
+    def merge(self, other: "PtpTiming"):
+        # Other timing got msgs following ones added here, first pair is made of
+        # last msg here and first msg there
+        if not self._active or other._first_msg is None:
+            return
+        first_columns, first_msg = other._first_msg
+        if self._first_msg is None:
+            self._first_msg = other._first_msg
+        else:
+            self._add_msgs(first_columns, [first_msg])
+        if self._timestamps_complete:
+            self._results["msg_rates"] += other._results["msg_rates"]
+            self._results["errors"] += other._results["errors"]
+            self._results["error_times"] += other._results["error_times"]
+            self._timestamp_log.merge(other._timestamp_log)
+            self._timestamps_complete = other._timestamps_complete
+        self._results["capture_rates"] += other._results["capture_rates"]
+        self._results["capture_errors"] += other._results["capture_errors"]
+        self._results["capture_error_times"] += other._results["capture_error_times"]
+        self._capture_log.merge(other._capture_log)
+        self._last_msg_columns = other._last_msg_columns
+
+    def _add_msgs(self, columns: Tuple[np.ndarray, ...], msgs: Sequence):
+        time_ns, ts_sec, ts_ns = columns
+        latter_msgs = msgs[1:]
+        if self._last_msg_columns is not None:
+            # first pair is made of last msg of previous batch and first msg of this one
+            last_time_ns, last_ts_sec, last_ts_ns = self._last_msg_columns
+            time_ns = np.concatenate((last_time_ns, time_ns))
+            ts_sec = np.concatenate((last_ts_sec, ts_sec))
+            ts_ns = np.concatenate((last_ts_ns, ts_ns))
+            latter_msgs = msgs
+        self._last_msg_columns = (time_ns[-1:], ts_sec[-1:], ts_ns[-1:])
+        self._add_timestamps(time_ns, ts_sec, ts_ns, latter_msgs)
+        if self._msg_interval != MsgInterval.Unknown:
+            self._add_capture_times(time_ns, latter_msgs)
+
+    def finish(self):
+        if not self._active:
+            return
+        self._active = False
+        self.msg_rates = self._join(self._results["msg_rates"], np.float64)
+        self.error_over_threshold = self._join(self._results["errors"], np.int64)
+        self.capture_rates = self._join(self._results["capture_rates"], np.float64)
+        self.capture_error_over_threshold = self._join(self._results["capture_errors"], np.int64)
+        self.error_time_ns = self._join(self._results["error_times"], np.int64)
+        self.capture_error_time_ns = self._join(self._results["capture_error_times"], np.int64)
         self._status_ok &= self._analyse_timestamp_regularity()
         self._status_ok &= self._analyse_capture_time_regularity()
         self._logger.info(self.__repr__())
-                   
+
+    def _add_timestamps(self, time_ns: np.ndarray, ts_sec: np.ndarray, ts_ns: np.ndarray, latter_msgs: Sequence):
+        # Origin or precise origin timestamps are compared as exact nanoseconds
+        if not self._timestamps_complete:
+            return
+        pairs = len(ts_ns) - 1
+        if self.processed_ptp_type in (PTP_MSG_TYPE.SYNC_MSG, PTP_MSG_TYPE.ANNOUNCE_MSG):
+            # analysis stops at first msg without origin timestamp
+            no_timestamp = np.flatnonzero(ts_sec[:-1] == 0)
+            if len(no_timestamp) > 0:
+                pairs, self._timestamps_complete = no_timestamp[0].item(), False
+        diffs = self._get_time_diffs(timestamps_to_ns(ts_sec[: pairs + 1], ts_ns[: pairs + 1]))
+        rates = self._get_msg_rates(diffs)
+        irregular = self._get_irregular(diffs)
+        errors = diffs[irregular] - self._msg_interval.value
+        self._results["msg_rates"].append(rates)
+        self._results["errors"].append(errors)
+        self._results["error_times"].append(time_ns[irregular + 1])
+        self._log_irregularities(self._timestamp_log, "timestamp", latter_msgs, irregular, diffs, rates, errors)
+
+    def _add_capture_times(self, time_ns: np.ndarray, latter_msgs: Sequence):
+        diffs = self._get_time_diffs(time_ns)
+        rates = self._get_msg_rates(diffs)
+        irregular = self._get_irregular(diffs)
+        errors = diffs[irregular] - self._msg_interval.value
+        self._results["capture_rates"].append(rates)
+        self._results["capture_errors"].append(errors)
+        self._results["capture_error_times"].append(time_ns[irregular + 1])
+        self._log_irregularities(self._capture_log, "capture time", latter_msgs, irregular, diffs, rates, errors)
 
     def _analyse_capture_time_regularity(self):
         if self._msg_interval == MsgInterval.Unknown:
             return False
         self._logger.debug(
-            f"Analyse capture time regularity of {self.processed_ptp_type}:"
+            lambda: f"Analyse capture time regularity of {self.processed_ptp_type}:"
             f"\n\tExpected time diff for {rate_to_str(self._msg_interval)} is: {self._msg_interval.value/1000} us., "
             f"allowed delta set to: {self.ERROR_THRESHOLD/1000} us."
         )
-        for i, msg in enumerate(self._msgs[:-1]):
-            ns, ns_next = self._get_capture_time_diff(msg, self._msgs[i + 1])
-            err, rate, diff = self._get_msg_rate_and_error(ns, ns_next)
-            self.capture_rates.append(rate)
-            if abs(err) > self.ERROR_THRESHOLD:
-                self.capture_error_over_threshold.append(err)
-                self._logger.warning(
-                    f"{PtpType.get_ptp_type_str(self._msgs[i+1])} msg capture time is irregular with "
-                    f"time difference above delta, msg rate: {rate:.3f}, Time diff: {diff} ns, "
-                    f"Time err: {err/1000} us\n"
-                    + self._msg_sequence_and_time_info(self._msgs[i + 1])
-                )
+        self._capture_log.flush()
         if len(self.capture_error_over_threshold) == 0:
             self._logger.info(
                 f"All {self.processed_ptp_type} msgs within threshold. Capture time regularity: OK"
@@ -89,27 +191,13 @@ class PtpTiming:
 
     def _analyse_timestamp_regularity(self):
         self._logger.debug(
-            f"Analyse Timestamp regularity of {self.processed_ptp_type}:"
+            lambda: f"Analyse Timestamp regularity of {self.processed_ptp_type}:"
             f"\n\tExpected time diff for{rate_to_str(self._msg_interval)} is: {self._msg_interval.value/1000} us., "
             f"allowed delta set to: {self.ERROR_THRESHOLD/1000} us."
         )
-        for i, msg in enumerate(self._msgs[:-1]):
-            if PtpType.is_sync(msg) or PtpType.is_announce(msg):
-                if msg.originTimestamp["s"] == 0:
-                    return False
-                ns, ns_next = self._get_sync_timestamp_diff(msg, self._msgs[i + 1])
-            if PtpType.is_followup(msg):
-                ns, ns_next = self._get_followup__timestamp_diff(msg, self._msgs[i + 1])
-            err, rate, diff = self._get_msg_rate_and_error(ns, ns_next)
-            self.msg_rates.append(rate)
-            if abs(err) > self.ERROR_THRESHOLD:
-                self.error_over_threshold.append(err)
-                self._logger.warning(
-                    f"{PtpType.get_ptp_type_str(self._msgs[i+1])} msg timestamp is irregular with "
-                    f"time difference above delta, msg rate: {rate:.3f}, Time diff: {diff} ns, "
-                    f"Time err: {err/1000} us\n"
-                    + self._msg_sequence_and_time_info(self._msgs[i + 1])
-                )
+        self._timestamp_log.flush()
+        if not self._timestamps_complete:
+            return False
         if len(self.error_over_threshold) == 0:
             self._logger.info(
                 f"All {self.processed_ptp_type} msgs within threshold. Timestamp regularity: OK"
@@ -120,19 +208,44 @@ class PtpTiming:
                 f"Number of timestamp time irregularities of {self.processed_ptp_type}: {len(self.error_over_threshold)}"
             )
             return False
-        
-    def _get_msg_rate_out_of_capture(self, msgs) -> MsgInterval:
-        for i, msg in enumerate(msgs[:-1]):
-            ns, ns_next = self._get_capture_time_diff(msg, self._msgs[i + 1])
-            rate = self._get_msg_rate_from_neighbor_msgs(ns, ns_next)
-            msg_rates: List[float] = []
-            msg_rates.append(rate)
-            mean_rate = statistics.mean(msg_rates)
-            msg_interval = self._meanToMsgRate(mean_rate)
-            if msg_interval is MsgInterval.Unknown:
-                self._logger.error("Unable to determin msg rate")
-            self._logger.info(f"Detected {rate_to_str(msg_interval)} of {PtpType.get_ptp_type_str(msg[0])}")
-            return msg_interval
+
+    def _get_irregular(self, diffs: np.ndarray) -> np.ndarray:
+        # Indexes of msg pairs with time difference error above threshold
+        expected = self._msg_interval.value
+        return np.flatnonzero(
+            (diffs < expected - self.ERROR_THRESHOLD) | (diffs > expected + self.ERROR_THRESHOLD)
+        )
+
+    def _log_irregularities(
+        self, warnings: RepeatedWarnings, what: str, latter_msgs: Sequence, irregular: np.ndarray,
+        diffs: np.ndarray, rates: np.ndarray, errors: np.ndarray
+    ):
+        # Irregularity of pair i is reported with the latter msg of the pair, msgs over
+        # limit of logged warnings are not materialised except the last one
+        if len(irregular) == 0:
+            return
+        in_full = min(len(irregular), warnings.left)
+        for i, diff, rate, err in zip(
+            irregular[:in_full].tolist(), diffs[irregular[:in_full]].tolist(),
+            rates[irregular[:in_full]].tolist(), errors[:in_full].tolist()
+        ):
+            warnings.add(_irregularity_message, latter_msgs[i], what, diff, rate, err, self._time_offset)
+        if in_full < len(irregular):
+            warnings.add_not_logged(
+                len(irregular) - in_full, _irregularity_message, latter_msgs[irregular[-1].item()], what,
+                diffs[irregular[-1]].item(), rates[irregular[-1]].item(), errors[-1].item(), self._time_offset
+            )
+
+    def _get_msg_rate_out_of_capture(self, msgs: PtpMsgView) -> MsgInterval:
+        # Rate is detected out of capture time of first two msgs
+        if len(msgs) < 2:
+            return MsgInterval.Unknown
+        rate = self._get_msg_rates(self._get_time_diffs(msgs[:2].column("time_ns")))[0].item()
+        msg_interval = self._meanToMsgRate(rate)
+        if msg_interval is MsgInterval.Unknown:
+            self._logger.error("Unable to determin msg rate")
+        self._logger.info(f"Detected {rate_to_str(msg_interval)} of {PtpType.get_ptp_type_str(msgs[0])}")
+        return msg_interval
 
     def _meanToMsgRate(self, rate: float) -> MsgInterval:
         RATE_MAX_DELTA_COEFFICIENT = 0.3    # 30%
@@ -151,55 +264,77 @@ class PtpTiming:
 
     def _isBetweenDelta(self, rate: float, val: int, delta: float) -> bool:
         return (val - (val * delta)) < rate < (val + (val * delta))
-     
-    def _get_capture_time_diff(self, msg, msg_n):
-        ns = msg.time * ONE_SEC_IN_NS
-        ns_next = msg_n.time * ONE_SEC_IN_NS
-        return (int(ns), int(ns_next))
-    
+
     def _get_concrete_err_threshold_from_percentage(self, percentage: float) -> int:
         threshold = int(self._msg_interval.value * percentage)
         self._logger.info(f'Allowed Threshold: {threshold}, what is {percentage*100}% of msgs time difference')
         return threshold
-        
-
-    def _get_msg_rate_and_error(self, ns, ns_next):
-        t1_diff = ns_next - ns
-        if t1_diff < 0:
-            t1_diff = ONE_SEC_IN_NS - ns + ns_next
-        rate = ONE_SEC_IN_NS / t1_diff
-        err = t1_diff - self._msg_interval.value
-        return (err, rate, t1_diff)
-    
-    def _get_msg_rate_from_neighbor_msgs(self, ns, ns_next):
-        t1_diff = ns_next - ns
-        if t1_diff < 0:
-            t1_diff = ONE_SEC_IN_NS - ns + ns_next
-        rate = ONE_SEC_IN_NS / t1_diff
-        return rate
-
-    def _get_sync_timestamp_diff(self, msg, msg_n):
-        ns = msg.originTimestamp["ns"]
-        ns_next = msg_n.originTimestamp["ns"]
-        return (ns, ns_next)
-
-    def _get_followup__timestamp_diff(self, msg, msg_n):
-        ns = msg.preciseOriginTimestamp["ns"]
-        ns_next = msg_n.preciseOriginTimestamp["ns"]
-        return (ns, ns_next)
-
-    def _msg_sequence_and_time_info(self, msg):
-        t = time.strftime("%H:%M:%S", time.localtime(msg.time))
-        return f"[TIME] Capture time: {t},\tCapture offset: {msg.time-self._time_offset:.9f},\tSequence ID: {msg.sequenceId}"
+
+    @staticmethod
+    def _get_time_diffs(ns: np.ndarray) -> np.ndarray:
+        return np.diff(ns.astype(np.int64, copy=False))
+
+    @staticmethod
+    def _get_msg_rates(diffs: np.ndarray) -> np.ndarray:
+        with np.errstate(divide="ignore"):
+            return ONE_SEC_IN_NS / diffs
+
+    @staticmethod
+    def _join(parts: list, dtype) -> np.ndarray:
+        return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+    @staticmethod
+    def _get_rate_stats(rates: np.ndarray) -> Tuple[float, float, float, float]:
+        # mean, sample standard deviation, min and max
+        with np.errstate(invalid="ignore"):
+            stdev = np.std(rates, ddof=1).item() if len(rates) > 1 else float("nan")
+        return (np.mean(rates).item(), stdev, np.min(rates).item(), np.max(rates).item())
+
+    @staticmethod
+    def _msg_sequence_and_time_info(msg, time_offset) -> str:
+        t = time.strftime("%H:%M:%S", time.localtime(float(msg.time)))
+        return f"[TIME] Capture time: {t},\tCapture offset: {msg.time-time_offset:.9f},\tSequence ID: {msg.sequenceId}"
 
     def _is_input_valid(self):
         if len(self._msgs) == 0:
             return False
-        ptp_type = PtpType.get_ptp_msg_type(self._msgs[0])
-        for msg in self._msgs:
-            if PtpType.get_ptp_msg_type(msg) != ptp_type:
-                return False
-        return True
+        msg_type = self._msgs.column("msg_type")
+        return bool(np.all(msg_type == msg_type[0]))
+
+    def __getstate__(self):
+        # View of msgs refers to all columns of stream, timing is sent to other
+        # process with its results only
+        state = self.__dict__.copy()
+        state["_msgs"] = []
+        return state
+
+    def result(self) -> Optional[TimingResult]:
+        # None if there were no msgs to analyse
+        if self._type_str is None:
+            return None
+        timestamp_stats = self._get_rate_stats(self.msg_rates) if len(self.msg_rates) > 0 else (float("nan"),) * 4
+        capture_stats = self._get_rate_stats(self.capture_rates) if len(self.capture_rates) > 0 else (float("nan"),) * 4
+        return TimingResult(
+            msg_type=self._type_str,
+            ok=self._status_ok,
+            msgs=self._msgs_number,
+            detected_rate=ONE_SEC_IN_NS // self._msg_interval.value if self._msg_interval.value else 0,
+            timestamps_complete=self._timestamps_complete,
+            timestamp_rate_mean=timestamp_stats[0],
+            timestamp_rate_std_dev=timestamp_stats[1],
+            timestamp_rate_min=timestamp_stats[2],
+            timestamp_rate_max=timestamp_stats[3],
+            timestamp_irregularities=len(self.error_over_threshold),
+            capture_rate_mean=capture_stats[0],
+            capture_rate_std_dev=capture_stats[1],
+            capture_rate_min=capture_stats[2],
+            capture_rate_max=capture_stats[3],
+            capture_irregularities=len(self.capture_error_over_threshold),
+            timestamp_irregularity_time_ns=self.error_time_ns,
+            timestamp_irregularity_error_ns=self.error_over_threshold,
+            capture_irregularity_time_ns=self.capture_error_time_ns,
+            capture_irregularity_error_ns=self.capture_error_over_threshold,
+        )
 
     @property
     def msgs(self):
@@ -209,6 +344,10 @@ class PtpTiming:
     def success(self):
         return self._status_ok
 
+    @property
+    def msg_interval(self) -> MsgInterval:
+        return self._msg_interval
+
     def __repr__(self) -> str:
         if (
             len(self.msg_rates) == 0
@@ -216,11 +355,22 @@ class PtpTiming:
             or len(self.capture_rates) == 0
         ):
             return "Ptp Timing: not enough data"
+        msg_mean, msg_stdev, msg_min, msg_max = self._get_rate_stats(self.msg_rates)
+        capture_mean, capture_stdev, capture_min, capture_max = self._get_rate_stats(self.capture_rates)
         return (
-            f"Ptp Timing of {PtpType.get_ptp_type_str(self._msgs[0])}:\nTimestamps:\n\tmean msg rate: {statistics.mean(self.msg_rates):.9f},"
-            f"\n\tstd dev msg rate: {statistics.stdev(self.msg_rates):.9f}, \n\tmin msg rate: {min(self.msg_rates):.9f},\n\t"
-            f"max msg rate: {max(self.msg_rates):.9f},\n\tnumber of msgs with irregularity above the limit: {len(self.error_over_threshold)}"
-            f"\nCapture time\n\tmean capture rate: {statistics.mean(self.capture_rates):.9f},\n\tstd dev capture rate: "
-            f"{statistics.stdev(self.capture_rates):.9f}, \n\tmin capture rate: {min(self.capture_rates):.9f},\n\tmax capture rate: "
-            f"{max(self.capture_rates):.9f},\n\tnumber of msgs captured with irregularity above the limit: {len(self.capture_error_over_threshold)}\n"
+            f"Ptp Timing of {PtpType.get_ptp_type_str(self._msgs[0])}:\nTimestamps:\n\tmean msg rate: {msg_mean:.9f},"
+            f"\n\tstd dev msg rate: {msg_stdev:.9f}, \n\tmin msg rate: {msg_min:.9f},\n\t"
+            f"max msg rate: {msg_max:.9f},\n\tnumber of msgs with irregularity above the limit: {len(self.error_over_threshold)}"
+            f"\nCapture time\n\tmean capture rate: {capture_mean:.9f},\n\tstd dev capture rate: "
+            f"{capture_stdev:.9f}, \n\tmin capture rate: {capture_min:.9f},\n\tmax capture rate: "
+            f"{capture_max:.9f},\n\tnumber of msgs captured with irregularity above the limit: {len(self.capture_error_over_threshold)}\n"
         )
+
+
+def _irregularity_message(msg, what: str, diff: int, rate: float, err: int, time_offset) -> str:
+    return (
+        f"{PtpType.get_ptp_type_str(msg)} msg {what} is irregular with "
+        f"time difference above delta, msg rate: {rate:.3f}, Time diff: {diff} ns, "
+        f"Time err: {err/1000} us\n"
+        + PtpTiming._msg_sequence_and_time_info(msg, time_offset)
+    )
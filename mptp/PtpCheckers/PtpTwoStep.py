@@ -0,0 +1,126 @@
+import time
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from appcommon.AppLogger.ILogger import ILogger
+from appcommon.AppLogger.RepeatedWarnings import RepeatedWarnings
+from mptp.PtpColumns import NO_INDEX, PtpMsgView
+from mptp.PtpPacket.PTPv2 import PTP_MSG_TYPE, TWO_STEP_FLAG
+from mptp.PtpResults import TwoStepResult
+from mptp.PtpTimestamps import join_next_msgs
+
+NS_IN_US = 1000
+SYNC = PTP_MSG_TYPE.SYNC_MSG.value
+FOLLOW_UP = PTP_MSG_TYPE.FOLLOW_UP_MSG.value
+MSG_COLUMNS = ("source_port", "sequence_id", "flags", "time_ns")
+
+
+class PtpTwoStep:
+    # Two-step clock sends Sync with TWO_STEP flag, its precise origin timestamp comes
+    # in Follow Up. Two-step Syncs and Follow Ups are joined on columns, turnaround is
+    # capture time from Sync to its Follow Up.
+    def __init__(
+        self,
+        logger: ILogger,
+        sync: Optional[PtpMsgView],
+        follow_up: Optional[PtpMsgView],
+        time_offset=0,
+    ):
+        # Without msgs given, add_batch has to be called with consecutive batches
+        # of Syncs and Follow Ups and then finish
+        self._logger = logger
+        self._time_offset = time_offset
+        self._parts: Dict[int, List[Tuple[np.ndarray, ...]]] = {SYNC: [], FOLLOW_UP: []}
+        self.turnaround_ns = np.empty(0, dtype=np.int64)
+        self.two_step_syncs = 0
+        self.syncs_without_follow_up = 0
+        self.follow_ups_without_sync = 0
+        if sync is None:
+            return
+        self.add_batch(sync)
+        self.add_batch(follow_up)
+        self.finish()
+
+    def add_batch(self, msgs: PtpMsgView):
+        msg_type = msgs.column("msg_type")
+        for t, parts in self._parts.items():
+            selected = msg_type == t
+            if selected.any():
+                rows = msgs.indexes[selected]
+                parts.append((rows,) + tuple(msgs.columns.column(name)[rows] for name in MSG_COLUMNS))
+
+    def merge(self, other: "PtpTwoStep"):
+        # Other got msgs following ones added here
+        for t, parts in self._parts.items():
+            parts += other._parts[t]
+
+    def finish(self):
+        sync_row, sync_port, sync_seq, sync_flags, sync_time_ns = self._join_parts(SYNC)
+        follow_up_row, follow_up_port, follow_up_seq, _, follow_up_time_ns = self._join_parts(FOLLOW_UP)
+        self._parts = {SYNC: [], FOLLOW_UP: []}
+        two_step = (sync_flags & TWO_STEP_FLAG) != 0
+        sync_row, sync_port, sync_seq, sync_time_ns = (
+            c[two_step] for c in (sync_row, sync_port, sync_seq, sync_time_ns)
+        )
+        follow_up_of_sync = join_next_msgs(
+            sync_port, sync_seq, sync_row, follow_up_port, follow_up_seq, follow_up_row
+        )
+        joined = follow_up_of_sync != NO_INDEX
+        self.two_step_syncs = len(sync_row)
+        self.syncs_without_follow_up = int(np.count_nonzero(~joined))
+        self.follow_ups_without_sync = len(follow_up_row) - int(np.count_nonzero(joined))
+        self.turnaround_ns = follow_up_time_ns[follow_up_of_sync[joined]] - sync_time_ns[joined]
+        self._log_state(sync_seq[~joined], sync_time_ns[~joined])
+
+    def _join_parts(self, msg_type: int) -> Tuple[np.ndarray, ...]:
+        parts = self._parts[msg_type]
+        if not parts:
+            return (np.empty(0, dtype=np.int64),) * (len(MSG_COLUMNS) + 1)
+        return tuple(np.concatenate(column) for column in zip(*parts))
+
+    def _log_state(self, missing_seq: np.ndarray, missing_time_ns: np.ndarray):
+        self._logger.banner_small("two-step sync and follow-up")
+        if self.two_step_syncs == 0:
+            self._logger.info("No two-step Sync messages, origin timestamps are in Sync messages")
+            return
+        self._logger.info(self.__repr__())
+        warnings = RepeatedWarnings(self._logger, "Two-step Sync without Follow-up")
+        for sequence_id, time_ns in zip(missing_seq.tolist(), missing_time_ns.tolist()):
+            warnings.add(self._missing_follow_up_info, sequence_id, time_ns, self._time_offset)
+        warnings.flush()
+        if len(self.turnaround_ns) == 0:
+            return
+        turnaround = self.turnaround_ns / NS_IN_US
+        self._logger.info(
+            f"Sync message to Follow-up message capture time (turnaround):\n\tmean: "
+            f"{turnaround.mean():.3f} us,\n\tstd dev: {turnaround.std(ddof=1) if len(turnaround) > 1 else 0.0:.3f}"
+            f" us,\n\tmin: {turnaround.min():.3f} us,\n\tmedian: {np.median(turnaround):.3f} us,"
+            f"\n\t99th percentile: {np.percentile(turnaround, 99):.3f} us,\n\tmax: {turnaround.max():.3f} us"
+        )
+
+    def result(self) -> TwoStepResult:
+        return TwoStepResult(
+            ok=self.syncs_without_follow_up == 0,
+            two_step_syncs=self.two_step_syncs,
+            syncs_without_follow_up=self.syncs_without_follow_up,
+            follow_ups_without_sync=self.follow_ups_without_sync,
+            turnaround_ns=self.turnaround_ns,
+        )
+
+    @staticmethod
+    def _missing_follow_up_info(sequence_id: int, time_ns: int, time_offset) -> str:
+        t = Decimal(time_ns).scaleb(-9)
+        return (
+            f"Two-step Sync without Follow-up:   Capture time: "
+            f"{time.strftime('%H:%M:%S', time.localtime(float(t)))},    Capture offset: "
+            f"{t-time_offset:.9f},\tSequence ID: {sequence_id}"
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"PTP Two-step Sync and Follow-up:\n\tTwo-step Syncs: {self.two_step_syncs},\n\t"
+            f"Syncs with Follow-up: {self.two_step_syncs - self.syncs_without_follow_up},\n\t"
+            f"Syncs without Follow-up: {self.syncs_without_follow_up},\n\t"
+            f"Follow-ups without Sync: {self.follow_ups_without_sync}"
+        )
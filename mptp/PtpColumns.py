@@ -0,0 +1,410 @@
+from array import array
+from typing import Dict, Iterable, List, Sequence, Tuple, Union
+import numpy as np
+
+from mptp.PtpPacket.PTPv2 import PTPv2, PTP_MSG_TYPE
+from mptp.PtpPacket.Fields import PortIdentityField
+from mptp.PtpPacket.PtpDecoder import (
+    ANNOUNCE_FIELDS,
+    NO_BODY,
+    TIMESTAMP_FIELDS,
+    PtpRecord,
+)
+from scapy.layers.l2 import CookedLinux, CookedLinuxV2, Ether
+from scapy.utils import mac2str, str2mac
+
+ONE_SEC_IN_NS = 1000000000
+NO_INDEX = -1
+NO_MAC_STR = "00:00:00:00:00:00"
+UINT64_SIGN_BIT = 1 << 63
+UINT64_RANGE = 1 << 64
+
+# Column name to array typecode, typecodes are valid numpy dtypes as well
+COLUMNS = {
+    "time_ns": "q",
+    "msg_type": "B",
+    "transport": "B",
+    "version": "B",
+    "msg_length": "H",
+    "domain": "B",
+    "flags": "H",
+    "correction": "q",
+    "sequence_id": "H",
+    "control": "B",
+    "log_interval": "b",
+    "ts_sec": "q",
+    "ts_ns": "I",
+    "source_port": "i",
+    "requesting_port": "i",
+    "src_mac": "i",
+    "dst_mac": "i",
+    "announce": "i",
+}
+
+
+class InternTable:
+    def __init__(self):
+        self.values: List = []
+        self._index: Dict = {}
+
+    def index(self, value) -> int:
+        i = self._index.get(value)
+        if i is None:
+            i = len(self.values)
+            self._index[value] = i
+            self.values.append(value)
+        return i
+
+    def __len__(self):
+        return len(self.values)
+
+
+class PtpColumnsBuilder:
+    def __init__(self):
+        self._arrays = {name: array(code) for name, code in COLUMNS.items()}
+        self._ports = InternTable()
+        self._macs = InternTable()
+        self._announce_bodies = InternTable()
+        # raw bytes to interned index caches, formatting is done once per distinct value
+        self._raw_port_index: Dict[bytes, int] = {}
+        self._raw_mac_index: Dict[bytes, int] = {}
+
+    def append(self, msg):
+        if isinstance(msg, PtpRecord):
+            self._append_record(msg)
+        else:
+            self._append_packet(msg)
+
+    def extend(self, msgs: Iterable):
+        for msg in msgs:
+            self.append(msg)
+
+    def _append_record(self, r: PtpRecord):
+        ts_field = TIMESTAMP_FIELDS.get(r.messageType)
+        ts = r._body.get(ts_field) if ts_field else None
+        announce = (
+            tuple(r._body[name] for name in ANNOUNCE_FIELDS)
+            if r.messageType == PTP_MSG_TYPE.ANNOUNCE_MSG.value
+            else None
+        )
+        self._append_row(
+            r.time_ns,
+            r,
+            ts,
+            self._raw_port(r._source_port),
+            r._body.get("requestingPortIdentity"),
+            self._raw_mac(r._eth[6:12]),
+            self._raw_mac(r._eth[:6]),
+            announce,
+        )
+
+    def _append_packet(self, p):
+        # Slow path for scapy dissected packets of reference engine, PTP fields are
+        # taken from PTPv2 layer, as lower layers may have fields of the same names
+        ptp = p.getlayer(PTPv2)
+        ts_field = TIMESTAMP_FIELDS.get(ptp.messageType)
+        ts = getattr(ptp, ts_field) if ts_field else None
+        announce = (
+            tuple(getattr(ptp, name) for name in ANNOUNCE_FIELDS)
+            if ptp.messageType == PTP_MSG_TYPE.ANNOUNCE_MSG.value
+            else None
+        )
+        src, dst = self._get_packet_macs(p)
+        self._append_row(
+            round(p.time * ONE_SEC_IN_NS),
+            ptp,
+            ts,
+            self._ports.index(ptp.sourcePortIdentity),
+            getattr(ptp, "requestingPortIdentity", None),
+            self._macs.index(src),
+            self._macs.index(dst),
+            announce,
+        )
+
+    @staticmethod
+    def _get_packet_macs(p) -> Tuple[str, str]:
+        # Same addresses as fast decoder reports, see get_frame_addresses
+        if p.haslayer(Ether):
+            return (p[Ether].src, p[Ether].dst)
+        if isinstance(p, (CookedLinux, CookedLinuxV2)) and p.lladdrlen == 6:
+            return (str2mac(p.src[:6]), NO_MAC_STR)
+        return (NO_MAC_STR, NO_MAC_STR)
+
+    def _append_row(self, time_ns, msg, ts, source_port, requesting_port, src_mac, dst_mac, announce):
+        a = self._arrays
+        a["time_ns"].append(time_ns)
+        a["msg_type"].append(msg.messageType)
+        a["transport"].append(msg.transportSpecific)
+        a["version"].append(msg.versionPTP)
+        a["msg_length"].append(msg.messageLength)
+        a["domain"].append(msg.domainNumber)
+        a["flags"].append(int(msg.flags))
+        correction = msg.correctionField
+        a["correction"].append(correction - UINT64_RANGE if correction >= UINT64_SIGN_BIT else correction)
+        a["sequence_id"].append(msg.sequenceId)
+        a["control"].append(msg.control)
+        a["log_interval"].append(msg.logMessageInterval)
+        a["ts_sec"].append(ts["s"] if ts else 0)
+        a["ts_ns"].append(ts["ns"] if ts else 0)
+        a["source_port"].append(source_port)
+        a["requesting_port"].append(
+            self._ports.index(requesting_port) if requesting_port is not None else NO_INDEX
+        )
+        a["src_mac"].append(src_mac)
+        a["dst_mac"].append(dst_mac)
+        a["announce"].append(
+            self._announce_bodies.index(announce) if announce is not None else NO_INDEX
+        )
+
+    def _raw_port(self, raw: bytes) -> int:
+        i = self._raw_port_index.get(raw)
+        if i is None:
+            i = self._ports.index(PortIdentityField.to_str(raw))
+            self._raw_port_index[raw] = i
+        return i
+
+    def _raw_mac(self, raw: bytes) -> int:
+        i = self._raw_mac_index.get(raw)
+        if i is None:
+            i = self._macs.index(str2mac(raw))
+            self._raw_mac_index[raw] = i
+        return i
+
+    def build(self) -> "PtpColumns":
+        columns = {
+            name: np.frombuffer(self._arrays[name], dtype=code) for name, code in COLUMNS.items()
+        }
+        return PtpColumns(
+            columns, self._ports.values, self._macs.values, self._announce_bodies.values
+        )
+
+
+class PtpColumns:
+    # Columnar storage of PTP messages. Each message takes a few tens of bytes,
+    # port identities, MAC addresses and Announce bodies are interned in tables
+    # and columns keep indexes to them. Type specific timestamp of each message
+    # (origin, precise origin, receive, ...) is kept in ts_sec and ts_ns columns.
+    def __init__(
+        self,
+        columns: Dict[str, np.ndarray],
+        port_ids: List[str],
+        macs: List[str],
+        announce_bodies: List[tuple],
+    ):
+        self.time_ns: np.ndarray = columns["time_ns"]
+        self.msg_type: np.ndarray = columns["msg_type"]
+        self.transport: np.ndarray = columns["transport"]
+        self.version: np.ndarray = columns["version"]
+        self.msg_length: np.ndarray = columns["msg_length"]
+        self.domain: np.ndarray = columns["domain"]
+        self.flags: np.ndarray = columns["flags"]
+        self.correction: np.ndarray = columns["correction"]
+        self.sequence_id: np.ndarray = columns["sequence_id"]
+        self.control: np.ndarray = columns["control"]
+        self.log_interval: np.ndarray = columns["log_interval"]
+        self.ts_sec: np.ndarray = columns["ts_sec"]
+        self.ts_ns: np.ndarray = columns["ts_ns"]
+        self.source_port: np.ndarray = columns["source_port"]
+        self.requesting_port: np.ndarray = columns["requesting_port"]
+        self.src_mac: np.ndarray = columns["src_mac"]
+        self.dst_mac: np.ndarray = columns["dst_mac"]
+        self.announce: np.ndarray = columns["announce"]
+        self.port_ids: List[str] = port_ids
+        self.macs: List[str] = macs
+        self.announce_bodies: List[tuple] = announce_bodies
+        self._raw_port_ids = [self._port_to_raw(p) for p in port_ids]
+        self._raw_macs = [mac2str(m) for m in macs]
+
+    @classmethod
+    def from_messages(cls, msgs: Iterable) -> "PtpColumns":
+        builder = PtpColumnsBuilder()
+        builder.extend(msgs)
+        return builder.build()
+
+    @classmethod
+    def concatenate(cls, parts: Sequence["PtpColumns"]) -> "PtpColumns":
+        # Interned tables are merged in order of parts, so result is the same
+        # as if all messages were appended to a single builder
+        ports, macs, announce_bodies = InternTable(), InternTable(), InternTable()
+        remapped = []
+        for part in parts:
+            port_map = _index_map(ports, part.port_ids)
+            mac_map = _index_map(macs, part.macs)
+            announce_map = _index_map(announce_bodies, part.announce_bodies)
+            remapped.append(
+                part._with_indexes(
+                    _remap(part.source_port, port_map),
+                    _remap(part.requesting_port, port_map),
+                    _remap(part.src_mac, mac_map),
+                    _remap(part.dst_mac, mac_map),
+                    _remap(part.announce, announce_map),
+                )
+            )
+        columns = {
+            name: np.concatenate([part[name] for part in remapped]).astype(code, copy=False)
+            if remapped
+            else np.empty(0, dtype=code)
+            for name, code in COLUMNS.items()
+        }
+        return cls(columns, ports.values, macs.values, announce_bodies.values)
+
+    def take(self, indexes: Union[np.ndarray, slice]) -> "PtpColumns":
+        # Selected rows only, interned tables are reduced to values still in use.
+        # Rows selected with slice are views, not copies, except remapped index columns
+        port_map, port_ids = _compact(self.port_ids, self.source_port[indexes], self.requesting_port[indexes])
+        mac_map, macs = _compact(self.macs, self.src_mac[indexes], self.dst_mac[indexes])
+        announce_map, announce_bodies = _compact(self.announce_bodies, self.announce[indexes])
+        columns = self._with_indexes(
+            _remap(self.source_port[indexes], port_map),
+            _remap(self.requesting_port[indexes], port_map),
+            _remap(self.src_mac[indexes], mac_map),
+            _remap(self.dst_mac[indexes], mac_map),
+            _remap(self.announce[indexes], announce_map),
+            indexes,
+        )
+        return PtpColumns(columns, port_ids, macs, announce_bodies)
+
+    def _with_indexes(
+        self, source_port, requesting_port, src_mac, dst_mac, announce, rows=slice(None)
+    ) -> Dict[str, np.ndarray]:
+        columns = {name: getattr(self, name)[rows] for name in COLUMNS}
+        columns["source_port"] = source_port
+        columns["requesting_port"] = requesting_port
+        columns["src_mac"] = src_mac
+        columns["dst_mac"] = dst_mac
+        columns["announce"] = announce
+        return columns
+
+    def __len__(self):
+        return len(self.time_ns)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in COLUMNS)
+
+    def column(self, name: str) -> np.ndarray:
+        return getattr(self, name)
+
+    def record(self, i: int) -> PtpRecord:
+        return self._make_record(*(getattr(self, name)[i].item() for name in COLUMNS))
+
+    def records(self, indexes: np.ndarray):
+        rows = [getattr(self, name)[indexes].tolist() for name in COLUMNS]
+        for row in zip(*rows):
+            yield self._make_record(*row)
+
+    def _make_record(
+        self,
+        time_ns,
+        msg_type,
+        transport,
+        version,
+        msg_length,
+        domain,
+        flags,
+        correction,
+        sequence_id,
+        control,
+        log_interval,
+        ts_sec,
+        ts_ns,
+        source_port,
+        requesting_port,
+        src_mac,
+        dst_mac,
+        announce,
+    ) -> PtpRecord:
+        r = PtpRecord()
+        r.time_ns = time_ns
+        r.transportSpecific = transport
+        r.messageType = msg_type
+        r.reserved0 = 0
+        r.versionPTP = version
+        r.messageLength = msg_length
+        r.domainNumber = domain
+        r.reserved1 = 0
+        r.flags = flags
+        r.correctionField = correction % UINT64_RANGE
+        r.reserved2 = 0
+        r.sequenceId = sequence_id
+        r.control = control
+        r.logMessageInterval = log_interval
+        r._eth = self._raw_macs[dst_mac] + self._raw_macs[src_mac]
+        r._source_port = self._raw_port_ids[source_port]
+        r._body = self._make_body(msg_type, ts_sec, ts_ns, requesting_port, announce)
+        return r
+
+    def _make_body(self, msg_type, ts_sec, ts_ns, requesting_port, announce) -> dict:
+        ts_field = TIMESTAMP_FIELDS.get(msg_type)
+        if ts_field is None:
+            return NO_BODY
+        body = {ts_field: {"s": ts_sec, "ns": ts_ns}}
+        if ts_field == "originTimestamp" and announce == NO_INDEX:
+            body["padding"] = 0
+        if requesting_port != NO_INDEX:
+            body["requestingPortIdentity"] = self.port_ids[requesting_port]
+        if announce != NO_INDEX:
+            body.update(zip(ANNOUNCE_FIELDS, self.announce_bodies[announce]))
+        return body
+
+    @staticmethod
+    def _port_to_raw(port_id: str) -> bytes:
+        mac, port = port_id.split("/")
+        return PortIdentityField.from_mac(mac, int(port))
+
+
+def _index_map(table: InternTable, values: List) -> np.ndarray:
+    return np.array([table.index(v) for v in values], dtype=np.int32)
+
+
+def _remap(column: np.ndarray, index_map: np.ndarray) -> np.ndarray:
+    if len(index_map) == 0:
+        return column
+    return np.where(column == NO_INDEX, NO_INDEX, index_map[column]).astype(np.int32)
+
+
+def _compact(values: List, *columns: np.ndarray) -> Tuple[np.ndarray, List]:
+    # Keeps values referenced by columns in order of first reference, row by row
+    refs = np.stack(columns, axis=1).ravel() if len(columns[0]) else np.empty(0, np.int32)
+    refs = refs[refs != NO_INDEX]
+    used, first_ref = np.unique(refs, return_index=True)
+    used = used[np.argsort(first_ref)]
+    index_map = np.full(len(values), NO_INDEX, dtype=np.int32)
+    index_map[used] = np.arange(len(used), dtype=np.int32)
+    return index_map, [values[i] for i in used.tolist()]
+
+
+class PtpMsgView:
+    # Read only sequence of PTP messages selected from PtpColumns with index array.
+    # Items are materialised as PtpRecord on access, columns are never copied.
+    def __init__(self, columns: PtpColumns, indexes: np.ndarray):
+        self._columns = columns
+        self._indexes = indexes
+
+    @property
+    def columns(self) -> PtpColumns:
+        return self._columns
+
+    @property
+    def indexes(self) -> np.ndarray:
+        return self._indexes
+
+    def column(self, name: str) -> np.ndarray:
+        return self._columns.column(name)[self._indexes]
+
+    def __len__(self):
+        return len(self._indexes)
+
+    def __iter__(self):
+        return self._columns.records(self._indexes)
+
+    def __reversed__(self):
+        return self._columns.records(self._indexes[::-1])
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return PtpMsgView(self._columns, self._indexes[key])
+        return self._columns.record(self._indexes[key])
+
+    def __repr__(self) -> str:
+        return f"<PtpMsgView of {len(self)} PTP messages>"
@@ -47,13 +47,17 @@ class PortIdentityField(XStrFixedLenField):
     def __init__(self, name, default):
         XStrFixedLenField.__init__(self, name, default, length=10)
 
-    def i2h(self, pkt, val):
-        if val is None:
-            return "None"
-        p = struct.unpack(self.encoding, val)
+    @classmethod
+    def to_str(cls, val: bytes) -> str:
+        p = struct.unpack(cls.encoding, val)
         return (
             f"{p[0]:02x}:{p[1]:02x}:{p[2]:02x}:{p[5]:02x}:{p[6]:02x}:{p[7]:02x}/{p[8]}"
         )
 
+    def i2h(self, pkt, val):
+        if val is None:
+            return "None"
+        return self.to_str(val)
+
     def i2repr(self, pkt, x):
         return self.i2h(pkt, x)
@@ -13,7 +13,8 @@ from scapy.fields import (
     XIntField,
     XStrFixedLenField,
 )
-from scapy.layers.l2 import Ether
+from scapy.layers.inet import UDP
+from scapy.layers.l2 import CookedLinux, CookedLinuxV2, Dot1AD, Dot1Q, Ether
 from scapy.packet import Packet, bind_layers
 
 from .Fields import TimestampField, PortIdentityField
@@ -31,6 +32,11 @@ class PTP_MSG_TYPE(Enum):
     SIGNALLING_MSG = 0xC
 
 
+# TWO_STEP bit of flags, set in Sync of two-step clock whose precise origin
+# timestamp is sent in Follow Up
+TWO_STEP_FLAG = 0x0200
+
+
 class PTPv2(Packet):
     name = "PTPv2"
 
@@ -189,6 +195,12 @@ class PTPv2(Packet):
 
 
 bind_layers(Ether, PTPv2, type=0x88F7)
+bind_layers(Dot1Q, PTPv2, type=0x88F7)
+bind_layers(Dot1AD, PTPv2, type=0x88F7)
+bind_layers(CookedLinux, PTPv2, proto=0x88F7)
+bind_layers(CookedLinuxV2, PTPv2, proto=0x88F7)
+bind_layers(UDP, PTPv2, dport=319)
+bind_layers(UDP, PTPv2, dport=320)
 
 
 class PtpType:
@@ -217,23 +229,27 @@ class PtpType:
 
     @staticmethod
     def get_ptp_type_str(ptp_v2: PTPv2) -> str:
-        if ptp_v2.messageType == PTP_MSG_TYPE.SYNC_MSG.value:
+        return PtpType.get_msg_type_str(ptp_v2.messageType)
+
+    @staticmethod
+    def get_msg_type_str(message_type: int) -> str:
+        if message_type == PTP_MSG_TYPE.SYNC_MSG.value:
             return "Sync"
-        elif ptp_v2.messageType == PTP_MSG_TYPE.FOLLOW_UP_MSG.value:
+        elif message_type == PTP_MSG_TYPE.FOLLOW_UP_MSG.value:
             return "Follow-up"
-        elif ptp_v2.messageType == PTP_MSG_TYPE.DELAY_REQ_MSG.value:
+        elif message_type == PTP_MSG_TYPE.DELAY_REQ_MSG.value:
             return "Delay req"
-        elif ptp_v2.messageType == PTP_MSG_TYPE.DELAY_RESP_MSG.value:
+        elif message_type == PTP_MSG_TYPE.DELAY_RESP_MSG.value:
             return "Delay res"
-        elif ptp_v2.messageType == PTP_MSG_TYPE.PDELAY_REQ_MSG.value:
+        elif message_type == PTP_MSG_TYPE.PDELAY_REQ_MSG.value:
             return "PDelay req"
-        elif ptp_v2.messageType == PTP_MSG_TYPE.PDELAY_RESP_MSG.value:
+        elif message_type == PTP_MSG_TYPE.PDELAY_RESP_MSG.value:
             return "PDelay res"
-        elif ptp_v2.messageType == PTP_MSG_TYPE.PDELAY_RESP_FOLLOW_UP_MSG.value:
+        elif message_type == PTP_MSG_TYPE.PDELAY_RESP_FOLLOW_UP_MSG.value:
             return "Delay res follow-up"
-        elif ptp_v2.messageType == PTP_MSG_TYPE.ANNOUNCE_MSG.value:
+        elif message_type == PTP_MSG_TYPE.ANNOUNCE_MSG.value:
             return "Announce"
-        elif ptp_v2.messageType == PTP_MSG_TYPE.SIGNALLING_MSG.value:
+        elif message_type == PTP_MSG_TYPE.SIGNALLING_MSG.value:
             return "Signaling"
         else:
             return "Unknown"
@@ -246,6 +262,10 @@ class PtpType:
     def is_followup(ptpv2: PTPv2) -> bool:
         return ptpv2.messageType == PTP_MSG_TYPE.FOLLOW_UP_MSG.value
 
+    @staticmethod
+    def is_two_step(ptpv2: PTPv2) -> bool:
+        return int(ptpv2.flags) & TWO_STEP_FLAG != 0
+
     @staticmethod
     def is_delay_req(ptpv2: PTPv2) -> bool:
         return ptpv2.messageType == PTP_MSG_TYPE.DELAY_REQ_MSG.value
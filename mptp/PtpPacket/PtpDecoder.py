@@ -0,0 +1,370 @@
+import struct
+from decimal import Decimal
+from typing import Optional
+from scapy.utils import str2mac
+
+from .Fields import PortIdentityField
+from .PTPv2 import PTP_MSG_TYPE
+
+# Fast PTPv2 decoder working on raw frame bytes with precompiled struct layouts.
+# PTP is located in Ethernet (also VLAN tagged), Linux cooked capture (SLL, SLL2)
+# and raw IP frames, carried directly or over UDP/IPv4 and UDP/IPv6 ports 319/320.
+# PtpRecord exposes the same attribute names and values as the scapy Ether/PTPv2
+# layers, so it can be used wherever a dissected scapy packet is used.
+
+ETH_HEADER_LEN = 14
+ETH_TYPE_OFFSET = 12
+ETH_TYPE_PTP = 0x88F7
+ETH_TYPE_IPV4 = 0x0800
+ETH_TYPE_IPV6 = 0x86DD
+VLAN_TYPES = frozenset((0x8100, 0x88A8, 0x9100))
+VLAN_TAG_LEN = 4
+SLL_PROTOCOL_OFFSET = 14
+SLL_HEADER_LEN = 16
+SLL2_PROTOCOL_OFFSET = 0
+SLL2_HEADER_LEN = 20
+IPV4_MIN_HEADER_LEN = 20
+IPV6_HEADER_LEN = 40
+IPV6_EXTENSION_HEADERS = frozenset((0, 43, 60))
+IP_PROTO_UDP = 17
+UDP_HEADER_LEN = 8
+PTP_UDP_PORTS = frozenset((319, 320))
+NO_MAC = bytes(6)
+PTP_CARRIER_TYPES = frozenset((ETH_TYPE_PTP, ETH_TYPE_IPV4, ETH_TYPE_IPV6)) | VLAN_TYPES
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+PTP_HEADER_LEN = 34
+
+COMMON_HEADER = struct.Struct("!BBHBBHQI10sHBb")
+TIMESTAMP_BODY = struct.Struct("!HII")
+SYNC_BODY = struct.Struct("!HIIH")
+ANNOUNCE_BODY = struct.Struct("!HIIHHBBHB8sHB")
+FOLLOW_UP_BODY = TIMESTAMP_BODY
+FOLLOW_UP_TLV_LEN = 32
+RESPONSE_BODY = struct.Struct("!HII10s")
+
+BODY_FIELDS = frozenset(
+    (
+        "originTimestamp",
+        "utcOffset",
+        "priority1",
+        "grandmasterClockClass",
+        "grandmasterClockAccuracy",
+        "grandmasterClockVariance",
+        "priority2",
+        "grandmasterClockId",
+        "localStepsRemoved",
+        "timeSource",
+        "padding",
+        "preciseOriginTimestamp",
+        "informationTlv",
+        "receiveTimestamp",
+        "requestReceiptTimestamp",
+        "responseOriginTimestamp",
+        "requestingPortIdentity",
+    )
+)
+
+
+class PtpRecord:
+    __slots__ = (
+        "time_ns",
+        "transportSpecific",
+        "messageType",
+        "reserved0",
+        "versionPTP",
+        "messageLength",
+        "domainNumber",
+        "reserved1",
+        "flags",
+        "correctionField",
+        "reserved2",
+        "sequenceId",
+        "control",
+        "logMessageInterval",
+        "_eth",
+        "_source_port",
+        "_body",
+    )
+
+    def __getattr__(self, name):
+        # Called only for attributes which are not slots, i.e. type specific body fields.
+        # Same as in scapy, fields not present in processed message type are None
+        if name in BODY_FIELDS:
+            return self._body.get(name)
+        raise AttributeError(name)
+
+    @property
+    def time(self) -> Decimal:
+        return Decimal(self.time_ns).scaleb(-9)
+
+    @property
+    def dst(self) -> str:
+        return str2mac(self._eth[:6])
+
+    @property
+    def src(self) -> str:
+        return str2mac(self._eth[6:12])
+
+    @property
+    def sourcePortIdentity(self) -> str:
+        return PortIdentityField.to_str(self._source_port)
+
+    def __repr__(self) -> str:
+        return (
+            f"<PtpRecord messageType={self.messageType} sequenceId={self.sequenceId} "
+            f"time={self.time}>"
+        )
+
+
+def _timestamp(s_high: int, s_low: int, ns: int) -> dict:
+    return {"s": (s_high << 32) | s_low, "ns": ns}
+
+
+def _decode_sync_or_delay_req(buf, offset: int, end: int) -> Optional[dict]:
+    if end - offset < SYNC_BODY.size:
+        return None
+    s_high, s_low, ns, padding = SYNC_BODY.unpack_from(buf, offset)
+    return {"originTimestamp": _timestamp(s_high, s_low, ns), "padding": padding}
+
+
+def _decode_announce(buf, offset: int, end: int) -> Optional[dict]:
+    if end - offset < ANNOUNCE_BODY.size:
+        return None
+    (
+        s_high,
+        s_low,
+        ns,
+        utc_offset,
+        priority1,
+        clock_class,
+        clock_accuracy,
+        clock_variance,
+        priority2,
+        clock_id,
+        steps_removed,
+        time_source,
+    ) = ANNOUNCE_BODY.unpack_from(buf, offset)
+    return {
+        "originTimestamp": _timestamp(s_high, s_low, ns),
+        "utcOffset": utc_offset,
+        "priority1": priority1,
+        "grandmasterClockClass": clock_class,
+        "grandmasterClockAccuracy": clock_accuracy,
+        "grandmasterClockVariance": clock_variance,
+        "priority2": priority2,
+        "grandmasterClockId": clock_id,
+        "localStepsRemoved": steps_removed,
+        "timeSource": time_source,
+    }
+
+
+def _decode_follow_up(buf, offset: int, end: int) -> Optional[dict]:
+    if end - offset < FOLLOW_UP_BODY.size:
+        return None
+    s_high, s_low, ns = FOLLOW_UP_BODY.unpack_from(buf, offset)
+    tlv_offset = offset + FOLLOW_UP_BODY.size
+    # informationTlv is a fixed length string, scapy accepts it truncated
+    tlv = bytes(buf[tlv_offset : min(end, tlv_offset + FOLLOW_UP_TLV_LEN)])
+    return {"preciseOriginTimestamp": _timestamp(s_high, s_low, ns), "informationTlv": tlv}
+
+
+def _response_decoder(timestamp_name: str):
+    def decode(buf, offset: int, end: int) -> Optional[dict]:
+        if end - offset < RESPONSE_BODY.size:
+            return None
+        s_high, s_low, ns, requesting_port = RESPONSE_BODY.unpack_from(buf, offset)
+        return {
+            timestamp_name: _timestamp(s_high, s_low, ns),
+            "requestingPortIdentity": PortIdentityField.to_str(requesting_port),
+        }
+
+    return decode
+
+
+BODY_DECODERS = {
+    PTP_MSG_TYPE.SYNC_MSG.value: _decode_sync_or_delay_req,
+    PTP_MSG_TYPE.DELAY_REQ_MSG.value: _decode_sync_or_delay_req,
+    PTP_MSG_TYPE.ANNOUNCE_MSG.value: _decode_announce,
+    PTP_MSG_TYPE.FOLLOW_UP_MSG.value: _decode_follow_up,
+    PTP_MSG_TYPE.DELAY_RESP_MSG.value: _response_decoder("receiveTimestamp"),
+    PTP_MSG_TYPE.PDELAY_RESP_MSG.value: _response_decoder("requestReceiptTimestamp"),
+    PTP_MSG_TYPE.PDELAY_RESP_FOLLOW_UP_MSG.value: _response_decoder("responseOriginTimestamp"),
+}
+
+NO_BODY = {}
+
+TIMESTAMP_FIELDS = {
+    PTP_MSG_TYPE.SYNC_MSG.value: "originTimestamp",
+    PTP_MSG_TYPE.DELAY_REQ_MSG.value: "originTimestamp",
+    PTP_MSG_TYPE.ANNOUNCE_MSG.value: "originTimestamp",
+    PTP_MSG_TYPE.FOLLOW_UP_MSG.value: "preciseOriginTimestamp",
+    PTP_MSG_TYPE.DELAY_RESP_MSG.value: "receiveTimestamp",
+    PTP_MSG_TYPE.PDELAY_RESP_MSG.value: "requestReceiptTimestamp",
+    PTP_MSG_TYPE.PDELAY_RESP_FOLLOW_UP_MSG.value: "responseOriginTimestamp",
+}
+
+ANNOUNCE_FIELDS = (
+    "utcOffset",
+    "priority1",
+    "grandmasterClockClass",
+    "grandmasterClockAccuracy",
+    "grandmasterClockVariance",
+    "priority2",
+    "grandmasterClockId",
+    "localStepsRemoved",
+    "timeSource",
+)
+
+
+def decode_ptp_message(buf, offset: int, time_ns: int, eth: bytes) -> Optional[PtpRecord]:
+    end = len(buf)
+    if end - offset < PTP_HEADER_LEN:
+        return None
+    (
+        type_byte,
+        version_byte,
+        msg_len,
+        domain,
+        reserved1,
+        flags,
+        correction,
+        reserved2,
+        source_port,
+        sequence_id,
+        control,
+        log_interval,
+    ) = COMMON_HEADER.unpack_from(buf, offset)
+    msg_type = type_byte & 0x0F
+    body_decoder = BODY_DECODERS.get(msg_type)
+    if body_decoder is None:
+        body = NO_BODY
+    else:
+        body = body_decoder(buf, offset + PTP_HEADER_LEN, end)
+        if body is None:
+            # scapy fails to dissect truncated messages and leaves them as Raw
+            return None
+    record = PtpRecord()
+    record.time_ns = time_ns
+    record.transportSpecific = type_byte >> 4
+    record.messageType = msg_type
+    record.reserved0 = version_byte >> 4
+    record.versionPTP = version_byte & 0x0F
+    record.messageLength = msg_len
+    record.domainNumber = domain
+    record.reserved1 = reserved1
+    record.flags = flags
+    record.correctionField = correction
+    record.reserved2 = reserved2
+    record.sequenceId = sequence_id
+    record.control = control
+    record.logMessageInterval = log_interval
+    record._eth = eth
+    record._source_port = source_port
+    record._body = body
+    return record
+
+
+def locate_ptp_payload(buf, start: int, caplen: int, linktype: int = LINKTYPE_ETHERNET) -> int:
+    # Returns offset of PTP message from start of frame or -1 if frame does not carry PTP.
+    # Only single bytes of buf are read, so it is cheap for memory mapped captures as well.
+    if linktype == LINKTYPE_ETHERNET:
+        # quick path for the most common frames
+        if caplen < ETH_HEADER_LEN + PTP_HEADER_LEN:
+            return -1
+        eth_type = buf[start + ETH_TYPE_OFFSET] << 8 | buf[start + ETH_TYPE_OFFSET + 1]
+        if eth_type == ETH_TYPE_PTP:
+            return ETH_HEADER_LEN
+        if eth_type not in PTP_CARRIER_TYPES:
+            return -1
+        if eth_type == ETH_TYPE_IPV4 and buf[start + ETH_HEADER_LEN + 9] != IP_PROTO_UDP:
+            return -1
+    offset = _locate_in_link_layer(buf, start, caplen, linktype)
+    return offset if 0 <= offset <= caplen - PTP_HEADER_LEN else -1
+
+
+def _locate_in_link_layer(buf, start: int, caplen: int, linktype: int) -> int:
+    if linktype == LINKTYPE_ETHERNET:
+        return _locate_in_ethertype(buf, start, caplen, ETH_TYPE_OFFSET, ETH_HEADER_LEN)
+    if linktype == LINKTYPE_LINUX_SLL:
+        return _locate_in_ethertype(buf, start, caplen, SLL_PROTOCOL_OFFSET, SLL_HEADER_LEN)
+    if linktype == LINKTYPE_LINUX_SLL2:
+        return _locate_in_ethertype(buf, start, caplen, SLL2_PROTOCOL_OFFSET, SLL2_HEADER_LEN)
+    if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6) and caplen > 0:
+        version = buf[start] >> 4
+        if version == 4:
+            return _locate_in_ipv4(buf, start, caplen, 0)
+        if version == 6:
+            return _locate_in_ipv6(buf, start, caplen, 0)
+    return -1
+
+
+def _locate_in_ethertype(buf, start: int, caplen: int, type_offset: int, payload: int) -> int:
+    if payload > caplen:
+        return -1
+    eth_type = buf[start + type_offset] << 8 | buf[start + type_offset + 1]
+    while eth_type in VLAN_TYPES and payload + VLAN_TAG_LEN <= caplen:
+        eth_type = buf[start + payload + 2] << 8 | buf[start + payload + 3]
+        payload += VLAN_TAG_LEN
+    if eth_type == ETH_TYPE_PTP:
+        return payload
+    if eth_type == ETH_TYPE_IPV4:
+        return _locate_in_ipv4(buf, start, caplen, payload)
+    if eth_type == ETH_TYPE_IPV6:
+        return _locate_in_ipv6(buf, start, caplen, payload)
+    return -1
+
+
+def _locate_in_ipv4(buf, start: int, caplen: int, ip: int) -> int:
+    if ip + IPV4_MIN_HEADER_LEN > caplen or buf[start + ip + 9] != IP_PROTO_UDP:
+        return -1
+    if (buf[start + ip + 6] & 0x1F) | buf[start + ip + 7]:
+        return -1  # not first fragment
+    return _locate_in_udp(buf, start, caplen, ip + (buf[start + ip] & 0x0F) * 4)
+
+
+def _locate_in_ipv6(buf, start: int, caplen: int, ip: int) -> int:
+    if ip + IPV6_HEADER_LEN > caplen:
+        return -1
+    next_header = buf[start + ip + 6]
+    offset = ip + IPV6_HEADER_LEN
+    while next_header in IPV6_EXTENSION_HEADERS and offset + 2 <= caplen:
+        next_header, offset = buf[start + offset], offset + (buf[start + offset + 1] + 1) * 8
+    if next_header != IP_PROTO_UDP:
+        return -1
+    return _locate_in_udp(buf, start, caplen, offset)
+
+
+def _locate_in_udp(buf, start: int, caplen: int, udp: int) -> int:
+    if udp + UDP_HEADER_LEN > caplen:
+        return -1
+    dst_port = buf[start + udp + 2] << 8 | buf[start + udp + 3]
+    return udp + UDP_HEADER_LEN if dst_port in PTP_UDP_PORTS else -1
+
+
+def get_frame_addresses(frame, linktype: int) -> bytes:
+    # Destination and source MAC as in Ethernet header, link types without
+    # destination MAC have it zeroed, without any MAC have both zeroed
+    if linktype == LINKTYPE_ETHERNET:
+        return bytes(frame[:12])
+    if linktype == LINKTYPE_LINUX_SLL and frame[4:6] == b"\x00\x06":
+        return NO_MAC + bytes(frame[6:12])
+    if linktype == LINKTYPE_LINUX_SLL2 and frame[11] == 6:
+        return NO_MAC + bytes(frame[12:18])
+    return NO_MAC + NO_MAC
+
+
+def decode_ptp_frame(
+    frame, time_ns: int, linktype: int = LINKTYPE_ETHERNET, ptp_offset: int = None
+) -> Optional[PtpRecord]:
+    # ptp_offset may be given if PTP was already located by reader prefilter
+    if ptp_offset is None:
+        ptp_offset = locate_ptp_payload(frame, 0, len(frame), linktype)
+        if ptp_offset < 0:
+            return None
+    return decode_ptp_message(frame, ptp_offset, time_ns, get_frame_addresses(frame, linktype))
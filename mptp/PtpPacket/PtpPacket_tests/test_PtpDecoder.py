@@ -0,0 +1,120 @@
+import unittest
+from scapy.layers.inet import IP, UDP
+from scapy.layers.inet6 import IPv6
+from scapy.layers.l2 import CookedLinux, CookedLinuxV2, Dot1AD, Dot1Q, Ether
+
+from mptp.PtpPacket.PTPv2 import PTPv2
+from mptp.PtpPacket.PtpDecoder import (
+    BODY_FIELDS,
+    LINKTYPE_ETHERNET,
+    LINKTYPE_LINUX_SLL,
+    LINKTYPE_LINUX_SLL2,
+    LINKTYPE_RAW,
+    decode_ptp_frame,
+    locate_ptp_payload,
+)
+from mptp.PtpPacket.PtpPacket_tests.test_PTPv2 import (
+    SYNC_MESSAGE_TRACE,
+    FOLLOW_UP_MESSAGE_TRACE,
+    PDELAY_REQ_MESSAGE_TRACE,
+    PDELAY_RESP_MESSAGE_TRACE,
+    PDELAY_RESP_FOLLOW_UP_MESSAGE_TRACE,
+)
+
+ETH_HEADER = bytes.fromhex("0180c200000e112233445566") + b"\x88\xf7"
+ETH_HEADER_IPV4 = bytes.fromhex("0180c200000e112233445566") + b"\x08\x00"
+DUMMY_TIME_NS = 1615905574125002557
+
+HEADER_FIELDS = (
+    "src",
+    "dst",
+    "transportSpecific",
+    "messageType",
+    "reserved0",
+    "versionPTP",
+    "messageLength",
+    "domainNumber",
+    "reserved1",
+    "flags",
+    "correctionField",
+    "reserved2",
+    "sourcePortIdentity",
+    "sequenceId",
+    "control",
+    "logMessageInterval",
+)
+
+
+class PtpDecoderTest(unittest.TestCase):
+
+    def assert_same_as_scapy(self, frame: bytes):
+        record = decode_ptp_frame(frame, DUMMY_TIME_NS)
+        packet = Ether(frame)
+        self.assertIsInstance(packet[PTPv2], PTPv2)
+        self.assertIsNotNone(record)
+        for name in HEADER_FIELDS + tuple(BODY_FIELDS):
+            self.assertEqual(getattr(packet, name), getattr(record, name), name)
+
+    def test_decode_sync_message(self):
+        self.assert_same_as_scapy(ETH_HEADER + bytes(SYNC_MESSAGE_TRACE) + bytes(2))
+
+    def test_decode_followup_message(self):
+        self.assert_same_as_scapy(ETH_HEADER + bytes(FOLLOW_UP_MESSAGE_TRACE))
+
+    def test_decode_pdelay_req_message(self):
+        self.assert_same_as_scapy(ETH_HEADER + bytes(PDELAY_REQ_MESSAGE_TRACE))
+
+    def test_decode_pdelay_resp_message(self):
+        self.assert_same_as_scapy(ETH_HEADER + bytes(PDELAY_RESP_MESSAGE_TRACE))
+
+    def test_decode_pdelay_resp_followup_message(self):
+        self.assert_same_as_scapy(ETH_HEADER + bytes(PDELAY_RESP_FOLLOW_UP_MESSAGE_TRACE))
+
+    def test_capture_time(self):
+        record = decode_ptp_frame(ETH_HEADER + bytes(PDELAY_REQ_MESSAGE_TRACE), DUMMY_TIME_NS)
+        self.assertEqual("1615905574.125002557", str(record.time))
+
+    def test_truncated_message_is_not_ptp(self):
+        self.assertIsNone(decode_ptp_frame(ETH_HEADER + bytes(SYNC_MESSAGE_TRACE), 0))
+        self.assertIsNone(decode_ptp_frame(ETH_HEADER + bytes(FOLLOW_UP_MESSAGE_TRACE[:34]), 0))
+
+    def test_non_ptp_ethertype_is_skipped(self):
+        self.assertIsNone(decode_ptp_frame(ETH_HEADER_IPV4 + bytes(PDELAY_REQ_MESSAGE_TRACE), 0))
+
+    def test_ptp_located_in_encapsulations(self):
+        ptp = bytes(SYNC_MESSAGE_TRACE) + bytes(2)
+        eth = Ether(dst="01:1b:19:00:00:00", src="11:22:33:44:55:66")
+        sll = CookedLinux(lladdrlen=6, src=bytes.fromhex("1122334455660000"))
+        sll2 = CookedLinuxV2(lladdrlen=6, src=bytes.fromhex("1122334455660000"))
+        frames = [
+            (LINKTYPE_ETHERNET, eth / Dot1Q(vlan=10) / PTPv2(ptp)),
+            (LINKTYPE_ETHERNET, eth / Dot1AD(vlan=20) / Dot1Q(vlan=10) / PTPv2(ptp)),
+            (LINKTYPE_ETHERNET, eth / IP(dst="224.0.1.129") / UDP(sport=319, dport=319) / PTPv2(ptp)),
+            (LINKTYPE_ETHERNET, eth / Dot1Q() / IPv6(dst="ff0e::181") / UDP(dport=320) / PTPv2(ptp)),
+            (LINKTYPE_LINUX_SLL, sll / PTPv2(ptp)),
+            (LINKTYPE_LINUX_SLL2, sll2 / IP() / UDP(dport=319) / PTPv2(ptp)),
+            (LINKTYPE_RAW, IPv6() / UDP(dport=319) / PTPv2(ptp)),
+        ]
+        for linktype, packet in frames:
+            frame = bytes(packet)
+            self.assertEqual(len(frame) - len(ptp), locate_ptp_payload(frame, 0, len(frame), linktype))
+            record = decode_ptp_frame(frame, DUMMY_TIME_NS, linktype)
+            self.assertEqual(packet[PTPv2].sequenceId, record.sequenceId)
+            self.assertEqual(packet[PTPv2].originTimestamp, record.originTimestamp)
+        self.assertEqual("11:22:33:44:55:66", decode_ptp_frame(bytes(frames[4][1]), 0, LINKTYPE_LINUX_SLL).src)
+        self.assertEqual("00:00:00:00:00:00", decode_ptp_frame(bytes(frames[5][1]), 0, LINKTYPE_LINUX_SLL2).dst)
+
+    def test_non_ptp_udp_is_skipped(self):
+        ptp = bytes(SYNC_MESSAGE_TRACE) + bytes(2)
+        eth = Ether()
+        frames = [
+            eth / IP() / UDP(dport=1234) / ptp,
+            eth / IP(frag=100) / UDP(dport=319) / ptp,
+            eth / IPv6(nh=6) / ptp,
+            eth / IP() / UDP(dport=319),
+            bytes(eth / IP())[:20],
+            bytes(eth / Dot1Q())[:16],
+        ]
+        for packet in frames:
+            frame = bytes(packet)
+            self.assertEqual(-1, locate_ptp_payload(frame, 0, len(frame), LINKTYPE_ETHERNET))
@@ -0,0 +1,143 @@
+from typing import Callable, List, Optional, Tuple
+import numpy as np
+
+from mptp.PtpPacket.PTPv2 import PTP_MSG_TYPE
+from mptp.PtpPacket.PtpDecoder import PtpRecord
+from mptp.PtpColumns import PtpColumns, PtpMsgView
+from mptp.PtpStream import PtpStream
+
+# Single pass analysis. Checkers registered as stages consume the stream together,
+# batch after batch of rows. Messages of a batch are materialised once and handed
+# to every stage subscribed to their type, stages working on columns get view of
+# the same rows while they are still in cache.
+# Stream may be also split into shards checked by separate pipelines, stages of
+# following shards are then merged into stages of the first one.
+
+BATCH_SIZE = 64 * 1024
+PTP_MSG_TYPES_NUM = 16
+
+
+class PipelineStage:
+    # msg_types - PTP message types stage consumes, all when None.
+    # Stage gets messages one by one in add(), or with uses_records False,
+    # views of batch rows in add_batch(). finish() is called after last batch.
+    msg_types: Optional[Tuple[PTP_MSG_TYPE, ...]] = None
+    uses_records = True
+
+    def add(self, msg: PtpRecord):
+        pass
+
+    def add_batch(self, msgs: PtpMsgView):
+        pass
+
+    def merge(self, other: "PipelineStage") -> bool:
+        # Takes over results of the same stage which got messages following the ones
+        # given to this stage, the next shard always starts with Sync. False if results
+        # can not be stitched, then this stage is given the messages of shard again.
+        return False
+
+    def finish(self):
+        pass
+
+
+class PtpPipeline:
+    def __init__(self, stream: PtpStream, batch_size: int = BATCH_SIZE):
+        self._stream = stream
+        self._batch_size = batch_size
+        self._stages: List[PipelineStage] = []
+
+    @property
+    def stages(self) -> List[PipelineStage]:
+        return self._stages
+
+    def add_stage(self, stage: PipelineStage):
+        self._stages.append(stage)
+
+    def run(self):
+        self.process(0, len(self._stream.columns))
+        self.finish()
+
+    def process(self, start: int, end: int):
+        # Gives rows start:end to stages, may be called for consecutive row ranges
+        self._process(self._stages, start, end)
+
+    def merge(self, stages: List[PipelineStage], start: int, end: int):
+        # Stages of pipeline which processed rows start:end following already processed ones
+        rejected = [stage for stage, other in zip(self._stages, stages) if not stage.merge(other)]
+        if rejected:
+            self._process(rejected, start, end)
+
+    def finish(self):
+        stages, self._stages = self._stages, []
+        for stage in stages:
+            stage.finish()
+
+    def _process(self, stages: List[PipelineStage], start: int, end: int):
+        columns = self._stream.columns
+        msg_type = columns.msg_type
+        record_stages = [s for s in stages if s.uses_records]
+        dispatch = self._get_dispatch_table(record_stages)
+        record_types = self._get_types(record_stages)
+        batch_stages = [s for s in stages if not s.uses_records]
+        for batch_start in range(start, end, self._batch_size):
+            rows = np.arange(batch_start, min(batch_start + self._batch_size, end))
+            batch_types = msg_type[batch_start : batch_start + len(rows)]
+            for stage in batch_stages:
+                selected = rows if stage.msg_types is None else rows[self._is_of_types(batch_types, stage.msg_types)]
+                if len(selected) > 0:
+                    stage.add_batch(PtpMsgView(columns, selected))
+            if dispatch:
+                # only msgs some stage is subscribed to are materialised
+                if record_types is not None:
+                    selected = self._is_of_types(batch_types, record_types)
+                    rows, batch_types = rows[selected], batch_types[selected]
+                for t, msg in zip(batch_types.tolist(), columns.records(rows)):
+                    for add in dispatch[t]:
+                        add(msg)
+
+    @staticmethod
+    def _get_dispatch_table(stages: List[PipelineStage]) -> Optional[List[List[Callable]]]:
+        # Bound add() of stages for every message type value
+        if not stages:
+            return None
+        table: List[List[Callable]] = [[] for _ in range(PTP_MSG_TYPES_NUM)]
+        for stage in stages:
+            types = range(PTP_MSG_TYPES_NUM) if stage.msg_types is None else [t.value for t in stage.msg_types]
+            for t in types:
+                table[t].append(stage.add)
+        return table
+
+    @staticmethod
+    def _get_types(stages: List[PipelineStage]) -> Optional[Tuple[PTP_MSG_TYPE, ...]]:
+        # All types consumed by stages, None when some stage consumes all
+        types = set()
+        for stage in stages:
+            if stage.msg_types is None:
+                return None
+            types.update(stage.msg_types)
+        return tuple(types)
+
+    @staticmethod
+    def _is_of_types(msg_type: np.ndarray, types: Tuple[PTP_MSG_TYPE, ...]) -> np.ndarray:
+        mask = np.zeros(len(msg_type), dtype=bool)
+        for t in types:
+            mask |= msg_type == t.value
+        return mask
+
+
+def split_into_time_shards(columns: PtpColumns, shards: int) -> List[Tuple[int, int]]:
+    # Row ranges covering equal parts of capture time. Every shard but the first one
+    # starts with Sync, so open message exchange is the only state carried over edge.
+    # Shards without Sync are joined with previous ones.
+    n = len(columns)
+    if shards <= 1 or n == 0:
+        return [(0, n)]
+    time_ns = columns.time_ns
+    first, last = time_ns[0].item(), time_ns[-1].item()
+    edge_times = [first + (last - first) * i // shards for i in range(1, shards)]
+    # capture time is not strictly ordered, edges are kept increasing
+    edges = np.maximum.accumulate(np.searchsorted(time_ns, edge_times))
+    sync_rows = np.flatnonzero(columns.msg_type == PTP_MSG_TYPE.SYNC_MSG.value)
+    next_sync = np.searchsorted(sync_rows, edges)
+    starts = [0] + sorted(set(sync_rows[next_sync[next_sync < len(sync_rows)]].tolist()) - {0})
+    return list(zip(starts, starts[1:] + [n]))
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from mptp.PtpColumns import COLUMNS, PtpColumns
+from mptp.PtpPacket.PtpDecoder import ANNOUNCE_FIELDS
+from mptp.PtpReader.MmapPcapNgReader import PcapNgBlockIndex, PcapNgInterface
+
+# Sidecar cache of decoded PTP messages. Each cached capture is a directory with
+# one .npy file per column, loaded with memory map, and meta.json with interned
+# tables. Entries are keyed by capture size, mtime and hash of sampled content.
+# All PTP messages of capture are kept, boundaries are cut after loading.
+# Block index of pcapng capture read by time range is kept in its own entry.
+
+FORMAT_VERSION = 2
+META_FILE = "meta.json"
+BLOCK_INDEX_SUFFIX = "_blocks"
+BLOCK_INDEX_COLUMNS = ("offsets", "times_ns", "interfaces")
+HASH_BLOCK_SIZE = 64 * 1024
+HASH_SAMPLED_BLOCKS = 16
+ONE_MB = 1024 * 1024
+ONE_DAY_IN_S = 24 * 60 * 60
+GM_CLOCK_ID_IDX = ANNOUNCE_FIELDS.index("grandmasterClockId")
+
+
+def get_default_cache_dir() -> str:
+    app_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return os.path.join(app_dir, "cache")
+
+
+class CaptureCache:
+    def __init__(self, max_size_mb: float, max_age_days: float, cache_dir: str = None):
+        self._cache_dir = cache_dir if cache_dir is not None else get_default_cache_dir()
+        self._max_size = max_size_mb * ONE_MB
+        self._max_age = max_age_days * ONE_DAY_IN_S
+
+    def load(self, filename: str) -> Optional[PtpColumns]:
+        entry = self._entry_dir(filename)
+        try:
+            with open(os.path.join(entry, META_FILE), "r") as f:
+                meta = json.load(f)
+            if meta["version"] != FORMAT_VERSION:
+                return None
+            columns = {
+                name: np.load(os.path.join(entry, name + ".npy"), mmap_mode="r")
+                for name in COLUMNS
+            }
+        except (OSError, ValueError, KeyError):
+            return None
+        os.utime(os.path.join(entry, META_FILE))  # last use time for eviction
+        announce_bodies = [self._announce_from_json(a) for a in meta["announce_bodies"]]
+        return PtpColumns(columns, meta["port_ids"], meta["macs"], announce_bodies)
+
+    def store(self, filename: str, columns: PtpColumns):
+        # OSError is raised when entry could not be written, nothing of it is left then
+        meta = {
+            "port_ids": columns.port_ids,
+            "macs": columns.macs,
+            "announce_bodies": [self._announce_to_json(a) for a in columns.announce_bodies],
+        }
+        arrays = {name: columns.column(name) for name in COLUMNS}
+        self._store_entry(self._entry_dir(filename), filename, arrays, meta)
+
+    def load_block_index(self, filename: str) -> Optional[PcapNgBlockIndex]:
+        entry = self._entry_dir(filename) + BLOCK_INDEX_SUFFIX
+        try:
+            with open(os.path.join(entry, META_FILE), "r") as f:
+                meta = json.load(f)
+            if meta["version"] != FORMAT_VERSION:
+                return None
+            arrays = [np.load(os.path.join(entry, name + ".npy")) for name in BLOCK_INDEX_COLUMNS]
+            interfaces = [PcapNgInterface(*interface) for interface in meta["interfaces"]]
+            section_endians = [(pos, endian) for pos, endian in meta["section_endians"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        os.utime(os.path.join(entry, META_FILE))
+        return PcapNgBlockIndex.from_arrays(*arrays, interfaces, section_endians)
+
+    def store_block_index(self, filename: str, index: PcapNgBlockIndex):
+        # Same as store, index has to be complete
+        meta = {
+            "interfaces": [[i.linktype, i.tsresol, i.tsoffset] for i in index.interface_list],
+            "section_endians": index.section_endians,
+        }
+        arrays = dict(zip(BLOCK_INDEX_COLUMNS, (index.offsets, index.times_ns, index.interfaces)))
+        self._store_entry(self._entry_dir(filename) + BLOCK_INDEX_SUFFIX, filename, arrays, meta)
+
+    def _store_entry(self, entry: str, filename: str, arrays: Dict[str, np.ndarray], meta: dict):
+        # Entry is written aside and renamed, so it is never read half written
+        tmp_entry = f"{entry}.tmp{os.getpid()}"
+        try:
+            os.makedirs(tmp_entry, exist_ok=True)
+            for name, values in arrays.items():
+                np.save(os.path.join(tmp_entry, name + ".npy"), values)
+            with open(os.path.join(tmp_entry, META_FILE), "w") as f:
+                json.dump({"version": FORMAT_VERSION, "source": os.path.abspath(filename), **meta}, f)
+            shutil.rmtree(entry, ignore_errors=True)
+            os.rename(tmp_entry, entry)
+        except OSError:
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+            raise
+        self.evict(keep=entry)
+
+    def evict(self, keep: str = None):
+        entries = self._list_entries()
+        now = time.time()
+        total_size = sum(size for _, size, _ in entries)
+        # oldest used first
+        for path, size, last_use in sorted(entries, key=lambda e: e[2]):
+            if path == keep:
+                continue
+            if now - last_use > self._max_age or total_size > self._max_size:
+                shutil.rmtree(path, ignore_errors=True)
+                total_size -= size
+
+    def _list_entries(self) -> List[Tuple[str, int, float]]:
+        if not os.path.isdir(self._cache_dir):
+            return []
+        entries = []
+        for name in os.listdir(self._cache_dir):
+            path = os.path.join(self._cache_dir, name)
+            meta = os.path.join(path, META_FILE)
+            if not os.path.isfile(meta):
+                continue
+            size = sum(f.stat().st_size for f in os.scandir(path) if f.is_file())
+            entries.append((path, size, os.path.getmtime(meta)))
+        return entries
+
+    def _entry_dir(self, filename: str) -> str:
+        return os.path.join(self._cache_dir, self.get_key(filename))
+
+    @staticmethod
+    def get_key(filename: str) -> str:
+        stat = os.stat(filename)
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+        with open(filename, "rb") as f:
+            for offset in CaptureCache._get_sampled_offsets(stat.st_size):
+                f.seek(offset)
+                digest.update(f.read(HASH_BLOCK_SIZE))
+        return digest.hexdigest()
+
+    @staticmethod
+    def _get_sampled_offsets(size: int) -> List[int]:
+        # Small captures are hashed whole, big ones by blocks spread evenly over file
+        if size <= HASH_BLOCK_SIZE * HASH_SAMPLED_BLOCKS:
+            return list(range(0, size, HASH_BLOCK_SIZE))
+        step = (size - HASH_BLOCK_SIZE) // (HASH_SAMPLED_BLOCKS - 1)
+        return [i * step for i in range(HASH_SAMPLED_BLOCKS)]
+
+    @staticmethod
+    def _announce_to_json(announce: tuple) -> list:
+        body = list(announce)
+        body[GM_CLOCK_ID_IDX] = body[GM_CLOCK_ID_IDX].hex()
+        return body
+
+    @staticmethod
+    def _announce_from_json(announce: list) -> tuple:
+        announce[GM_CLOCK_ID_IDX] = bytes.fromhex(announce[GM_CLOCK_ID_IDX])
+        return tuple(announce)
@@ -0,0 +1,148 @@
+import gzip
+import lzma
+import queue
+import threading
+from typing import BinaryIO, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+# Compressed captures are detected by magic bytes and decompressed as a stream.
+# Decompression runs in a background thread a few chunks ahead of the reader,
+# zlib, lzma, zstd and lz4 release GIL, so it overlaps with PTP decoding.
+
+READ_AHEAD_CHUNK_SIZE = 1024 * 1024
+READ_AHEAD_CHUNKS = 8
+
+COMPRESSION_MAGICS = {
+    "gzip": b"\x1f\x8b",
+    "xz": b"\xfd7zXZ\x00",
+    "zstd": b"\x28\xb5\x2f\xfd",
+    "lz4": b"\x04\x22\x4d\x18",
+}
+
+
+class UnsupportedCompression(Exception):
+    pass
+
+
+def detect_compression(filename: str) -> Optional[str]:
+    with open(filename, "rb") as f:
+        head = f.read(8)
+    for name, magic in COMPRESSION_MAGICS.items():
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def open_capture(filename: str) -> BinaryIO:
+    # Returns file object of uncompressed capture, regardless of how it is stored
+    compression = detect_compression(filename)
+    if compression is None:
+        return open(filename, "rb")
+    return ReadAheadReader(_open_decompressed(filename, compression), filename)
+
+
+def _open_decompressed(filename: str, compression: str) -> BinaryIO:
+    if compression == "gzip":
+        return gzip.open(filename, "rb")
+    if compression == "xz":
+        return lzma.open(filename, "rb")
+    if compression == "zstd":
+        if zstandard is None:
+            raise UnsupportedCompression("Reading zstd compressed capture requires zstandard package")
+        return zstandard.ZstdDecompressor().stream_reader(
+            open(filename, "rb"), read_across_frames=True, closefd=True
+        )
+    if lz4_frame is None:
+        raise UnsupportedCompression("Reading lz4 compressed capture requires lz4 package")
+    return lz4_frame.open(filename, "rb")
+
+
+class ReadAheadReader:
+    # Read only, not seekable file object filled by background thread
+    def __init__(self, source: BinaryIO, name: str = "No name"):
+        self.name = name
+        self._source = source
+        self._chunks: queue.Queue = queue.Queue(maxsize=READ_AHEAD_CHUNKS)
+        self._closed = threading.Event()
+        self._chunk = b""
+        self._pos = 0
+        self._eof = False
+        self._thread = threading.Thread(target=self._read_ahead, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _read_ahead(self):
+        try:
+            while not self._closed.is_set():
+                chunk = self._source.read(READ_AHEAD_CHUNK_SIZE)
+                self._put(chunk)
+                if not chunk:
+                    return
+        except Exception as e:
+            self._put(e)
+
+    def _put(self, item):
+        while not self._closed.is_set():
+            try:
+                self._chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _next_chunk(self) -> bytes:
+        if self._eof:
+            return b""
+        chunk = self._chunks.get()
+        if isinstance(chunk, Exception):
+            self._eof = True
+            raise chunk
+        if not chunk:
+            self._eof = True
+        return chunk
+
+    def read(self, size: int = -1) -> bytes:
+        chunk, pos = self._chunk, self._pos
+        if 0 <= size <= len(chunk) - pos:
+            self._pos = pos + size
+            return chunk[pos : pos + size]
+        parts = [chunk[pos:]]
+        missing = size - (len(chunk) - pos) if size >= 0 else -1
+        self._chunk, self._pos = b"", 0
+        while missing != 0:
+            chunk = self._next_chunk()
+            if not chunk:
+                break
+            if 0 <= missing < len(chunk):
+                parts.append(chunk[:missing])
+                self._chunk, self._pos = chunk, missing
+                break
+            parts.append(chunk)
+            if missing > 0:
+                missing -= len(chunk)
+        return b"".join(parts)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._thread.join()
+        self._source.close()
@@ -0,0 +1,272 @@
+import mmap
+import struct
+from array import array
+from typing import Iterator, List, Optional, Tuple
+import numpy as np
+
+from mptp.PtpPacket.PtpDecoder import locate_ptp_payload
+
+# Random access reader of pcapng files. Capture is memory mapped and blocks are
+# walked in place, frames are handed out as memoryview slices of the map.
+# Every section and interface is supported, each interface with its own link
+# type, if_tsresol and if_tsoffset. While blocks are walked for the first time
+# an index of packet block offsets and capture times is built, so later reads
+# of a time range go straight to the blocks of interest. Complete index may be
+# stored and given to reader of the same capture, which then does not walk it.
+
+ONE_SEC_IN_NS = 1000000000
+BLOCK_HEADER_LEN = 8
+SHB_TYPE = 0x0A0D0D0A
+IDB_TYPE = 0x00000001
+PB_TYPE = 0x00000002
+EPB_TYPE = 0x00000006
+BYTE_ORDER_MAGIC = 0x1A2B3C4D
+OPT_END = 0
+OPT_IF_TSRESOL = 9
+OPT_IF_TSOFFSET = 14
+DEFAULT_TSRESOL = 6
+SHB_FIXED_LEN = 16
+IDB_FIXED_LEN = 8
+PACKET_FIXED_LEN = 20
+EPB_FIXED = "IIII4x"
+PB_FIXED = "H2xIII4x"
+
+
+def is_pcapng(filename: str) -> bool:
+    with open(filename, "rb") as f:
+        magic = f.read(4)
+    return len(magic) == 4 and struct.unpack("<I", magic)[0] == SHB_TYPE
+
+
+class PcapNgInterface:
+    def __init__(self, linktype: int, tsresol: int = DEFAULT_TSRESOL, tsoffset: int = 0):
+        self.linktype = linktype
+        self.tsresol = tsresol
+        self.tsoffset = tsoffset
+        # time in ns = ts * multiplier // divisor + offset, exact for every resolution
+        if tsresol & 0x80:
+            self._multiplier, self._divisor = ONE_SEC_IN_NS, 1 << (tsresol & 0x7F)
+        elif tsresol <= 9:
+            self._multiplier, self._divisor = 10 ** (9 - tsresol), 1
+        else:
+            self._multiplier, self._divisor = 1, 10 ** (tsresol - 9)
+        self._offset_ns = tsoffset * ONE_SEC_IN_NS
+
+    def get_time_ns(self, ts: int) -> int:
+        return ts * self._multiplier // self._divisor + self._offset_ns
+
+
+class PcapNgBlockIndex:
+    # Offsets, capture times and interfaces of packet blocks in file order. Complete
+    # index keeps interfaces and byte order of sections needed to read blocks.
+    def __init__(self):
+        self._offsets = array("q")
+        self._times = array("q")
+        self._interfaces = array("i")
+        self.complete = False
+        self.interface_list: List[PcapNgInterface] = []
+        self.section_endians: List[Tuple[int, str]] = []
+
+    @classmethod
+    def from_arrays(
+        cls,
+        offsets: np.ndarray,
+        times_ns: np.ndarray,
+        interfaces: np.ndarray,
+        interface_list: List[PcapNgInterface],
+        section_endians: List[Tuple[int, str]],
+    ) -> "PcapNgBlockIndex":
+        index = cls()
+        index._offsets.frombytes(offsets.astype(np.int64).tobytes())
+        index._times.frombytes(times_ns.astype(np.int64).tobytes())
+        index._interfaces.frombytes(interfaces.astype(np.int32).tobytes())
+        index.interface_list = interface_list
+        index.section_endians = section_endians
+        index.complete = True
+        return index
+
+    def append(self, offset: int, time_ns: int, interface: int):
+        self._offsets.append(offset)
+        self._times.append(time_ns)
+        self._interfaces.append(interface)
+
+    @property
+    def last_offset(self) -> int:
+        return self._offsets[-1] if len(self._offsets) > 0 else -1
+
+    @property
+    def offsets(self) -> np.ndarray:
+        return np.frombuffer(self._offsets, dtype=np.int64)
+
+    @property
+    def times_ns(self) -> np.ndarray:
+        return np.frombuffer(self._times, dtype=np.int64)
+
+    @property
+    def interfaces(self) -> np.ndarray:
+        return np.frombuffer(self._interfaces, dtype=np.int32)
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def select(self, start_ns: Optional[int], end_ns: Optional[int]) -> np.ndarray:
+        # Positions of blocks captured in [start_ns, end_ns), in file order
+        times = self.times_ns
+        mask = np.ones(len(times), dtype=bool)
+        if start_ns is not None:
+            mask &= times >= start_ns
+        if end_ns is not None:
+            mask &= times < end_ns
+        return np.flatnonzero(mask)
+
+
+class MmapPcapNgReader:
+    def __init__(self, filename: str, index: Optional[PcapNgBlockIndex] = None):
+        with open(filename, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mem = memoryview(self._map)
+        if len(self._map) < BLOCK_HEADER_LEN + SHB_FIXED_LEN or self._read_u32("<", 0) != SHB_TYPE:
+            self.close()
+            raise ValueError("Not a pcapng file")
+        self._interfaces: List[PcapNgInterface] = []
+        self._section_endians: List[Tuple[int, str]] = []
+        self._index = PcapNgBlockIndex()
+        if index is not None and index.complete:
+            self._index = index
+            self._interfaces = index.interface_list
+            self._section_endians = index.section_endians
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        # Frame views handed out have to be released before, otherwise map can not be closed
+        self._mem.release()
+        self._map.close()
+
+    @property
+    def size(self) -> int:
+        return len(self._map)
+
+    @property
+    def interfaces(self) -> List[PcapNgInterface]:
+        return self._interfaces
+
+    def get_block_index(self) -> PcapNgBlockIndex:
+        if not self._index.complete:
+            for _ in self._iter_packet_blocks():
+                pass
+        return self._index
+
+    def iter_frames(self) -> Iterator[Tuple[int, int, memoryview]]:
+        # Yields (capture time in ns, link type, frame view) of every packet block
+        for time_ns, interface, offset, caplen in self._iter_packet_blocks():
+            linktype = self._interfaces[interface].linktype
+            yield (time_ns, linktype, self._mem[offset : offset + caplen])
+
+    def iter_ptp_frames(self) -> Iterator[Tuple[int, int, memoryview, int]]:
+        # Same as iter_frames, but frames are checked on mapped bytes first, so non PTP
+        # frames are skipped without creating any object. Offset of PTP in frame is added.
+        mm = self._map
+        for time_ns, interface, offset, caplen in self._iter_packet_blocks():
+            linktype = self._interfaces[interface].linktype
+            ptp_offset = locate_ptp_payload(mm, offset, caplen, linktype)
+            if ptp_offset >= 0:
+                yield (time_ns, linktype, self._mem[offset : offset + caplen], ptp_offset)
+
+    def iter_frames_in_time_range(
+        self, start_ns: Optional[int] = None, end_ns: Optional[int] = None
+    ) -> Iterator[Tuple[int, int, memoryview]]:
+        # Seeks straight to indexed packet blocks, index is built first if needed
+        index = self.get_block_index()
+        offsets, times, interfaces = index.offsets, index.times_ns, index.interfaces
+        for i in index.select(start_ns, end_ns).tolist():
+            block = offsets[i].item()
+            endian = self._get_endian_at(block)
+            _, _, offset, caplen = self._read_packet_block(endian, block, self._read_u32(endian, block))
+            linktype = self._interfaces[interfaces[i]].linktype
+            yield (times[i].item(), linktype, self._mem[offset : offset + caplen])
+
+    def _iter_packet_blocks(self) -> Iterator[Tuple[int, int, int, int]]:
+        # Walks all blocks, yields (time ns, interface, frame offset, frame length)
+        # of packet blocks and records them in block index on first pass
+        size = len(self._map)
+        index = self._index
+        pos = 0
+        endian = "<"
+        section_interfaces: List[int] = []
+        self._interfaces = []
+        self._section_endians = []
+        while pos + BLOCK_HEADER_LEN <= size:
+            block_type = self._read_u32(endian, pos)
+            if block_type == SHB_TYPE:
+                endian = self._read_section_endian(pos)
+                self._section_endians.append((pos, endian))
+                section_interfaces = []
+            block_len = self._read_u32(endian, pos + 4)
+            if block_len < BLOCK_HEADER_LEN + 4 or pos + block_len > size:
+                break  # truncated or corrupted last block
+            if block_type == IDB_TYPE:
+                section_interfaces.append(len(self._interfaces))
+                self._interfaces.append(self._read_interface(endian, pos, block_len))
+            elif block_type in (EPB_TYPE, PB_TYPE):
+                ts, if_id, offset, caplen = self._read_packet_block(endian, pos, block_type)
+                if if_id >= len(section_interfaces):
+                    pos += block_len
+                    continue  # packet of undefined interface can not be interpreted
+                interface = section_interfaces[if_id]
+                time_ns = self._interfaces[interface].get_time_ns(ts)
+                if pos > index.last_offset:
+                    index.append(pos, time_ns, interface)
+                yield (time_ns, interface, offset, caplen)
+            pos += block_len
+        index.complete = True
+        index.interface_list = self._interfaces
+        index.section_endians = self._section_endians
+
+    def _read_packet_block(self, endian: str, pos: int, block_type: int) -> Tuple[int, int, int, int]:
+        # Returns (raw timestamp, interface id in section, frame offset, frame length),
+        # obsolete Packet Block differs from Enhanced one by 16 bit interface id
+        fmt = EPB_FIXED if block_type == EPB_TYPE else PB_FIXED
+        if_id, ts_high, ts_low, caplen = struct.unpack_from(endian + fmt, self._map, pos + BLOCK_HEADER_LEN)
+        return ((ts_high << 32) | ts_low, if_id, pos + BLOCK_HEADER_LEN + PACKET_FIXED_LEN, caplen)
+
+    def _get_endian_at(self, pos: int) -> str:
+        endian = "<"
+        for section_start, section_endian in self._section_endians:
+            if section_start > pos:
+                break
+            endian = section_endian
+        return endian
+
+    def _read_section_endian(self, pos: int) -> str:
+        magic = self._read_u32("<", pos + BLOCK_HEADER_LEN)
+        if magic == BYTE_ORDER_MAGIC:
+            return "<"
+        if self._read_u32(">", pos + BLOCK_HEADER_LEN) == BYTE_ORDER_MAGIC:
+            return ">"
+        raise ValueError("Not a pcapng file")
+
+    def _read_interface(self, endian: str, pos: int, block_len: int) -> PcapNgInterface:
+        linktype, _, _ = struct.unpack_from(endian + "HHI", self._map, pos + BLOCK_HEADER_LEN)
+        interface = PcapNgInterface(linktype)
+        opt = pos + BLOCK_HEADER_LEN + IDB_FIXED_LEN
+        end = pos + block_len - 4
+        while opt + 4 <= end:
+            code, length = struct.unpack_from(endian + "HH", self._map, opt)
+            if code == OPT_END:
+                break
+            value = opt + 4
+            if code == OPT_IF_TSRESOL and length >= 1:
+                interface = PcapNgInterface(linktype, self._map[value], interface.tsoffset)
+            elif code == OPT_IF_TSOFFSET and length >= 8:
+                tsoffset = struct.unpack_from(endian + "q", self._map, value)[0]
+                interface = PcapNgInterface(linktype, interface.tsresol, tsoffset)
+            opt = value + ((length + 3) & ~3)
+        return interface
+
+    def _read_u32(self, endian: str, pos: int) -> int:
+        return struct.unpack_from(endian + "I", self._map, pos)[0]
@@ -0,0 +1,168 @@
+import mmap
+import struct
+from typing import Iterator, List, Optional, Tuple
+
+from mptp.PtpPacket.PtpDecoder import locate_ptp_payload
+
+# Random access reader of classic pcap files. Whole capture is memory mapped and
+# record headers are walked in place, frames are handed out as memoryview slices
+# of the map, so no per frame bytes object is created.
+
+ONE_SEC_IN_NS = 1000000000
+ONE_SEC_IN_US = 1000000
+GLOBAL_HEADER_LEN = 24
+RECORD_HEADER_LEN = 16
+# record header is taken as found when so many valid ones follow in chain
+RESYNC_RECORDS = 16
+MAX_RECORD_TIME_SPREAD_S = 24 * 60 * 60
+DEFAULT_SNAPLEN = 262144
+
+# magic as read in little endian -> (byte order, ns resolution)
+PCAP_MAGICS = {
+    0xA1B2C3D4: ("<", False),
+    0xD4C3B2A1: (">", False),
+    0xA1B23C4D: ("<", True),
+    0x4D3CB2A1: (">", True),
+}
+
+
+def is_classic_pcap(filename: str) -> bool:
+    with open(filename, "rb") as f:
+        magic = f.read(4)
+    return len(magic) == 4 and struct.unpack("<I", magic)[0] in PCAP_MAGICS
+
+
+class MmapPcapReader:
+    def __init__(self, filename: str):
+        with open(filename, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mem = memoryview(self._map)
+        if len(self._map) < GLOBAL_HEADER_LEN:
+            self.close()
+            raise ValueError("Not a pcap file")
+        magic = struct.unpack_from("<I", self._map, 0)[0]
+        if magic not in PCAP_MAGICS:
+            self.close()
+            raise ValueError("Not a pcap file")
+        endian, nano = PCAP_MAGICS[magic]
+        self._record_header = struct.Struct(endian + "IIII")
+        self._ts_multiplier = 1 if nano else ONE_SEC_IN_NS // ONE_SEC_IN_US
+        self._frac_limit = ONE_SEC_IN_NS if nano else ONE_SEC_IN_US
+        snaplen = struct.unpack_from(endian + "I", self._map, 16)[0]
+        self._snaplen = snaplen if snaplen > 0 else DEFAULT_SNAPLEN
+        self._linktype = struct.unpack_from(endian + "I", self._map, 20)[0] & 0x0FFFFFFF
+        self._records_end = GLOBAL_HEADER_LEN
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        # Frame views handed out have to be released before, otherwise map can not be closed
+        self._mem.release()
+        self._map.close()
+
+    @property
+    def linktype(self) -> int:
+        return self._linktype
+
+    @property
+    def size(self) -> int:
+        return len(self._map)
+
+    @property
+    def records_end(self) -> int:
+        # Offset where the last walk of records stopped, it is the first record start at
+        # or after end of walked range, so end itself if range ends at record start
+        return self._records_end
+
+    def get_record_aligned_ranges(self, n_ranges: int) -> List[Tuple[int, int]]:
+        # Splits records into at most n_ranges byte ranges of similar size. Bounds are
+        # found by resync to record header at even byte offsets, so file is not walked.
+        # Resync is checked on chain of headers, still whoever reads ranges should check
+        # that each one ends at records_end.
+        size = len(self._map)
+        bounds = [GLOBAL_HEADER_LEN]
+        step = max((size - GLOBAL_HEADER_LEN) // max(n_ranges, 1), 1)
+        for i in range(1, n_ranges):
+            bound = self._find_record_start(max(GLOBAL_HEADER_LEN + i * step, bounds[-1] + 1))
+            if bound is None:
+                break
+            bounds.append(bound)
+        bounds.append(size)
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def iter_frames(
+        self, start: int = GLOBAL_HEADER_LEN, end: Optional[int] = None
+    ) -> Iterator[Tuple[int, int, memoryview]]:
+        # Yields (capture time in ns, link type, frame view) for every record starting in [start, end)
+        linktype = self._linktype
+        for time_ns, offset, caplen in self._iter_records(start, end):
+            yield (time_ns, linktype, self._mem[offset : offset + caplen])
+
+    def iter_ptp_frames(
+        self, start: int = GLOBAL_HEADER_LEN, end: Optional[int] = None
+    ) -> Iterator[Tuple[int, int, memoryview, int]]:
+        # Same as iter_frames, but frames are checked on mapped bytes first, so non PTP
+        # frames are skipped without creating any object. Offset of PTP in frame is added.
+        mm = self._map
+        linktype = self._linktype
+        for time_ns, offset, caplen in self._iter_records(start, end):
+            ptp_offset = locate_ptp_payload(mm, offset, caplen, linktype)
+            if ptp_offset >= 0:
+                yield (time_ns, linktype, self._mem[offset : offset + caplen], ptp_offset)
+
+    def _find_record_start(self, pos: int) -> Optional[int]:
+        # First offset from pos starting chain of valid record headers, each record is
+        # at most snaplen long, so one is found within that many bytes if any
+        size = len(self._map)
+        last = min(pos + RECORD_HEADER_LEN + self._snaplen, size - RECORD_HEADER_LEN)
+        while pos <= last:
+            if self._is_record_chain(pos):
+                return pos
+            pos += 1
+        return None
+
+    def _is_record_chain(self, pos: int) -> bool:
+        mm = self._map
+        size = len(mm)
+        unpack_from = self._record_header.unpack_from
+        first_sec = None
+        for _ in range(RESYNC_RECORDS):
+            if pos == size:
+                return True
+            if pos + RECORD_HEADER_LEN > size:
+                return False
+            sec, frac, caplen, origlen = unpack_from(mm, pos)
+            if first_sec is None:
+                first_sec = sec
+            if (
+                frac >= self._frac_limit
+                or caplen == 0
+                or caplen > self._snaplen
+                or caplen > origlen
+                or abs(sec - first_sec) > MAX_RECORD_TIME_SPREAD_S
+            ):
+                return False
+            pos += RECORD_HEADER_LEN + caplen
+            if pos > size:
+                return False
+        return True
+
+    def _iter_records(self, start: int, end: Optional[int]) -> Iterator[Tuple[int, int, int]]:
+        mm = self._map
+        size = len(mm)
+        end = size if end is None else min(end, size)
+        unpack_from = self._record_header.unpack_from
+        ts_multiplier = self._ts_multiplier
+        pos = start
+        while pos < end and pos + RECORD_HEADER_LEN <= size:
+            sec, frac, caplen, _ = unpack_from(mm, pos)
+            offset = pos + RECORD_HEADER_LEN
+            if offset + caplen > size:
+                break  # truncated last record
+            yield (sec * ONE_SEC_IN_NS + frac * ts_multiplier, offset, caplen)
+            pos = offset + caplen
+        self._records_end = pos
@@ -0,0 +1,27 @@
+from typing import Iterator, Tuple
+from scapy.utils import RawPcapReader
+
+from mptp.PtpReader.CompressedInput import open_capture
+
+ONE_SEC_IN_NS = 1000000000
+ONE_SEC_IN_US = 1000000
+
+
+def iter_raw_frames(filename: str) -> Iterator[Tuple[int, int, bytes]]:
+    # Yields (capture time in ns, link type, frame bytes) without any dissection,
+    # compressed captures are decompressed on the fly
+    with RawPcapReader(open_capture(filename)) as pcap:
+        for frame, meta in pcap:
+            yield (_get_time_ns(pcap, meta), _get_linktype(pcap, meta), frame)
+
+
+def _get_time_ns(pcap, meta) -> int:
+    if hasattr(meta, "tsresol"):
+        return (((meta.tshigh << 32) + meta.tslow) * ONE_SEC_IN_NS) // meta.tsresol
+    if getattr(pcap, "nano", False):
+        return meta.sec * ONE_SEC_IN_NS + meta.usec
+    return meta.sec * ONE_SEC_IN_NS + meta.usec * (ONE_SEC_IN_NS // ONE_SEC_IN_US)
+
+
+def _get_linktype(pcap, meta) -> int:
+    return meta.linktype if hasattr(meta, "linktype") else pcap.linktype
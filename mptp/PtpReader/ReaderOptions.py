@@ -0,0 +1,30 @@
+from enum import Enum
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from mptp.PtpStream import TrimEnd, TrimStart
+
+
+class PtpEngine(Enum):
+    Fast = 0
+    Scapy = 1
+
+
+class CacheMode(Enum):
+    Use = 0
+    Bypass = 1
+    Rebuild = 2
+
+
+@dataclass
+class ReaderOptions:
+    engine: PtpEngine = PtpEngine.Fast
+    mmap: bool = True
+    workers: int = 1
+    cache: CacheMode = CacheMode.Use
+    cache_max_size_mb: float = 2048
+    cache_max_age_days: float = 30
+    trim_start: TrimStart = TrimStart.FirstSync
+    trim_end: TrimEnd = TrimEnd.LastDelayResp
+    # start and end in seconds from first frame of capture, either may be None
+    time_range: Optional[Tuple[Optional[float], Optional[float]]] = None
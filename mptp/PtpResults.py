@@ -0,0 +1,190 @@
+import json
+import math
+import os
+from dataclasses import dataclass, fields
+from decimal import Decimal
+from typing import Any, ClassVar, Dict, Iterable, Optional
+import numpy as np
+
+# Typed results of checkers. Scalar fields of result are written as one JSON object per
+# line, array fields are per event columns written together into one compressed npz
+# file under keys "<result name>.<field>", so results of many captures are aggregated
+# without parsing reports.
+ONE_SEC_IN_NS = 1000000000
+
+
+class CheckResult:
+    check: ClassVar[str] = ""
+
+    @property
+    def name(self) -> str:
+        return self.check
+
+    def summary(self) -> Dict[str, Any]:
+        summary = {"check": self.check}
+        for field in fields(self):
+            value = getattr(self, field.name)
+            if not isinstance(value, np.ndarray):
+                summary[field.name] = _to_json_value(value)
+        return summary
+
+    def events(self) -> Dict[str, np.ndarray]:
+        return {
+            field.name: getattr(self, field.name)
+            for field in fields(self)
+            if isinstance(getattr(self, field.name), np.ndarray)
+        }
+
+
+@dataclass
+class AnnounceResult(CheckResult):
+    check: ClassVar[str] = "announce"
+    ok: bool
+    announce_msgs: int
+    inconsistent_msgs: int
+    changes: int
+    # fields of first Announce
+    source: Dict[str, Any]
+    change_time_ns: np.ndarray
+    change_sequence_id: np.ndarray
+
+
+@dataclass
+class PortCheckResult(CheckResult):
+    check: ClassVar[str] = "ports"
+    ok: bool
+    flows: int
+    identity_changes: int
+    # requesting port is empty string for flows of msgs without it
+    flow_src_mac: np.ndarray
+    flow_dst_mac: np.ndarray
+    flow_source_port: np.ndarray
+    flow_requesting_port: np.ndarray
+    flow_msgs: np.ndarray
+    flow_first_ns: np.ndarray
+    flow_last_ns: np.ndarray
+    change_time_ns: np.ndarray
+    change_sequence_id: np.ndarray
+
+
+@dataclass
+class SequenceIdResult(CheckResult):
+    check: ClassVar[str] = "sequence_id"
+    ok: bool
+    lost_msgs: int
+    duplicated_msgs: int
+    reordered_msgs: int
+    # msgs of one type without msg of the other type with the same id
+    missing_msgs: int
+    length_mismatches: int
+    # runs of msgs out of order, kind is value of SequenceRunKind
+    run_msg_type: np.ndarray
+    run_kind: np.ndarray
+    run_msgs: np.ndarray
+    run_first_id: np.ndarray
+    run_last_id: np.ndarray
+    run_time_ns: np.ndarray
+
+
+@dataclass
+class TimingResult(CheckResult):
+    check: ClassVar[str] = "timing"
+    msg_type: str
+    ok: bool
+    msgs: int
+    # detected msgs per second, 0 if unknown
+    detected_rate: int
+    timestamps_complete: bool
+    timestamp_rate_mean: float
+    timestamp_rate_std_dev: float
+    timestamp_rate_min: float
+    timestamp_rate_max: float
+    timestamp_irregularities: int
+    capture_rate_mean: float
+    capture_rate_std_dev: float
+    capture_rate_min: float
+    capture_rate_max: float
+    capture_irregularities: int
+    # capture time of latter msg of irregular pair and error of its time difference
+    timestamp_irregularity_time_ns: np.ndarray
+    timestamp_irregularity_error_ns: np.ndarray
+    capture_irregularity_time_ns: np.ndarray
+    capture_irregularity_error_ns: np.ndarray
+
+    @property
+    def name(self) -> str:
+        return f"{self.check}.{self.msg_type}"
+
+
+@dataclass
+class MatchedResult(CheckResult):
+    check: ClassVar[str] = "matched"
+    ok: bool
+    exchanges: int
+    discarded_syncs: int
+    discarded_delay_reqs: int
+    discarded_delay_resps: int
+    exchange_sync_to_delay_req_us: np.ndarray
+    exchange_delay_req_to_resp_us: np.ndarray
+    exchange_t1_to_t4_us: np.ndarray
+    discarded_msg_type: np.ndarray
+    discarded_time_ns: np.ndarray
+    discarded_sequence_id: np.ndarray
+
+
+@dataclass
+class TwoStepResult(CheckResult):
+    check: ClassVar[str] = "two_step"
+    ok: bool
+    two_step_syncs: int
+    syncs_without_follow_up: int
+    follow_ups_without_sync: int
+    turnaround_ns: np.ndarray
+
+
+@dataclass
+class OffsetResult(CheckResult):
+    check: ClassVar[str] = "offset"
+    ok: bool
+    delay_req_exchanges: int
+    pdelay_req_exchanges: int
+    requests_without_response: int
+    requests_without_sync: int
+    drift_ppb: Optional[float]
+    exchange_time_ns: np.ndarray
+    offset_ns: np.ndarray
+    mean_path_delay_ns: np.ndarray
+
+
+def msg_time_ns(msg) -> int:
+    # Capture time of decoded record or scapy packet
+    time_ns = getattr(msg, "time_ns", None)
+    return time_ns if time_ns is not None else round(Decimal(msg.time) * ONE_SEC_IN_NS)
+
+
+def write_results(log_dir_and_name: str, results: Iterable[CheckResult]):
+    # Results are written next to report, named as report with .jsonl and .npz extension
+    results = list(results)
+    dir_and_name = log_dir_and_name[: log_dir_and_name.rfind(".")]
+    capture = os.path.basename(dir_and_name)
+    with open(dir_and_name + ".jsonl", "w") as json_lines:
+        for result in results:
+            json_lines.write(json.dumps({"capture": capture, **result.summary()}) + "\n")
+    columns = {}
+    for result in results:
+        for field, values in result.events().items():
+            columns[f"{result.name}.{field}"] = values
+    np.savez_compressed(dir_and_name + ".npz", **columns)
+
+
+def _to_json_value(value):
+    # Rates of msgs with the same time are infinite, JSON has no such numbers
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {k: _to_json_value(v) for k, v in value.items()}
+    if isinstance(value, np.generic):
+        return _to_json_value(value.item())
+    if value is not None and not isinstance(value, (bool, int, float, str)):
+        return str(value)
+    return value
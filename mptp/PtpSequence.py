@@ -0,0 +1,165 @@
+from bisect import bisect_left
+from enum import IntEnum
+from typing import List, Tuple
+import numpy as np
+
+# Sequence ids of one PTP message type are compared on columns. Difference of
+# neighbour ids is taken modulo 2^16, so wrap from 65535 to 0 is in order. Pairs out
+# of order are coalesced into runs of neighbour pairs of the same kind.
+SEQUENCE_ID_RANGE = 1 << 16
+
+
+class SequenceRunKind(IntEnum):
+    InOrder = 0
+    Lost = 1
+    Duplicated = 2
+    Reordered = 3
+
+
+class SequenceRuns:
+    # Runs of pairs out of order: kind, index of first pair (pair i is made of msgs i
+    # and i + 1), number of pairs and number of msgs lost, duplicated or reordered
+    def __init__(self, kind: np.ndarray, first_pair: np.ndarray, pairs: np.ndarray, msgs: np.ndarray):
+        self.kind = kind
+        self.first_pair = first_pair
+        self.pairs = pairs
+        self.msgs = msgs
+
+    def of_kind(self, kind: SequenceRunKind) -> "SequenceRuns":
+        selected = self.kind == kind
+        return SequenceRuns(self.kind[selected], self.first_pair[selected], self.pairs[selected], self.msgs[selected])
+
+    def __len__(self):
+        return len(self.kind)
+
+
+def sequence_id_diffs(sequence_ids: np.ndarray) -> np.ndarray:
+    # Differences of neighbour ids modulo 2^16 in range -32768..32767, 16 bit
+    # subtraction wraps by itself
+    return np.diff(sequence_ids.astype(np.uint16, copy=False)).view(np.int16)
+
+
+def find_sequence_runs(sequence_ids: np.ndarray) -> SequenceRuns:
+    # Lost msgs of a pair are the ids skipped above the highest id received before,
+    # duplicated pair repeats id. Step back into gap of lost pair is msg received late,
+    # it is not lost, so jump over it, the step back and return after it are one run
+    # of reordered pairs, e.g. 3, 5, 4, 6 is 1 reordered msg. Other step back is
+    # reordered msg after which ids are counted from it, as after restart of sequence.
+    # Only pairs not in order are classified, they are found by walk of the pairs with
+    # id difference other than 1, so cost of ids in order is a single comparison.
+    diffs = sequence_id_diffs(sequence_ids)
+    events = np.flatnonzero(diffs != 1)
+    if len(events) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return SequenceRuns(np.empty(0, dtype=np.uint8), empty, empty, empty)
+    pair, latter, highest, restart = _walk_pairs_out_of_order(events, diffs[events], len(diffs))
+    diff = diffs[pair].astype(np.int64)
+    skipped = latter - highest - 1
+    late = (skipped < 0) & (diff != 0)
+    lost = np.flatnonzero(skipped > 0)
+    kind = np.full(len(pair), SequenceRunKind.InOrder, dtype=np.uint8)
+    kind[(skipped == 0) & (diff != 1)] = SequenceRunKind.Reordered
+    kind[lost] = SequenceRunKind.Lost
+    kind[late | restart] = SequenceRunKind.Reordered
+    kind[diff == 0] = SequenceRunKind.Duplicated
+    msgs = np.where(kind == SequenceRunKind.Lost, skipped, 0)
+    msgs[late | restart | (diff == 0)] = 1
+    # each id received late is subtracted once from lost msgs of its gap
+    late_ids = latter[late]
+    gap = _lost_gap(highest[lost], latter[lost], late_ids)
+    _, filled = np.unique(late_ids[gap >= 0], return_index=True)
+    msgs[lost] -= np.bincount(gap[gap >= 0][filled], minlength=len(lost))
+    kind[lost[msgs[lost] == 0]] = SequenceRunKind.Reordered
+    out_of_order = np.flatnonzero(kind != SequenceRunKind.InOrder)
+    out_of_order_pair = pair[out_of_order]
+    out_of_order_kind = kind[out_of_order]
+    run_start = np.ones(len(out_of_order), dtype=bool)
+    run_start[1:] = (np.diff(out_of_order_pair) != 1) | (out_of_order_kind[1:] != out_of_order_kind[:-1])
+    starts = np.flatnonzero(run_start)
+    pairs = np.diff(np.append(starts, len(out_of_order)))
+    msgs = np.add.reduceat(msgs[out_of_order], starts) if len(starts) > 0 else np.empty(0, dtype=np.int64)
+    return SequenceRuns(out_of_order_kind[starts], out_of_order_pair[starts], pairs, msgs)
+
+
+def _walk_pairs_out_of_order(
+    events: np.ndarray, event_diffs: np.ndarray, n_pairs: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # Ids on one increasing scale are followed pair by pair, only pairs with id
+    # difference other than 1 are visited, pairs with difference 1 between them go in
+    # order unless latter id is not above the highest one, as after msg received late.
+    # Returns pair index, latter id, highest id before pair and restart of pairs
+    # visited and of pairs with difference 1 below the highest id, in pair order.
+    cur = highest = 0
+    previous = 0
+    gap_after: List[int] = []
+    gap_before: List[int] = []
+    latters: List[int] = []
+    highests: List[int] = []
+    restarts: List[int] = []
+    below: List[Tuple[int, int, int, int]] = []  # first pair, its latter id, pairs, highest id
+    add_latter, add_highest = latters.append, highests.append
+    for i, d in zip(events.tolist() + [n_pairs], event_diffs.tolist() + [1]):
+        if i != previous:
+            in_order = i - previous
+            if cur < highest:
+                below.append((previous, cur + 1, min(in_order, highest - cur), highest))
+            cur += in_order
+            if cur > highest:
+                highest = cur
+        if i == n_pairs:
+            break
+        latter = cur + d
+        if d < 0:
+            gap = bisect_left(gap_after, latter) - 1
+            if gap < 0 or latter >= gap_before[gap]:
+                # step back out of any gap, ids are counted from the highest one
+                latter = highest + 1
+                restarts.append(i)
+        elif latter > highest + 1:
+            gap_after.append(highest)
+            gap_before.append(latter)
+        add_latter(latter)
+        add_highest(highest)
+        cur = latter
+        if latter > highest:
+            highest = latter
+        previous = i + 1
+    pair = events.astype(np.int64)
+    latter, highest = np.array(latters, dtype=np.int64), np.array(highests, dtype=np.int64)
+    if below:
+        first, first_id, count, below_highest = (np.array(column, dtype=np.int64) for column in zip(*below))
+        offset = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+        pair = np.concatenate((pair, np.repeat(first, count) + offset))
+        latter = np.concatenate((latter, np.repeat(first_id, count) + offset))
+        highest = np.concatenate((highest, np.repeat(below_highest, count)))
+        order = np.argsort(pair, kind="stable")
+        pair, latter, highest = pair[order], latter[order], highest[order]
+    return pair, latter, highest, np.isin(pair, restarts)
+
+
+def _lost_gap(gap_after: np.ndarray, gap_before: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    # Index of gap each id is in, -1 if none. Gaps of lost pairs are ids above highest
+    # id before pair and below its latter id, they are disjoint and ascending.
+    gap = np.searchsorted(gap_after, ids) - 1
+    in_gap = gap >= 0
+    in_gap[in_gap] = ids[in_gap] < gap_before[gap[in_gap]]
+    return np.where(in_gap, gap, -1)
+
+
+def missing_sequence_ids(in_set: np.ndarray, subset: np.ndarray) -> np.ndarray:
+    # Sorted ids of in_set which are not in subset. Ids are 16 bit, so sets are kept
+    # as presence tables of all ids, what is linear in number of msgs.
+    present = np.zeros(SEQUENCE_ID_RANGE, dtype=bool)
+    present[in_set] = True
+    present[subset] = False
+    return np.flatnonzero(present)
+
+
+def sequence_id_ranges(sorted_ids: np.ndarray) -> List[Tuple[int, int]]:
+    # Consecutive ids coalesced into (first, last) ranges
+    if len(sorted_ids) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(sorted_ids.astype(np.int32)) != 1) + 1
+    firsts = np.concatenate(([0], breaks))
+    lasts = np.concatenate((breaks - 1, [len(sorted_ids) - 1]))
+    return list(zip(sorted_ids[firsts].tolist(), sorted_ids[lasts].tolist()))
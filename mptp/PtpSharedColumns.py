@@ -0,0 +1,65 @@
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Dict, List, Tuple
+import numpy as np
+
+from mptp.PtpColumns import COLUMNS, PtpColumns
+
+# PtpColumns shared between processes. Columns are copied once into a single
+# shared memory block, worker processes get only a small handle and map the
+# block, so PTP messages are neither pickled nor copied per worker.
+
+COLUMN_ALIGNMENT = 64
+
+# Shared memory blocks attached by this process, kept open for process lifetime,
+# as columns of analysed stream may be referenced by checkers until process ends
+_attached: Dict[str, Tuple[shared_memory.SharedMemory, PtpColumns]] = {}
+
+
+@dataclass
+class SharedColumnsHandle:
+    name: str
+    # column name, offset in block and number of rows
+    layout: List[Tuple[str, int, int]]
+    port_ids: List[str]
+    macs: List[str]
+    announce_bodies: List[tuple]
+
+
+class SharedColumns:
+    def __init__(self, columns: PtpColumns):
+        layout, size = [], 0
+        for name in COLUMNS:
+            layout.append((name, size, len(columns)))
+            nbytes = columns.column(name).nbytes
+            size += -(-nbytes // COLUMN_ALIGNMENT) * COLUMN_ALIGNMENT
+        self._shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for name, offset, rows in layout:
+            _map_column(self._shm, name, offset, rows)[:] = columns.column(name)
+        self.handle = SharedColumnsHandle(
+            self._shm.name, layout, columns.port_ids, columns.macs, columns.announce_bodies
+        )
+
+    def close(self):
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def attach_shared_columns(handle: SharedColumnsHandle) -> PtpColumns:
+    attached = _attached.get(handle.name)
+    if attached is None:
+        shm = shared_memory.SharedMemory(name=handle.name)
+        columns = {name: _map_column(shm, name, offset, rows) for name, offset, rows in handle.layout}
+        attached = (shm, PtpColumns(columns, handle.port_ids, handle.macs, handle.announce_bodies))
+        _attached[handle.name] = attached
+    return attached[1]
+
+
+def _map_column(shm: shared_memory.SharedMemory, name: str, offset: int, rows: int) -> np.ndarray:
+    return np.ndarray(rows, dtype=COLUMNS[name], buffer=shm.buf, offset=offset)
@@ -1,78 +1,138 @@
 import time
 from dataclasses import dataclass
-from typing import List
-from mptp.PtpPacket.PTPv2 import PTPv2, PtpType
+from decimal import Decimal
+from enum import Enum
+from typing import Iterable, Union
+import numpy as np
+from mptp.PtpPacket.PTPv2 import PTPv2, PTP_MSG_TYPE
+from mptp.PtpColumns import PtpColumns, PtpMsgView
+
+
+class TrimStart(Enum):
+    FirstSync = "first_sync"
+    NoTrim = "none"
+
+
+class TrimEnd(Enum):
+    LastDelayResp = "last_delay_resp"
+    NoTrim = "none"
 
 
 @dataclass
 class PtpStream:
-    def __init__(self, packets: List[PTPv2]):
-        self._time_offset: float = 0.0
-        self._pcap_start_date: float = 0.0 
-        self._packets: List[PTPv2] = packets
-        self._announce: List[PTPv2] = []
-        self._signalling: List[PTPv2] = []
-        self._sync: List[PTPv2] = []
-        self._follow_up: List[PTPv2] = []
-        self._delay_req: List[PTPv2] = []
-        self._delay_resp: List[PTPv2] = []
-        self._delay_resp_fup: List[PTPv2] = []
-        self._other_ptp_msgs: List[PTPv2] = []
-        self._ptp_msgs_total: List[PTPv2] = []
-        self._get_time_offset_from_packets(packets)
-        self._add(self._cut_boundaries(packets))
-
-    def _add(self, pkt: List[PTPv2]):
-        if type(pkt) == PTPv2:
-            self._add_dispatch(pkt)
-        elif iter(pkt):
-            for p in pkt:
-                self._add_dispatch(p)
-
-    def _get_time_offset_from_packets(self, pkt):
-        if len(pkt) > 0:
-            self._add_time_data(pkt)
-
-    def _add_dispatch(self, p: PTPv2):
-        if PtpType.is_sync(p):
-            self._sync.append(p)
-        elif PtpType.is_delay_req(p) or PtpType.is_pdelay_req(p):
-            self.delay_req.append(p)
-        elif PtpType.is_delay_resp(p) or PtpType.is_pdelay_resp(p):
-            self._delay_resp.append(p)
-        elif PtpType.is_followup(p):
-            self._follow_up.append(p)
-        elif PtpType.is_delay_resp_followup(p):
-            self._delay_resp_fup.append(p)
-        elif PtpType.is_announce:
-            self._announce.append(p)
-        elif PtpType.is_signalling(p):
-            self._signalling.append(p)
-        else:
-            self._other_ptp_msgs.append(p)
-        self._ptp_msgs_total.append(p)
-
-    def _add_time_data(self, pkt: PTPv2):
-        self._time_offset = pkt[0].time
-        self._pcap_start_date = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(pkt[0].time))
+    def __init__(
+        self,
+        packets: Iterable[PTPv2],
+        trim_start: TrimStart = TrimStart.FirstSync,
+        trim_end: TrimEnd = TrimEnd.LastDelayResp,
+    ):
+        # packets may be a generator streaming PTP messages straight from the pcap reader,
+        # they are never collected, messages are kept only in columnar form
+        self._init_from_parsed(PtpColumns.from_messages(packets), trim_start, trim_end)
+
+    @classmethod
+    def from_parsed_columns(
+        cls,
+        columns: PtpColumns,
+        trim_start: TrimStart = TrimStart.FirstSync,
+        trim_end: TrimEnd = TrimEnd.LastDelayResp,
+    ) -> "PtpStream":
+        # Columns of all PTP messages from capture, boundaries are not cut yet
+        stream = cls.__new__(cls)
+        stream._init_from_parsed(columns, trim_start, trim_end)
+        return stream
+
+    @classmethod
+    def from_trimmed_columns(cls, columns: PtpColumns, time_offset_ns: int) -> "PtpStream":
+        # Columns of stream already cut, e.g. shared by other process, with its time offset
+        stream = cls.__new__(cls)
+        stream._set_time_offset(time_offset_ns)
+        stream._columns = columns
+        stream._create_views()
+        return stream
+
+    def _init_from_parsed(self, columns: PtpColumns, trim_start: TrimStart, trim_end: TrimEnd):
+        self._set_time_offset(columns.time_ns[0].item() if len(columns) > 0 else None)
+        kept = self._cut_boundaries(columns.msg_type, trim_start, trim_end)
+        self._columns = columns if kept is None else columns.take(kept)
+        self._create_views()
+
+    def _set_time_offset(self, time_offset_ns):
+        self._time_offset = 0.0
+        self._time_offset_ns = 0
+        self._pcap_start_date = 0.0
+        if time_offset_ns is not None:
+            self._time_offset_ns = time_offset_ns
+            self._time_offset = Decimal(time_offset_ns).scaleb(-9)
+            self._pcap_start_date = self._format_date(self._time_offset)
+
+    def _create_views(self):
+        msg_type = self._columns.msg_type
+        self._sync = self._view_of_types(msg_type, PTP_MSG_TYPE.SYNC_MSG)
+        self._delay_req = self._view_of_types(
+            msg_type, PTP_MSG_TYPE.DELAY_REQ_MSG, PTP_MSG_TYPE.PDELAY_REQ_MSG
+        )
+        self._delay_resp = self._view_of_types(
+            msg_type, PTP_MSG_TYPE.DELAY_RESP_MSG, PTP_MSG_TYPE.PDELAY_RESP_MSG
+        )
+        self._follow_up = self._view_of_types(msg_type, PTP_MSG_TYPE.FOLLOW_UP_MSG)
+        self._delay_resp_fup = self._view_of_types(
+            msg_type, PTP_MSG_TYPE.PDELAY_RESP_FOLLOW_UP_MSG
+        )
+        self._announce = self._view_of_types(msg_type, PTP_MSG_TYPE.ANNOUNCE_MSG)
+        self._signalling = self._view_of_types(msg_type, PTP_MSG_TYPE.SIGNALLING_MSG)
+        known_types = [t.value for t in PTP_MSG_TYPE]
+        self._other_ptp_msgs = PtpMsgView(
+            self._columns, np.flatnonzero(~np.isin(msg_type, known_types))
+        )
+        self._ptp_msgs_total = PtpMsgView(self._columns, np.arange(len(self._columns)))
+
+    def _view_of_types(self, msg_type: np.ndarray, *ptp_types: PTP_MSG_TYPE) -> PtpMsgView:
+        mask = np.isin(msg_type, [t.value for t in ptp_types])
+        return PtpMsgView(self._columns, np.flatnonzero(mask))
+
+    @staticmethod
+    def _format_date(t) -> str:
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(float(t)))
 
     @staticmethod
-    def _cut_boundaries(raw_ptp_list: List[PTPv2]):
-        for ptp_msg in raw_ptp_list:
-            if PtpType.is_sync(ptp_msg):
-                break
-            elif PtpType.is_announce(ptp_msg):
-                continue
-            else:
-                raw_ptp_list.remove(ptp_msg)
-        for ptp_msg in reversed(raw_ptp_list):
-            if PtpType.is_delay_resp_followup(ptp_msg) or PtpType.is_delay_resp(
-                ptp_msg
-            ):
-                break
-            else:
-                raw_ptp_list.remove(ptp_msg)
-        return raw_ptp_list
+    def _cut_boundaries(
+        msg_type: np.ndarray, trim_start: TrimStart, trim_end: TrimEnd
+    ) -> Union[np.ndarray, slice, None]:
+        # Returns rows left after cutting, a slice when possible, None if nothing is cut.
+        # Messages before first Sync are dropped except Announces, which do not depend
+        # on any exchange. Messages after last Delay Response or Delay Response
+        # Follow-up are dropped, so the stream ends with complete exchange.
+        start, end = 0, len(msg_type)
+        if trim_start is TrimStart.FirstSync:
+            start = PtpStream._find_first(msg_type, [PTP_MSG_TYPE.SYNC_MSG.value])
+        if trim_end is TrimEnd.LastDelayResp:
+            end_types = [PTP_MSG_TYPE.DELAY_RESP_MSG.value, PTP_MSG_TYPE.PDELAY_RESP_FOLLOW_UP_MSG.value]
+            end = start + PtpStream._find_last(msg_type[start:], end_types) + 1
+        leading_announces = np.flatnonzero(msg_type[:start] == PTP_MSG_TYPE.ANNOUNCE_MSG.value)
+        if len(leading_announces) > 0:
+            return np.concatenate((leading_announces, np.arange(start, end)))
+        if start == 0 and end == len(msg_type):
+            return None
+        return slice(start, end)
+
+    @staticmethod
+    def _find_first(msg_type: np.ndarray, types: list) -> int:
+        # Length of msg_type when no message of given types
+        found = np.zeros(len(msg_type), dtype=bool)
+        for t in types:
+            found |= msg_type == t
+        first = int(found.argmax()) if len(found) > 0 else 0
+        return first if len(found) > 0 and found[first] else len(msg_type)
+
+    @staticmethod
+    def _find_last(msg_type: np.ndarray, types: list) -> int:
+        # -1 when no message of given types
+        return len(msg_type) - 1 - PtpStream._find_first(msg_type[::-1], types)
+
+    @property
+    def columns(self) -> PtpColumns:
+        return self._columns
 
     @property
     def sync(self):
@@ -112,12 +172,16 @@ class PtpStream:
 
     @property
     def packets_total(self):
-        return self._packets
-    
+        return self._ptp_msgs_total
+
     @property
     def time_offset(self):
         return self._time_offset
-    
+
+    @property
+    def time_offset_ns(self):
+        return self._time_offset_ns
+
     @property
     def stream_start_time(self):
         return self._pcap_start_date
@@ -0,0 +1,66 @@
+import numpy as np
+
+from mptp.PtpColumns import NO_INDEX
+
+# PTP timestamp is made of 48 bit seconds and 32 bit nanoseconds. Converted to int64
+# nanoseconds it is exact till year 2262 of PTP epoch, so differences of timestamps
+# are exact at any distance. correctionField is nanoseconds multiplied by 2^16.
+ONE_SEC_IN_NS = 1000000000
+CORRECTION_FRACTION_BITS = 16
+
+
+def timestamps_to_ns(ts_sec: np.ndarray, ts_ns: np.ndarray) -> np.ndarray:
+    return ts_sec.astype(np.int64) * ONE_SEC_IN_NS + ts_ns
+
+
+def timestamp_to_ns(timestamp: dict) -> int:
+    # Timestamp field of decoded msg
+    return timestamp["s"] * ONE_SEC_IN_NS + timestamp["ns"]
+
+
+def corrections_to_ns(correction: np.ndarray) -> np.ndarray:
+    # Rounded to nearest nanosecond
+    half = 1 << (CORRECTION_FRACTION_BITS - 1)
+    return (correction.astype(np.int64) + half) >> CORRECTION_FRACTION_BITS
+
+
+def take(values: np.ndarray, index: np.ndarray, default=0) -> np.ndarray:
+    # Values at index, default where index is NO_INDEX
+    joined = index != NO_INDEX
+    taken = np.full(len(index), default, dtype=values.dtype)
+    taken[joined] = values[index[joined]]
+    return taken
+
+
+def join_next_msgs(
+    first_port: np.ndarray,
+    first_seq: np.ndarray,
+    first_row: np.ndarray,
+    next_port: np.ndarray,
+    next_seq: np.ndarray,
+    next_row: np.ndarray,
+) -> np.ndarray:
+    # Index of next msg of each first msg, NO_INDEX if there is none. Next msg has the
+    # same port identity and sequence id and is the next msg of them after first msg,
+    # like Follow Up of Sync or Delay Resp of Delay Req. Rows of first and of next msgs
+    # are increasing. Msgs are ordered by port, sequence id and row with stable radix
+    # sorts of 16 bit keys, so in linear time.
+    firsts = len(first_row)
+    port = np.concatenate((first_port, next_port))
+    seq = np.concatenate((first_seq, next_seq))
+    order = np.argsort(np.concatenate((first_row, next_row)), kind="stable")
+    order = order[np.argsort(seq[order], kind="stable")]
+    port_key = port[order]
+    if len(port_key) > 0 and 0 <= port_key.min() and port_key.max() <= np.iinfo(np.uint16).max:
+        port_key = port_key.astype(np.uint16)
+    order = order[np.argsort(port_key, kind="stable")]
+    is_next = order >= firsts
+    joined = (
+        ~is_next[:-1]
+        & is_next[1:]
+        & (port[order[:-1]] == port[order[1:]])
+        & (seq[order[:-1]] == seq[order[1:]])
+    )
+    next_of_first = np.full(firsts, NO_INDEX, dtype=np.int64)
+    next_of_first[order[:-1][joined]] = order[1:][joined] - firsts
+    return next_of_first
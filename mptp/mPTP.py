@@ -1,24 +1,269 @@
-from scapy.utils import rdpcap
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, repeat
+from typing import Iterator, Optional, Tuple
+from scapy.utils import PcapReader
 
 from appcommon.AppLogger.ILogger import ILogger
 from appcommon.ConfigReader.ConfigReader import ConfigReader
+from .PtpPacket.PTPv2 import PTPv2
+from .PtpPacket.PtpDecoder import PtpRecord, decode_ptp_frame
+from .PtpReader.CaptureCache import CaptureCache
+from .PtpReader.CompressedInput import UnsupportedCompression, open_capture
+from .PtpReader.MmapPcapNgReader import MmapPcapNgReader, is_pcapng
+from .PtpReader.MmapPcapReader import MmapPcapReader, is_classic_pcap
+from .PtpReader.RawFrames import iter_raw_frames
+from .PtpReader.ReaderOptions import CacheMode, PtpEngine, ReaderOptions
+from .PtpColumns import PtpColumns
+from .PtpResults import msg_time_ns
 from .PtpStream import PtpStream
 from .Analyser import Analyser
+from .AnalysisOptions import AnalysisOptions
 
+MIN_PARALLEL_CHUNK_SIZE = 8 * 1024 * 1024
+ONE_SEC_IN_NS = 1000000000
 
-def PcapToPtpStream(filename: str) -> PtpStream:
-    return PtpStream(open_pcap_get_ptp(filename))
 
+def PcapToPtpStream(
+    filename: str, options: ReaderOptions = ReaderOptions(), logger: Optional[ILogger] = None
+) -> PtpStream:
+    columns = _get_capture_columns(filename, options, logger)
+    return PtpStream.from_parsed_columns(columns, options.trim_start, options.trim_end)
 
-def CreatePtpAnalyser(config: ConfigReader, logger: ILogger, stream: PtpStream) -> Analyser:
-    return Analyser(config, logger, stream)
+
+def _get_capture_columns(filename: str, options: ReaderOptions, logger: Optional[ILogger]) -> PtpColumns:
+    # Cache keeps all PTP messages of capture, so trimming rules may change between runs.
+    # Cached columns come from fast decoder, reference scapy dissection always parses capture.
+    # Part of capture in time range is parsed alone and not cached.
+    if options.time_range is not None:
+        return PtpColumns.from_messages(_iter_pcap_ptp_in_time_range(filename, options, logger))
+    if options.cache is CacheMode.Bypass or options.engine is PtpEngine.Scapy:
+        return _parse_pcap(filename, options)
+    cache = CaptureCache(options.cache_max_size_mb, options.cache_max_age_days)
+    try:
+        cached = cache.load(filename) if options.cache is CacheMode.Use else None
+    except FileNotFoundError:
+        _exit_on_invalid_file()
+    if cached is not None:
+        return cached
+    columns = _parse_pcap(filename, options)
+    try:
+        cache.store(filename, columns)
+    except OSError as e:
+        _warn_cache_not_stored(e, logger)
+    return columns
+
+
+def _warn_cache_not_stored(e: OSError, logger: Optional[ILogger]):
+    # analysis goes on without cache entry
+    message = f"Unable to store parsed capture in cache: {e}"
+    if logger is None:
+        print(message, file=sys.stderr)
+    else:
+        logger.warning(message)
+
+
+def _iter_pcap_ptp_in_time_range(filename: str, options: ReaderOptions, logger: Optional[ILogger]) -> Iterator:
+    # Frames captured in range are taken, range is relative to first frame of capture.
+    # Memory mapped pcapng is read from its block index, other captures are read whole.
+    if options.engine is PtpEngine.Scapy:
+        return _iter_pcap_ptp_scapy(filename, options.time_range)
+    if options.mmap and _is_local_pcapng(filename):
+        return _iter_pcap_ptp_mmap_ng_in_time_range(filename, options, logger)
+    if options.mmap and _is_local_classic_pcap(filename):
+        return _iter_pcap_ptp_mmap_in_time_range(filename, options.time_range)
+    return _iter_pcap_ptp_fast(filename, options.time_range)
+
+
+def _iter_pcap_ptp_mmap_ng_in_time_range(
+    filename: str, options: ReaderOptions, logger: Optional[ILogger]
+) -> Iterator[PtpRecord]:
+    cache = CaptureCache(options.cache_max_size_mb, options.cache_max_age_days)
+    index = cache.load_block_index(filename) if options.cache is CacheMode.Use else None
+    with MmapPcapNgReader(filename, index) as pcap:
+        if index is None:
+            index = pcap.get_block_index()
+            if options.cache is not CacheMode.Bypass:
+                try:
+                    cache.store_block_index(filename, index)
+                except OSError as e:
+                    _warn_cache_not_stored(e, logger)
+        if len(index) == 0:
+            return
+        start_ns, end_ns = _get_time_range_ns(index.times_ns[0].item(), options.time_range)
+        for time_ns, linktype, frame in pcap.iter_frames_in_time_range(start_ns, end_ns):
+            record = decode_ptp_frame(frame, time_ns, linktype)
+            frame.release()
+            if record is not None:
+                yield record
+
+
+def _iter_pcap_ptp_mmap_in_time_range(filename: str, time_range) -> Iterator[PtpRecord]:
+    with MmapPcapReader(filename) as pcap:
+        first = next(pcap.iter_frames(), None)
+        if first is None:
+            return
+        first[2].release()
+        start_ns, end_ns = _get_time_range_ns(first[0], time_range)
+        yield from _decode_mapped_frames(_frames_in_time_range(pcap.iter_ptp_frames(), start_ns, end_ns))
+
+
+def _frames_in_time_range(frames, start_ns: Optional[int], end_ns: Optional[int]):
+    # Views of frames out of range are released right away
+    for frame in frames:
+        if (start_ns is None or frame[0] >= start_ns) and (end_ns is None or frame[0] < end_ns):
+            yield frame
+        else:
+            frame[2].release()
+
+
+def _get_time_range_ns(first_ns: int, time_range) -> Tuple[Optional[int], Optional[int]]:
+    return tuple(None if s is None else first_ns + round(s * ONE_SEC_IN_NS) for s in time_range)
+
+
+def _parse_pcap(filename: str, options: ReaderOptions) -> PtpColumns:
+    workers = _get_parse_workers(filename, options)
+    if workers > 1:
+        return _parse_pcap_parallel(filename, workers)
+    return PtpColumns.from_messages(iter_pcap_ptp(filename, options.engine, options.mmap))
+
+
+def _get_parse_workers(filename: str, options: ReaderOptions) -> int:
+    # Parallel parsing needs random access, so only fast engine with memory mapped classic pcap
+    if options.workers <= 1 or options.engine is not PtpEngine.Fast or not options.mmap:
+        return 1
+    if not _is_local_classic_pcap(filename):
+        return 1
+    return min(options.workers, os.path.getsize(filename) // MIN_PARALLEL_CHUNK_SIZE)
+
+
+def _parse_pcap_parallel(filename: str, workers: int) -> PtpColumns:
+    with MmapPcapReader(filename) as pcap:
+        ranges = pcap.get_record_aligned_ranges(workers)
+    starts, ends = zip(*ranges)
+    with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+        parts, records_ends = zip(*pool.map(_parse_pcap_range, repeat(filename), starts, ends))
+    if records_ends[:-1] != ends[:-1]:
+        # bound resynced to bytes looking like record header, not a record start
+        return PtpColumns.from_messages(_iter_pcap_ptp_mmap(filename))
+    # parts are in capture order, so result is the same as of serial parsing
+    return PtpColumns.concatenate(parts)
+
+
+def _parse_pcap_range(filename: str, start: int, end: int) -> Tuple[PtpColumns, int]:
+    # Columns of range and offset where walk of its records stopped
+    with MmapPcapReader(filename) as pcap:
+        columns = PtpColumns.from_messages(_decode_mapped_frames(pcap.iter_ptp_frames(start, end)))
+        return columns, pcap.records_end
+
+
+def CreatePtpAnalyser(
+    config: ConfigReader, logger: ILogger, stream: PtpStream, options: AnalysisOptions = AnalysisOptions()
+) -> Analyser:
+    return Analyser(config, logger, stream, options)
 
 
-def open_pcap_get_ptp(filename: str):
+def open_pcap_get_ptp(filename: str, engine: PtpEngine = PtpEngine.Fast, use_mmap: bool = True):
+    return list(iter_pcap_ptp(filename, engine, use_mmap))
+
+
+def iter_pcap_ptp(filename: str, engine: PtpEngine = PtpEngine.Fast, use_mmap: bool = True):
+    # Frames are read one by one, non PTP frames are dropped as soon as they are seen,
+    # so memory usage does not depend on capture size but only on amount of PTP messages
+    if engine is PtpEngine.Scapy:
+        return _iter_pcap_ptp_scapy(filename)
+    if use_mmap and _is_local_classic_pcap(filename):
+        return _iter_pcap_ptp_mmap(filename)
+    if use_mmap and _is_local_pcapng(filename):
+        return _iter_pcap_ptp_mmap_ng(filename)
+    return _iter_pcap_ptp_fast(filename)
+
+
+def _iter_pcap_ptp_scapy(filename: str, time_range=None) -> Iterator[PTPv2]:
+    # Reference engine - full scapy dissection of every frame
     try:
-        pcap = rdpcap(filename)
+        pcap = PcapReader(open_capture(filename))
     except FileNotFoundError:
-        print("Provided file is invalid or does not exist!")
-        quit()
-    raw_ptp_list = [p for p in pcap if p.haslayer("PTPv2")]
-    return raw_ptp_list
+        _exit_on_invalid_file()
+    except UnsupportedCompression as e:
+        _exit_on_unsupported_compression(e)
+    start_ns = end_ns = None
+    with pcap:
+        for i, p in enumerate(pcap):
+            if time_range is not None:
+                time_ns = msg_time_ns(p)
+                if i == 0:
+                    start_ns, end_ns = _get_time_range_ns(time_ns, time_range)
+                if (start_ns is not None and time_ns < start_ns) or (end_ns is not None and time_ns >= end_ns):
+                    continue
+            if p.haslayer("PTPv2"):
+                yield p
+
+
+def _iter_pcap_ptp_fast(filename: str, time_range=None) -> Iterator[PtpRecord]:
+    try:
+        frames = iter_raw_frames(filename)
+        if time_range is not None:
+            frames = _raw_frames_in_time_range(frames, time_range)
+        for time_ns, linktype, frame in frames:
+            record = decode_ptp_frame(frame, time_ns, linktype)
+            if record is not None:
+                yield record
+    except FileNotFoundError:
+        _exit_on_invalid_file()
+    except UnsupportedCompression as e:
+        _exit_on_unsupported_compression(e)
+
+
+def _raw_frames_in_time_range(frames, time_range) -> Iterator[Tuple[int, int, bytes]]:
+    first = next(frames, None)
+    if first is None:
+        return
+    start_ns, end_ns = _get_time_range_ns(first[0], time_range)
+    for time_ns, linktype, frame in chain((first,), frames):
+        if (start_ns is None or time_ns >= start_ns) and (end_ns is None or time_ns < end_ns):
+            yield time_ns, linktype, frame
+
+
+def _iter_pcap_ptp_mmap(filename: str, *byte_range) -> Iterator[PtpRecord]:
+    with MmapPcapReader(filename) as pcap:
+        yield from _decode_mapped_frames(pcap.iter_ptp_frames(*byte_range))
+
+
+def _iter_pcap_ptp_mmap_ng(filename: str) -> Iterator[PtpRecord]:
+    with MmapPcapNgReader(filename) as pcap:
+        yield from _decode_mapped_frames(pcap.iter_ptp_frames())
+
+
+def _decode_mapped_frames(frames) -> Iterator[PtpRecord]:
+    for time_ns, linktype, frame, ptp_offset in frames:
+        record = decode_ptp_frame(frame, time_ns, linktype, ptp_offset)
+        frame.release()
+        if record is not None:
+            yield record
+
+
+def _is_local_classic_pcap(filename: str) -> bool:
+    # not seekable files are read by streaming reader
+    try:
+        return os.path.isfile(filename) and is_classic_pcap(filename)
+    except OSError:
+        return False
+
+
+def _is_local_pcapng(filename: str) -> bool:
+    try:
+        return os.path.isfile(filename) and is_pcapng(filename)
+    except OSError:
+        return False
+
+
+def _exit_on_invalid_file():
+    print("Provided file is invalid or does not exist!")
+    quit()
+
+
+def _exit_on_unsupported_compression(e: UnsupportedCompression):
+    print(f"Provided file is compressed, but can not be read. {e}")
+    quit()
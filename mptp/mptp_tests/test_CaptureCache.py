@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from mptp.PtpPacket.PTPv2 import PTP_MSG_TYPE
+from mptp.PtpColumns import COLUMNS, PtpColumns
+from mptp.PtpReader.CaptureCache import CaptureCache
+from mptp.PtpReader.MmapPcapNgReader import PcapNgBlockIndex, PcapNgInterface
+from mptp.PtpStream import PtpStream
+from mptp.mptp_tests.test_PtpStream import create_exchange_test_data, create_ptp_packet
+
+
+class CaptureCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmp_dir, "cache")
+        self.capture = os.path.join(self.tmp_dir, "capture.pcap")
+        with open(self.capture, "wb") as f:
+            f.write(b"\x00" * 1000)
+        packets = [create_ptp_packet(PTP_MSG_TYPE.ANNOUNCE_MSG, 0, -1)]
+        self.columns = PtpColumns.from_messages(packets + create_exchange_test_data())
+        self.stream = PtpStream.from_parsed_columns(self.columns)
+        self.sut = CaptureCache(max_size_mb=10, max_age_days=1, cache_dir=self.cache_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_load_without_entry(self):
+        self.assertIsNone(self.sut.load(self.capture))
+
+    def test_store_failure_raised(self):
+        # cache directory path taken by file
+        open(self.cache_dir, "w").close()
+        with self.assertRaises(OSError):
+            self.sut.store(self.capture, self.columns)
+        self.assertIsNone(self.sut.load(self.capture))
+
+    def test_store_load_roundtrip(self):
+        self.sut.store(self.capture, self.columns)
+        columns = self.sut.load(self.capture)
+        for name in COLUMNS:
+            np.testing.assert_array_equal(self.columns.column(name), columns.column(name))
+        cached_stream = PtpStream.from_parsed_columns(columns)
+        self.assertEqual(self.stream.time_offset_ns, cached_stream.time_offset_ns)
+        self.assertEqual(repr(self.stream), repr(cached_stream))
+        self.assertEqual(self.stream.stream_start_time, cached_stream.stream_start_time)
+        for expected, actual in zip(self.stream.ptp_total, cached_stream.ptp_total):
+            self.assertEqual(expected.sourcePortIdentity, actual.sourcePortIdentity)
+            self.assertEqual(expected.grandmasterClockId, actual.grandmasterClockId)
+
+    def test_block_index_store_load_roundtrip(self):
+        self.assertIsNone(self.sut.load_block_index(self.capture))
+        interfaces = [PcapNgInterface(1, 9, 0), PcapNgInterface(113, 6, 10)]
+        index = PcapNgBlockIndex.from_arrays(
+            np.array([28, 100]), np.array([5, 3]), np.array([1, 0]), interfaces, [(0, "<"), (80, ">")]
+        )
+        self.sut.store_block_index(self.capture, index)
+        loaded = self.sut.load_block_index(self.capture)
+        self.assertTrue(loaded.complete)
+        self.assertEqual([28, 100], loaded.offsets.tolist())
+        self.assertEqual([5, 3], loaded.times_ns.tolist())
+        self.assertEqual([1, 0], loaded.interfaces.tolist())
+        self.assertEqual(
+            [(1, 9, 0), (113, 6, 10)], [(i.linktype, i.tsresol, i.tsoffset) for i in loaded.interface_list]
+        )
+        self.assertEqual([(0, "<"), (80, ">")], loaded.section_endians)
+        # block index does not replace parsed capture entry
+        self.assertIsNone(self.sut.load(self.capture))
+
+    def test_key_changes_with_content(self):
+        key = self.sut.get_key(self.capture)
+        self.assertEqual(key, self.sut.get_key(self.capture))
+        with open(self.capture, "r+b") as f:
+            f.write(b"\x01")
+        os.utime(self.capture, ns=(0, 0))
+        self.assertNotEqual(key, self.sut.get_key(self.capture))
+
+    def test_eviction_by_size_keeps_newest(self):
+        self.sut.store(self.capture, self.columns)
+        other_capture = os.path.join(self.tmp_dir, "other.pcap")
+        shutil.copy(self.capture, other_capture)
+        os.utime(other_capture, ns=(0, 0))
+        self.sut = CaptureCache(max_size_mb=0, max_age_days=1, cache_dir=self.cache_dir)
+        self.sut.store(other_capture, self.columns)
+        self.assertIsNone(self.sut.load(self.capture))
+        self.assertIsNotNone(self.sut.load(other_capture))
+
+    def test_eviction_by_age(self):
+        self.sut.store(self.capture, self.columns)
+        self.sut = CaptureCache(max_size_mb=10, max_age_days=-1, cache_dir=self.cache_dir)
+        self.sut.evict()
+        self.assertIsNone(self.sut.load(self.capture))
@@ -0,0 +1,82 @@
+import gzip
+import lzma
+import os
+import shutil
+import tempfile
+import unittest
+from scapy.utils import wrpcap
+
+from mptp import mPTP
+from mptp.PtpReader import CompressedInput
+from mptp.PtpReader.CompressedInput import ReadAheadReader, detect_compression, open_capture
+from mptp.PtpReader.ReaderOptions import PtpEngine
+from mptp.mptp_tests.test_MmapPcapReader import create_mixed_test_data
+
+
+class CompressedInputTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.capture = os.path.join(self.tmp_dir, "capture.pcap")
+        wrpcap(self.capture, create_mixed_test_data(), nano=True)
+        with open(self.capture, "rb") as f:
+            self.data = f.read()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def write_compressed(self, compression: str, compress) -> str:
+        filename = f"{self.capture}.{compression}"
+        with open(filename, "wb") as f:
+            f.write(compress(self.data))
+        return filename
+
+    def get_compressed_captures(self):
+        captures = [
+            ("gzip", self.write_compressed("gz", gzip.compress)),
+            ("xz", self.write_compressed("xz", lzma.compress)),
+        ]
+        if CompressedInput.zstandard is not None:
+            compress = CompressedInput.zstandard.ZstdCompressor().compress
+            captures.append(("zstd", self.write_compressed("zst", compress)))
+        if CompressedInput.lz4_frame is not None:
+            captures.append(("lz4", self.write_compressed("lz4", CompressedInput.lz4_frame.compress)))
+        return captures
+
+    def test_compression_detected_by_magic(self):
+        self.assertIsNone(detect_compression(self.capture))
+        for compression, filename in self.get_compressed_captures():
+            self.assertEqual(compression, detect_compression(filename))
+            with open_capture(filename) as f:
+                self.assertEqual(self.data, f.read())
+
+    def test_ptp_messages_same_as_from_uncompressed(self):
+        expected = [(r.time_ns, r.sequenceId) for r in mPTP.open_pcap_get_ptp(self.capture)]
+        self.assertEqual(17, len(expected))
+        for _, filename in self.get_compressed_captures():
+            ptp = mPTP.open_pcap_get_ptp(filename)
+            self.assertEqual(expected, [(r.time_ns, r.sequenceId) for r in ptp])
+            self.assertEqual(17, len(mPTP.open_pcap_get_ptp(filename, PtpEngine.Scapy)))
+
+    def test_read_ahead_reader_reads_across_chunks(self):
+        original_chunk_size = CompressedInput.READ_AHEAD_CHUNK_SIZE
+        CompressedInput.READ_AHEAD_CHUNK_SIZE = 100
+        try:
+            with ReadAheadReader(open(self.capture, "rb")) as sut:
+                parts = [sut.read(n) for n in (10, 90, 1, 250, 0, 99)] + [sut.read()]
+            self.assertEqual(self.data, b"".join(parts))
+            self.assertEqual([10, 90, 1, 250, 0, 99], [len(p) for p in parts[:-1]])
+        finally:
+            CompressedInput.READ_AHEAD_CHUNK_SIZE = original_chunk_size
+
+    def test_reader_closed_before_end_of_file(self):
+        original_chunks = CompressedInput.READ_AHEAD_CHUNKS
+        CompressedInput.READ_AHEAD_CHUNKS = 1
+        try:
+            source = open(self.capture, "rb")
+            sut = ReadAheadReader(source)
+            self.assertEqual(self.data[:4], sut.read(4))
+            sut.close()
+            self.assertTrue(source.closed)
+        finally:
+            CompressedInput.READ_AHEAD_CHUNKS = original_chunks
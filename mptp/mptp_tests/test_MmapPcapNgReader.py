@@ -0,0 +1,120 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+from unittest import mock
+from scapy.layers.inet import IP, UDP
+from scapy.layers.l2 import Ether
+
+from mptp.PtpPacket.PTPv2 import PTP_MSG_TYPE
+from mptp.PtpReader.MmapPcapNgReader import MmapPcapNgReader, PcapNgBlockIndex, is_pcapng
+from mptp.mptp_tests.test_MmapPcapReader import read_frames
+from mptp.mptp_tests.test_PtpStream import create_ptp_packet
+
+START_TIME_NS = 1615905574 * 1000000000
+
+
+def pcapng_block(endian: str, block_type: int, body: bytes) -> bytes:
+    body += b"\x00" * (-len(body) % 4)
+    block_len = len(body) + 12
+    return struct.pack(endian + "II", block_type, block_len) + body + struct.pack(endian + "I", block_len)
+
+
+def section_header(endian: str) -> bytes:
+    return pcapng_block(endian, 0x0A0D0D0A, struct.pack(endian + "IHHq", 0x1A2B3C4D, 1, 0, -1))
+
+
+def interface(endian: str, linktype: int, tsresol: int = None, tsoffset: int = None) -> bytes:
+    options = b""
+    if tsresol is not None:
+        options += struct.pack(endian + "HHB3x", 9, 1, tsresol)
+    if tsoffset is not None:
+        options += struct.pack(endian + "HHq", 14, 8, tsoffset)
+    if options:
+        options += struct.pack(endian + "HH", 0, 0)
+    return pcapng_block(endian, 1, struct.pack(endian + "HHI", linktype, 0, 65535) + options)
+
+
+def enhanced_packet(endian: str, if_id: int, ts: int, frame: bytes) -> bytes:
+    header = struct.pack(endian + "IIIII", if_id, ts >> 32, ts & 0xFFFFFFFF, len(frame), len(frame))
+    return pcapng_block(endian, 6, header + frame)
+
+
+class MmapPcapNgReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmp_dir, "capture.pcapng")
+        ptp = bytes(create_ptp_packet(PTP_MSG_TYPE.SYNC_MSG, 1, 0))
+        noise = bytes(Ether() / IP() / UDP(dport=1234))
+        t = START_TIME_NS
+        # (time ns, link type, frame) in file order
+        self.expected = [
+            (t, 1, ptp),
+            (t + 1000, 1, noise),
+            (t + 2000, 1, ptp),
+            (t + 125000000, 1, ptp),
+            (t + 5000, 1, noise),
+        ]
+        data = section_header("<") + interface("<", 1, tsresol=9) + interface("<", 1, tsoffset=10)
+        data += enhanced_packet("<", 0, t, ptp) + enhanced_packet("<", 0, t + 1000, noise)
+        data += enhanced_packet("<", 1, (t - 10000000000) // 1000 + 2, ptp)
+        data += interface("<", 1, tsresol=0x83)
+        data += enhanced_packet("<", 2, (t + 125000000) * 8 // 1000000000, ptp)
+        data += section_header(">") + interface(">", 1, tsresol=9)
+        data += enhanced_packet(">", 0, t + 5000, noise)
+        with open(self.filename, "wb") as f:
+            f.write(data)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_frames_of_all_sections_and_interfaces(self):
+        self.assertTrue(is_pcapng(self.filename))
+        with MmapPcapNgReader(self.filename) as sut:
+            frames = read_frames(sut.iter_frames())
+            self.assertEqual([9, 6, 0x83, 9], [i.tsresol for i in sut.interfaces])
+        self.assertEqual([(t, frame) for t, _, frame in self.expected], frames)
+
+    def test_ptp_prefilter(self):
+        with MmapPcapNgReader(self.filename) as sut:
+            frames = read_frames(sut.iter_ptp_frames())
+        expected = [(t, frame) for t, _, frame in self.expected if frame[12:14] == b"\x88\xf7"]
+        self.assertEqual(expected, frames)
+
+    def test_block_index_built_while_streaming(self):
+        with MmapPcapNgReader(self.filename) as sut:
+            read_frames(sut.iter_frames())
+            index = sut.get_block_index()
+            self.assertTrue(index.complete)
+            self.assertEqual([t for t, _, _ in self.expected], index.times_ns.tolist())
+            self.assertEqual([0, 0, 1, 2, 3], index.interfaces.tolist())
+
+    def test_time_range_read_from_index(self):
+        start, end = START_TIME_NS + 1000, START_TIME_NS + 125000000
+        with MmapPcapNgReader(self.filename) as sut:
+            frames = read_frames(sut.iter_frames_in_time_range(start, end))
+        expected = [(t, frame) for t, _, frame in self.expected if start <= t < end]
+        self.assertEqual(3, len(frames))
+        self.assertEqual(expected, frames)
+
+    def test_time_range_read_from_given_index(self):
+        start = START_TIME_NS + 2000
+        with MmapPcapNgReader(self.filename) as sut:
+            index = sut.get_block_index()
+        index = PcapNgBlockIndex.from_arrays(
+            index.offsets, index.times_ns, index.interfaces, index.interface_list, index.section_endians
+        )
+        with MmapPcapNgReader(self.filename, index) as sut:
+            with mock.patch.object(sut, "_iter_packet_blocks", side_effect=AssertionError("capture walked")):
+                frames = read_frames(sut.iter_frames_in_time_range(start))
+        expected = [(t, frame) for t, _, frame in self.expected if start <= t]
+        self.assertEqual(3, len(frames))
+        self.assertEqual(expected, frames)
+
+    def test_truncated_last_block_is_skipped(self):
+        with open(self.filename, "r+b") as f:
+            f.truncate(os.path.getsize(self.filename) - 5)
+        with MmapPcapNgReader(self.filename) as sut:
+            self.assertEqual(len(self.expected) - 1, len(read_frames(sut.iter_frames())))
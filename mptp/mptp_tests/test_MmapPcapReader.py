@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import unittest
+from scapy.layers.inet import IP, UDP
+from scapy.layers.l2 import Ether
+from scapy.utils import wrpcap
+
+from mptp.PtpPacket.PTPv2 import PTP_MSG_TYPE
+from mptp.PtpReader.MmapPcapReader import MmapPcapReader, is_classic_pcap
+from mptp.PtpReader.RawFrames import iter_raw_frames
+from mptp.mptp_tests.test_PtpStream import create_exchange_test_data, create_ptp_packet
+
+
+def create_mixed_test_data():
+    packets = []
+    for p in create_exchange_test_data(4):
+        noise = Ether() / IP() / UDP(dport=1234) / (b"\x00" * 20)
+        noise.time = p.time
+        packets += [noise, p]
+    # PTP frame truncated within PTP header is rejected by prefilter
+    truncated = Ether(bytes(create_ptp_packet(PTP_MSG_TYPE.SYNC_MSG, 9, 2000))[:30])
+    truncated.time = packets[-1].time
+    return packets + [truncated]
+
+
+def read_frames(frames):
+    # frame views have to be released before reader is closed
+    result = []
+    for time_ns, _, frame, *_ in frames:
+        result.append((time_ns, bytes(frame)))
+        frame.release()
+    return result
+
+
+class MmapPcapReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.packets = create_mixed_test_data()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def write_pcap(self, nano: bool) -> str:
+        filename = os.path.join(self.tmp_dir, "nano.pcap" if nano else "micro.pcap")
+        wrpcap(filename, self.packets, nano=nano)
+        return filename
+
+    def test_frames_same_as_streaming_reader(self):
+        for nano in (False, True):
+            filename = self.write_pcap(nano)
+            self.assertTrue(is_classic_pcap(filename))
+            expected = [(t, bytes(f)) for t, _, f in iter_raw_frames(filename)]
+            with MmapPcapReader(filename) as sut:
+                self.assertEqual(1, sut.linktype)
+                actual = read_frames(sut.iter_frames())
+            self.assertEqual(len(self.packets), len(actual))
+            self.assertEqual(expected, actual)
+
+    def test_ptp_prefilter(self):
+        filename = self.write_pcap(True)
+        with MmapPcapReader(filename) as sut:
+            frames = read_frames(sut.iter_ptp_frames())
+        expected = [
+            (round(p.time * 1000000000), bytes(p))
+            for p in self.packets
+            if p.type == 0x88F7 and len(p) >= 48
+        ]
+        self.assertEqual(len(self.packets) // 2, len(frames))
+        self.assertEqual(expected, frames)
+
+    def test_record_aligned_ranges(self):
+        filename = self.write_pcap(False)
+        with MmapPcapReader(filename) as sut:
+            expected = read_frames(sut.iter_frames())
+            for n in (1, 2, 5, len(self.packets) + 10):
+                ranges = sut.get_record_aligned_ranges(n)
+                self.assertLessEqual(len(ranges), n)
+                self.assertEqual(sut.size, ranges[-1][1])
+                frames = []
+                for start, end in ranges:
+                    frames += read_frames(sut.iter_frames(start, end))
+                self.assertEqual(expected, frames)
+
+    def test_range_bound_resynced_to_next_record(self):
+        filename = self.write_pcap(True)
+        with MmapPcapReader(filename) as sut:
+            record_starts = [offset - 16 for _, offset, _ in sut._iter_records(24, None)]
+            for pos in range(24, sut.size):
+                following = [start for start in record_starts if start >= pos]
+                # the last records are too few to make resync chain
+                if len(following) >= 16:
+                    self.assertEqual(following[0], sut._find_record_start(pos))
+                else:
+                    self.assertIn(sut._find_record_start(pos), following + [None])
+
+    def test_truncated_last_record_is_skipped(self):
+        filename = self.write_pcap(False)
+        with open(filename, "r+b") as f:
+            f.truncate(os.path.getsize(filename) - 5)
+        with MmapPcapReader(filename) as sut:
+            frames = read_frames(sut.iter_frames())
+        self.assertEqual(len(self.packets) - 1, len(frames))
+
+    def test_not_pcap_file(self):
+        filename = os.path.join(self.tmp_dir, "not.pcap")
+        with open(filename, "wb") as f:
+            f.write(b"\x0a\x0d\x0d\x0a" + b"\x00" * 40)
+        self.assertFalse(is_classic_pcap(filename))
+        with self.assertRaises(ValueError):
+            MmapPcapReader(filename)
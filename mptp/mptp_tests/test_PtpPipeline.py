@@ -0,0 +1,150 @@
+import unittest
+from decimal import Decimal
+from unittest import mock
+from appcommon.AppLogger.ILogger import ILogger, LogMessage, build_message
+from appcommon.ConfigReader.ConfigReader import ConfigReader
+
+from mptp.Analyser import Analyser
+from mptp.AnalysisOptions import AnalysisMode, AnalysisOptions
+from mptp.PtpPacket.PTPv2 import PTP_MSG_TYPE
+from mptp.PtpPipeline import PipelineStage, PtpPipeline, split_into_time_shards
+from mptp.PtpStream import PtpStream
+from mptp.mptp_tests.test_PtpStream import create_exchange_test_data, create_ptp_packet
+
+
+class RecordingLogger(ILogger):
+    def __init__(self):
+        self.logs = []
+
+    def info(self, in_string: LogMessage):
+        self.logs.append(("info", build_message(in_string)))
+
+    def debug(self, in_string: LogMessage):
+        self.logs.append(("debug", build_message(in_string)))
+
+    def warning(self, in_string: LogMessage):
+        self.logs.append(("warning", build_message(in_string)))
+
+    def error(self, in_string: LogMessage):
+        self.logs.append(("error", build_message(in_string)))
+
+    def msg_timing(self, msg, time_offset=0):
+        self.logs.append(("msg_timing", msg.time_ns, msg.sequenceId))
+
+    def banner_small(self, in_string: str):
+        self.logs.append(("banner_small", in_string))
+
+    def banner_large(self, in_string: str):
+        self.logs.append(("banner_large", in_string))
+
+    def new_line(self):
+        self.logs.append(("new_line",))
+
+    def get_log_dir_and_name(self) -> str:
+        return "test.log"
+
+
+class CountingStage(PipelineStage):
+    msg_types = (PTP_MSG_TYPE.SYNC_MSG, PTP_MSG_TYPE.DELAY_RESP_MSG)
+
+    def __init__(self, uses_records: bool):
+        self.uses_records = uses_records
+        self.sequence_ids = []
+        self.finished = False
+
+    def add(self, msg):
+        self.sequence_ids.append((msg.messageType, msg.sequenceId))
+
+    def add_batch(self, msgs):
+        self.sequence_ids += zip(msgs.column("msg_type").tolist(), msgs.column("sequence_id").tolist())
+
+    def finish(self):
+        self.finished = True
+
+
+class PtpPipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        packets = create_exchange_test_data(40)
+        # late Follow-up, missing Delay Request and Delay Request sent twice
+        packets[41].time += Decimal("0.02")
+        del packets[82]
+        packets.insert(100, create_ptp_packet(PTP_MSG_TYPE.DELAY_REQ_MSG, 24, 24 * 125 + 50))
+        self.stream = PtpStream(packets)
+
+    def analyse(self, mode: AnalysisMode, batch_size: int = None, workers: int = 1) -> list:
+        config = ConfigReader()
+        config.plotter_off = True
+        logger = RecordingLogger()
+        analyser = Analyser(config, logger, self.stream, AnalysisOptions(mode, workers))
+        if batch_size is not None:
+            analyser._pipeline = PtpPipeline(self.stream, batch_size)
+        analyser.analyse()
+        return logger.logs
+
+    def test_stages_get_messages_of_their_types_in_order(self):
+        expected = [(PTP_MSG_TYPE.SYNC_MSG.value, i) for i in range(40)]
+        expected = sorted(expected + [(PTP_MSG_TYPE.DELAY_RESP_MSG.value, i) for i in range(40)], key=lambda m: m[1])
+        for uses_records in (True, False):
+            sut = PtpPipeline(self.stream, batch_size=7)
+            stage = CountingStage(uses_records)
+            sut.add_stage(stage)
+            sut.run()
+            self.assertTrue(stage.finished)
+            self.assertEqual(expected, stage.sequence_ids)
+
+    def test_single_pass_logs_same_as_analyses_one_by_one(self):
+        expected = self.analyse(AnalysisMode.Serial)
+        self.assertIn(("banner_large", "ptp timing and rate"), expected)
+        self.assertIn(("info", "Delay req msgs lost: 1 in 1 burst"), expected)
+        self.assertIn(("info", "Delay req msgs duplicated: 1 in 1 burst"), expected)
+        for batch_size in (None, 1, 5):
+            self.assertEqual(expected, self.analyse(AnalysisMode.SinglePass, batch_size=batch_size))
+
+    def test_time_shards_start_with_sync(self):
+        columns = self.stream.columns
+        shards = split_into_time_shards(columns, 4)
+        self.assertEqual(4, len(shards))
+        self.assertEqual(0, shards[0][0])
+        self.assertEqual(len(columns), shards[-1][1])
+        for (_, end), (start, _) in zip(shards, shards[1:]):
+            self.assertEqual(end, start)
+            self.assertEqual(PTP_MSG_TYPE.SYNC_MSG.value, columns.msg_type[start])
+        self.assertEqual([(0, len(columns))], split_into_time_shards(columns, 1))
+
+    def test_time_sharded_logs_same_as_analyses_one_by_one(self):
+        # port data changed and Sync without Delay Request just before edges of shards
+        packets = create_exchange_test_data(40)
+        packets[37].src = "02:00:00:00:00:01"
+        del packets[78]
+        packets.insert(120, create_ptp_packet(PTP_MSG_TYPE.DELAY_REQ_MSG, 31, 29 * 125 + 60))
+        self.stream = PtpStream(packets)
+        expected = self.analyse(AnalysisMode.Serial)
+        with mock.patch("mptp.Analyser.MIN_SHARD_MSGS", 1):
+            for workers in (2, 4, 7):
+                self.assertEqual(expected, self.analyse(AnalysisMode.TimeSharded, workers=workers))
+
+    def test_results_same_in_all_modes(self):
+        def results(mode: AnalysisMode, workers: int = 1) -> list:
+            config = ConfigReader()
+            config.plotter_off = True
+            analyser = Analyser(config, RecordingLogger(), self.stream, AnalysisOptions(mode, workers, True))
+            with mock.patch("mptp.Analyser.write_results") as write_results:
+                analyser.analyse()
+            write_results.assert_called_once_with("test.log", analyser.results)
+            return [(r.summary(), {name: v.tolist() for name, v in r.events().items()}) for r in analyser.results]
+
+        expected = results(AnalysisMode.Serial)
+        self.assertEqual(
+            ["announce", "ports", "sequence_id", "timing", "timing", "matched", "two_step", "offset"],
+            [summary["check"] for summary, _ in expected],
+        )
+        self.assertEqual(1, expected[2][0]["lost_msgs"])
+        self.assertEqual(expected, results(AnalysisMode.SinglePass))
+        self.assertEqual(expected, results(AnalysisMode.Concurrent, workers=2))
+        with mock.patch("mptp.Analyser.MIN_SHARD_MSGS", 1):
+            self.assertEqual(expected, results(AnalysisMode.TimeSharded, workers=3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+
+from mptp.PtpResults import TwoStepResult, TimingResult, write_results
+
+
+def create_timing_result(msg_type: str, rate_max: float) -> TimingResult:
+    return TimingResult(
+        msg_type=msg_type,
+        ok=False,
+        msgs=3,
+        detected_rate=8,
+        timestamps_complete=True,
+        timestamp_rate_mean=8.0,
+        timestamp_rate_std_dev=float("nan"),
+        timestamp_rate_min=8.0,
+        timestamp_rate_max=rate_max,
+        timestamp_irregularities=1,
+        capture_rate_mean=8.0,
+        capture_rate_std_dev=0.0,
+        capture_rate_min=8.0,
+        capture_rate_max=8.0,
+        capture_irregularities=0,
+        timestamp_irregularity_time_ns=np.array([2000], dtype=np.int64),
+        timestamp_irregularity_error_ns=np.array([-125000000], dtype=np.int64),
+        capture_irregularity_time_ns=np.empty(0, dtype=np.int64),
+        capture_irregularity_error_ns=np.empty(0, dtype=np.int64),
+    )
+
+
+class PtpResultsTest(unittest.TestCase):
+
+    def test_scalars_in_summary_and_arrays_in_events(self):
+        result = create_timing_result("Sync", float("inf"))
+        summary = result.summary()
+        self.assertEqual("timing", summary["check"])
+        self.assertEqual("Sync", summary["msg_type"])
+        self.assertEqual(1, summary["timestamp_irregularities"])
+        # not finite numbers are not valid JSON
+        self.assertIsNone(summary["timestamp_rate_std_dev"])
+        self.assertIsNone(summary["timestamp_rate_max"])
+        self.assertNotIn("timestamp_irregularity_time_ns", summary)
+        self.assertEqual(
+            [
+                "timestamp_irregularity_time_ns",
+                "timestamp_irregularity_error_ns",
+                "capture_irregularity_time_ns",
+                "capture_irregularity_error_ns",
+            ],
+            list(result.events()),
+        )
+        self.assertEqual("timing.Sync", result.name)
+
+    def test_results_written_as_json_lines_and_columns(self):
+        results = [
+            create_timing_result("Sync", 8.0),
+            create_timing_result("Follow-up", 8.0),
+            TwoStepResult(True, 2, 0, 0, np.array([5000, 6000], dtype=np.int64)),
+        ]
+        with tempfile.TemporaryDirectory() as reports:
+            write_results(os.path.join(reports, "capture.log"), results)
+            with open(os.path.join(reports, "capture.jsonl")) as json_lines:
+                lines = [json.loads(line) for line in json_lines]
+            with np.load(os.path.join(reports, "capture.npz")) as columns:
+                self.assertEqual([5000, 6000], columns["two_step.turnaround_ns"].tolist())
+                self.assertEqual([2000], columns["timing.Follow-up.timestamp_irregularity_time_ns"].tolist())
+                self.assertEqual(9, len(columns.files))
+        self.assertEqual(["timing", "timing", "two_step"], [line["check"] for line in lines])
+        self.assertEqual(
+            {"capture": "capture", "check": "two_step", "ok": True, "two_step_syncs": 2,
+             "syncs_without_follow_up": 0, "follow_ups_without_sync": 0},
+            lines[2],
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
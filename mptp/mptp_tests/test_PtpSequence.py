@@ -0,0 +1,96 @@
+import time
+import unittest
+import numpy as np
+
+from mptp.PtpSequence import (
+    SequenceRunKind,
+    find_sequence_runs,
+    missing_sequence_ids,
+    sequence_id_diffs,
+    sequence_id_ranges,
+)
+
+
+class PtpSequenceTest(unittest.TestCase):
+    def test_diffs_modulo_sequence_id_range(self):
+        sequence_ids = np.array([65534, 65535, 0, 1, 3, 2, 2], dtype=np.uint16)
+        self.assertEqual([1, 1, 1, 2, -1, 0], sequence_id_diffs(sequence_ids).tolist())
+
+    def test_in_order_with_wrap(self):
+        sequence_ids = (np.arange(200000) % 65536).astype(np.uint16)
+        self.assertEqual(0, len(find_sequence_runs(sequence_ids)))
+
+    def test_runs_coalesced(self):
+        # lost 3-4, then every other id lost 6, 8, 10, duplicated 12 twice, reordered 14
+        sequence_ids = np.array([1, 2, 5, 7, 9, 11, 12, 12, 12, 13, 15, 14, 16], dtype=np.uint16)
+        runs = find_sequence_runs(sequence_ids)
+        self.assertEqual(
+            [SequenceRunKind.Lost, SequenceRunKind.Duplicated, SequenceRunKind.Reordered],
+            runs.kind.tolist(),
+        )
+        self.assertEqual([1, 6, 9], runs.first_pair.tolist())
+        self.assertEqual([4, 2, 3], runs.pairs.tolist())
+        self.assertEqual([5, 2, 1], runs.msgs.tolist())
+        lost = runs.of_kind(SequenceRunKind.Lost)
+        self.assertEqual(1, len(lost))
+        self.assertEqual(5, lost.msgs.sum())
+
+    def test_msgs_received_late_are_not_lost(self):
+        # jump over late msgs, steps back into the gap and return are one reordered run
+        for sequence_ids, first_pair, pairs, msgs in (
+            ([1, 2, 3, 5, 4, 6, 7], 2, 3, 1),
+            ([1, 4, 2, 3, 5], 0, 4, 2),
+            ([65534, 65535, 1, 0, 2], 1, 3, 1),
+        ):
+            runs = find_sequence_runs(np.array(sequence_ids, dtype=np.uint16))
+            self.assertEqual([SequenceRunKind.Reordered], runs.kind.tolist())
+            self.assertEqual([first_pair], runs.first_pair.tolist())
+            self.assertEqual([pairs], runs.pairs.tolist())
+            self.assertEqual([msgs], runs.msgs.tolist())
+
+    def test_gap_partly_filled_by_late_msg(self):
+        runs = find_sequence_runs(np.array([1, 4, 2, 5], dtype=np.uint16))
+        self.assertEqual([SequenceRunKind.Lost, SequenceRunKind.Reordered], runs.kind.tolist())
+        self.assertEqual([1, 1], runs.msgs.tolist())
+
+    def test_step_back_out_of_gap_restarts_sequence(self):
+        # ids after restart are not received late
+        runs = find_sequence_runs(np.array([100, 101, 0, 1, 2, 4], dtype=np.uint16))
+        self.assertEqual([SequenceRunKind.Reordered, SequenceRunKind.Lost], runs.kind.tolist())
+        self.assertEqual([1, 4], runs.first_pair.tolist())
+        self.assertEqual([1, 1], runs.msgs.tolist())
+
+    def test_restart_decided_on_ids_counted_after_previous_restart(self):
+        # after restart at 0, 2 skips 1 which comes late, nothing is lost
+        runs = find_sequence_runs(np.array([0, 1, 0, 2, 1], dtype=np.uint16))
+        self.assertEqual([SequenceRunKind.Reordered], runs.kind.tolist())
+        self.assertEqual([1], runs.first_pair.tolist())
+        self.assertEqual([3], runs.pairs.tolist())
+        self.assertEqual([2], runs.msgs.tolist())
+
+    def test_long_capture_with_few_msgs_out_of_order_is_fast(self):
+        rng = np.random.default_rng(0)
+        ids = np.delete(np.arange(10000000), rng.choice(10000000, 10000, replace=False))
+        swapped = rng.choice(len(ids) - 1, 5000, replace=False)
+        ids[swapped], ids[swapped + 1] = ids[swapped + 1], ids[swapped].copy()
+        start = time.perf_counter()
+        runs = find_sequence_runs(ids.astype(np.uint16))
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertGreater(len(runs.of_kind(SequenceRunKind.Lost)), 9000)
+        self.assertGreater(len(runs.of_kind(SequenceRunKind.Reordered)), 4000)
+
+    def test_empty_and_single_msg(self):
+        for sequence_ids in ([], [7]):
+            self.assertEqual(0, len(find_sequence_runs(np.array(sequence_ids, dtype=np.uint16))))
+
+    def test_missing_sequence_ids_in_ranges(self):
+        in_set = np.array([9, 1, 2, 3, 4, 5, 7, 65535, 9], dtype=np.uint16)
+        subset = np.array([1, 5, 100], dtype=np.uint16)
+        missing = missing_sequence_ids(in_set, subset)
+        self.assertEqual([2, 3, 4, 7, 9, 65535], missing.tolist())
+        self.assertEqual([(2, 4), (7, 7), (9, 9), (65535, 65535)], sequence_id_ranges(missing))
+        self.assertEqual([], sequence_id_ranges(missing_sequence_ids(subset, subset)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+import numpy as np
+from appcommon.ConfigReader.ConfigReader import ConfigReader
+
+from mptp.Analyser import Analyser
+from mptp.AnalysisOptions import AnalysisMode, AnalysisOptions
+from mptp.PtpColumns import COLUMNS
+from mptp.PtpSharedColumns import SharedColumns, attach_shared_columns
+from mptp.PtpStream import PtpStream
+from mptp.mptp_tests.test_PtpPipeline import RecordingLogger
+from mptp.mptp_tests.test_PtpStream import create_exchange_test_data
+
+
+class SharedColumnsTest(unittest.TestCase):
+
+    def setUp(self):
+        packets = create_exchange_test_data(20)
+        del packets[30]
+        self.stream = PtpStream(packets)
+
+    def analyse(self, concurrent: bool) -> list:
+        config = ConfigReader()
+        config.plotter_off = True
+        logger = RecordingLogger()
+        mode = AnalysisMode.Concurrent if concurrent else AnalysisMode.Serial
+        Analyser(config, logger, self.stream, AnalysisOptions(mode, workers=2)).analyse()
+        return logger.logs
+
+    def test_attached_columns_same_as_shared(self):
+        columns = self.stream.columns
+        with SharedColumns(columns) as shared:
+            attached = attach_shared_columns(shared.handle)
+            for name in COLUMNS:
+                np.testing.assert_array_equal(columns.column(name), attached.column(name))
+            self.assertEqual(columns.port_ids, attached.port_ids)
+            self.assertEqual(columns.macs, attached.macs)
+            self.assertEqual(
+                [m.sequenceId for m in columns.records(np.arange(len(columns)))],
+                [m.sequenceId for m in attached.records(np.arange(len(attached)))],
+            )
+
+    def test_concurrent_logs_same_as_analyses_one_by_one(self):
+        expected = self.analyse(concurrent=False)
+        self.assertIn(("info", "Delay req msgs lost: 1 in 1 burst"), expected)
+        self.assertEqual(expected, self.analyse(concurrent=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import unittest
+from decimal import Decimal
+from typing import List
+from scapy.layers.l2 import Ether
+
+from mptp.PtpPacket.PTPv2 import PTPv2, PTP_MSG_TYPE
+from mptp.PtpColumns import PtpColumns, PtpMsgView
+from mptp.PtpStream import PtpStream, TrimEnd, TrimStart
+
+MASTER_MAC = "11:22:33:44:55:66"
+SLAVE_MAC = "8c:16:45:9b:9e:11"
+PTP_MULTICAST_MAC = "01:80:c2:00:00:0e"
+MASTER_PORT = b"\x11\x22\x33\xff\xfe\x44\x55\x66\x00\x06"
+SLAVE_PORT = b"\x8c\x16\x45\xff\xfe\x9b\x9e\x11\x00\x01"
+START_TIME = 1615905574
+
+
+def create_ptp_packet(msg_type: PTP_MSG_TYPE, seq: int, time_ms: int, **fields) -> Ether:
+    slave_msg = msg_type in (PTP_MSG_TYPE.DELAY_REQ_MSG, PTP_MSG_TYPE.PDELAY_REQ_MSG)
+    p = Ether(src=SLAVE_MAC if slave_msg else MASTER_MAC, dst=PTP_MULTICAST_MAC) / PTPv2(
+        messageType=msg_type.value,
+        sequenceId=seq,
+        sourcePortIdentity=SLAVE_PORT if slave_msg else MASTER_PORT,
+        **fields,
+    )
+    p = Ether(bytes(p))
+    p.time = Decimal(START_TIME * 1000 + time_ms).scaleb(-3)
+    return p
+
+
+def create_exchange_test_data(n: int = 8) -> List[Ether]:
+    packets = []
+    for i in range(n):
+        t = i * 125
+        ts = START_TIME + t / 1000
+        packets.append(create_ptp_packet(PTP_MSG_TYPE.SYNC_MSG, i, t, originTimestamp=ts))
+        packets.append(create_ptp_packet(PTP_MSG_TYPE.FOLLOW_UP_MSG, i, t + 1, preciseOriginTimestamp=ts))
+        packets.append(create_ptp_packet(PTP_MSG_TYPE.DELAY_REQ_MSG, i, t + 50))
+        packets.append(
+            create_ptp_packet(
+                PTP_MSG_TYPE.DELAY_RESP_MSG, i, t + 51,
+                receiveTimestamp=ts + 0.05, requestingPortIdentity=SLAVE_PORT,
+            )
+        )
+    packets.append(create_ptp_packet(PTP_MSG_TYPE.SYNC_MSG, n, n * 125))
+    return packets
+
+
+class PtpStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.packets = create_exchange_test_data()
+        self.sut = PtpStream(iter(create_exchange_test_data()))
+
+    def test_per_type_views(self):
+        self.assertIsInstance(self.sut.sync, PtpMsgView)
+        self.assertEqual(8, len(self.sut.sync))
+        self.assertEqual(8, len(self.sut.follow_up))
+        self.assertEqual(8, len(self.sut.delay_req))
+        self.assertEqual(8, len(self.sut.delay_resp))
+        self.assertEqual(0, len(self.sut.announce))
+        self.assertEqual(32, len(self.sut.ptp_total))
+
+    def test_boundaries_are_cut(self):
+        self.assertTrue(self.sut.ptp_total[0].messageType == PTP_MSG_TYPE.SYNC_MSG.value)
+        self.assertTrue(self.sut.ptp_total[-1].messageType == PTP_MSG_TYPE.DELAY_RESP_MSG.value)
+
+    def test_leading_messages_cut_up_to_first_sync_but_announces(self):
+        leading = [
+            create_ptp_packet(PTP_MSG_TYPE.DELAY_REQ_MSG, 0, -4),
+            create_ptp_packet(PTP_MSG_TYPE.DELAY_RESP_MSG, 0, -3),
+            create_ptp_packet(PTP_MSG_TYPE.ANNOUNCE_MSG, 0, -2),
+            create_ptp_packet(PTP_MSG_TYPE.FOLLOW_UP_MSG, 0, -1),
+        ]
+        sut = PtpStream(leading + self.packets)
+        self.assertEqual(33, len(sut.ptp_total))
+        self.assertEqual(PTP_MSG_TYPE.ANNOUNCE_MSG.value, sut.ptp_total[0].messageType)
+        self.assertEqual(PTP_MSG_TYPE.SYNC_MSG.value, sut.ptp_total[1].messageType)
+        self.assertEqual(8, len(sut.delay_resp))
+        self.assertEqual(START_TIME - Decimal("0.004"), sut.time_offset)
+
+    def test_trimming_rules(self):
+        leading = [create_ptp_packet(PTP_MSG_TYPE.FOLLOW_UP_MSG, 0, -1)]
+        packets = leading + self.packets
+        sut = PtpStream(packets, TrimStart.NoTrim, TrimEnd.NoTrim)
+        self.assertEqual(len(packets), len(sut.ptp_total))
+        sut = PtpStream(packets, TrimStart.NoTrim, TrimEnd.LastDelayResp)
+        self.assertEqual(len(packets) - 1, len(sut.ptp_total))
+        self.assertEqual(9, len(sut.follow_up))
+        sut = PtpStream(packets, TrimStart.FirstSync, TrimEnd.NoTrim)
+        self.assertEqual(len(self.packets), len(sut.ptp_total))
+        self.assertEqual(9, len(sut.sync))
+
+    def test_nothing_left_without_delay_response(self):
+        packets = [p for p in self.packets if p.messageType != PTP_MSG_TYPE.DELAY_RESP_MSG.value]
+        self.assertEqual(0, len(PtpStream(packets).ptp_total))
+        self.assertEqual(0, len(PtpStream([]).ptp_total))
+
+    def test_time_offset_is_first_message_time(self):
+        self.assertEqual(START_TIME, self.sut.time_offset)
+
+    def test_view_indexes_point_into_columns(self):
+        seq = self.sut.columns.sequence_id[self.sut.delay_resp.indexes]
+        self.assertEqual(list(range(8)), seq.tolist())
+        self.assertEqual(list(range(8)), self.sut.delay_resp.column("sequence_id").tolist())
+
+    def test_records_match_packets(self):
+        expected = self.packets[:-1]
+        for record, packet in zip(self.sut.ptp_total, expected):
+            self.assertEqual(packet.time, record.time)
+            for name in ("src", "dst", "messageType", "sequenceId", "sourcePortIdentity", "flags"):
+                self.assertEqual(getattr(packet, name), getattr(record, name), name)
+        resp = self.sut.delay_resp[3]
+        self.assertEqual(expected[15].receiveTimestamp, resp.receiveTimestamp)
+        self.assertEqual(expected[15].requestingPortIdentity, resp.requestingPortIdentity)
+
+    def test_port_identities_and_macs_are_interned(self):
+        columns: PtpColumns = self.sut.columns
+        self.assertEqual(2, len(columns.port_ids))
+        self.assertEqual(3, len(columns.macs))
+        self.assertEqual(columns.source_port[self.sut.delay_req.indexes[0]],
+                         columns.requesting_port[self.sut.delay_resp.indexes[0]])
+
+    def test_message_memory_footprint(self):
+        self.assertLess(self.sut.columns.nbytes / len(self.sut.columns), 100)
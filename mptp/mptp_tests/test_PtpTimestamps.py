@@ -0,0 +1,42 @@
+import unittest
+import numpy as np
+
+from mptp.PtpColumns import NO_INDEX
+from mptp.PtpTimestamps import corrections_to_ns, join_next_msgs, take, timestamp_to_ns, timestamps_to_ns
+
+
+class PtpTimestampsTest(unittest.TestCase):
+    def test_timestamps_to_ns_exact(self):
+        ts_sec = np.array([0, 1, 1188291, 2**48 // 2**20], dtype=np.int64)
+        ts_ns = np.array([999999999, 0, 869375344, 1], dtype=np.uint32)
+        expected = [s * 10**9 + ns for s, ns in zip(ts_sec.tolist(), ts_ns.tolist())]
+        self.assertEqual(expected, timestamps_to_ns(ts_sec, ts_ns).tolist())
+        self.assertEqual(1188291869375344, timestamp_to_ns({"s": 1188291, "ns": 869375344}))
+
+    def test_differences_longer_than_second(self):
+        ns = timestamps_to_ns(np.array([10, 12, 12]), np.array([900000000, 100000000, 50000000]))
+        self.assertEqual([1200000000, -50000000], np.diff(ns).tolist())
+
+    def test_corrections_to_ns_rounded(self):
+        correction = np.array([0, 1 << 16, -(3 << 16), (5 << 16) + (1 << 15), (7 << 16) - 1], dtype=np.int64)
+        self.assertEqual([0, 1, -3, 6, 7], corrections_to_ns(correction).tolist())
+
+    def test_take_with_default(self):
+        values = np.array([10, 20, 30])
+        self.assertEqual([30, 0, 10], take(values, np.array([2, NO_INDEX, 0])).tolist())
+        self.assertEqual([0], take(np.empty(0, dtype=np.int64), np.array([NO_INDEX])).tolist())
+
+    def test_join_next_msgs(self):
+        sync_seq = np.array([1, 2, 3, 1, 4], dtype=np.uint16)
+        sync_row = np.array([0, 2, 4, 10, 12])
+        follow_up_seq = np.array([1, 3, 3, 1, 4], dtype=np.uint16)
+        follow_up_row = np.array([1, 5, 6, 11, 13])
+        follow_up_port = np.array([0, 0, 0, 0, 1], dtype=np.int32)
+        follow_ups = join_next_msgs(
+            np.zeros(5, dtype=np.int32), sync_seq, sync_row, follow_up_port, follow_up_seq, follow_up_row
+        )
+        self.assertEqual([0, NO_INDEX, 1, 3, NO_INDEX], follow_ups.tolist())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from scapy.layers.inet import IP, UDP
+from scapy.layers.inet6 import IPv6
+from scapy.layers.l2 import CookedLinux, Dot1Q, Ether
+from scapy.utils import wrpcap, wrpcapng
+
+from mptp import mPTP
+from mptp.PtpColumns import COLUMNS, PtpColumns
+from mptp.PtpPacket.PTPv2 import PTPv2, PTP_MSG_TYPE
+from mptp.PtpReader.CaptureCache import CaptureCache
+from mptp.PtpReader.ReaderOptions import CacheMode, PtpEngine, ReaderOptions
+from mptp.PtpResults import msg_time_ns
+from mptp.PtpStream import PtpStream
+from mptp.mptp_tests.test_MmapPcapReader import create_mixed_test_data
+from mptp.mptp_tests.test_PtpStream import create_exchange_test_data, create_ptp_packet
+
+
+def encapsulate(packets, *layers):
+    # Same PTP messages, each carried in given lower layers instead of plain Ethernet
+    result = []
+    for p in packets:
+        e = Ether(src=p.src, dst=p.dst)
+        for layer in layers:
+            e = e / layer.copy()
+        e = Ether(bytes(e / p[PTPv2]))
+        e.time = p.time
+        result.append(e)
+    return result
+
+
+class PcapToPtpStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.capture = os.path.join(self.tmp_dir, "capture.pcap")
+        packets = [create_ptp_packet(PTP_MSG_TYPE.ANNOUNCE_MSG, 0, -1)] + create_mixed_test_data()
+        wrpcap(self.capture, packets, nano=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def assertStreamsEqual(self, expected: PtpStream, actual: PtpStream):
+        self.assertEqual(repr(expected), repr(actual))
+        self.assertEqual(expected.time_offset_ns, actual.time_offset_ns)
+        for name in COLUMNS:
+            np.testing.assert_array_equal(expected.columns.column(name), actual.columns.column(name))
+        self.assertEqual(expected.columns.port_ids, actual.columns.port_ids)
+        self.assertEqual(expected.columns.macs, actual.columns.macs)
+        self.assertEqual(expected.columns.announce_bodies, actual.columns.announce_bodies)
+
+    def test_mmap_and_streaming_readers_give_same_stream(self):
+        options = ReaderOptions(cache=CacheMode.Bypass)
+        expected = mPTP.PcapToPtpStream(self.capture, options)
+        options.mmap = False
+        self.assertEqual(17, len(expected.ptp_total))
+        self.assertStreamsEqual(expected, mPTP.PcapToPtpStream(self.capture, options))
+
+    def test_parallel_parsing_same_as_serial(self):
+        expected = mPTP.PcapToPtpStream(self.capture, ReaderOptions(cache=CacheMode.Bypass))
+        for workers in (1, 2, 3, 8):
+            columns = mPTP._parse_pcap_parallel(self.capture, workers)
+            self.assertStreamsEqual(expected, PtpStream.from_parsed_columns(columns))
+
+    def test_scapy_engine_does_not_use_cache(self):
+        with mock.patch.object(mPTP, "CaptureCache") as cache:
+            mPTP.PcapToPtpStream(self.capture, ReaderOptions(engine=PtpEngine.Scapy))
+        cache.assert_not_called()
+
+    def test_cache_store_failure_logged(self):
+        logger = mock.Mock()
+        with mock.patch.object(mPTP.CaptureCache, "store", side_effect=OSError("disk full")):
+            stream = mPTP.PcapToPtpStream(self.capture, ReaderOptions(cache=CacheMode.Rebuild), logger)
+        self.assertEqual(17, len(stream.ptp_total))
+        logger.warning.assert_called_once_with("Unable to store parsed capture in cache: disk full")
+
+    def test_parallel_parsing_with_bound_not_at_record_parsed_serially(self):
+        expected = mPTP.PcapToPtpStream(self.capture, ReaderOptions(cache=CacheMode.Bypass))
+        size = os.path.getsize(self.capture)
+        with mock.patch.object(mPTP.MmapPcapReader, "get_record_aligned_ranges", return_value=[(24, 101), (101, size)]):
+            columns = mPTP._parse_pcap_parallel(self.capture, 2)
+        self.assertStreamsEqual(expected, PtpStream.from_parsed_columns(columns))
+
+    def test_engines_give_same_stream_for_every_encapsulation(self):
+        udp = (IP(dst="224.0.1.129") / UDP(dport=319),)
+        encapsulations = [(Dot1Q(vlan=7),), udp, (Dot1Q(vlan=7), IPv6(dst="ff0e::181"), UDP(dport=320))]
+        for layers in encapsulations:
+            wrpcap(self.capture, encapsulate(create_exchange_test_data(), *layers), nano=True)
+            self.assert_engines_give_same_stream()
+
+    def test_linux_cooked_capture(self):
+        packets = []
+        for p in create_exchange_test_data():
+            sll = CookedLinux(lladdrlen=6, src=bytes.fromhex(p.src.replace(":", "")) + bytes(2))
+            sll = CookedLinux(bytes(sll / p[PTPv2]))
+            sll.time = p.time
+            packets.append(sll)
+        wrpcap(self.capture, packets, nano=True, linktype=113)
+        stream = self.assert_engines_give_same_stream()
+        self.assertEqual(32, len(stream.ptp_total))
+        self.assertEqual("11:22:33:44:55:66", stream.sync[0].src)
+
+    def test_time_range_same_for_every_reader(self):
+        packets = [create_ptp_packet(PTP_MSG_TYPE.ANNOUNCE_MSG, 0, -1)] + create_mixed_test_data()
+        pcapng = os.path.join(self.tmp_dir, "capture.pcapng")
+        wrpcapng(pcapng, packets)
+        start_ns = msg_time_ns(packets[0]) + 100000000
+        messages = mPTP.open_pcap_get_ptp(self.capture)
+        messages = [m for m in messages if start_ns <= msg_time_ns(m) < start_ns + 200000000]
+        expected = PtpStream.from_parsed_columns(PtpColumns.from_messages(messages))
+        self.assertEqual(4, len(expected.ptp_total))
+        cache = CaptureCache(10, 1, os.path.join(self.tmp_dir, "cache"))
+        with mock.patch.object(mPTP, "CaptureCache", return_value=cache):
+            for filename in (self.capture, pcapng):
+                for options in (ReaderOptions(), ReaderOptions(mmap=False), ReaderOptions(engine=PtpEngine.Scapy)):
+                    options.time_range = (0.1, 0.3)
+                    self.assertStreamsEqual(expected, mPTP.PcapToPtpStream(filename, options))
+        self.assertIsNone(cache.load(self.capture))
+        self.assertIsNotNone(cache.load_block_index(pcapng))
+
+    def assert_engines_give_same_stream(self) -> PtpStream:
+        options = ReaderOptions(cache=CacheMode.Bypass)
+        expected = mPTP.PcapToPtpStream(self.capture, options)
+        self.assertEqual(32, len(expected.ptp_total))
+        options = ReaderOptions(cache=CacheMode.Bypass, mmap=False)
+        self.assertStreamsEqual(expected, mPTP.PcapToPtpStream(self.capture, options))
+        options = ReaderOptions(engine=PtpEngine.Scapy, cache=CacheMode.Bypass)
+        self.assertStreamsEqual(expected, mPTP.PcapToPtpStream(self.capture, options))
+        return expected
@@ -1,7 +1,28 @@
 import unittest
 from mptp.PtpPacket.PtpPacket_tests.test_fields import TimestampFieldTest, PortIdentityFieldTest
 from mptp.PtpPacket.PtpPacket_tests.test_PTPv2 import PTPv2LayerTest
+from mptp.PtpPacket.PtpPacket_tests.test_PtpDecoder import PtpDecoderTest
+from appcommon.AppLogger.AppLogger_tests.test_AppLogger import LazyLoggingTest, LogWriterTest, RepeatedWarningsTest
+from appcommon.Plotter.Plotter_tests.test_Plotter import PlotterTest
+from appcommon.Plotter.Plotter_tests.test_Decimation import DecimationTest
 from mptp.PtpCheckers.PtpCheckers_tests.PtpSequenceId_test import PtpSequenceId_test 
+from mptp.PtpCheckers.PtpCheckers_tests.PtpAnnounceSignal_test import PtpAnnounceSignal_test
+from mptp.PtpCheckers.PtpCheckers_tests.PtpTiming_test import PtpTiming_test
+from mptp.PtpCheckers.PtpCheckers_tests.PtpJoinMatched_test import PtpJoinMatched_test
+from mptp.PtpCheckers.PtpCheckers_tests.PtpTwoStep_test import PtpTwoStep_test
+from mptp.PtpCheckers.PtpCheckers_tests.PtpOffset_test import PtpOffset_test
+from mptp.PtpCheckers.PtpCheckers_tests.PtpPortCheck_test import PtpPortCheck_test
+from mptp.mptp_tests.test_PtpStream import PtpStreamTest
+from mptp.mptp_tests.test_PtpPipeline import PtpPipelineTest
+from mptp.mptp_tests.test_PtpSharedColumns import SharedColumnsTest
+from mptp.mptp_tests.test_PtpTimestamps import PtpTimestampsTest
+from mptp.mptp_tests.test_PtpSequence import PtpSequenceTest
+from mptp.mptp_tests.test_PtpResults import PtpResultsTest
+from mptp.mptp_tests.test_CaptureCache import CaptureCacheTest
+from mptp.mptp_tests.test_MmapPcapReader import MmapPcapReaderTest
+from mptp.mptp_tests.test_MmapPcapNgReader import MmapPcapNgReaderTest
+from mptp.mptp_tests.test_CompressedInput import CompressedInputTest
+from mptp.mptp_tests.test_mPTP import PcapToPtpStreamTest
 
 #python -m tests.runUt
 if __name__ == '__main__':